@@ -3,7 +3,6 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_cors import CORS
 import os
-import logging
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -24,6 +23,11 @@ def create_app(test_config=None):
             SECRET_KEY=os.environ.get('SECRET_KEY', 'dev'),
             SQLALCHEMY_DATABASE_URI=os.environ.get('DATABASE_URL', 'sqlite:///upmon.db'),
             SQLALCHEMY_TRACK_MODIFICATIONS=False,
+            MONITOR_ENABLED=os.environ.get('MONITOR_ENABLED', 'false').lower() == 'true',
+            # Days of history to keep (older raw checks survive as rollups)
+            CHECK_RETENTION_DAYS=int(os.environ.get('CHECK_RETENTION_DAYS', 30)),
+            MINUTE_ROLLUP_RETENTION_DAYS=int(os.environ.get('MINUTE_ROLLUP_RETENTION_DAYS', 7)),
+            HOUR_ROLLUP_RETENTION_DAYS=int(os.environ.get('HOUR_ROLLUP_RETENTION_DAYS', 180)),
         )
     else:
         # Load the test config if passed in
@@ -39,8 +43,13 @@ def create_app(test_config=None):
     db.init_app(app)
     migrate.init_app(app, db)
     
+    # Let retention hand freed pages back on new SQLite databases
+    from app.utils.retention import enable_incremental_auto_vacuum
+    with app.app_context():
+        enable_incremental_auto_vacuum(db.engine)
+    
     # Setup CORS with explicit configuration
-    CORS(app, resources={
+    CORS(app, resources={
         r"/*": {
             "origins": "*",
             "allow_headers": ["Content-Type", "Authorization"],
@@ -48,8 +57,9 @@ def create_app(test_config=None):
         }
     })
     
-    # Setup logging
-    app.logger.setLevel(logging.DEBUG)
+    # Structured, sampled logging (LOG_LEVEL, LOG_FORMAT, LOG_SAMPLE_RATE)
+    from app.utils.log import configure_logging
+    configure_logging(app)
     
     # Add a route to test API connection
     @app.route('/api/test', methods=['GET'])
@@ -58,7 +68,20 @@ def create_app(test_config=None):
         return jsonify({'message': 'API is working!'})
     
     # Register blueprints
-    from app.routes import websites_bp
+    from app.routes import websites_bp, metrics_bp, dashboard_bp, stream_bp, telemetry_bp
     app.register_blueprint(websites_bp)
+    app.register_blueprint(metrics_bp)
+    app.register_blueprint(dashboard_bp)
+    app.register_blueprint(stream_bp)
+    app.register_blueprint(telemetry_bp)
+    
+    # Register maintenance CLI commands
+    from app.commands import register_commands
+    register_commands(app)
+    
+    # Run scheduled checks in this process (keep off when running several API workers)
+    if app.config.get('MONITOR_ENABLED'):
+        from app.utils.monitor import start_monitor
+        start_monitor(app)
     
     return app
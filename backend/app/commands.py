@@ -0,0 +1,68 @@
+"""Flask CLI commands for maintenance jobs (run with `flask <command>`)"""
+from datetime import datetime, timedelta
+
+import click
+
+from app.utils.rollups import update_rollups
+from app.utils.retention import apply_retention, checks_kept_since, retention_settings, convert_to_incremental_vacuum
+from app.utils.sla import build_sla_report, month_window
+
+
+def register_commands(app):
+    """Attach the maintenance commands to the app's CLI"""
+
+    @app.cli.command('update-rollups')
+    @click.option('--batch-size', default=20000, help='Checks folded in per transaction')
+    def update_rollups_command(batch_size):
+        """Fold new checks into the rollup tables"""
+        processed = update_rollups(batch_size=batch_size)
+        click.echo(f"Rolled up {processed} checks")
+
+    @app.cli.command('apply-retention')
+    @click.option('--convert-vacuum', is_flag=True,
+                  help='Switch an existing SQLite database to incremental auto-vacuum (runs a full VACUUM once)')
+    def apply_retention_command(convert_vacuum):
+        """Roll up and delete history past its retention period"""
+        if convert_vacuum:
+            convert_to_incremental_vacuum()
+        stats = apply_retention(**retention_settings(app))
+        for name, value in stats.items():
+            click.echo(f"{name}: {value}")
+
+    @app.cli.command('sla-report')
+    @click.option('--month', help='Month to report on, as YYYY-MM (default: last month)')
+    @click.option('--start', type=click.DateTime(), help='Window start (UTC), instead of --month')
+    @click.option('--end', type=click.DateTime(), help='Window end (UTC), instead of --month')
+    @click.option('--format', 'report_format', type=click.Choice(['json', 'csv']), default='json')
+    @click.option('--output', type=click.Path(dir_okay=False), help='Write the report here instead of stdout')
+    @click.option('--outages', type=click.Path(dir_okay=False),
+                  help='With --format csv, also write the outages table here')
+    def sla_report_command(month, start, end, report_format, output, outages):
+        """Uptime, outages, MTTR and response time percentiles for every website"""
+        if start or end:
+            if not (start and end):
+                raise click.UsageError('--start and --end go together')
+        else:
+            if month is None:
+                month = f"{(datetime.utcnow().replace(day=1) - timedelta(days=1)):%Y-%m}"
+            try:
+                start, end = month_window(month)
+            except ValueError:
+                raise click.BadParameter('expected YYYY-MM', param_hint='--month')
+
+        report = build_sla_report(start, end, checks_since=checks_kept_since(app))
+        text = report.to_csv() if report_format == 'csv' else report.to_json()
+        if output:
+            with open(output, 'w', newline='') as f:
+                f.write(text)
+        else:
+            click.echo(text, nl=False)
+        if outages and report_format == 'csv':
+            with open(outages, 'w', newline='') as f:
+                f.write(report.to_csv('outages'))
+        click.echo(f"{len(report.websites)} websites, {len(report.outages)} outages "
+                   f"from {start.isoformat()} to {end.isoformat()}", err=True)
+        if not report.complete:
+            click.echo(f"Warning: raw checks before {report.covered_from.isoformat()} have been deleted "
+                       f"(CHECK_RETENTION_DAYS), so this report only covers {report.coverage_percent}% "
+                       f"of the window", err=True)
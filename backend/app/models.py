@@ -10,13 +10,32 @@ class Website(db.Model):
     url = db.Column(db.String(255), nullable=False)
     check_interval_minutes = db.Column(db.Integer, default=5)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Bumped on every change so check workers can pick up edits (see app.utils.worker)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     is_active = db.Column(db.Boolean, default=True)
+    # How the site is checked: 'head', 'partial' or 'keyword' (see app.utils.check_modes)
+    check_mode = db.Column(db.String(10), nullable=False, default='partial', server_default='partial')
+    # Most body bytes read per check (None for the default)
+    check_max_bytes = db.Column(db.Integer, nullable=True)
+    check_keyword = db.Column(db.String(255), nullable=True)
+    check_keyword_is_regex = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
     
     # Relationship with checks
     checks = db.relationship('Check', back_populates='website', cascade='all, delete-orphan')
     
-    def to_dict(self):
-        """Convert object to dictionary"""
+    def to_dict(self, latest_statuses=None):
+        """
+        Convert object to dictionary
+        
+        Args:
+            latest_statuses: Optional dict of website ID -> status preloaded
+                with get_latest_statuses() (or the status cache), so listing
+                many websites doesn't run one query per website
+        """
+        if latest_statuses is not None:
+            latest_status = latest_statuses.get(self.id)
+        else:
+            latest_status = self.get_latest_status()
         return {
             'id': self.id,
             'name': self.name,
@@ -24,7 +43,11 @@ class Website(db.Model):
             'check_interval_minutes': self.check_interval_minutes,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'is_active': self.is_active,
-            'latest_status': self.get_latest_status()
+            'check_mode': self.check_mode,
+            'check_max_bytes': self.check_max_bytes,
+            'check_keyword': self.check_keyword,
+            'check_keyword_is_regex': self.check_keyword_is_regex,
+            'latest_status': latest_status
         }
     
     def get_latest_status(self):
@@ -32,13 +55,34 @@ class Website(db.Model):
         latest_check = Check.query.filter_by(website_id=self.id).order_by(Check.checked_at.desc()).first()
         if not latest_check:
             return None
-        return {
-            'is_up': latest_check.is_up,
-            'status_code': latest_check.status_code,
-            'response_time_ms': latest_check.response_time_ms,
-            'checked_at': latest_check.checked_at.isoformat() if latest_check.checked_at else None,
-            'error_message': latest_check.error_message
-        }
+        return latest_check.status_dict()
+    
+    @staticmethod
+    def get_latest_statuses(website_ids=None):
+        """
+        Get the latest check status for many websites in a single query
+        
+        Args:
+            website_ids: Optional list of IDs to limit the lookup to
+            
+        Returns:
+            dict: Website ID -> latest status (websites without checks are omitted)
+        """
+        latest = db.session.query(
+            Check.website_id,
+            db.func.max(Check.checked_at).label('checked_at')
+        ).group_by(Check.website_id)
+        if website_ids is not None:
+            latest = latest.filter(Check.website_id.in_(website_ids))
+        latest = latest.subquery()
+        
+        checks = Check.query.join(
+            latest,
+            db.and_(Check.website_id == latest.c.website_id, Check.checked_at == latest.c.checked_at)
+        ).order_by(Check.id)
+        
+        # Checks sharing the same timestamp resolve to the most recently inserted one
+        return {check.website_id: check.status_dict() for check in checks}
 
 
 class Check(db.Model):
@@ -52,10 +96,51 @@ class Check(db.Model):
     is_up = db.Column(db.Boolean, nullable=False)
     checked_at = db.Column(db.DateTime, default=datetime.utcnow)
     error_message = db.Column(db.Text, nullable=True)
+    # How the connection was made: 'cold', 'new' or 'reused' (see app.utils.http_client)
+    connection_mode = db.Column(db.String(10), nullable=True)
+    # Time spent in each phase of the request (see app.utils.http_client.Timings);
+    # None for phases that didn't happen, e.g. connection setup on a reused connection
+    dns_ms = db.Column(db.Integer, nullable=True)
+    connect_ms = db.Column(db.Integer, nullable=True)
+    tls_ms = db.Column(db.Integer, nullable=True)
+    ttfb_ms = db.Column(db.Integer, nullable=True)
+    download_ms = db.Column(db.Integer, nullable=True)
     
     # Relationship with website
     website = db.relationship('Website', back_populates='checks')
     
+    __table_args__ = (
+        # Every status/history query filters on website and orders newest first
+        db.Index('ix_checks_website_id_checked_at', website_id, checked_at.desc()),
+        # Failures only, for outage lookups
+        db.Index(
+            'ix_checks_failures', website_id, checked_at.desc(),
+            sqlite_where=db.text('NOT is_up'), postgresql_where=db.text('NOT is_up')
+        ),
+    )
+    
+    def status_dict(self):
+        """Summary of this check as used for a website's latest status"""
+        return {
+            'is_up': self.is_up,
+            'status_code': self.status_code,
+            'response_time_ms': self.response_time_ms,
+            'checked_at': self.checked_at.isoformat() if self.checked_at else None,
+            'error_message': self.error_message,
+            'connection_mode': self.connection_mode,
+            'timings': self.timings_dict()
+        }
+    
+    def timings_dict(self):
+        """Per-phase breakdown of response_time_ms"""
+        return {
+            'dns_ms': self.dns_ms,
+            'connect_ms': self.connect_ms,
+            'tls_ms': self.tls_ms,
+            'ttfb_ms': self.ttfb_ms,
+            'download_ms': self.download_ms
+        }
+    
     def to_dict(self):
         """Convert object to dictionary"""
         return {
@@ -65,5 +150,160 @@ class Check(db.Model):
             'response_time_ms': self.response_time_ms,
             'is_up': self.is_up,
             'checked_at': self.checked_at.isoformat() if self.checked_at else None,
-            'error_message': self.error_message
+            'error_message': self.error_message,
+            'connection_mode': self.connection_mode,
+            'timings': self.timings_dict()
+        }
+
+
+class CheckRollup(db.Model):
+    """Aggregated checks for one website over one time bucket"""
+    __tablename__ = 'check_rollups'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    website_id = db.Column(db.Integer, db.ForeignKey('websites.id', ondelete='CASCADE'), nullable=False)
+    # Bucket size in seconds (60, 3600 or 86400)
+    resolution = db.Column(db.Integer, nullable=False)
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    up_count = db.Column(db.Integer, nullable=False, default=0)
+    min_response_ms = db.Column(db.Integer, nullable=True)
+    max_response_ms = db.Column(db.Integer, nullable=True)
+    sum_response_ms = db.Column(db.BigInteger, nullable=False, default=0)
+    # Checks that got a response time (failed ones may not), the divisor for the average
+    response_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Serialized app.utils.sketch.LatencySketch of response times
+    sketch = db.Column(db.Text, nullable=True)
+    
+    __table_args__ = (
+        db.UniqueConstraint('website_id', 'resolution', 'bucket_start', name='uq_check_rollups_bucket'),
+    )
+    
+    def to_dict(self):
+        """Convert object to dictionary"""
+        return {
+            'website_id': self.website_id,
+            'resolution': self.resolution,
+            'bucket_start': self.bucket_start.isoformat() if self.bucket_start else None,
+            'count': self.count,
+            'up_count': self.up_count,
+            'uptime_percent': round(100.0 * self.up_count / self.count, 3) if self.count else None,
+            'min_response_ms': self.min_response_ms,
+            'max_response_ms': self.max_response_ms,
+            'avg_response_ms': round(self.sum_response_ms / self.response_count, 1) if self.response_count else None
+        }
+
+
+class RollupState(db.Model):
+    """Progress marker for the incremental rollup job"""
+    __tablename__ = 'rollup_state'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    last_check_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class Worker(db.Model):
+    """A running check worker process (see app.utils.worker)"""
+    __tablename__ = 'workers'
+    
+    id = db.Column(db.String(100), primary_key=True)
+    started_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    heartbeat_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # Websites in this worker's shard as of its last heartbeat
+    shard_size = db.Column(db.Integer, nullable=False, default=0)
+    
+    def to_dict(self):
+        """Convert object to dictionary"""
+        return {
+            'id': self.id,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'heartbeat_at': self.heartbeat_at.isoformat() if self.heartbeat_at else None,
+            'shard_size': self.shard_size
+        }
+
+
+class WebsiteState(db.Model):
+    """Alerting state of one website (kept by the Lambda checker's state machine)"""
+    __tablename__ = 'website_states'
+    
+    website_id = db.Column(db.Integer, db.ForeignKey('websites.id', ondelete='CASCADE'), primary_key=True)
+    # Confirmed status, 'up' or 'down' (None until enough checks agree)
+    status = db.Column(db.String(10), nullable=True)
+    consecutive_failures = db.Column(db.Integer, nullable=False, default=0)
+    consecutive_successes = db.Column(db.Integer, nullable=False, default=0)
+    # Latest results as bits, newest in bit 0 (1 = up), and how many are valid
+    recent_results = db.Column(db.Integer, nullable=False, default=0)
+    recent_count = db.Column(db.Integer, nullable=False, default=0)
+    is_flapping = db.Column(db.Boolean, nullable=False, default=False)
+    changed_at = db.Column(db.DateTime, nullable=True)
+    # Last status an alert went out for ('up', 'down' or 'flapping'), and when
+    notified_status = db.Column(db.String(10), nullable=True)
+    notified_at = db.Column(db.DateTime, nullable=True)
+    
+    def to_dict(self):
+        """Convert object to dictionary"""
+        return {
+            'website_id': self.website_id,
+            'status': self.status,
+            'is_flapping': self.is_flapping,
+            'consecutive_failures': self.consecutive_failures,
+            'consecutive_successes': self.consecutive_successes,
+            'changed_at': self.changed_at.isoformat() if self.changed_at else None,
+            'notified_status': self.notified_status,
+            'notified_at': self.notified_at.isoformat() if self.notified_at else None
+        }
+
+
+class LatencyBaseline(db.Model):
+    """Response time baseline of one website (kept by app.utils.anomaly)"""
+    __tablename__ = 'latency_baselines'
+    
+    website_id = db.Column(db.Integer, db.ForeignKey('websites.id', ondelete='CASCADE'), primary_key=True)
+    # Exponentially weighted mean and variance of response_time_ms
+    mean_ms = db.Column(db.Float, nullable=False, default=0.0)
+    variance = db.Column(db.Float, nullable=False, default=0.0)
+    samples = db.Column(db.Integer, nullable=False, default=0)
+    # Anomalous (or normal) checks in a row
+    anomalous_checks = db.Column(db.Integer, nullable=False, default=0)
+    normal_checks = db.Column(db.Integer, nullable=False, default=0)
+    # When the site was flagged as degraded (None while it isn't)
+    degraded_since = db.Column(db.DateTime, nullable=True)
+    last_response_ms = db.Column(db.Integer, nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class Notification(db.Model):
+    """A status change notification waiting in (or delivered from) the outbox"""
+    __tablename__ = 'notification_outbox'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    # Name of the channel it goes to (see NOTIFICATION_CHANNELS in the Lambda checker)
+    channel = db.Column(db.String(50), nullable=False)
+    # JSON body of the notification
+    payload = db.Column(db.Text, nullable=False)
+    # 'pending', 'delivered' or 'dead' (gave up after too many attempts)
+    status = db.Column(db.String(10), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    delivered_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    
+    __table_args__ = (
+        # Finding due notifications
+        db.Index('ix_notification_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+    
+    def to_dict(self):
+        """Convert object to dictionary"""
+        return {
+            'id': self.id,
+            'channel': self.channel,
+            'status': self.status,
+            'attempts': self.attempts,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'next_attempt_at': self.next_attempt_at.isoformat() if self.next_attempt_at else None,
+            'delivered_at': self.delivered_at.isoformat() if self.delivered_at else None,
+            'last_error': self.last_error
         }
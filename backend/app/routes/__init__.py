@@ -1,3 +1,7 @@
 from app.routes.websites import websites_bp
+from app.routes.metrics import metrics_bp
+from app.routes.dashboard import dashboard_bp
+from app.routes.stream import stream_bp
+from app.routes.telemetry import telemetry_bp
 
 # Add other blueprints as they are created
@@ -0,0 +1,20 @@
+from flask import Blueprint
+from app.utils.status_cache import get_status_cache, etag_response
+from datetime import datetime
+
+dashboard_bp = Blueprint('dashboard', __name__, url_prefix='/api/dashboard')
+
+@dashboard_bp.route('', methods=['GET'])
+def get_dashboard_stats():
+    """
+    Up/down counts and average response time over each website's latest check
+    
+    Served from the status cache; returns 304 if nothing changed since the
+    client's ETag.
+    """
+    status_cache = get_status_cache()
+    status_cache.refresh()
+    return etag_response(status_cache, lambda: {
+        **status_cache.stats(status_cache.website_count),
+        'last_updated': datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
+    })
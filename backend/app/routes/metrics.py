@@ -0,0 +1,155 @@
+from flask import Blueprint, Response, current_app, jsonify, request, abort
+from app.models import Website, CheckRollup
+from app import db
+from app.utils.rollups import window_rollups, summarize, RESOLUTIONS, DAY
+from app.utils.retention import checks_kept_since, rollup_cutoffs
+from app.utils.sla import build_sla_report, month_window
+from datetime import datetime, timedelta
+
+metrics_bp = Blueprint('metrics', __name__, url_prefix='/api/metrics')
+
+# Longest window a single request may ask for
+MAX_WINDOW_DAYS = 400
+
+# Most buckets returned by the series endpoint
+MAX_SERIES_POINTS = 2000
+
+# Most websites in an SLA report built within a request (about 20ms each
+# for a month of 5-minute checks); whole-fleet reports are for the
+# sla-report CLI command
+MAX_SLA_WEBSITES = 100
+
+def parse_window():
+    """Read start/end (ISO 8601) from the query string, defaulting to the last 24 hours"""
+    try:
+        if 'month' in request.args:
+            return month_window(request.args['month'])
+        end = datetime.fromisoformat(request.args['end']) if 'end' in request.args else datetime.utcnow()
+        start = datetime.fromisoformat(request.args['start']) if 'start' in request.args \
+            else end - timedelta(days=1)
+    except ValueError:
+        abort(400, description="start and end must be ISO 8601 timestamps (or month YYYY-MM)")
+    
+    if start.tzinfo or end.tzinfo:
+        # Checks are stored as naive UTC
+        start = start.replace(tzinfo=None) - (start.utcoffset() or timedelta())
+        end = end.replace(tzinfo=None) - (end.utcoffset() or timedelta())
+    if start >= end:
+        abort(400, description="start must be before end")
+    if end - start > timedelta(days=MAX_WINDOW_DAYS):
+        abort(400, description=f"Window can't be longer than {MAX_WINDOW_DAYS} days")
+    return start, end
+
+@metrics_bp.route('/websites', methods=['GET'])
+def get_fleet_metrics():
+    """Uptime and response time for every website over a window"""
+    start, end = parse_window()
+    
+    totals = window_rollups(start, end, kept_since=rollup_cutoffs(current_app)).with_entities(
+        CheckRollup.website_id,
+        db.func.sum(CheckRollup.count),
+        db.func.sum(CheckRollup.up_count),
+        db.func.sum(CheckRollup.sum_response_ms),
+        db.func.sum(CheckRollup.response_count)
+    ).group_by(CheckRollup.website_id).all()
+    
+    websites = []
+    for website_id, count, up_count, sum_response_ms, response_count in totals:
+        websites.append({
+            'website_id': website_id,
+            'count': count,
+            'up_count': up_count,
+            'uptime_percent': round(100.0 * up_count / count, 3) if count else None,
+            'avg_response_ms': round(sum_response_ms / response_count, 1) if response_count else None
+        })
+    
+    return jsonify({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'websites': websites
+    })
+
+@metrics_bp.route('/websites/<int:website_id>', methods=['GET'])
+def get_website_metrics(website_id):
+    """Uptime and response time percentiles for one website over a window"""
+    Website.query.get_or_404(website_id)  # Check if website exists
+    start, end = parse_window()
+    
+    summary = summarize(window_rollups(start, end, [website_id], rollup_cutoffs(current_app)))
+    summary.update({
+        'website_id': website_id,
+        'start': start.isoformat(),
+        'end': end.isoformat()
+    })
+    return jsonify(summary)
+
+@metrics_bp.route('/websites/<int:website_id>/series', methods=['GET'])
+def get_website_series(website_id):
+    """Rollup buckets for charting (resolution in seconds: 60, 3600 or 86400)"""
+    Website.query.get_or_404(website_id)  # Check if website exists
+    start, end = parse_window()
+    
+    resolution = request.args.get('resolution', DAY, type=int)
+    if resolution not in RESOLUTIONS:
+        abort(400, description=f"resolution must be one of {', '.join(map(str, RESOLUTIONS))}")
+    if (end - start).total_seconds() / resolution > MAX_SERIES_POINTS:
+        abort(400, description="Too many points; use a coarser resolution or a shorter window")
+    
+    rollups = CheckRollup.query.filter(
+        CheckRollup.website_id == website_id,
+        CheckRollup.resolution == resolution,
+        CheckRollup.bucket_start >= start,
+        CheckRollup.bucket_start < end
+    ).order_by(CheckRollup.bucket_start)
+    
+    return jsonify({
+        'website_id': website_id,
+        'resolution': resolution,
+        'series': [rollup.to_dict() for rollup in rollups]
+    })
+
+@metrics_bp.route('/sla', methods=['GET'])
+def get_sla_report():
+    """
+    Uptime, outages, MTTR and response time percentiles for the websites in
+    ?websites=1,2 (at most MAX_SLA_WEBSITES) over a window (or
+    ?month=YYYY-MM), computed from raw checks.  A window reaching back past
+    check retention is marked complete: false, with covered_from and
+    coverage_percent (X-SLA-* headers for CSV).
+    
+    ?format=csv returns the per-website table as CSV (?table=outages for the
+    outages).  Reports on the whole fleet take too long for a request; use
+    `flask sla-report`.
+    """
+    start, end = parse_window()
+    
+    report_format = request.args.get('format', 'json')
+    table = request.args.get('table', 'websites')
+    if report_format not in ('json', 'csv'):
+        abort(400, description="format must be json or csv")
+    if table not in ('websites', 'outages'):
+        abort(400, description="table must be websites or outages")
+    
+    if not request.args.get('websites'):
+        abort(400, description="websites (a comma-separated list of IDs) is required; "
+                               "use the sla-report command for the whole fleet")
+    try:
+        website_ids = list(dict.fromkeys(int(website_id) for website_id in request.args['websites'].split(',')))
+    except ValueError:
+        abort(400, description="websites must be a comma-separated list of IDs")
+    if len(website_ids) > MAX_SLA_WEBSITES:
+        abort(400, description=f"At most {MAX_SLA_WEBSITES} websites per report; "
+                               "use the sla-report command for more")
+    
+    report = build_sla_report(start, end, website_ids, checks_since=checks_kept_since(current_app))
+    if report_format == 'csv':
+        return Response(
+            report.to_csv(table),
+            mimetype='text/csv',
+            headers={
+                'Content-Disposition': f'attachment; filename=sla-{table}-{start:%Y%m%d}-{end:%Y%m%d}.csv',
+                'X-SLA-Covered-From': report.covered_from.isoformat(),
+                'X-SLA-Coverage-Percent': str(report.coverage_percent)
+            }
+        )
+    return Response(report.to_json(), mimetype='application/json')
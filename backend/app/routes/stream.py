@@ -0,0 +1,63 @@
+from flask import Blueprint, Response, request, abort
+from app.utils.events import get_event_broker
+
+stream_bp = Blueprint('stream', __name__, url_prefix='/api/stream')
+
+# Seconds between keepalive comments on an idle stream, so proxies don't
+# drop the connection
+KEEPALIVE_SECONDS = 15
+
+# Milliseconds the browser waits before reconnecting
+RETRY_MS = 5000
+
+def parse_website_ids(value):
+    """Parse a comma-separated list of website IDs, or None if any is invalid"""
+    try:
+        website_ids = {int(part) for part in value.split(',') if part.strip()}
+    except ValueError:
+        return None
+    return website_ids or None
+
+@stream_bp.route('', methods=['GET'])
+def stream_events():
+    """
+    Server-sent events for status transitions and new checks
+    
+    Query parameters:
+        websites: Comma-separated website IDs to follow (default: all,
+            which also gets dashboard stats events)
+    
+    Event types: check, status, stats and resync.  A resync means events
+    were missed (the client fell behind or websites changed) and the client
+    should refetch over the REST API.
+    """
+    website_ids = None
+    if request.args.get('websites'):
+        website_ids = parse_website_ids(request.args['websites'])
+        if website_ids is None:
+            abort(400, description="websites must be a comma-separated list of website IDs")
+    
+    broker = get_event_broker()
+    subscription = broker.subscribe(website_ids)
+    if subscription is None:
+        abort(503, description="Too many stream clients, poll the REST API instead")
+    
+    def generate():
+        try:
+            yield f"retry: {RETRY_MS}\n\n"
+            while True:
+                events, dropped = subscription.take(KEEPALIVE_SECONDS)
+                if dropped:
+                    yield f"event: resync\ndata: {{\"reason\":\"dropped\",\"dropped\":{dropped}}}\n\n"
+                if events:
+                    yield ''.join(events)
+                elif not dropped:
+                    yield ": keepalive\n\n"
+        finally:
+            broker.unsubscribe(subscription)
+    
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,13 @@
+from flask import Blueprint, Response, request
+from app.utils.telemetry import registry, TEXT_CONTENT_TYPE, OPENMETRICS_CONTENT_TYPE
+
+telemetry_bp = Blueprint('telemetry', __name__)
+
+@telemetry_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Monitor internals for Prometheus (OpenMetrics if the scraper accepts it)"""
+    openmetrics = 'application/openmetrics-text' in request.headers.get('Accept', '')
+    return Response(
+        registry.render(openmetrics),
+        content_type=OPENMETRICS_CONTENT_TYPE if openmetrics else TEXT_CONTENT_TYPE
+    )
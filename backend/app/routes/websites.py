@@ -1,15 +1,30 @@
-from flask import Blueprint, jsonify, request, abort
-from app.models import Website, Check
+from flask import Blueprint, Response, jsonify, request, abort, stream_with_context
+from app.models import Website, Check, CheckRollup, WebsiteState, LatencyBaseline
 from app import db
+from app.utils.scheduler import scheduler
+from app.utils.check_modes import validate_check_options
+from app.utils.status_cache import get_status_cache, etag_response
+from app.utils.anomaly import Baseline, get_latency_detector
+from app.utils.bulk import BulkImport, read_ndjson, read_csv, export_rows, export_ndjson, export_csv
 from datetime import datetime
+import base64
+
+# Upper bound on rows counted when a capped total is requested
+TOTAL_COUNT_CAP = 10000
+
+CHECK_OPTION_FIELDS = ('check_mode', 'check_max_bytes', 'check_keyword', 'check_keyword_is_regex')
 
 websites_bp = Blueprint('websites', __name__, url_prefix='/api/websites')
 
 @websites_bp.route('', methods=['GET'])
 def get_websites():
-    """Get all monitored websites"""
-    websites = Website.query.all()
-    return jsonify([website.to_dict() for website in websites])
+    """Get all monitored websites (304 if nothing changed since the client's ETag)"""
+    status_cache = get_status_cache()
+    status_cache.refresh()
+    return etag_response(
+        status_cache,
+        lambda: [website.to_dict(status_cache) for website in Website.query.all()]
+    )
 
 @websites_bp.route('', methods=['POST'])
 def create_website():
@@ -20,24 +35,104 @@ def create_website():
     if not data or not data.get('name') or not data.get('url'):
         abort(400, description="Name and URL are required")
     
+    error = validate_check_options(data)
+    if error:
+        abort(400, description=error)
+    
     # Create new website
     new_website = Website(
         name=data['name'],
         url=data['url'],
         check_interval_minutes=data.get('check_interval_minutes', 5),
-        is_active=data.get('is_active', True)
+        is_active=data.get('is_active', True),
+        **{field: data[field] for field in CHECK_OPTION_FIELDS if field in data}
     )
     
     db.session.add(new_website)
     db.session.commit()
+    get_status_cache().invalidate()
+    
+    # Check new sites soon rather than up to a full interval from now
+    if new_website.is_active:
+        scheduler.schedule(new_website.id, new_website.check_interval_minutes, first_check_within=10)
     
-    return jsonify(new_website.to_dict()), 201
+    # A brand new website has no checks yet
+    return jsonify(new_website.to_dict(latest_statuses={})), 201
+
+BULK_FORMATS = {
+    'ndjson': ('application/x-ndjson', read_ndjson, export_ndjson),
+    'csv': ('text/csv', read_csv, export_csv)
+}
+
+def bulk_format():
+    """The bulk format named by ?format=, else by the Content-Type, else NDJSON"""
+    name = request.args.get('format')
+    if name is None:
+        name = 'csv' if request.mimetype == 'text/csv' else 'ndjson'
+    if name not in BULK_FORMATS:
+        abort(400, description=f"format must be one of: {', '.join(BULK_FORMATS)}")
+    return name
+
+@websites_bp.route('/bulk', methods=['POST'])
+def bulk_import_websites():
+    """
+    Create or update many websites from an NDJSON or CSV body
+    
+    Rows take the same fields as POST /api/websites; a row whose URL matches
+    an existing website (ignoring case, default port and trailing slash)
+    updates it.  Valid rows are written even when others fail, and each
+    failure is reported with its line number.
+    """
+    _, read_rows, _ = BULK_FORMATS[bulk_format()]
+    bulk = BulkImport().run(read_rows(request.stream))
+    if not bulk.rows:
+        abort(400, description="No rows to import")
+    
+    if bulk.changed:
+        get_status_cache().invalidate()
+        # Spread first checks over an interval so an import doesn't become
+        # one burst of thousands of checks
+        for website_id, interval, is_active in bulk.changed:
+            if is_active:
+                scheduler.schedule(website_id, interval)
+            else:
+                scheduler.remove(website_id)
+    
+    return jsonify(bulk.result())
+
+@websites_bp.route('/export', methods=['GET'])
+def export_websites():
+    """Stream every website as NDJSON (or CSV with ?format=csv), in the bulk import format"""
+    name = bulk_format()
+    mimetype, _, write_rows = BULK_FORMATS[name]
+    return Response(
+        stream_with_context(write_rows(export_rows())),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=websites.{name}'}
+    )
+
+@websites_bp.route('/degraded', methods=['GET'])
+def get_degraded_websites():
+    """Websites whose response times are flagged as degraded (see app.utils.anomaly), longest first"""
+    rows = db.session.query(Website.id, Website.name, Website.url, LatencyBaseline)\
+        .join(LatencyBaseline, LatencyBaseline.website_id == Website.id)\
+        .filter(LatencyBaseline.degraded_since.isnot(None))\
+        .order_by(LatencyBaseline.degraded_since)
+    
+    degraded = []
+    for website_id, name, url, row in rows:
+        baseline = Baseline(row.mean_ms, row.variance, row.samples, degraded_since=row.degraded_since,
+                            last_response_ms=row.last_response_ms)
+        degraded.append({'website_id': website_id, 'name': name, 'url': url, **baseline.to_dict()})
+    return jsonify(degraded)
 
 @websites_bp.route('/<int:website_id>', methods=['GET'])
 def get_website(website_id):
     """Get details of a specific website"""
     website = Website.query.get_or_404(website_id)
-    return jsonify(website.to_dict())
+    status_cache = get_status_cache()
+    status_cache.refresh()
+    return jsonify(website.to_dict(status_cache))
 
 @websites_bp.route('/<int:website_id>', methods=['PUT'])
 def update_website(website_id):
@@ -48,6 +143,13 @@ def update_website(website_id):
     if not data:
         abort(400, description="No data provided")
     
+    # Validate the check options as they will be after the update
+    check_options = {field: getattr(website, field) for field in CHECK_OPTION_FIELDS}
+    check_options.update({field: data[field] for field in CHECK_OPTION_FIELDS if field in data})
+    error = validate_check_options(check_options)
+    if error:
+        abort(400, description=error)
+    
     # Update fields if provided
     if 'name' in data:
         website.name = data['name']
@@ -57,8 +159,17 @@ def update_website(website_id):
         website.check_interval_minutes = data['check_interval_minutes']
     if 'is_active' in data:
         website.is_active = data['is_active']
+    for field in CHECK_OPTION_FIELDS:
+        if field in data:
+            setattr(website, field, data[field])
     
     db.session.commit()
+    get_status_cache().invalidate()
+    
+    if website.is_active:
+        scheduler.schedule(website.id, website.check_interval_minutes, first_check_within=10)
+    else:
+        scheduler.remove(website.id)
     
     return jsonify(website.to_dict())
 
@@ -67,38 +178,119 @@ def delete_website(website_id):
     """Remove a website from monitoring"""
     website = Website.query.get_or_404(website_id)
     
+    CheckRollup.query.filter_by(website_id=website_id).delete()
+    WebsiteState.query.filter_by(website_id=website_id).delete()
+    LatencyBaseline.query.filter_by(website_id=website_id).delete()
     db.session.delete(website)
     db.session.commit()
+    scheduler.remove(website_id)
+    get_latency_detector().forget(website_id)
+    get_status_cache().invalidate()
     
     return '', 204
 
 @websites_bp.route('/<int:website_id>/status', methods=['GET'])
 def get_website_status(website_id):
-    """Get current status and recent history"""
+    """Get current status and recent history (304 if nothing changed since the client's ETag)"""
+    # Before the ETag check, so a stale ETag for a deleted website still gets a 404
     website = Website.query.get_or_404(website_id)
+    status_cache = get_status_cache()
+    status_cache.refresh()
     
-    # Get the latest status
-    latest_status = website.get_latest_status()
+    def build():
+        # Get recent checks (last 10)
+        recent_checks = Check.query.filter_by(website_id=website_id)\
+            .order_by(Check.checked_at.desc())\
+            .limit(10).all()
+        
+        # The latest status is simply the newest of the recent checks
+        latest_status = recent_checks[0].status_dict() if recent_checks else None
+        
+        return {
+            'website': website.to_dict({website_id: latest_status}),
+            'latest_status': latest_status,
+            'recent_checks': [check.to_dict() for check in recent_checks]
+        }
     
-    # Get recent checks (last 10)
-    recent_checks = Check.query.filter_by(website_id=website_id)\
-        .order_by(Check.checked_at.desc())\
-        .limit(10).all()
+    return etag_response(status_cache, build)
+
+def encode_cursor(check):
+    """Opaque cursor pointing just after the given check"""
+    raw = f"{check.checked_at.isoformat()}|{check.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
+    """Decode a cursor into (checked_at, id), aborting with 400 if it is invalid"""
+    try:
+        checked_at, check_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(checked_at), int(check_id)
+    except (ValueError, UnicodeError):
+        abort(400, description="Invalid cursor")
+
+def get_checks_after_cursor(website_id, cursor, per_page):
+    """
+    Keyset pagination over a website's checks, newest first.
     
-    return jsonify({
-        'website': website.to_dict(),
-        'latest_status': latest_status,
-        'recent_checks': [check.to_dict() for check in recent_checks]
-    })
+    Each page seeks straight to (checked_at, id) on the
+    (website_id, checked_at) index, so page 1000 costs the same as page 1.
+    """
+    query = Check.query.filter_by(website_id=website_id)
+    if cursor:
+        checked_at, check_id = decode_cursor(cursor)
+        query = query.filter(db.or_(
+            Check.checked_at < checked_at,
+            db.and_(Check.checked_at == checked_at, Check.id < check_id)
+        ))
+    
+    # Fetch one extra row to find out whether there is another page
+    checks = query.order_by(Check.checked_at.desc(), Check.id.desc()).limit(per_page + 1).all()
+    has_more = len(checks) > per_page
+    checks = checks[:per_page]
+    
+    pagination = {
+        'per_page': per_page,
+        'cursor': cursor or None,
+        'next_cursor': encode_cursor(checks[-1]) if has_more else None,
+        'has_more': has_more,
+        'total': None
+    }
+    
+    # Counting is optional: exact scans the whole history, capped stops early
+    total_mode = request.args.get('total', 'none')
+    if total_mode == 'exact':
+        pagination['total'] = Check.query.filter_by(website_id=website_id).count()
+    elif total_mode == 'capped':
+        capped = Check.query.with_entities(Check.id).filter_by(website_id=website_id)\
+            .limit(TOTAL_COUNT_CAP + 1).subquery()
+        total = db.session.query(db.func.count()).select_from(capped).scalar()
+        pagination['total'] = min(total, TOTAL_COUNT_CAP)
+        pagination['total_capped'] = total > TOTAL_COUNT_CAP
+    
+    return checks, pagination
 
 @websites_bp.route('/<int:website_id>/checks', methods=['GET'])
 def get_website_checks(website_id):
-    """Get check history for a website"""
+    """
+    Get check history for a website
+    
+    Pass cursor (empty for the first page) to use keyset pagination and
+    follow next_cursor from each response; total=exact|capped adds a count.
+    Without cursor the older page/per_page offset pagination is used.
+    """
     Website.query.get_or_404(website_id)  # Check if website exists
     
+    per_page = request.args.get('per_page', 20, type=int)
+    
+    if 'cursor' in request.args:
+        per_page = max(1, min(per_page, 100))
+        checks, pagination = get_checks_after_cursor(website_id, request.args['cursor'], per_page)
+        return jsonify({
+            'checks': [check.to_dict() for check in checks],
+            'pagination': pagination
+        })
+    
     # Optional pagination parameters
     page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 20, type=int)
     
     # Get checks with pagination
     checks = Check.query.filter_by(website_id=website_id)\
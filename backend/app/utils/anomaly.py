@@ -0,0 +1,342 @@
+"""
+Response time anomaly detection.
+
+Each website keeps a baseline of its response times: an exponentially
+weighted mean and variance, updated in O(1) as each check comes in, so no
+history is ever rescanned.  A check is anomalous when its response time is
+more than LATENCY_THRESHOLD standard deviations (and at least
+LATENCY_MIN_DELTA_MS) above the mean.  After LATENCY_TRIGGER_CHECKS
+anomalous checks in a row the site is flagged as degraded, and the flag is
+cleared after LATENCY_RECOVER_CHECKS normal ones.  Nothing is flagged until a
+site has LATENCY_MIN_SAMPLES checks.
+
+Anomalous response times only nudge the mean, by alpha times the threshold
+distance, and leave the variance alone, so a spike can't inflate the
+baseline and a slowdown isn't learnt as normal straight away; if it lasts,
+it eventually is and the flag clears.  Failed checks are the status tracking's business and leave the
+baseline alone.
+
+LatencyDetector is the plain in-memory detector (used directly by run.py).
+DatabaseLatencyDetector also keeps the baselines in the latency_baselines
+table, one row per website, so a restart (or a site moving to another
+worker) carries on where it left off.  Each app gets its own, see
+get_latency_detector().
+"""
+import math
+import os
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import bindparam
+
+from app import db
+from app.models import LatencyBaseline
+from app.utils.telemetry import DB_WRITE, registry
+
+DEFAULT_SETTINGS = {
+    # Weight of each new response time in the mean and variance
+    'LATENCY_ALPHA': 0.05,
+    'LATENCY_THRESHOLD': 3.0,
+    'LATENCY_MIN_DELTA_MS': 50,
+    'LATENCY_MIN_SAMPLES': 20,
+    'LATENCY_TRIGGER_CHECKS': 3,
+    'LATENCY_RECOVER_CHECKS': 3,
+}
+
+# Longest changed baselines wait to be written, unless a site's flag changed
+DEFAULT_SAVE_INTERVAL = 30.0
+
+# Most IDs per IN (...) lookup, well under SQLite's variable limit
+ID_BATCH_SIZE = 500
+
+DEGRADED_SITES = registry.gauge('upmon_degraded_sites', 'Websites flagged with degraded response times')
+
+
+def latency_settings(app):
+    """Detector settings from app.config (or the environment), as LatencyDetector arguments"""
+    settings = {}
+    for name, default in DEFAULT_SETTINGS.items():
+        value = app.config.get(name, os.environ.get(name, default))
+        try:
+            value = type(default)(value)
+        except (TypeError, ValueError):
+            value = default
+        settings[name[len('LATENCY_'):].lower()] = value
+    return settings
+
+
+class Baseline:
+    """Response time baseline and flag state of one website"""
+
+    __slots__ = ('mean', 'variance', 'samples', 'anomalous_checks', 'normal_checks', 'degraded_since',
+                 'last_response_ms')
+
+    def __init__(self, mean=0.0, variance=0.0, samples=0, anomalous_checks=0, normal_checks=0,
+                 degraded_since=None, last_response_ms=None):
+        self.mean = mean
+        self.variance = variance
+        self.samples = samples
+        self.anomalous_checks = anomalous_checks
+        self.normal_checks = normal_checks
+        self.degraded_since = degraded_since
+        self.last_response_ms = last_response_ms
+
+    @property
+    def deviation(self):
+        return math.sqrt(self.variance)
+
+    def to_dict(self):
+        """Convert object to dictionary"""
+        return {
+            'baseline_ms': round(self.mean, 1),
+            'deviation_ms': round(self.deviation, 1),
+            'samples': self.samples,
+            'last_response_ms': self.last_response_ms,
+            'degraded_since': self.degraded_since.isoformat() if self.degraded_since else None
+        }
+
+
+class LatencyDetector:
+    """Website ID -> response time Baseline, flagging sites that slow down"""
+
+    def __init__(self, alpha=0.05, threshold=3.0, min_delta_ms=50, min_samples=20, trigger_checks=3,
+                 recover_checks=3):
+        self.alpha = alpha
+        self.threshold = threshold
+        self.min_delta_ms = min_delta_ms
+        self.min_samples = min_samples
+        self.trigger_checks = trigger_checks
+        self.recover_checks = recover_checks
+        self._baselines = {}
+        self._lock = threading.Lock()
+
+    def get(self, website_id):
+        return self._baselines.get(website_id)
+
+    def _load(self, website_ids):
+        """Hook for subclasses to fetch baselines they haven't seen yet"""
+
+    def _changed(self, website_id):
+        """Hook for subclasses: website_id's baseline was updated"""
+
+    def observe(self, website_id, response_time_ms, is_up=True, checked_at=None):
+        """
+        Fold in one check.
+
+        Returns:
+            str: 'degraded' or 'recovered' if the site's flag changed, else None
+        """
+        if not is_up or response_time_ms is None:
+            return None
+        if website_id not in self._baselines:
+            self._load([website_id])
+        with self._lock:
+            baseline = self._baselines.get(website_id)
+            if baseline is None:
+                baseline = self._baselines[website_id] = Baseline()
+            change = self._update(baseline, response_time_ms, checked_at or datetime.utcnow())
+        self._changed(website_id)
+        if change:
+            DEGRADED_SITES.set(len(self.degraded()))
+        return change
+
+    def observe_many(self, results):
+        """
+        Fold in check result dicts (website_id, response_time_ms, is_up and
+        checked_at, as written to the checks table).
+
+        Returns:
+            list: (website_id, 'degraded' or 'recovered') for each flag that changed
+        """
+        self._load([result['website_id'] for result in results if result['website_id'] not in self._baselines])
+        changes = []
+        for result in results:
+            change = self.observe(result['website_id'], result.get('response_time_ms'), result.get('is_up'),
+                                  result.get('checked_at'))
+            if change:
+                changes.append((result['website_id'], change))
+        return changes
+
+    def _update(self, baseline, response_time_ms, checked_at):
+        excess = float(response_time_ms) - baseline.mean
+        limit = max(self.threshold * baseline.deviation, self.min_delta_ms)
+        anomalous = baseline.samples >= self.min_samples and excess > limit
+
+        if anomalous:
+            baseline.mean += self.alpha * limit
+        else:
+            # A plain running average until there are 1/alpha samples, so
+            # early checks aren't swamped by the first one
+            alpha = max(self.alpha, 1.0 / (baseline.samples + 1))
+            increment = alpha * excess
+            baseline.mean += increment
+            baseline.variance = (1 - alpha) * (baseline.variance + excess * increment)
+        baseline.samples += 1
+        baseline.last_response_ms = response_time_ms
+
+        if anomalous:
+            baseline.anomalous_checks += 1
+            baseline.normal_checks = 0
+        else:
+            baseline.normal_checks += 1
+            baseline.anomalous_checks = 0
+
+        if baseline.degraded_since is None and baseline.anomalous_checks >= self.trigger_checks:
+            baseline.degraded_since = checked_at
+            return 'degraded'
+        if baseline.degraded_since is not None and baseline.normal_checks >= self.recover_checks:
+            baseline.degraded_since = None
+            return 'recovered'
+        return None
+
+    def degraded(self):
+        """(website ID, Baseline) of every site flagged as degraded, longest first"""
+        with self._lock:
+            flagged = [(website_id, baseline) for website_id, baseline in self._baselines.items()
+                       if baseline.degraded_since is not None]
+        return sorted(flagged, key=lambda item: item[1].degraded_since)
+
+    def forget(self, website_id):
+        with self._lock:
+            self._baselines.pop(website_id, None)
+
+
+class DatabaseLatencyDetector(LatencyDetector):
+    """LatencyDetector that loads and saves its baselines in latency_baselines"""
+
+    def __init__(self, save_interval=DEFAULT_SAVE_INTERVAL, clock=time.monotonic, **settings):
+        super().__init__(**settings)
+        self.save_interval = save_interval
+        self.clock = clock
+        self._stored = set()
+        self._dirty = set()
+        self._urgent = False
+        self._last_save = clock()
+
+    def _load(self, website_ids):
+        for start in range(0, len(website_ids), ID_BATCH_SIZE):
+            batch = website_ids[start:start + ID_BATCH_SIZE]
+            rows = LatencyBaseline.query.filter(LatencyBaseline.website_id.in_(batch)).all()
+            with self._lock:
+                for row in rows:
+                    self._stored.add(row.website_id)
+                    self._baselines.setdefault(row.website_id, Baseline(
+                        row.mean_ms, row.variance, row.samples, row.anomalous_checks, row.normal_checks,
+                        row.degraded_since, row.last_response_ms
+                    ))
+                for website_id in batch:
+                    self._baselines.setdefault(website_id, Baseline())
+
+    def _changed(self, website_id):
+        with self._lock:
+            self._dirty.add(website_id)
+
+    def observe(self, website_id, response_time_ms, is_up=True, checked_at=None):
+        change = super().observe(website_id, response_time_ms, is_up, checked_at)
+        if change:
+            # Don't keep the API waiting for a flag
+            self._urgent = True
+        return change
+
+    def save(self, force=False):
+        """
+        Write changed baselines, if a flag changed or save_interval has
+        passed since the last write (or force).
+
+        Returns:
+            int: Number of baselines written
+        """
+        if not self._dirty or not (force or self._urgent or self.clock() - self._last_save >= self.save_interval):
+            return 0
+        now = datetime.utcnow()
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            self._urgent = False
+            rows = []
+            for website_id in dirty:
+                baseline = self._baselines.get(website_id)
+                if baseline is None:
+                    continue
+                rows.append({
+                    '_id': website_id,
+                    'website_id': website_id,
+                    'mean_ms': baseline.mean,
+                    'variance': baseline.variance,
+                    'samples': baseline.samples,
+                    'anomalous_checks': baseline.anomalous_checks,
+                    'normal_checks': baseline.normal_checks,
+                    'degraded_since': baseline.degraded_since,
+                    'last_response_ms': baseline.last_response_ms,
+                    'updated_at': now
+                })
+        self._last_save = self.clock()
+
+        table = LatencyBaseline.__table__
+        inserts = [row for row in rows if row['_id'] not in self._stored]
+        updates = [row for row in rows if row['_id'] in self._stored]
+        try:
+            with DB_WRITE.time('latency_baselines'):
+                if updates:
+                    db.session.execute(table.update().where(table.c.website_id == bindparam('_id')), updates)
+                if inserts:
+                    db.session.execute(table.insert(), [
+                        {key: value for key, value in row.items() if key != '_id'} for row in inserts
+                    ])
+                db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Failed to save {len(rows)} latency baselines: {str(e)}")
+            # Another process may have inserted some of them; look again
+            # and retry with the next save
+            ids = [row['_id'] for row in rows]
+            stored = set()
+            for start in range(0, len(ids), ID_BATCH_SIZE):
+                stored.update(website_id for website_id, in db.session.query(LatencyBaseline.website_id)
+                              .filter(LatencyBaseline.website_id.in_(ids[start:start + ID_BATCH_SIZE])))
+            with self._lock:
+                self._stored.update(stored)
+                self._dirty.update(ids)
+            return 0
+        self._stored.update(row['_id'] for row in inserts)
+        return len(rows)
+
+    def forget(self, website_id):
+        super().forget(website_id)
+        with self._lock:
+            self._stored.discard(website_id)
+            self._dirty.discard(website_id)
+
+
+def get_latency_detector(app=None):
+    """The DatabaseLatencyDetector of app (or the current app), created on first use"""
+    app = app or current_app._get_current_object()
+    detector = app.extensions.get('latency_detector')
+    if detector is None:
+        detector = app.extensions.setdefault('latency_detector', DatabaseLatencyDetector(**latency_settings(app)))
+    return detector
+
+
+def track_latency(results):
+    """
+    Fold finished checks into the current app's baselines, logging sites
+    that are flagged or cleared, and save the baselines if due.
+
+    Call it once the checks have been stored: a database error here is
+    logged rather than raised, so it can only cost baseline updates.
+
+    Args:
+        results: Check result dicts, see LatencyDetector.observe_many
+    """
+    try:
+        detector = get_latency_detector()
+        for website_id, change in detector.observe_many(results):
+            baseline = detector.get(website_id)
+            current_app.logger.warning(f"Website {website_id} response times {change}", extra={'fields': {
+                'website_id': website_id, 'latency': change, **baseline.to_dict()
+            }})
+        detector.save()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Failed to update latency baselines: {str(e)}")
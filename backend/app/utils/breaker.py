@@ -0,0 +1,340 @@
+"""
+Adaptive timeouts and host-level circuit breaking for checks.
+
+AdaptiveTimeouts keeps a smoothed mean and mean deviation of each site's
+response times (the estimator TCP uses for its retransmission timeout) and
+derives an allowance for the next check from them:
+
+    allowance = clamp(TIMEOUT_MULTIPLIER * (mean + 4 * deviation),
+                      MIN_TIMEOUT_SECONDS, the configured timeout)
+
+A site that normally answers in 200ms has its request given up on after a
+couple of seconds instead of the full 10s.  That only abandons the request,
+not the check: it is tried again on a fresh connection for whatever is left
+of the configured timeout (see CheckGuard.retry_timeout), so a site that is
+merely slower than usual is recorded as slow, not down, and only the
+configured timeout decides that a site didn't answer.  A stuck connection or
+a lost packet costs a couple of seconds rather than the whole timeout.
+Until a site has MIN_SAMPLES answers the configured timeout is used, and
+each check that runs out of time doubles the site's next allowance (once,
+however many tries it made, and up to the configured timeout) so a site
+that really has got slower is learnt again.
+
+HostCircuitBreaker groups sites by the host (or, once resolved, the IP
+address) and port they are served from.  After FAILURE_THRESHOLD checks in
+a row on a group fail without any response, the circuit opens: checks of
+the group's sites are recorded as down straight away, without taking a
+worker slot, and the group is probed with a bare TCP connect every
+PROBE_INTERVAL_SECONDS (doubling up to MAX_PROBE_INTERVAL_SECONDS while it
+stays down).  When a probe connects, one real check is let through; if it
+gets a response the circuit closes, otherwise it opens again.
+
+Allowances are learnt per site, since paths on one host can be very
+different; only the circuit breaker groups sites by host.  CheckGuard puts
+the two together for one checker.  The asyncio engine uses
+before_async/after, the requests-based checkers before/after.
+"""
+import asyncio
+import socket
+import threading
+import time
+import weakref
+from urllib.parse import urlsplit
+
+from app.utils.telemetry import registry
+
+# Adaptive timeout estimator
+TIMEOUT_MULTIPLIER = 2.0
+MIN_TIMEOUT_SECONDS = 2.0
+MIN_SAMPLES = 5
+# Smoothing of the mean and the deviation (RFC 6298's alpha and beta)
+MEAN_GAIN = 1 / 8
+DEVIATION_GAIN = 1 / 4
+
+# Circuit breaker
+FAILURE_THRESHOLD = 5
+PROBE_INTERVAL_SECONDS = 10
+MAX_PROBE_INTERVAL_SECONDS = 120
+PROBE_TIMEOUT_SECONDS = 2.0
+# A trial check that hasn't reported back by then is presumed lost
+TRIAL_TIMEOUT_SECONDS = 60
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+SKIPPED_CHECKS = registry.counter(
+    'upmon_circuit_skipped_checks_total', 'Checks recorded as down without a request because the circuit was open')
+PROBES = registry.counter(
+    'upmon_circuit_probes_total', 'TCP connect probes of hosts with an open circuit', labels=('result',))
+
+# Every live breaker, for the open hosts gauge
+_breakers = weakref.WeakSet()
+registry.gauge('upmon_circuit_open_hosts', 'Hosts whose circuit is open or half open',
+               callback=lambda: sum(len(breaker.open_hosts()) for breaker in list(_breakers)))
+
+
+class AdaptiveTimeouts:
+    """Per-site timeouts learnt from the site's response times"""
+
+    def __init__(self, ceiling=10.0, floor=MIN_TIMEOUT_SECONDS, multiplier=TIMEOUT_MULTIPLIER,
+                 min_samples=MIN_SAMPLES):
+        self.ceiling = ceiling
+        self.floor = min(floor, ceiling)
+        self.multiplier = multiplier
+        self.min_samples = min_samples
+        # key -> [mean, deviation, samples, backoff]
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def timeout(self, key):
+        """Seconds to allow the next request for this site"""
+        state = self._hosts.get(key)
+        if state is None or state[2] < self.min_samples:
+            return self.ceiling
+        mean, deviation, _, backoff = state
+        # Backed off from what the site was actually given, so a site learnt
+        # below the floor still gets twice as long after a timeout
+        learnt = max(self.floor, self.multiplier * (mean + 4 * deviation))
+        return min(self.ceiling, learnt * backoff)
+
+    def observe(self, key, seconds):
+        """Record the response time of a check that got an answer"""
+        with self._lock:
+            state = self._hosts.get(key)
+            if state is None:
+                self._hosts[key] = [seconds, seconds / 2, 1, 1]
+                return
+            mean, deviation, samples, _ = state
+            deviation += DEVIATION_GAIN * (abs(seconds - mean) - deviation)
+            mean += MEAN_GAIN * (seconds - mean)
+            self._hosts[key] = [mean, deviation, samples + 1, 1]
+
+    def timed_out(self, key):
+        """Give the site more time next check, up to the ceiling"""
+        with self._lock:
+            state = self._hosts.get(key)
+            if state is not None and state[2] >= self.min_samples:
+                state[3] = min(state[3] * 2, self.ceiling / self.floor)
+
+    def forget(self, key):
+        with self._lock:
+            self._hosts.pop(key, None)
+
+
+class HostCircuitBreaker:
+    """Stops checking hosts that aren't answering at all, and probes them instead"""
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, probe_interval=PROBE_INTERVAL_SECONDS,
+                 max_probe_interval=MAX_PROBE_INTERVAL_SECONDS, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.probe_interval = probe_interval
+        self.max_probe_interval = max_probe_interval
+        self.clock = clock
+        # key -> state dict; hosts that have never failed have no entry
+        self._hosts = {}
+        self._lock = threading.Lock()
+        _breakers.add(self)
+
+    def before_check(self, key):
+        """
+        What to do about a check of a site on this host.
+
+        Returns:
+            str: 'check' to go ahead, 'probe' to TCP-probe the host first
+                (then report with probe_result), or 'skip' to record the
+                site as down without a request
+        """
+        state = self._hosts.get(key)
+        if state is None or state['state'] == CLOSED:
+            return 'check'
+        with self._lock:
+            now = self.clock()
+            if state['state'] == HALF_OPEN and now < state['trial_deadline']:
+                return 'skip'
+            if not state['probing'] and now >= state['next_probe']:
+                state['probing'] = True
+                return 'probe'
+            return 'skip'
+
+    def probe_result(self, key, connected, error=None):
+        """Record a probe; a successful one lets the caller's check through as the trial"""
+        with self._lock:
+            state = self._hosts.get(key)
+            if state is None:
+                return
+            state['probing'] = False
+            if connected:
+                state['state'] = HALF_OPEN
+                state['trial_deadline'] = self.clock() + TRIAL_TIMEOUT_SECONDS
+            else:
+                state['last_error'] = error or state['last_error']
+                self._reopen(state, backoff=True)
+        PROBES.inc('connected' if connected else 'failed')
+
+    def record(self, key, reachable, error=None):
+        """Record a check that got a response (reachable) or none at all"""
+        if reachable:
+            if key in self._hosts:
+                with self._lock:
+                    self._hosts.pop(key, None)
+            return
+        with self._lock:
+            state = self._hosts.get(key)
+            if state is None:
+                state = self._hosts[key] = {
+                    'state': CLOSED, 'failures': 0, 'interval': self.probe_interval,
+                    'next_probe': 0, 'probing': False, 'trial_deadline': 0, 'last_error': None
+                }
+            state['failures'] += 1
+            state['last_error'] = error
+            if state['state'] == HALF_OPEN:
+                self._reopen(state, backoff=True)
+            elif state['state'] == CLOSED and state['failures'] >= self.failure_threshold:
+                self._reopen(state, backoff=False)
+
+    def _reopen(self, state, backoff):
+        if backoff and state['state'] != CLOSED:
+            state['interval'] = min(self.max_probe_interval, state['interval'] * 2)
+        state['state'] = OPEN
+        state['next_probe'] = self.clock() + state['interval']
+
+    def circuit_error(self, key):
+        """Error message recorded for a check skipped because the circuit is open"""
+        state = self._hosts.get(key) or {}
+        message = f"Host {key} unreachable, circuit open (probing every {state.get('interval', 0)}s)"
+        if state.get('last_error'):
+            message += f": {state['last_error']}"
+        return message
+
+    def open_hosts(self):
+        """Keys of the hosts whose circuit is not closed"""
+        with self._lock:
+            return [key for key, state in self._hosts.items() if state['state'] != CLOSED]
+
+
+def tcp_probe(host, port, timeout=PROBE_TIMEOUT_SECONDS):
+    """
+    Try to open (and immediately close) a TCP connection.
+
+    Returns:
+        str: None if it connected, otherwise the error
+    """
+    try:
+        socket.create_connection((host, port), timeout=timeout).close()
+        return None
+    except OSError as e:
+        return str(e) or e.__class__.__name__
+
+
+async def tcp_probe_async(host, port, timeout=PROBE_TIMEOUT_SECONDS):
+    """tcp_probe on the running event loop"""
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except (OSError, asyncio.TimeoutError) as e:
+        return str(e) or e.__class__.__name__
+    writer.close()
+    return None
+
+
+class CheckGuard:
+    """Adaptive timeouts and circuit breaking around one checker's requests"""
+
+    def __init__(self, timeout=10.0, timeouts=None, breaker=None):
+        self.timeouts = timeouts or AdaptiveTimeouts(ceiling=timeout)
+        self.breaker = breaker or HostCircuitBreaker()
+
+    @staticmethod
+    def host_key(url, resolve=None):
+        """
+        Group key for url: host and port, with the host replaced by its
+        address when resolve(host, port) knows it.  None for URLs that
+        can't be parsed.
+        """
+        try:
+            parts = urlsplit(url)
+            port = parts.port or (443 if parts.scheme == 'https' else 80)
+        except ValueError:
+            return None
+        if not parts.hostname:
+            return None
+        address = resolve(parts.hostname, port) if resolve else None
+        return f"{address or parts.hostname}:{port}"
+
+    def _decide(self, key):
+        if key is None:
+            return 'check'
+        return self.breaker.before_check(key)
+
+    def _probe_target(self, key):
+        host, _, port = key.rpartition(':')
+        return host.strip('[]'), int(port)
+
+    def before(self, key, site=None):
+        """
+        Decide how to check a site on host key, probing it first if due.
+
+        Args:
+            key: Host key from host_key()
+            site: Key the site's timeout is learnt under (its website ID)
+
+        Returns:
+            tuple: (allowance in seconds, None) to go ahead with the check,
+                or (None, error message) to record it as down without one
+        """
+        decision = self._decide(key)
+        if decision == 'probe':
+            error = tcp_probe(*self._probe_target(key))
+            self.breaker.probe_result(key, error is None, error)
+            decision = 'check' if error is None else 'skip'
+        return self._outcome(key, site, decision)
+
+    async def before_async(self, key, site=None):
+        """before() for the asyncio engine"""
+        decision = self._decide(key)
+        if decision == 'probe':
+            error = await tcp_probe_async(*self._probe_target(key))
+            self.breaker.probe_result(key, error is None, error)
+            decision = 'check' if error is None else 'skip'
+        return self._outcome(key, site, decision)
+
+    def _outcome(self, key, site, decision):
+        if decision == 'skip':
+            SKIPPED_CHECKS.inc()
+            return None, self.breaker.circuit_error(key)
+        return (self.timeouts.timeout(site) if site is not None else self.timeouts.ceiling), None
+
+    def retry_timeout(self, allowance, elapsed):
+        """
+        A request given allowance seconds timed out after elapsed seconds.
+
+        The site's allowance is only backed off by after(), once the whole
+        check has run out of time.
+
+        Returns:
+            float: Seconds to try it again for, up to the configured timeout,
+                or None if it already had all of it (the site is down)
+        """
+        if allowance is None or allowance >= self.timeouts.ceiling:
+            return None
+        remaining = self.timeouts.ceiling - elapsed
+        return remaining if remaining > 0 else None
+
+    def after(self, key, seconds, reachable, timed_out=False, error=None, site=None):
+        """
+        Record how a check went.
+
+        Args:
+            key: Host key the check was made under
+            seconds: How long it took, retries included
+            reachable: Whether the server answered at all (any status code)
+            timed_out: Whether it failed by running out of time
+            error: Error message, if it failed
+            site: Key the site's timeout is learnt under
+        """
+        if site is not None:
+            if reachable:
+                self.timeouts.observe(site, seconds)
+            elif timed_out:
+                self.timeouts.timed_out(site)
+        if key is not None:
+            self.breaker.record(key, reachable, error)
+
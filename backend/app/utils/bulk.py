@@ -0,0 +1,313 @@
+"""
+Bulk website import and export.
+
+Imports are NDJSON (one JSON object per line) or CSV with a header row,
+using the same fields as POST /api/websites.  Rows are read from the
+request stream one at a time, validated and deduplicated on their
+normalised URL in the same pass, and written as upserts: a row whose URL
+matches an existing website updates it, any other creates one.  Writes
+go out in chunked transactions of executemany statements, so one bad row
+costs an error entry rather than the whole import.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from urllib.parse import urlsplit, urlunsplit
+
+from app import db
+from app.models import Website
+from app.utils.check_modes import validate_check_options
+
+# Rows written per transaction
+CHUNK_SIZE = 1000
+
+# Most rows accepted in one import, and per-row errors reported back
+MAX_ROWS = 100000
+MAX_ERRORS = 1000
+
+CHECK_OPTION_FIELDS = ('check_mode', 'check_max_bytes', 'check_keyword', 'check_keyword_is_regex')
+IMPORT_FIELDS = ('name', 'url', 'check_interval_minutes', 'is_active',
+                 'check_mode', 'check_max_bytes', 'check_keyword', 'check_keyword_is_regex')
+EXPORT_FIELDS = ('id',) + IMPORT_FIELDS
+
+INTEGER_FIELDS = ('check_interval_minutes', 'check_max_bytes')
+BOOLEAN_FIELDS = ('is_active', 'check_keyword_is_regex')
+BOOLEAN_STRINGS = {'true': True, '1': True, 'yes': True, 'false': False, '0': False, 'no': False}
+
+# Longest allowed check interval (one day)
+MAX_INTERVAL_MINUTES = 1440
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(url):
+    """
+    Canonical form of a URL for duplicate detection.
+
+    Lower-cases the scheme and host, drops a default port, a fragment and
+    a lone trailing slash, so http://Example.com:80/ and
+    http://example.com are the same website.
+
+    Returns:
+        str: The normalised URL, or None if it isn't an http(s) URL
+    """
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except (AttributeError, ValueError):
+        return None
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return None
+    netloc = parts.hostname.lower()
+    if ':' in netloc:
+        netloc = f"[{netloc}]"
+    if port is not None and port != DEFAULT_PORTS[scheme]:
+        netloc = f"{netloc}:{port}"
+    if parts.username:
+        credentials = parts.username + (f":{parts.password}" if parts.password else '')
+        netloc = f"{credentials}@{netloc}"
+    path = '' if parts.path == '/' else parts.path
+    return urlunsplit((scheme, netloc, path, parts.query, ''))
+
+
+def read_ndjson(stream):
+    """
+    Yield (line number, row dict or error message) for each non-blank line.
+    """
+    for line_number, line in enumerate(io.TextIOWrapper(stream, encoding='utf-8', errors='replace'), 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(row, dict):
+            yield line_number, "Each line must be a JSON object"
+            continue
+        yield line_number, row
+
+
+def read_csv(stream):
+    """
+    Yield (line number, row dict or error message) for each CSV record.
+
+    Values arrive as strings; empty cells are treated as missing and
+    numbers and booleans are converted, so rows validate like JSON ones
+    (a value that doesn't convert is left as a string for validation to
+    reject).
+    """
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', errors='replace', newline=''))
+    unknown = set(reader.fieldnames or ()) - set(EXPORT_FIELDS)
+    if unknown:
+        yield 1, f"Unknown CSV columns: {', '.join(sorted(unknown))}"
+        return
+    for record in reader:
+        if None in record:
+            yield reader.line_num, "More values than columns"
+            continue
+        row = {}
+        for field, value in record.items():
+            if value is None or value == '' or field == 'id':
+                continue
+            if field in INTEGER_FIELDS:
+                try:
+                    value = int(value)
+                except ValueError:
+                    pass
+            elif field in BOOLEAN_FIELDS:
+                value = BOOLEAN_STRINGS.get(value.strip().lower(), value)
+            row[field] = value
+        yield reader.line_num, row
+
+
+def validate_row(row, existing=None):
+    """
+    Validate one import row.
+
+    Args:
+        row: Row dict
+        existing: Current field values when the row updates a website
+
+    Returns:
+        str: Description of the first problem found, or None if valid
+    """
+    unknown = set(row) - set(EXPORT_FIELDS)
+    if unknown:
+        return f"Unknown fields: {', '.join(sorted(unknown))}"
+    if existing is None and not row.get('name'):
+        return "name is required"
+    if 'name' in row and (not isinstance(row['name'], str) or not row['name'].strip() or len(row['name']) > 100):
+        return "name must be a non-empty string of at most 100 characters"
+    if len(row['url']) > 255:
+        return "url must be at most 255 characters"
+    interval = row.get('check_interval_minutes')
+    if interval is not None and (isinstance(interval, bool) or not isinstance(interval, int)
+                                 or not 1 <= interval <= MAX_INTERVAL_MINUTES):
+        return f"check_interval_minutes must be an integer between 1 and {MAX_INTERVAL_MINUTES}"
+    for field in BOOLEAN_FIELDS:
+        if field in row and not isinstance(row[field], bool):
+            return f"{field} must be true or false"
+    # Check options as they will be after the upsert
+    check_options = {field: existing[field] for field in CHECK_OPTION_FIELDS} if existing else {}
+    check_options.update({field: row[field] for field in CHECK_OPTION_FIELDS if field in row})
+    return validate_check_options(check_options)
+
+
+class BulkImport:
+    """Validates, deduplicates and upserts website rows"""
+
+    def __init__(self, chunk_size=CHUNK_SIZE, max_rows=MAX_ROWS, max_errors=MAX_ERRORS):
+        self.chunk_size = chunk_size
+        self.max_rows = max_rows
+        self.max_errors = max_errors
+        self.created = 0
+        self.updated = 0
+        self.rows = 0
+        self.error_count = 0
+        self.errors = []
+        # Websites created or updated, as (id, interval, is_active), for scheduling
+        self.changed = []
+        self._seen = {}
+        self._inserts = []
+        self._updates = []
+        # Normalised URL -> current values of every existing website, loaded
+        # once so matching a row costs a dict lookup rather than a query
+        fields = ('id', 'check_interval_minutes', 'is_active') + CHECK_OPTION_FIELDS
+        self._existing = {}
+        for url, *values in db.session.query(Website.url, *(getattr(Website, field) for field in fields)):
+            self._existing[normalize_url(url) or url] = dict(zip(fields, values))
+
+    def _error(self, line_number, message, url=None):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line_number, 'url': url, 'error': message})
+
+    def add(self, line_number, row):
+        """Validate one parsed row (or parse error) and queue it for writing"""
+        self.rows += 1
+        if self.rows > self.max_rows:
+            self._error(line_number, f"Too many rows, at most {self.max_rows} per import")
+            return
+        if isinstance(row, str):
+            self._error(line_number, row)
+            return
+
+        url = row.get('url')
+        key = normalize_url(url) if isinstance(url, str) else None
+        if key is None:
+            self._error(line_number, "url must be an http or https URL", url if isinstance(url, str) else None)
+            return
+        if key in self._seen:
+            self._error(line_number, f"Duplicate of line {self._seen[key]}", url)
+            return
+
+        existing = self._existing.get(key)
+        error = validate_row(row, existing)
+        if error:
+            self._error(line_number, error, url)
+            return
+        self._seen[key] = line_number
+
+        now = datetime.utcnow()
+        values = {field: row[field] for field in IMPORT_FIELDS if field in row}
+        values['url'] = url.strip()
+        values['updated_at'] = now
+        if existing:
+            values['id'] = existing['id']
+            self._updates.append(values)
+            existing.update(values)
+        else:
+            values.setdefault('check_interval_minutes', 5)
+            values.setdefault('is_active', True)
+            values['created_at'] = now
+            self._inserts.append(values)
+        if len(self._inserts) + len(self._updates) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Write the queued rows in one transaction"""
+        if not self._inserts and not self._updates:
+            return
+        # Rows with different sets of fields need separate statements
+        for rows in _group_by_fields(self._inserts):
+            ids = db.session.execute(
+                Website.__table__.insert().returning(Website.id, sort_by_parameter_order=True), rows
+            ).scalars().all()
+            self.changed.extend(
+                (website_id, values['check_interval_minutes'], values['is_active'])
+                for website_id, values in zip(ids, rows)
+            )
+        for rows in _group_by_fields(self._updates):
+            db.session.execute(
+                Website.__table__.update().where(Website.id == db.bindparam('_id')),
+                [{'_id': values['id'], **{field: values[field] for field in values if field != 'id'}}
+                 for values in rows]
+            )
+        db.session.commit()
+
+        for values in self._updates:
+            existing = self._existing[normalize_url(values['url'])]
+            self.changed.append((existing['id'], existing['check_interval_minutes'], existing['is_active']))
+        self.created += len(self._inserts)
+        self.updated += len(self._updates)
+        self._inserts = []
+        self._updates = []
+
+    def run(self, rows):
+        """Import (line number, row) pairs from read_ndjson or read_csv"""
+        for line_number, row in rows:
+            self.add(line_number, row)
+        self.flush()
+        return self
+
+    def result(self):
+        return {
+            'rows': self.rows,
+            'created': self.created,
+            'updated': self.updated,
+            'failed': self.error_count,
+            'errors': self.errors,
+            'errors_truncated': self.error_count > len(self.errors)
+        }
+
+
+def _group_by_fields(rows):
+    groups = {}
+    for values in rows:
+        groups.setdefault(tuple(sorted(values)), []).append(values)
+    return groups.values()
+
+
+def export_rows(chunk_size=CHUNK_SIZE):
+    """Yield every website as an export dict, reading chunk_size rows at a time"""
+    columns = [getattr(Website, field) for field in EXPORT_FIELDS]
+    last_id = 0
+    while True:
+        rows = db.session.query(*columns).filter(Website.id > last_id)\
+            .order_by(Website.id).limit(chunk_size).all()
+        for row in rows:
+            yield dict(zip(EXPORT_FIELDS, row))
+        if len(rows) < chunk_size:
+            return
+        last_id = rows[-1][0]
+
+
+def export_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row) + '\n'
+
+
+def export_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, lineterminator='\n')
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= 64 * 1024:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
@@ -0,0 +1,106 @@
+"""
+Per-website check modes.
+
+'head': HEAD request, no body at all.  Servers that don't support HEAD
+    (405/501) are retried once with a partial GET.
+'partial': GET that stops after the first max_bytes of the body.
+'keyword': Like 'partial', but the site is only up if the keyword (or regular
+    expression) appears in that first window of the body.
+
+Bodies are read in chunks and never past max_bytes, which is itself capped
+at MAX_BYTES_LIMIT, so a huge page costs no more memory or bandwidth than a
+small one.
+"""
+import re
+
+CHECK_MODES = ('head', 'partial', 'keyword')
+DEFAULT_CHECK_MODE = 'partial'
+
+DEFAULT_MAX_BYTES = 64 * 1024
+
+# Hard cap on how much of a body is read (and, for keywords, held) per check
+MAX_BYTES_LIMIT = 1024 * 1024
+
+MAX_KEYWORD_LENGTH = 255
+
+# Status codes meaning the server doesn't do HEAD for this URL
+HEAD_NOT_SUPPORTED = (405, 501)
+
+
+class CheckOptions:
+    """How to check one website"""
+
+    def __init__(self, mode=DEFAULT_CHECK_MODE, max_bytes=None, keyword=None, keyword_is_regex=False):
+        self.mode = mode or DEFAULT_CHECK_MODE
+        self.max_bytes = min(max_bytes or DEFAULT_MAX_BYTES, MAX_BYTES_LIMIT)
+        self.keyword = keyword
+        self.keyword_is_regex = bool(keyword_is_regex)
+        self._pattern = None
+        if self.mode == 'keyword' and keyword:
+            self._pattern = re.compile(keyword if self.keyword_is_regex else re.escape(keyword))
+
+    @classmethod
+    def from_website(cls, website):
+        return cls(website.check_mode, website.check_max_bytes, website.check_keyword,
+                   website.check_keyword_is_regex)
+
+    @property
+    def method(self):
+        return 'HEAD' if self.mode == 'head' else 'GET'
+
+    @property
+    def keep_body(self):
+        """Whether the body window has to be kept for matching"""
+        return self._pattern is not None
+
+    def match(self, body):
+        """
+        Look for the keyword in a body window.
+
+        Args:
+            body: First max_bytes of the response body
+
+        Returns:
+            str: Error message if the keyword is missing, otherwise None
+        """
+        if self._pattern is None:
+            return None
+        text = body.decode('utf-8', errors='replace')
+        if self._pattern.search(text):
+            return None
+        kind = 'Pattern' if self.keyword_is_regex else 'Keyword'
+        return f"{kind} '{self.keyword}' not found in the first {self.max_bytes} bytes"
+
+
+def validate_check_options(data):
+    """
+    Validate the check mode fields of a website create/update payload.
+
+    Args:
+        data: Request JSON (only the check_* keys present are validated)
+
+    Returns:
+        str: Description of the first problem found, or None if valid
+    """
+    if 'check_mode' in data and data['check_mode'] not in CHECK_MODES:
+        return f"check_mode must be one of: {', '.join(CHECK_MODES)}"
+
+    max_bytes = data.get('check_max_bytes')
+    if max_bytes is not None:
+        if isinstance(max_bytes, bool) or not isinstance(max_bytes, int) \
+                or not 1 <= max_bytes <= MAX_BYTES_LIMIT:
+            return f"check_max_bytes must be an integer between 1 and {MAX_BYTES_LIMIT}"
+
+    keyword = data.get('check_keyword')
+    if keyword is not None:
+        if not isinstance(keyword, str) or len(keyword) > MAX_KEYWORD_LENGTH:
+            return f"check_keyword must be a string of at most {MAX_KEYWORD_LENGTH} characters"
+        if data.get('check_keyword_is_regex'):
+            try:
+                re.compile(keyword)
+            except re.error as e:
+                return f"check_keyword is not a valid regular expression: {e}"
+
+    if data.get('check_mode') == 'keyword' and not keyword:
+        return "check_keyword is required for keyword checks"
+    return None
@@ -1,15 +1,128 @@
 import requests
+from requests.adapters import HTTPAdapter
 import time
 from datetime import datetime
 from app.models import Check, Website
 from app import db
+from app.utils.engine import CheckEngine
+from app.utils.breaker import CheckGuard
+from app.utils.anomaly import track_latency
+from app.utils.check_modes import CheckOptions, HEAD_NOT_SUPPORTED
+from app.utils.status_cache import get_status_cache
+from app.utils.log import log_check
+from app.utils.telemetry import DB_WRITE, record_check
 
-def check_website(website):
+# Shared session so repeat checks reuse keep-alive connections
+session = requests.Session()
+session.headers['User-Agent'] = 'UpMon Website Checker/1.0'
+session.mount('http://', HTTPAdapter(pool_connections=100, pool_maxsize=4))
+session.mount('https://', HTTPAdapter(pool_connections=100, pool_maxsize=4))
+
+# Adaptive timeouts and circuit breaking for check_website; for the circuit
+# sites are grouped by host and port, since requests doesn't tell us the address
+guard = CheckGuard()
+
+# Shared engine for check_websites, so callers that don't bring their own
+# reuse one event loop thread and keep-alive pool instead of leaking one per call
+shared_engine = CheckEngine()
+
+def _connections_opened(url):
+    """How many connections the session's pool for url has opened so far"""
+    try:
+        return session.get_adapter(url).poolmanager.connection_from_url(url).num_connections
+    except Exception:
+        return None
+
+def _idle_connection_open(url):
+    """Whether the next request to url can go over an open pooled connection"""
+    try:
+        pool = session.get_adapter(url).poolmanager.connection_from_url(url)
+        # Pools are a LIFO queue of connections, padded with None; a
+        # connection closed mid-body stays in it but has to reconnect
+        idle = pool.pool.queue if pool.pool is not None else []
+        return bool(idle) and idle[-1] is not None and idle[-1].sock is not None
+    except Exception:
+        return None
+
+# Body is streamed in chunks of this size, up to the site's check_max_bytes
+STREAM_CHUNK_SIZE = 16 * 1024
+
+def _read_window(response, options):
+    """
+    Read at most options.max_bytes of a streamed body, then close it.
+    
+    Returns:
+        bytes: The body read, or None unless options.keep_body
+    """
+    kept = bytearray() if options.keep_body else None
+    received = 0
+    try:
+        for chunk in response.iter_content(chunk_size=min(STREAM_CHUNK_SIZE, options.max_bytes)):
+            chunk = chunk[:options.max_bytes - received]
+            received += len(chunk)
+            if kept is not None:
+                kept += chunk
+            if received >= options.max_bytes:
+                break
+    finally:
+        # Drops the connection if the body wasn't finished, instead of
+        # downloading the rest of it
+        response.close()
+    return bytes(kept) if kept is not None else None
+
+def _fetch(url, options, cold, timeout=10):
+    """Send the check request for url with streaming, falling back from HEAD to GET"""
+    method = options.method
+    while True:
+        if cold:
+            response = requests.request(
+                method,
+                url,
+                timeout=timeout,
+                stream=True,
+                allow_redirects=True,
+                headers={'User-Agent': 'UpMon Website Checker/1.0', 'Connection': 'close'}
+            )
+        else:
+            response = session.request(method, url, timeout=timeout, stream=True, allow_redirects=True)
+        if method == 'HEAD' and response.status_code in HEAD_NOT_SUPPORTED:
+            response.close()
+            method = 'GET'
+            continue
+        return response
+
+def _fetch_within(url, options, cold, allowance, start_time):
+    """_fetch within the site's learnt allowance, retried for the rest of the configured timeout"""
+    try:
+        return _fetch(url, options, cold, timeout=allowance)
+    except requests.exceptions.Timeout:
+        retry = guard.retry_timeout(allowance, time.time() - start_time)
+        if retry is None:
+            raise
+    return _fetch(url, options, cold, timeout=retry)
+
+def check_website(website, sink=None, cold=False):
     """
     Check if a website is up and record the result.
     
     Args:
         website: Website model instance to check
+        sink: Optional CheckSink to queue the result on instead of
+            committing it straight away
+        cold: Use a fresh connection instead of the shared keep-alive pool
+        
+    The body is streamed and only read up to the website's check_max_bytes
+    (see app.utils.check_modes).
+    
+    requests doesn't expose DNS, connect and TLS times, so only ttfb_ms and
+    download_ms are recorded, with any connection setup counted in ttfb_ms.
+    For the full breakdown use check_websites (app.utils.engine.CheckEngine).
+    
+    The request is first given an allowance learnt from the site's usual
+    response times and retried for the rest of the configured timeout if
+    that runs out.  Sites on a host that has stopped answering are recorded
+    as down without a request until a TCP probe gets through (see
+    app.utils.breaker).
         
     Returns:
         Check: The created Check instance
@@ -18,50 +131,127 @@ def check_website(website):
     is_up = False
     status_code = None
     error_message = None
+    connection_mode = None
+    ttfb_ms = None
+    download_ms = None
+    timed_out = False
+    options = CheckOptions.from_website(website)
+    key = guard.host_key(website.url)
+    allowance, circuit_error = guard.before(key, website.id)
     
-    try:
-        # Set a reasonable timeout
-        response = requests.get(
-            website.url, 
-            timeout=10,
-            headers={'User-Agent': 'UpMon Website Checker/1.0'}
-        )
-        status_code = response.status_code
-        # Consider 2xx and 3xx status codes as up
-        is_up = 200 <= status_code < 400
-        response_time_ms = int((time.time() - start_time) * 1000)
-    except requests.exceptions.RequestException as e:
-        response_time_ms = int((time.time() - start_time) * 1000)
-        error_message = str(e)
-    
-    # Create a new check record
-    check = Check(
-        website_id=website.id,
-        status_code=status_code,
-        response_time_ms=response_time_ms,
-        is_up=is_up,
-        checked_at=datetime.utcnow(),
-        error_message=error_message
-    )
-    
-    # Save to database
-    db.session.add(check)
-    db.session.commit()
+    if circuit_error:
+        # The host isn't answering at all; don't spend a timeout finding out again
+        response_time_ms = None
+        error_message = circuit_error
+    else:
+        try:
+            if cold:
+                response = _fetch_within(website.url, options, True, allowance, start_time)
+                connection_mode = 'cold'
+            else:
+                opened = _connections_opened(website.url)
+                idle_open = _idle_connection_open(website.url)
+                response = _fetch_within(website.url, options, False, allowance, start_time)
+                if opened is not None:
+                    reused = idle_open and _connections_opened(website.url) == opened
+                    connection_mode = 'reused' if reused else 'new'
+            body = _read_window(response, options)
+            status_code = response.status_code
+            # Consider 2xx and 3xx status codes as up
+            is_up = 200 <= status_code < 400
+            if is_up and options.keep_body:
+                error_message = options.match(body)
+                is_up = error_message is None
+            response_time_ms = int((time.time() - start_time) * 1000)
+            # elapsed stops once the headers have been parsed
+            ttfb_ms = int(response.elapsed.total_seconds() * 1000)
+            download_ms = max(response_time_ms - ttfb_ms, 0)
+        except requests.exceptions.RequestException as e:
+            response_time_ms = int((time.time() - start_time) * 1000)
+            error_message = str(e)
+            timed_out = isinstance(e, requests.exceptions.Timeout)
+        except Exception as e:
+            # Same as the engine: any other failure is this site's down check
+            response_time_ms = int((time.time() - start_time) * 1000)
+            is_up = False
+            error_message = f"Check failed: {type(e).__name__}: {e}"
+        guard.after(key, time.time() - start_time, status_code is not None, timed_out, error_message, website.id)
+    
+    record_check(website.url, is_up, status_code)
+    log_check(website.id, website.url, is_up, status_code, response_time_ms, error_message)
+    
+    result = {
+        'website_id': website.id,
+        'status_code': status_code,
+        'response_time_ms': response_time_ms,
+        'is_up': is_up,
+        'checked_at': datetime.utcnow(),
+        'error_message': error_message,
+        'connection_mode': connection_mode,
+        'ttfb_ms': ttfb_ms,
+        'download_ms': download_ms
+    }
+    if sink is not None:
+        # The sink updates the latency baselines once the row is written
+        sink.put(result)
+        return Check(**result)
+    
+    # Create a new check record and save it to the database
+    check = Check(**result)
+    with DB_WRITE.time('check'):
+        db.session.add(check)
+        db.session.commit()
+    get_status_cache().invalidate()
+    track_latency([result])
     
     return check
 
-def check_all_websites():
+def check_websites(websites, engine=None, sink=None):
     """
-    Check all active websites and record their status.
+    Check a batch of websites and record their status.
+    
+    All checks run concurrently in a single event loop (see
+    app.utils.engine.CheckEngine) and the results are committed together,
+    or handed to sink to be written in the background.  Their response
+    times feed the latency anomaly baselines (see app.utils.anomaly) once
+    they are stored.
     
+    Args:
+        websites: Website model instances to check
+        engine: Optional CheckEngine to use instead of the shared one
+        sink: Optional CheckSink to queue the results on
+        
     Returns:
         list: List of Check instances created
     """
-    websites = Website.query.filter_by(is_active=True).all()
-    checks = []
+    targets = [(website.id, website.url, CheckOptions.from_website(website)) for website in websites]
+    
+    engine = engine or shared_engine
+    results = engine.run_sync(targets)
+    
+    if sink is not None:
+        sink.put_many(results)
+        return [Check(**result) for result in results]
     
-    for website in websites:
-        check = check_website(website)
-        checks.append(check)
+    checks = [Check(**result) for result in results]
+    with DB_WRITE.time('check_batch'):
+        db.session.add_all(checks)
+        db.session.commit()
+    get_status_cache().invalidate()
+    track_latency(results)
     
     return checks
+
+def check_all_websites(engine=None, sink=None):
+    """
+    Check all active websites and record their status.
+    
+    Args:
+        engine: Optional CheckEngine to use instead of the default one
+        sink: Optional CheckSink to queue the results on
+        
+    Returns:
+        list: List of Check instances created
+    """
+    websites = Website.query.filter_by(is_active=True).all()
+    return check_websites(websites, engine, sink)
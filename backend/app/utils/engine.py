@@ -0,0 +1,243 @@
+"""
+Asyncio check engine.
+
+Runs a whole set of website checks inside a single event loop.  A global
+semaphore bounds how many checks are in flight at once and a per-host
+semaphore stops a large number of sites on the same origin from hammering it
+(or from being throttled by it).  Each request phase has its own timeout, see
+app.utils.http_client.PhaseTimeouts.
+
+How much of each page is fetched depends on the website's check mode (see
+app.utils.check_modes); by default only the start of the body is read.
+
+Each site's request is first given an allowance learnt from its usual
+response times, then retried for the rest of the configured timeout, and
+hosts that stop answering altogether are circuit-broken: their sites are
+recorded as down without a request until a TCP probe gets through (see
+app.utils.breaker).
+
+The loop lives in a background thread for the lifetime of the engine so the
+client's keep-alive pool and DNS cache carry over from one sweep to the next.
+"""
+import asyncio
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlsplit
+
+from app.utils.breaker import CheckGuard
+from app.utils.check_modes import CheckOptions, HEAD_NOT_SUPPORTED
+from app.utils.http_client import HTTPClient, HTTPError, PhaseTimeouts, Timings
+from app.utils.log import log_check
+from app.utils.telemetry import CHECKS_IN_FLIGHT, SWEEP_CHECKS_PER_SECOND, SWEEP_DURATION, record_check
+
+DEFAULT_CONCURRENCY = 200
+DEFAULT_PER_HOST_LIMIT = 4
+
+
+def _host_key(url):
+    """Key used for per-host limits (hostname and port)"""
+    try:
+        parts = urlsplit(url)
+        return f"{parts.hostname}:{parts.port or parts.scheme}"
+    except ValueError:
+        return url
+
+
+class CheckEngine:
+    """Runs many website checks concurrently with bounded parallelism"""
+
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, per_host_limit=DEFAULT_PER_HOST_LIMIT,
+                 timeouts=None, cold_connections=False, guard=True):
+        """
+        Args:
+            concurrency: Most checks in flight at once
+            per_host_limit: Most checks in flight against a single host
+            timeouts: PhaseTimeouts for every request (the most any adaptive
+                timeout can grow to)
+            cold_connections: Skip the keep-alive pool and DNS cache so each
+                check measures a full first request
+            guard: CheckGuard for adaptive timeouts and circuit breaking,
+                True for a new one or False to always use timeouts as given
+        """
+        self.concurrency = concurrency
+        self.per_host_limit = per_host_limit
+        self.timeouts = timeouts or PhaseTimeouts()
+        self.cold_connections = cold_connections
+        if guard is True:
+            guard = CheckGuard(timeout=self.timeouts.total)
+        self.guard = guard or None
+        self.client = HTTPClient(max_idle_per_host=per_host_limit)
+        self._semaphore = None
+        self._host_semaphores = {}
+        self._loop = None
+        self._loop_lock = threading.Lock()
+
+    def _host_semaphore(self, url):
+        key = _host_key(url)
+        semaphore = self._host_semaphores.get(key)
+        if semaphore is None:
+            semaphore = self._host_semaphores[key] = asyncio.Semaphore(self.per_host_limit)
+        return semaphore
+
+    async def _fetch(self, url, options, timeouts):
+        response = await self.client.fetch(
+            url, method=options.method, timeouts=timeouts, cold=self.cold_connections,
+            max_body_bytes=options.max_bytes, keep_body=options.keep_body
+        )
+        if options.method == 'HEAD' and response.status_code in HEAD_NOT_SUPPORTED:
+            response = await self.client.fetch(
+                url, timeouts=timeouts, cold=self.cold_connections, max_body_bytes=options.max_bytes
+            )
+        return response
+
+    async def _fetch_within(self, url, options, allowance, start_time):
+        """
+        _fetch within the site's learnt allowance, and if only that runs out,
+        again on a fresh connection for the rest of the configured timeout
+        """
+        if allowance is None:
+            return await self._fetch(url, options, self.timeouts)
+        try:
+            return await self._fetch(url, options, self._timeouts_within(allowance))
+        except HTTPError as e:
+            retry = self.guard.retry_timeout(allowance, time.monotonic() - start_time) \
+                if e.timed_out else None
+            if retry is None:
+                raise
+        return await self._fetch(url, options, self._timeouts_within(retry))
+
+    def _timeouts_within(self, seconds):
+        """The engine's PhaseTimeouts, each capped at seconds"""
+        base = self.timeouts
+        if seconds >= base.total:
+            return base
+        return PhaseTimeouts(dns=min(base.dns, seconds), connect=min(base.connect, seconds),
+                             tls=min(base.tls, seconds), ttfb=min(base.ttfb, seconds),
+                             read=min(base.read, seconds), total=seconds)
+
+    async def check(self, website_id, url, options=None):
+        """
+        Check a single website.
+
+        Args:
+            website_id: ID of the website being checked
+            url: URL to request
+            options: CheckOptions for the website (a partial GET if None)
+
+        Returns:
+            dict: Check result with the same fields as a Check row
+        """
+        options = options or CheckOptions()
+        allowance = None
+        key = None
+        if self.guard is not None:
+            # Sites are grouped by address once their host has been resolved
+            key = self.guard.host_key(url, self.client.cached_address)
+            allowance, circuit_error = await self.guard.before_async(key, website_id)
+            if circuit_error is not None:
+                # The host isn't answering at all: record the site as down
+                # without spending a slot (or a timeout) on it
+                record_check(url, False, None)
+                log_check(website_id, url, False, None, None, circuit_error)
+                return self._result(website_id, None, None, False, circuit_error, None, None)
+
+        timed_out = False
+        async with self._semaphore, self._host_semaphore(url):
+            CHECKS_IN_FLIGHT.inc()
+            start_time = time.monotonic()
+            is_up = False
+            status_code = None
+            error_message = None
+            connection_mode = None
+            timings = None
+            try:
+                response = await self._fetch_within(url, options, allowance, start_time)
+                status_code = response.status_code
+                connection_mode = response.connection_mode
+                timings = response.timings
+                # Consider 2xx and 3xx status codes as up
+                is_up = 200 <= status_code < 400
+                if is_up and options.keep_body:
+                    error_message = options.match(response.body)
+                    is_up = error_message is None
+            except HTTPError as e:
+                error_message = str(e)
+                timed_out = e.timed_out
+                # Keep whatever phases finished before the failure
+                timings = e.timings
+            except Exception as e:
+                # A bug tripped by one odd site must not cost the rest of
+                # the sweep its results
+                error_message = f"Check failed: {type(e).__name__}: {e}"
+            finally:
+                CHECKS_IN_FLIGHT.dec()
+            elapsed = time.monotonic() - start_time
+            response_time_ms = int(elapsed * 1000)
+
+        if self.guard is not None:
+            self.guard.after(key, elapsed, status_code is not None, timed_out, error_message, website_id)
+        record_check(url, is_up, status_code)
+        log_check(website_id, url, is_up, status_code, response_time_ms, error_message)
+        return self._result(website_id, status_code, response_time_ms, is_up, error_message,
+                            connection_mode, timings)
+
+    @staticmethod
+    def _result(website_id, status_code, response_time_ms, is_up, error_message, connection_mode, timings):
+        return {
+            'website_id': website_id,
+            'status_code': status_code,
+            'response_time_ms': response_time_ms,
+            'is_up': is_up,
+            'checked_at': datetime.utcnow(),
+            'error_message': error_message,
+            'connection_mode': connection_mode,
+            **(timings or Timings()).as_dict()
+        }
+
+    async def run(self, targets):
+        """
+        Check every target concurrently.
+
+        Args:
+            targets: Iterable of (website_id, url) or (website_id, url, CheckOptions) tuples
+
+        Returns:
+            list: Check result dicts, in the same order as targets
+        """
+        if self._semaphore is None:
+            # Semaphores must be created inside the loop that uses them
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        targets = list(targets)
+        start = time.perf_counter()
+        results = await asyncio.gather(*(self.check(*target) for target in targets), return_exceptions=True)
+        for index, result in enumerate(results):
+            if isinstance(result, Exception):
+                # Anything check() itself didn't catch still only fails its own site
+                results[index] = self._result(targets[index][0], None, None, False,
+                                              f"Check failed: {type(result).__name__}: {result}", None, None)
+        elapsed = time.perf_counter() - start
+        SWEEP_DURATION.observe(elapsed)
+        if results:
+            SWEEP_CHECKS_PER_SECOND.set(len(results) / max(elapsed, 1e-6))
+        return results
+
+    def _get_loop(self):
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, daemon=True).start()
+            return self._loop
+
+    def run_sync(self, targets):
+        """Run a sweep on the engine's event loop and wait for the results"""
+        return asyncio.run_coroutine_threadsafe(self.run(targets), self._get_loop()).result()
+
+    def close(self):
+        """Close pooled connections and stop the event loop"""
+        with self._loop_lock:
+            if self._loop is None:
+                return
+            loop, self._loop = self._loop, None
+        loop.call_soon_threadsafe(self.client.close)
+        loop.call_soon_threadsafe(loop.stop)
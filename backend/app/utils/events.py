@@ -0,0 +1,233 @@
+"""
+Live status events for /api/stream.
+
+The app's DatabaseStatusCache reports every check it folds in, and the
+EventBroker turns those into server-sent events.  Three kinds are sent:
+
+- check: a new check summary for a website
+- status: a website went from up to down or back
+- stats: the dashboard totals changed (only to clients following every site)
+
+Each client has a subscription with an optional set of website IDs and a
+bounded buffer.  A client that can't keep up loses its oldest events and is
+sent a resync event instead, telling it to refetch over the REST API, so a
+slow reader can never make the server hold an unbounded backlog.
+
+Capacity: the app is plain WSGI, so an open stream holds a server thread for
+as long as it lasts.  Each process serves at most STREAM_MAX_CLIENTS streams
+(32 by default) and answers any more with a 503, after which the dashboard
+keeps polling; a deployment holds workers times that many.  Thousands of
+idle streams would take thousands of threads (about 115 KB each in
+benchmarks/bench_stream.py), which isn't a goal here.  Serve the API from
+threaded workers with more threads than STREAM_MAX_CLIENTS, never from
+plain sync workers.
+
+While anyone is subscribed, a feed thread refreshes the status cache once a
+second, so checks written by other processes (see app.utils.worker) are
+pushed too.  Apps without a database (run.py) create the broker with
+follow_database=False and report checks to it themselves.
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+
+from flask import current_app
+
+from app import db
+from app.utils.status_cache import get_status_cache
+
+DEFAULT_BUFFER_SIZE = 256
+# Streams per process unless STREAM_MAX_CLIENTS says otherwise
+DEFAULT_MAX_SUBSCRIBERS = 32
+
+# How often the feed thread looks for new checks
+FEED_INTERVAL_SECONDS = 1.0
+
+
+def format_event(event_type, data, event_id=None):
+    """Serialise one server-sent event"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return '\n'.join(lines) + '\n\n'
+
+
+class Subscription:
+    """One client's filter and bounded event buffer"""
+
+    def __init__(self, website_ids=None, buffer_size=DEFAULT_BUFFER_SIZE):
+        self.website_ids = frozenset(website_ids) if website_ids is not None else None
+        self.buffer_size = buffer_size
+        self.dropped = 0
+        self._events = deque()
+        self._condition = threading.Condition()
+
+    def push(self, event):
+        with self._condition:
+            if len(self._events) >= self.buffer_size:
+                self._events.popleft()
+                self.dropped += 1
+            self._events.append(event)
+            self._condition.notify()
+
+    def take(self, timeout):
+        """
+        Wait up to timeout seconds for events.
+
+        Returns:
+            tuple: (list of serialised events, number dropped since the
+                last call)
+        """
+        with self._condition:
+            if not self._events:
+                self._condition.wait(timeout)
+            events = list(self._events)
+            self._events.clear()
+            dropped, self.dropped = self.dropped, 0
+        return events, dropped
+
+
+class EventBroker:
+    """Fans status events out to subscriptions"""
+
+    def __init__(self, app, max_subscribers=DEFAULT_MAX_SUBSCRIBERS, follow_database=True):
+        self.app = app
+        self.max_subscribers = max_subscribers
+        self.follow_database = follow_database
+        # Subscriptions following every website, and the rest by website ID
+        self._everything = set()
+        self._by_website = {}
+        self._count = 0
+        self._lock = threading.Lock()
+        self._feed = None
+        self.events_published = 0
+
+    @property
+    def subscriber_count(self):
+        return self._count
+
+    def subscribe(self, website_ids=None, buffer_size=DEFAULT_BUFFER_SIZE):
+        """
+        Add a subscription.
+
+        Returns:
+            Subscription: The new subscription, or None if the server is
+                already at max_subscribers
+        """
+        subscription = Subscription(website_ids, buffer_size)
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                return None
+            self._count += 1
+            if subscription.website_ids is None:
+                self._everything.add(subscription)
+            else:
+                for website_id in subscription.website_ids:
+                    self._by_website.setdefault(website_id, set()).add(subscription)
+        self._start_feed()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if subscription.website_ids is None:
+                if subscription not in self._everything:
+                    return
+                self._everything.discard(subscription)
+            else:
+                for website_id in subscription.website_ids:
+                    subscribers = self._by_website.get(website_id)
+                    if subscribers is not None:
+                        subscribers.discard(subscription)
+                        if not subscribers:
+                            del self._by_website[website_id]
+            self._count -= 1
+
+    def publish(self, event, website_id=None):
+        """Send a serialised event to everyone following website_id (or everyone, if None)"""
+        with self._lock:
+            targets = list(self._everything)
+            if website_id is None:
+                for subscribers in self._by_website.values():
+                    targets.extend(subscribers)
+            else:
+                targets.extend(self._by_website.get(website_id, ()))
+        for subscription in set(targets):
+            subscription.push(event)
+        self.events_published += 1
+
+    def publish_to_everything(self, event):
+        """Send an event only to subscriptions that follow every website"""
+        with self._lock:
+            targets = list(self._everything)
+        for subscription in targets:
+            subscription.push(event)
+        self.events_published += 1
+
+    # Status cache listener
+
+    def on_check(self, check_id, website_id, status, previous):
+        """Called by the status cache for every new check it folds in"""
+        if not self._count:
+            return
+        self.publish(format_event('check', {'website_id': website_id, 'status': status}, check_id), website_id)
+        if previous is not None and previous['is_up'] != status['is_up']:
+            self.publish(format_event('status', {
+                'website_id': website_id,
+                'is_up': status['is_up'],
+                'previous_is_up': previous['is_up'],
+                'checked_at': status['checked_at']
+            }, check_id), website_id)
+
+    def on_refresh(self, cache, reloaded):
+        """Called by the status cache after each refresh that changed something"""
+        if not self._count:
+            return
+        if reloaded:
+            # Websites were added, edited or removed
+            self.publish(format_event('resync', {'reason': 'websites'}))
+        self.publish_stats(cache.stats(cache.website_count))
+
+    def publish_stats(self, stats):
+        """Send dashboard totals to subscriptions that follow every website"""
+        if self._count:
+            self.publish_to_everything(format_event('stats', stats))
+
+    # Feed thread
+
+    def _start_feed(self):
+        if not self.follow_database:
+            return
+        with self._lock:
+            if self._feed is not None:
+                return
+            self._feed = threading.Thread(target=self._run_feed, daemon=True)
+        self._feed.start()
+
+    def _run_feed(self):
+        cache = get_status_cache(self.app)
+        while True:
+            time.sleep(FEED_INTERVAL_SECONDS)
+            if not self._count:
+                continue
+            with self.app.app_context():
+                try:
+                    cache.refresh()
+                except Exception as e:
+                    db.session.rollback()
+                    self.app.logger.error(f"Error refreshing the status feed: {str(e)}")
+
+
+def get_event_broker(app=None):
+    """The EventBroker of app (or the current app), created on first use"""
+    app = app or current_app._get_current_object()
+    broker = app.extensions.get('event_broker')
+    if broker is None:
+        max_subscribers = int(app.config.get('STREAM_MAX_CLIENTS',
+                                             os.environ.get('STREAM_MAX_CLIENTS', DEFAULT_MAX_SUBSCRIBERS)))
+        broker = app.extensions.setdefault('event_broker', EventBroker(app, max_subscribers))
+        get_status_cache(app).add_listener(broker)
+    return broker
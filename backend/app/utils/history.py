@@ -0,0 +1,156 @@
+"""
+Compact in-memory check history for run.py.
+
+Each website gets a fixed-capacity ring buffer that stores its checks as
+four typed columns (array.array) rather than a list of dicts:
+
+    timestamp         uint32, seconds since the epoch (UTC)
+    status_code       uint16 (0 when the request failed)
+    response_time_ms  uint32
+    is_up             uint8
+
+That is 11 bytes per check, against several hundred for a dict with its
+keys and formatted timestamp string, and appending is O(1) once the ring is
+full (the oldest check is overwritten in place).  Columns grow with the
+history up to capacity, so a website checked a few times costs a few bytes.
+
+Checks are read back newest first, as dicts or straight to JSON text
+without building the dicts.
+"""
+import time
+from array import array
+
+DEFAULT_CAPACITY = 100
+
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+# One history entry as JSON, in the field order run.py has always returned
+_ENTRY_JSON = ('{"website_id":%d,"timestamp":"%s%02d:%02d:%02dZ","status":"%s","is_up":%s,'
+               '"response_time_ms":%d,"status_code":%d}')
+
+
+def format_timestamp(seconds):
+    return time.strftime(TIMESTAMP_FORMAT, time.gmtime(seconds))
+
+
+class CheckRing:
+    """The latest `capacity` checks of one website, oldest overwritten first"""
+
+    __slots__ = ('capacity', 'timestamps', 'status_codes', 'response_times', 'up', '_next')
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.timestamps = array('I')
+        self.status_codes = array('H')
+        self.response_times = array('I')
+        self.up = array('B')
+        # Where the next check goes
+        self._next = 0
+
+    def __len__(self):
+        # is_up is the last column appended to, so a reader on another
+        # thread never sees a row that is only partly written
+        return len(self.up)
+
+    def append(self, timestamp, status_code, response_time_ms, is_up):
+        """
+        Record a check.
+
+        Args:
+            timestamp: Seconds since the epoch (UTC)
+            status_code: HTTP status code, or 0 if the request failed
+            response_time_ms: Response time in milliseconds
+            is_up: Whether the website was up
+        """
+        if len(self.timestamps) < self.capacity:
+            self.timestamps.append(timestamp)
+            self.status_codes.append(status_code)
+            self.response_times.append(response_time_ms)
+            self.up.append(is_up)
+        else:
+            position = self._next
+            self.timestamps[position] = timestamp
+            self.status_codes[position] = status_code
+            self.response_times[position] = response_time_ms
+            self.up[position] = is_up
+        self._next = (self._next + 1) % self.capacity
+
+    def _newest_first(self, limit=None):
+        """Column positions from the newest check back"""
+        last = self._next - 1
+        size = len(self)
+        count = size if limit is None else min(size, limit)
+        return ((last - offset) % size for offset in range(count))
+
+    def latest(self, website_id):
+        """The newest check as a dict, or None if there are none"""
+        for position in self._newest_first(1):
+            return self._entry(website_id, position)
+        return None
+
+    def _entry(self, website_id, position):
+        is_up = bool(self.up[position])
+        return {
+            'website_id': website_id,
+            'timestamp': format_timestamp(self.timestamps[position]),
+            'status': 'up' if is_up else 'down',
+            'is_up': is_up,
+            'response_time_ms': self.response_times[position],
+            'status_code': self.status_codes[position]
+        }
+
+    def to_dicts(self, website_id, limit=None):
+        """Checks newest first, as dicts"""
+        return [self._entry(website_id, position) for position in self._newest_first(limit)]
+
+    def to_json(self, website_id, limit=None):
+        """Checks newest first, as a JSON array, formatted straight from the columns"""
+        timestamps, status_codes, response_times, up = \
+            self.timestamps, self.status_codes, self.response_times, self.up
+        parts = []
+        # Checks are mostly on the same day as their neighbours, so only the
+        # time of day is formatted per check
+        day = prefix = None
+        for position in self._newest_first(limit):
+            timestamp = timestamps[position]
+            if timestamp // 86400 != day:
+                day = timestamp // 86400
+                prefix = time.strftime('%Y-%m-%dT', time.gmtime(day * 86400))
+            seconds = timestamp % 86400
+            is_up = up[position]
+            parts.append(_ENTRY_JSON % (
+                website_id,
+                prefix, seconds // 3600, seconds // 60 % 60, seconds % 60,
+                'up' if is_up else 'down',
+                'true' if is_up else 'false',
+                response_times[position],
+                status_codes[position]
+            ))
+        return '[' + ','.join(parts) + ']'
+
+
+class HistoryStore:
+    """Website ID -> CheckRing"""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self._rings = {}
+
+    def __len__(self):
+        return len(self._rings)
+
+    def __contains__(self, website_id):
+        return website_id in self._rings
+
+    def get(self, website_id):
+        """The website's CheckRing, or None if it has never been checked"""
+        return self._rings.get(website_id)
+
+    def append(self, website_id, timestamp, status_code, response_time_ms, is_up):
+        ring = self._rings.get(website_id)
+        if ring is None:
+            ring = self._rings[website_id] = CheckRing(self.capacity)
+        ring.append(timestamp, status_code, response_time_ms, is_up)
+
+    def remove(self, website_id):
+        self._rings.pop(website_id, None)
@@ -0,0 +1,592 @@
+"""
+Small asyncio HTTP/1.1 client used by the check engine.
+
+It only does what an uptime check needs: resolve, connect, optionally
+negotiate TLS, send a GET/HEAD, read the status line and headers, then read
+(and discard) the body, or only its first few bytes.  Every phase has its
+own timeout so a dead host can never hold a worker for longer than the
+phase it is stuck in.
+
+Connections are kept alive and pooled per host, and DNS answers are cached,
+so repeat checks don't pay for a new TCP+TLS handshake every time.  A cold
+request skips both to measure a true first byte.  Every response records
+which of these happened (see CONNECTION_MODES) so latencies stay comparable.
+
+Each request is also timed phase by phase (see Timings), so a slow check can
+be put down to DNS, connecting, the TLS handshake, the server or the body.
+
+Unlike requests, it always connects directly: HTTP_PROXY, HTTPS_PROXY and
+NO_PROXY are not honoured, so sites only reachable through a proxy can't be
+checked by the engine.
+"""
+import asyncio
+import socket
+import ssl
+import time
+import zlib
+from urllib.parse import quote, urlsplit, urljoin
+
+USER_AGENT = 'UpMon Website Checker/1.0'
+
+# Same limit requests uses by default
+MAX_REDIRECTS = 30
+
+READ_CHUNK_SIZE = 64 * 1024
+MAX_HEADER_LINES = 100
+
+# Characters left alone when percent-encoding a request path or query:
+# everything RFC 3986 allows there, plus '%' so existing escapes survive
+_PATH_SAFE = "/%:@!$&'()*+,;=-._~"
+_QUERY_SAFE = _PATH_SAFE + '?'
+
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+
+DEFAULT_DNS_TTL = 300
+DEFAULT_MAX_IDLE_PER_HOST = 4
+
+# Close pooled connections idle for longer than this; most servers drop
+# keep-alive connections well before a minute
+DEFAULT_IDLE_TIMEOUT = 30
+
+# 'cold': fresh DNS lookup and a new connection were forced
+# 'new': pooling was allowed but a new connection had to be opened
+# 'reused': every request went over an existing keep-alive connection
+CONNECTION_MODES = ('cold', 'new', 'reused')
+
+
+class HTTPError(Exception):
+    """
+    Raised for any failure while performing a check request.
+
+    HTTPClient.fetch attaches the Timings of the phases that completed
+    before the failure as `timings`.  `timed_out` is set when a phase (or
+    the whole request) ran out of time.
+    """
+
+    timings = None
+    timed_out = False
+
+
+class PhaseTimeouts:
+    """Timeouts (in seconds) for each phase of a request"""
+
+    def __init__(self, dns=5.0, connect=5.0, tls=5.0, ttfb=10.0, read=10.0, total=10.0):
+        self.dns = dns
+        self.connect = connect
+        self.tls = tls
+        self.ttfb = ttfb
+        self.read = read
+        self.total = total
+
+
+class Timings:
+    """
+    Time spent in each phase of a request, summed over redirects.
+
+    A phase that never happened (no connection setup on a reused
+    connection, no TLS over plain HTTP) stays None rather than 0.
+    """
+
+    PHASES = ('dns', 'connect', 'tls', 'ttfb', 'download')
+
+    def __init__(self):
+        for phase in self.PHASES:
+            setattr(self, phase, None)
+
+    def add(self, phase, seconds):
+        setattr(self, phase, (getattr(self, phase) or 0.0) + seconds)
+
+    def as_dict(self):
+        """Phase durations in whole milliseconds, keyed like the Check columns"""
+        return {
+            f"{phase}_ms": int(getattr(self, phase) * 1000) if getattr(self, phase) is not None else None
+            for phase in self.PHASES
+        }
+
+
+class Response:
+    """The parts of an HTTP response a check cares about"""
+
+    def __init__(self, url, status_code, headers, body_bytes, connection_mode=None, timings=None,
+                 body=None, truncated=False):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.body_bytes = body_bytes
+        self.connection_mode = connection_mode
+        self.timings = timings or Timings()
+        # Start of the body, only kept when asked for (see HTTPClient.fetch)
+        self.body = body
+        # Whether reading stopped at max_body_bytes before the body ended
+        self.truncated = truncated
+
+
+class _Connection:
+    """An open stream plus the bookkeeping the pool needs"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.last_used = time.monotonic()
+
+    def usable(self, idle_timeout):
+        return (not self.writer.is_closing()
+                and not self.reader.at_eof()
+                and time.monotonic() - self.last_used < idle_timeout)
+
+    def close(self):
+        self.writer.close()
+
+
+class _ConnectionClosed(HTTPError):
+    """The server closed the connection without sending a response"""
+
+
+class _RetryableError(Exception):
+    """A reused connection was closed before any response arrived"""
+
+
+_ssl_context = None
+
+
+def _get_ssl_context():
+    global _ssl_context
+    if _ssl_context is None:
+        _ssl_context = ssl.create_default_context()
+    return _ssl_context
+
+
+async def _with_timeout(coro, timeout, phase):
+    try:
+        return await asyncio.wait_for(coro, timeout)
+    except asyncio.TimeoutError:
+        error = HTTPError(f"Timed out during {phase} after {timeout}s")
+        error.timed_out = True
+        raise error
+
+
+async def _readline(reader, timeout, phase):
+    """Read one line, turning a line longer than the stream's limit into an HTTPError"""
+    try:
+        return await _with_timeout(reader.readline(), timeout, phase)
+    except (ValueError, asyncio.LimitOverrunError):
+        raise HTTPError(f"Response line too long during {phase}")
+
+
+async def _read_head(reader, timeouts):
+    """Read the status line and headers, skipping interim 1xx responses"""
+    phase, timeout = 'ttfb', timeouts.ttfb
+    while True:
+        line = await _readline(reader, timeout, phase)
+        if not line:
+            raise _ConnectionClosed("Connection closed before a response was received")
+        parts = line.decode('latin-1').split(None, 2)
+        if len(parts) < 2 or not parts[0].startswith('HTTP/') or not parts[1].isdigit():
+            raise HTTPError(f"Malformed status line: {line[:100]!r}")
+        version = parts[0]
+        status_code = int(parts[1])
+
+        headers = {}
+        for _ in range(MAX_HEADER_LINES):
+            line = await _readline(reader, timeouts.read, 'read')
+            if line in (b'\r\n', b'\n'):
+                break
+            if not line:
+                raise HTTPError("Connection closed while reading headers")
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        else:
+            raise HTTPError("Too many response headers")
+
+        if 100 <= status_code < 200 and status_code != 101:
+            phase, timeout = 'read', timeouts.read
+            continue
+        return version, status_code, headers
+
+
+class _BodyLimitReached(Exception):
+    """Stop reading: max_body_bytes of the body have been received"""
+
+
+class _Body:
+    """Bytes read so far, plus the kept prefix when one is wanted"""
+
+    def __init__(self, limit=None, keep=False):
+        self.limit = limit
+        self.received = 0
+        self.kept = bytearray() if keep else None
+
+    def room(self):
+        return None if self.limit is None else self.limit - self.received
+
+    def add(self, chunk):
+        self.received += len(chunk)
+        if self.kept is not None:
+            self.kept += chunk
+
+
+async def _discard(reader, length, timeouts, body):
+    """Read `length` bytes (or up to EOF if None) into body, stopping at its limit"""
+    received = 0
+    while length is None or received < length:
+        size = READ_CHUNK_SIZE if length is None else min(READ_CHUNK_SIZE, length - received)
+        room = body.room()
+        if room is not None:
+            if room <= 0:
+                raise _BodyLimitReached()
+            size = min(size, room)
+        chunk = await _with_timeout(reader.read(size), timeouts.read, 'read')
+        if not chunk:
+            if length is not None:
+                raise HTTPError("Connection closed before the full body was received")
+            break
+        received += len(chunk)
+        body.add(chunk)
+
+
+async def _read_body(reader, method, status_code, headers, timeouts, body):
+    """
+    Consume the response body into body.
+
+    Returns:
+        bool: Whether the whole body was read up to a known end, so the
+            connection can be reused
+    """
+    if method == 'HEAD' or status_code in (204, 304):
+        return True
+
+    try:
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            while True:
+                line = await _readline(reader, timeouts.read, 'read')
+                try:
+                    size = int(line.split(b';', 1)[0].strip(), 16)
+                except ValueError:
+                    raise HTTPError("Malformed chunked encoding")
+                if size == 0:
+                    # Skip optional trailers
+                    while line not in (b'\r\n', b'\n', b''):
+                        line = await _readline(reader, timeouts.read, 'read')
+                    return True
+                await _discard(reader, size, timeouts, body)
+                await _readline(reader, timeouts.read, 'read')
+
+        if 'content-length' in headers:
+            try:
+                length = int(headers['content-length'])
+            except ValueError:
+                raise HTTPError("Malformed Content-Length header")
+            if body.limit is not None and length > body.limit:
+                await _discard(reader, body.limit, timeouts, body)
+                raise _BodyLimitReached()
+            await _discard(reader, length, timeouts, body)
+            return True
+
+        await _discard(reader, None, timeouts, body)
+        return False
+    except _BodyLimitReached:
+        return False
+
+
+def _decode(body, encoding, limit=None):
+    """
+    Decompress a kept gzip or deflate body (which may stop part way, at
+    max_body_bytes), for servers that compress whatever was asked for.
+    At most limit bytes are decompressed.
+    """
+    encoding = encoding.strip().lower()
+    if encoding in ('gzip', 'x-gzip'):
+        decoders = [zlib.decompressobj(16 + zlib.MAX_WBITS)]
+    elif encoding == 'deflate':
+        # Usually zlib-wrapped, but some servers send raw deflate
+        decoders = [zlib.decompressobj(), zlib.decompressobj(-zlib.MAX_WBITS)]
+    else:
+        return body
+    for decoder in decoders:
+        try:
+            return decoder.decompress(body, limit or 0)
+        except zlib.error:
+            continue
+    raise HTTPError(f"Malformed {encoding} response body")
+
+
+def _parse_url(url):
+    """Split a URL into (pool key, Host header, request path)"""
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise HTTPError(f"Invalid URL '{url}': only http:// and https:// URLs are supported")
+
+    try:
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+    except ValueError:
+        raise HTTPError(f"Invalid port in URL '{url}'")
+
+    try:
+        host_header = parts.hostname.encode('idna').decode('ascii')
+    except UnicodeError:
+        raise HTTPError(f"Invalid hostname in URL '{url}'")
+    if ':' in host_header:
+        host_header = f"[{host_header}]"
+    if parts.port:
+        host_header = f"{host_header}:{port}"
+    # The request line must be plain ASCII
+    path = quote(parts.path, safe=_PATH_SAFE) or '/'
+    if parts.query:
+        path = f"{path}?{quote(parts.query, safe=_QUERY_SAFE)}"
+    return (parts.scheme, parts.hostname, port), host_header, path
+
+
+class HTTPClient:
+    """
+    Pooled keep-alive HTTP client.
+
+    An instance must only be used from the event loop it was first used in,
+    since pooled connections belong to that loop.
+    """
+
+    def __init__(self, max_idle_per_host=DEFAULT_MAX_IDLE_PER_HOST, idle_timeout=DEFAULT_IDLE_TIMEOUT,
+                 dns_ttl=DEFAULT_DNS_TTL):
+        self.max_idle_per_host = max_idle_per_host
+        self.idle_timeout = idle_timeout
+        self.dns_ttl = dns_ttl
+        # (scheme, host, port) -> idle _Connections, most recently used last
+        self._idle = {}
+        # (host, port) -> (expires_at, addrinfo list)
+        self._dns_cache = {}
+
+    async def _resolve(self, host, port, timeouts, cold):
+        key = (host, port)
+        cached = self._dns_cache.get(key)
+        if cached and not cold and cached[0] > time.monotonic():
+            return cached[1]
+
+        loop = asyncio.get_running_loop()
+        try:
+            infos = await _with_timeout(
+                loop.getaddrinfo(host, port, type=socket.SOCK_STREAM), timeouts.dns, 'dns'
+            )
+        except socket.gaierror as e:
+            raise HTTPError(f"Failed to resolve '{host}': {e}")
+        self._dns_cache[key] = (time.monotonic() + self.dns_ttl, infos)
+        return infos
+
+    def cached_address(self, host, port):
+        """First address host resolved to, if the answer is still cached"""
+        cached = self._dns_cache.get((host, port))
+        if cached and cached[0] > time.monotonic() and cached[1]:
+            return cached[1][0][4][0]
+        return None
+
+    async def _connect(self, key, timeouts, cold, timings):
+        """Resolve the host and open a (TLS) stream to the first reachable address"""
+        scheme, host, port = key
+        started = time.monotonic()
+        infos = await self._resolve(host, port, timeouts, cold)
+        timings.add('dns', time.monotonic() - started)
+
+        last_error = None
+        for family, _, _, _, sockaddr in infos:
+            started = time.monotonic()
+            try:
+                if scheme == 'https' and not hasattr(asyncio.StreamWriter, 'start_tls'):
+                    # Before Python 3.11 the handshake can't be timed on its
+                    # own, so it is counted as part of connecting
+                    reader, writer = await _with_timeout(
+                        asyncio.open_connection(
+                            sockaddr[0], port, family=family,
+                            ssl=_get_ssl_context(), server_hostname=host,
+                            ssl_handshake_timeout=timeouts.tls
+                        ),
+                        timeouts.connect + timeouts.tls, 'connect'
+                    )
+                    timings.add('connect', time.monotonic() - started)
+                    return _Connection(reader, writer)
+
+                reader, writer = await _with_timeout(
+                    asyncio.open_connection(sockaddr[0], port, family=family),
+                    timeouts.connect, 'connect'
+                )
+                timings.add('connect', time.monotonic() - started)
+            except ssl.SSLError as e:
+                # A certificate problem won't be fixed by trying another address
+                raise HTTPError(f"SSL error: {e}")
+            except (OSError, HTTPError) as e:
+                timings.add('connect', time.monotonic() - started)
+                last_error = e
+                continue
+
+            if scheme == 'https':
+                started = time.monotonic()
+                try:
+                    await _with_timeout(
+                        writer.start_tls(_get_ssl_context(), server_hostname=host,
+                                         ssl_handshake_timeout=timeouts.tls),
+                        timeouts.tls, 'tls'
+                    )
+                except ssl.SSLError as e:
+                    writer.close()
+                    raise HTTPError(f"SSL error: {e}")
+                except OSError as e:
+                    writer.close()
+                    raise HTTPError(f"TLS handshake with {host}:{port} failed: {e}")
+                except HTTPError:
+                    writer.close()
+                    raise
+                finally:
+                    timings.add('tls', time.monotonic() - started)
+            return _Connection(reader, writer)
+        error = HTTPError(f"Failed to connect to {host}:{port}: {last_error}")
+        error.timed_out = getattr(last_error, 'timed_out', False)
+        raise error
+
+    def _take_idle(self, key):
+        idle = self._idle.get(key)
+        while idle:
+            connection = idle.pop()
+            if connection.usable(self.idle_timeout):
+                return connection
+            connection.close()
+        return None
+
+    def _release(self, key, connection):
+        idle = self._idle.setdefault(key, [])
+        if len(idle) >= self.max_idle_per_host:
+            idle.pop(0).close()
+        connection.last_used = time.monotonic()
+        idle.append(connection)
+
+    async def _send(self, connection, method, host_header, path, keep_alive, timeouts, compressed=True):
+        try:
+            request = (
+                f"{method} {path} HTTP/1.1\r\n"
+                f"Host: {host_header}\r\n"
+                f"User-Agent: {USER_AGENT}\r\n"
+                "Accept: */*\r\n"
+                f"Accept-Encoding: {'gzip, deflate' if compressed else 'identity'}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+                "\r\n"
+            ).encode('latin-1')
+        except UnicodeEncodeError:
+            raise HTTPError(f"Request for '{path}' can't be encoded")
+        connection.writer.write(request)
+        await _with_timeout(connection.writer.drain(), timeouts.read, 'write')
+
+    async def _request_once(self, url, method, timeouts, cold, timings, body):
+        """One request/response on a pooled (or new) connection"""
+        key, host_header, path = _parse_url(url)
+
+        connection = None if cold else self._take_idle(key)
+        reused = connection is not None
+        if connection is None:
+            connection = await self._connect(key, timeouts, cold, timings)
+
+        reusable = False
+        try:
+            started = time.monotonic()
+            try:
+                # A kept body is searched as is, so ask for it uncompressed
+                await self._send(connection, method, host_header, path, not cold, timeouts,
+                                 compressed=body.kept is None)
+                version, status_code, headers = await _read_head(connection.reader, timeouts)
+            except (_ConnectionClosed, OSError, asyncio.IncompleteReadError) as e:
+                if reused:
+                    # The server probably closed the idle connection; try a fresh one
+                    raise _RetryableError(str(e))
+                raise
+            finally:
+                timings.add('ttfb', time.monotonic() - started)
+
+            started = time.monotonic()
+            try:
+                complete = await _read_body(connection.reader, method, status_code, headers, timeouts, body)
+            finally:
+                timings.add('download', time.monotonic() - started)
+            reusable = (not cold and complete and version == 'HTTP/1.1'
+                        and 'close' not in headers.get('connection', '').lower())
+            mode = 'cold' if cold else ('reused' if reused else 'new')
+            truncated = not complete and body.room() is not None and body.room() <= 0
+            kept = bytes(body.kept) if body.kept is not None else None
+            if kept and headers.get('content-encoding'):
+                kept = _decode(kept, headers['content-encoding'], body.limit)
+            return Response(url, status_code, headers, body.received, mode, timings, kept, truncated)
+        except (OSError, asyncio.IncompleteReadError) as e:
+            raise HTTPError(f"Connection error: {e}")
+        finally:
+            if reusable:
+                self._release(key, connection)
+            else:
+                connection.close()
+
+    async def _request(self, url, method, timeouts, max_redirects, cold, timings, max_body_bytes, keep_body):
+        modes = set()
+        for _ in range(max_redirects + 1):
+            try:
+                response = await self._request_once(
+                    url, method, timeouts, cold, timings, _Body(max_body_bytes, keep_body))
+            except _RetryableError:
+                response = await self._request_once(
+                    url, method, timeouts, cold, timings, _Body(max_body_bytes, keep_body))
+                response.connection_mode = 'new'
+            modes.add(response.connection_mode)
+
+            location = response.headers.get('location')
+            if response.status_code not in REDIRECT_CODES or not location:
+                # Only call it reused if no hop needed a new connection
+                if 'reused' in modes and len(modes) > 1:
+                    response.connection_mode = 'new'
+                return response
+            url = urljoin(url, location)
+        raise HTTPError(f"Exceeded {max_redirects} redirects.")
+
+    async def fetch(self, url, method='GET', timeouts=None, max_redirects=MAX_REDIRECTS, cold=False,
+                    max_body_bytes=None, keep_body=False):
+        """
+        Perform a request, following redirects the way requests.get does.
+
+        Args:
+            url: URL to request
+            method: 'GET' or 'HEAD'
+            timeouts: PhaseTimeouts to apply (defaults are used if None)
+            max_redirects: Maximum number of redirects to follow
+            cold: Skip the DNS cache and connection pool for a true
+                first-byte measurement
+            max_body_bytes: Stop reading each body after this many bytes
+                (None reads it all); the connection is then closed
+            keep_body: Keep what was read as Response.body, so memory use
+                is bounded by max_body_bytes
+
+        Returns:
+            Response: The final response, with Timings for the whole chain
+
+        Raises:
+            HTTPError: If the request fails or any phase times out
+        """
+        timeouts = timeouts or PhaseTimeouts()
+        timings = Timings()
+        try:
+            return await asyncio.wait_for(
+                self._request(url, method, timeouts, max_redirects, cold, timings, max_body_bytes, keep_body),
+                timeouts.total
+            )
+        except asyncio.TimeoutError:
+            error = HTTPError(f"Request timed out after {timeouts.total}s")
+            error.timings = timings
+            error.timed_out = True
+            raise error
+        except HTTPError as e:
+            e.timings = timings
+            raise
+
+    def close(self):
+        """Close every pooled connection"""
+        for idle in self._idle.values():
+            for connection in idle:
+                connection.close()
+        self._idle = {}
+
+
+async def fetch(url, method='GET', timeouts=None, max_redirects=MAX_REDIRECTS, max_body_bytes=None,
+                keep_body=False):
+    """One-off cold request without a shared pool (see HTTPClient.fetch)"""
+    return await HTTPClient().fetch(url, method, timeouts, max_redirects, cold=True,
+                                    max_body_bytes=max_body_bytes, keep_body=keep_body)
@@ -0,0 +1,118 @@
+"""
+Structured, sampled logging.
+
+Log records are written one JSON object per line (LOG_FORMAT=json, the
+default) or as plain text (LOG_FORMAT=text), at LOG_LEVEL (INFO by
+default).  Fields passed as extra={'fields': {...}} become keys of the JSON
+object.
+
+Per-check logging goes through log_check, which is sampled: only
+LOG_SAMPLE_RATE of successful checks are logged, at INFO (1%, by default),
+and LOG_ERROR_SAMPLE_RATE of failed ones, at WARNING (all of them, by
+default).  The level is tested before anything is formatted, so a check
+that isn't logged costs a comparison and a random number.  Sampled records carry their rate so
+counts can be scaled back up; exact counts are in /metrics.
+"""
+import json
+import logging
+import os
+import random
+import time
+
+DEFAULT_LOG_LEVEL = 'INFO'
+DEFAULT_LOG_FORMAT = 'json'
+DEFAULT_SAMPLE_RATE = 0.01
+DEFAULT_ERROR_SAMPLE_RATE = 1.0
+
+# Logger for per-check records; handlers come from configure_logging
+check_logger = logging.getLogger('upmon.checks')
+
+# Sampling rates, set by configure_logging
+_sample_rate = DEFAULT_SAMPLE_RATE
+_error_sample_rate = DEFAULT_ERROR_SAMPLE_RATE
+
+
+class JSONFormatter(logging.Formatter):
+    """Formats a record as a single line of JSON"""
+
+    def format(self, record):
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Plain text, with any structured fields appended as key=value"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    def format(self, record):
+        text = super().format(record)
+        fields = getattr(record, 'fields', None)
+        if fields:
+            text += ' ' + ' '.join(f"{key}={value}" for key, value in fields.items())
+        return text
+
+
+def _rate(value, default):
+    try:
+        return min(1.0, max(0.0, float(value)))
+    except (TypeError, ValueError):
+        return default
+
+
+def configure_logging(app):
+    """
+    Set up the app's logger and the per-check logger from app.config (or
+    the environment): LOG_LEVEL, LOG_FORMAT, LOG_SAMPLE_RATE and
+    LOG_ERROR_SAMPLE_RATE.
+    """
+    global _sample_rate, _error_sample_rate
+
+    def setting(name, default):
+        return app.config.get(name, os.environ.get(name, default))
+
+    level = str(setting('LOG_LEVEL', DEFAULT_LOG_LEVEL)).upper()
+    formatter = TextFormatter() if setting('LOG_FORMAT', DEFAULT_LOG_FORMAT) == 'text' else JSONFormatter()
+    _sample_rate = _rate(setting('LOG_SAMPLE_RATE', DEFAULT_SAMPLE_RATE), DEFAULT_SAMPLE_RATE)
+    _error_sample_rate = _rate(setting('LOG_ERROR_SAMPLE_RATE', DEFAULT_ERROR_SAMPLE_RATE),
+                               DEFAULT_ERROR_SAMPLE_RATE)
+
+    for logger in (app.logger, check_logger):
+        logger.setLevel(level)
+        for handler in logger.handlers:
+            handler.setFormatter(formatter)
+        if not logger.handlers:
+            handler = logging.StreamHandler()
+            handler.setFormatter(formatter)
+            logger.addHandler(handler)
+        logger.propagate = False
+
+
+def log_check(website_id, url, is_up, status_code, response_time_ms, error_message=None, logger=check_logger):
+    """Log a finished check, if it is picked by the sample"""
+    if is_up:
+        rate, level = _sample_rate, logging.INFO
+    else:
+        rate, level = _error_sample_rate, logging.WARNING
+    if not logger.isEnabledFor(level) or (rate < 1.0 and random.random() >= rate):
+        return
+    logger.log(level, 'check', extra={'fields': {
+        'website_id': website_id,
+        'url': url,
+        'is_up': is_up,
+        'status_code': status_code,
+        'response_time_ms': response_time_ms,
+        'error': error_message,
+        'sample_rate': rate
+    }})
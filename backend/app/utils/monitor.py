@@ -0,0 +1,107 @@
+"""
+Background monitor for the database-backed app.
+
+Loads every active website into the shared scheduler once at startup, then
+only checks the sites that are due.  API changes reach the scheduler through
+the website routes, so the table is never rescanned.
+"""
+import threading
+import time
+
+from app import db
+from app.models import Website
+from app.utils.checker import check_websites
+from app.utils.engine import CheckEngine
+from app.utils.scheduler import scheduler as default_scheduler
+from app.utils.sink import CheckSink
+from app.utils.rollups import update_rollups
+from app.utils.retention import apply_retention, retention_settings
+
+# How often new checks are folded into the rollup tables
+ROLLUP_INTERVAL_SECONDS = 60
+
+# How often history past its retention period is cleaned up
+RETENTION_INTERVAL_SECONDS = 3600
+
+
+def load_schedule(scheduler):
+    """Schedule every active website (only done once, at startup)"""
+    rows = Website.query.with_entities(Website.id, Website.check_interval_minutes)\
+        .filter_by(is_active=True).all()
+    for website_id, interval_minutes in rows:
+        scheduler.schedule(website_id, interval_minutes)
+    return len(rows)
+
+
+def run_due_checks(scheduler, engine, sink=None):
+    """
+    Check the websites that are due right now.
+
+    Results are queued on sink when one is given, otherwise committed
+    immediately.
+
+    Returns:
+        list: List of Check instances created
+    """
+    due_ids = scheduler.pop_due()
+    if not due_ids:
+        return []
+
+    websites = Website.query.filter(Website.id.in_(due_ids), Website.is_active.is_(True)).all()
+
+    # Anything missing was deleted or deactivated behind the scheduler's back
+    found = {website.id for website in websites}
+    for website_id in due_ids:
+        if website_id not in found:
+            scheduler.remove(website_id)
+
+    return check_websites(websites, engine, sink)
+
+
+class Maintenance:
+    """Runs rollups and retention whenever their intervals have passed"""
+
+    def __init__(self, app, clock=time.monotonic):
+        self.app = app
+        self.clock = clock
+        self.last_rollup = self.last_retention = clock()
+
+    def run_due(self):
+        """Run whichever jobs are due (needs an app context)"""
+        if self.clock() - self.last_rollup >= ROLLUP_INTERVAL_SECONDS:
+            self.last_rollup = self.clock()
+            update_rollups()
+
+        if self.clock() - self.last_retention >= RETENTION_INTERVAL_SECONDS:
+            self.last_retention = self.clock()
+            stats = apply_retention(**retention_settings(self.app))
+            self.app.logger.info(f"Retention: {stats}")
+
+
+def monitor_loop(app, scheduler=default_scheduler, engine=None):
+    """Run due checks forever, writing results through a CheckSink"""
+    engine = engine or CheckEngine()
+    sink = CheckSink(app).start()
+    with app.app_context():
+        count = load_schedule(scheduler)
+        app.logger.info(f"Monitor started with {count} scheduled websites")
+
+    maintenance = Maintenance(app)
+    while True:
+        scheduler.wait()
+        with app.app_context():
+            try:
+                checks = run_due_checks(scheduler, engine, sink)
+                if checks:
+                    app.logger.debug(f"Checked {len(checks)} due websites")
+                maintenance.run_due()
+            except Exception as e:
+                db.session.rollback()
+                app.logger.error(f"Error in monitor loop: {str(e)}")
+
+
+def start_monitor(app, scheduler=default_scheduler):
+    """Start the monitor loop in a daemon thread"""
+    thread = threading.Thread(target=monitor_loop, args=(app, scheduler), daemon=True)
+    thread.start()
+    return thread
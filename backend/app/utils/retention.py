@@ -0,0 +1,198 @@
+"""
+Retention for raw check history.
+
+Raw checks are kept for a configurable number of days; older ones are only
+deleted once they have been folded into the rollups (see app.utils.rollups),
+so history is compacted rather than lost.  Minute and hour rollups are aged
+out the same way, leaving day rollups as the long-term record.
+
+Deletes run in small batches, each in its own short transaction, so the
+table is never locked for long.  On SQLite the freed pages are then handed
+back to the filesystem with PRAGMA incremental_vacuum.
+"""
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from app import db
+from app.models import Check, CheckRollup, RollupState, Website
+from app.utils.rollups import update_rollups, STATE_NAME, MINUTE, HOUR
+
+DEFAULT_CHECK_RETENTION_DAYS = 30
+DEFAULT_MINUTE_ROLLUP_RETENTION_DAYS = 7
+DEFAULT_HOUR_ROLLUP_RETENTION_DAYS = 180
+
+DEFAULT_BATCH_SIZE = 1000
+
+# Pause between delete batches so API writes can get the lock
+DEFAULT_BATCH_PAUSE = 0.05
+
+# Pages released per incremental_vacuum call
+VACUUM_PAGES_PER_STEP = 2000
+
+
+def _set_incremental_auto_vacuum(dbapi_connection, connection_record):
+    # Only takes effect before the first table is created
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    cursor.close()
+
+
+def enable_incremental_auto_vacuum(engine):
+    """Create the app's database, if it is a new SQLite one, with incremental auto-vacuum enabled"""
+    if engine.dialect.name == 'sqlite' and not event.contains(engine, 'connect', _set_incremental_auto_vacuum):
+        event.listen(engine, 'connect', _set_incremental_auto_vacuum)
+
+
+def retention_settings(app):
+    """Retention periods (in days) from the app config"""
+    return {
+        'check_days': app.config.get('CHECK_RETENTION_DAYS', DEFAULT_CHECK_RETENTION_DAYS),
+        'minute_rollup_days': app.config.get(
+            'MINUTE_ROLLUP_RETENTION_DAYS', DEFAULT_MINUTE_ROLLUP_RETENTION_DAYS),
+        'hour_rollup_days': app.config.get(
+            'HOUR_ROLLUP_RETENTION_DAYS', DEFAULT_HOUR_ROLLUP_RETENTION_DAYS)
+    }
+
+
+def checks_kept_since(app, now=None):
+    """Oldest time raw checks are kept from"""
+    return (now or datetime.utcnow()) - timedelta(days=retention_settings(app)['check_days'])
+
+
+def rollup_cutoffs(app, now=None):
+    """
+    Oldest minute and hour rollups that retention keeps, for cover_window.
+
+    Returns:
+        dict: {MINUTE: datetime, HOUR: datetime}
+    """
+    now = now or datetime.utcnow()
+    settings = retention_settings(app)
+    return {
+        MINUTE: now - timedelta(days=settings['minute_rollup_days']),
+        HOUR: now - timedelta(days=settings['hour_rollup_days'])
+    }
+
+
+def _delete_in_batches(model, conditions, batch_size, pause):
+    """Delete matching rows batch by batch, committing after each batch"""
+    deleted = 0
+    while True:
+        ids = [row[0] for row in db.session.query(model.id).filter(*conditions).limit(batch_size)]
+        if not ids:
+            return deleted
+        model.query.filter(model.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        deleted += len(ids)
+        if len(ids) < batch_size:
+            return deleted
+        if pause:
+            time.sleep(pause)
+
+
+def delete_old_checks(cutoff, batch_size=DEFAULT_BATCH_SIZE, pause=DEFAULT_BATCH_PAUSE):
+    """
+    Delete raw checks older than cutoff that have already been rolled up.
+
+    Works one website at a time so every batch is an index range scan on
+    (website_id, checked_at).
+
+    Returns:
+        int: Number of checks deleted
+    """
+    state = db.session.get(RollupState, STATE_NAME)
+    rolled_up_to = state.last_check_id if state else 0
+    website_ids = [row[0] for row in db.session.query(Website.id)]
+
+    deleted = 0
+    for website_id in website_ids:
+        deleted += _delete_in_batches(Check, [
+            Check.website_id == website_id,
+            Check.checked_at < cutoff,
+            Check.id <= rolled_up_to
+        ], batch_size, pause)
+    return deleted
+
+
+def delete_old_rollups(resolution, cutoff, batch_size=DEFAULT_BATCH_SIZE, pause=DEFAULT_BATCH_PAUSE):
+    """Delete rollups of one resolution that start before cutoff"""
+    return _delete_in_batches(CheckRollup, [
+        CheckRollup.resolution == resolution,
+        CheckRollup.bucket_start < cutoff
+    ], batch_size, pause)
+
+
+def incremental_vacuum(max_steps=None):
+    """
+    Give free SQLite pages back to the filesystem a few at a time.
+
+    Returns:
+        int: Pages released, or None if the database isn't SQLite with
+            incremental auto-vacuum enabled
+    """
+    if db.engine.dialect.name != 'sqlite':
+        return None
+    with db.engine.connect() as connection:
+        # Use the driver cursor directly: the vacuum pragma only frees pages
+        # as its result rows are stepped through
+        cursor = connection.connection.cursor()
+        try:
+            if cursor.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+                return None
+            released = 0
+            steps = 0
+            while max_steps is None or steps < max_steps:
+                free_pages = cursor.execute('PRAGMA freelist_count').fetchone()[0]
+                if not free_pages:
+                    break
+                cursor.execute(f'PRAGMA incremental_vacuum({VACUUM_PAGES_PER_STEP})').fetchall()
+                remaining = cursor.execute('PRAGMA freelist_count').fetchone()[0]
+                released += free_pages - remaining
+                steps += 1
+                if remaining >= free_pages:
+                    break
+        finally:
+            cursor.close()
+    return released
+
+
+def convert_to_incremental_vacuum():
+    """
+    Switch an existing SQLite database to incremental auto-vacuum.
+
+    This needs one full VACUUM, which rewrites the whole file and locks it
+    while it runs, so it is only done on request.
+    """
+    with db.engine.connect() as connection:
+        connection.exec_driver_sql('PRAGMA auto_vacuum = INCREMENTAL')
+        connection.commit()
+        connection.execution_options(isolation_level='AUTOCOMMIT').exec_driver_sql('VACUUM')
+
+
+def apply_retention(check_days=DEFAULT_CHECK_RETENTION_DAYS,
+                    minute_rollup_days=DEFAULT_MINUTE_ROLLUP_RETENTION_DAYS,
+                    hour_rollup_days=DEFAULT_HOUR_ROLLUP_RETENTION_DAYS,
+                    batch_size=DEFAULT_BATCH_SIZE, pause=DEFAULT_BATCH_PAUSE, now=None):
+    """
+    Compact and delete history past its retention period.
+
+    Returns:
+        dict: Rows rolled up and deleted, and pages vacuumed
+    """
+    now = now or datetime.utcnow()
+
+    # Make sure everything about to be deleted is in the rollups first
+    rolled_up = update_rollups()
+
+    stats = {
+        'rolled_up': rolled_up,
+        'checks_deleted': delete_old_checks(now - timedelta(days=check_days), batch_size, pause),
+        'minute_rollups_deleted': delete_old_rollups(
+            MINUTE, now - timedelta(days=minute_rollup_days), batch_size, pause),
+        'hour_rollups_deleted': delete_old_rollups(
+            HOUR, now - timedelta(days=hour_rollup_days), batch_size, pause)
+    }
+    stats['pages_vacuumed'] = incremental_vacuum()
+    return stats
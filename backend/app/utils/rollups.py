@@ -0,0 +1,300 @@
+"""
+Incremental rollups of raw checks.
+
+update_rollups() reads the checks written since its last run (tracked by
+check ID in rollup_state) and folds them into per-site 1-minute, 1-hour and
+1-day buckets.  Each bucket keeps count, up_count, min/max/sum response time
+(over the response_count checks that got a response) and a LatencySketch,
+which are all mergeable, so any window can be answered by combining a
+handful of coarse buckets with finer ones at the edges.
+
+Retention deletes minute and hour buckets after a while, so the edges of a
+window that reaches back past those cutoffs are covered with the finest
+buckets that are still kept.
+"""
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import Check, CheckRollup, RollupState
+from app.utils.sketch import LatencySketch
+
+MINUTE = 60
+HOUR = 3600
+DAY = 86400
+RESOLUTIONS = (MINUTE, HOUR, DAY)
+
+# Checks folded in per transaction
+DEFAULT_BATCH_SIZE = 20000
+
+STATE_NAME = 'checks'
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def bucket_start(timestamp, resolution):
+    """Start of the bucket of the given size that contains timestamp"""
+    seconds = int((timestamp - EPOCH).total_seconds())
+    return EPOCH + timedelta(seconds=seconds - seconds % resolution)
+
+
+class _Bucket:
+    """In-memory accumulator for one rollup row"""
+
+    def __init__(self):
+        self.count = 0
+        self.up_count = 0
+        self.min_response_ms = None
+        self.max_response_ms = None
+        self.sum_response_ms = 0
+        self.response_count = 0
+        self.sketch = LatencySketch()
+
+    def add(self, is_up, response_time_ms):
+        self.count += 1
+        if is_up:
+            self.up_count += 1
+        if response_time_ms is not None:
+            self.sum_response_ms += response_time_ms
+            self.response_count += 1
+            self.sketch.add(response_time_ms)
+            if self.min_response_ms is None or response_time_ms < self.min_response_ms:
+                self.min_response_ms = response_time_ms
+            if self.max_response_ms is None or response_time_ms > self.max_response_ms:
+                self.max_response_ms = response_time_ms
+
+    def merge_into(self, rollup):
+        """Add this bucket's totals to an existing CheckRollup row"""
+        rollup.count = (rollup.count or 0) + self.count
+        rollup.up_count = (rollup.up_count or 0) + self.up_count
+        rollup.sum_response_ms = (rollup.sum_response_ms or 0) + self.sum_response_ms
+        rollup.response_count = (rollup.response_count or 0) + self.response_count
+        if self.min_response_ms is not None:
+            if rollup.min_response_ms is None or self.min_response_ms < rollup.min_response_ms:
+                rollup.min_response_ms = self.min_response_ms
+        if self.max_response_ms is not None:
+            if rollup.max_response_ms is None or self.max_response_ms > rollup.max_response_ms:
+                rollup.max_response_ms = self.max_response_ms
+        rollup.sketch = LatencySketch.from_json(rollup.sketch).merge(self.sketch).to_json()
+
+
+def fold_checks(rows, resolutions=RESOLUTIONS):
+    """
+    Merge raw check rows into the rollup table.
+
+    Args:
+        rows: Iterable of (website_id, checked_at, is_up, response_time_ms)
+        resolutions: Bucket sizes to update
+
+    Returns:
+        int: Number of rollup rows touched
+    """
+    buckets = {}
+    for website_id, checked_at, is_up, response_time_ms in rows:
+        if checked_at is None:
+            continue
+        for resolution in resolutions:
+            key = (website_id, resolution, bucket_start(checked_at, resolution))
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = _Bucket()
+            bucket.add(is_up, response_time_ms)
+    if not buckets:
+        return 0
+
+    # Load the existing rows for the touched buckets, one query per resolution
+    existing = {}
+    for resolution in resolutions:
+        keys = [key for key in buckets if key[1] == resolution]
+        if not keys:
+            continue
+        website_ids = {key[0] for key in keys}
+        starts = [key[2] for key in keys]
+        rollups = CheckRollup.query.filter(
+            CheckRollup.resolution == resolution,
+            CheckRollup.website_id.in_(website_ids),
+            CheckRollup.bucket_start >= min(starts),
+            CheckRollup.bucket_start <= max(starts)
+        )
+        for rollup in rollups:
+            existing[(rollup.website_id, rollup.resolution, rollup.bucket_start)] = rollup
+
+    for key, bucket in buckets.items():
+        rollup = existing.get(key)
+        if rollup is None:
+            website_id, resolution, start = key
+            rollup = CheckRollup(website_id=website_id, resolution=resolution, bucket_start=start)
+            db.session.add(rollup)
+        bucket.merge_into(rollup)
+    return len(buckets)
+
+
+def _get_state():
+    state = db.session.get(RollupState, STATE_NAME)
+    if state is None:
+        state = RollupState(name=STATE_NAME, last_check_id=0)
+        db.session.add(state)
+    return state
+
+
+def update_rollups(batch_size=DEFAULT_BATCH_SIZE, max_batches=None):
+    """
+    Fold every check written since the last run into the rollups.
+
+    Each batch is committed together with the new watermark, so a crash
+    can't double count or skip checks.
+
+    Args:
+        batch_size: Checks per transaction
+        max_batches: Stop after this many batches (None to catch up fully)
+
+    Returns:
+        int: Number of checks processed
+    """
+    processed = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        state = _get_state()
+        rows = db.session.query(
+            Check.id, Check.website_id, Check.checked_at, Check.is_up, Check.response_time_ms
+        ).filter(Check.id > state.last_check_id).order_by(Check.id).limit(batch_size).all()
+        if not rows:
+            db.session.commit()
+            break
+
+        fold_checks(row[1:] for row in rows)
+        state.last_check_id = rows[-1][0]
+        state.updated_at = datetime.utcnow()
+        db.session.commit()
+
+        processed += len(rows)
+        batches += 1
+        if len(rows) < batch_size:
+            break
+    return processed
+
+
+def _round_up(timestamp, resolution):
+    start = bucket_start(timestamp, resolution)
+    return start if start == timestamp else start + timedelta(seconds=resolution)
+
+
+def _cover(start, end, resolutions):
+    """Cover [start, end), aligned to resolutions[0], with the coarsest buckets that fit"""
+    if start >= end:
+        return []
+    for resolution in reversed(resolutions[1:]):
+        inner_start = _round_up(start, resolution)
+        inner_end = bucket_start(end, resolution)
+        if inner_start < inner_end:
+            # Cover the ragged edges with finer buckets
+            return (_cover(start, inner_start, resolutions)
+                    + [(resolution, inner_start, inner_end)]
+                    + _cover(inner_end, end, resolutions))
+    return [(resolutions[0], start, end)]
+
+
+def cover_window(start, end, kept_since=None):
+    """
+    Split [start, end) into (resolution, range_start, range_end) segments,
+    using the coarsest buckets that fit entirely inside the window.
+
+    Anything finer than a minute at the edges is rounded to whole minutes.
+    Where the window reaches back past a retention cutoff, the finer buckets
+    are gone, so that part is covered with the finest ones left and its
+    edges widen to the whole hour or day buckets that contain them.
+
+    Args:
+        start: Window start (naive UTC)
+        end: Window end (naive UTC)
+        kept_since: Optional {MINUTE: datetime, HOUR: datetime} with the
+            oldest bucket_start still kept at each resolution (see
+            app.utils.retention.rollup_cutoffs); None assumes all are kept
+
+    Returns:
+        list: (resolution, range_start, range_end) tuples in time order
+    """
+    kept_since = kept_since or {}
+    # (finest resolution available, until when): days only before the hour
+    # cutoff, hours and days before the minute cutoff, then everything
+    parts = ((DAY, kept_since.get(HOUR)), (HOUR, kept_since.get(MINUTE)), (MINUTE, None))
+
+    segments = []
+    boundary = start
+    for finest, until in parts:
+        if finest != MINUTE and until is None:
+            continue
+        part_start = bucket_start(boundary, finest)
+        if until is None:
+            part_end = bucket_start(end, MINUTE)
+        elif end >= _round_up(until, DAY):
+            # Run on to a day boundary so the rest can start with whole days
+            part_end = _round_up(until, DAY)
+        else:
+            part_end = min(_round_up(end, finest), _round_up(until, finest))
+        if part_start >= part_end:
+            continue
+        for segment in _cover(part_start, part_end, [r for r in RESOLUTIONS if r >= finest]):
+            if segments and segments[-1][0] == segment[0] and segments[-1][2] == segment[1]:
+                # Join runs of the same resolution across the cutoffs
+                segments[-1] = (segment[0], segments[-1][1], segment[2])
+            else:
+                segments.append(segment)
+        boundary = part_end
+    return segments
+
+
+def window_rollups(start, end, website_ids=None, kept_since=None):
+    """Query for the rollup rows that cover [start, end) (see cover_window)"""
+    conditions = [
+        db.and_(
+            CheckRollup.resolution == resolution,
+            CheckRollup.bucket_start >= range_start,
+            CheckRollup.bucket_start < range_end
+        )
+        for resolution, range_start, range_end in cover_window(start, end, kept_since)
+    ]
+    query = CheckRollup.query.filter(db.or_(*conditions) if conditions else db.false())
+    if website_ids is not None:
+        query = query.filter(CheckRollup.website_id.in_(website_ids))
+    return query
+
+
+def summarize(rollups):
+    """
+    Combine rollup rows into window totals and percentiles.
+
+    Returns:
+        dict: count, up_count, uptime_percent, min/max/avg response time and
+            p50/p95/p99 (None where there is no data)
+    """
+    count = up_count = sum_response_ms = response_count = 0
+    min_response_ms = max_response_ms = None
+    sketch = LatencySketch()
+    for rollup in rollups:
+        count += rollup.count
+        up_count += rollup.up_count
+        sum_response_ms += rollup.sum_response_ms or 0
+        response_count += rollup.response_count or 0
+        if rollup.min_response_ms is not None:
+            min_response_ms = rollup.min_response_ms if min_response_ms is None \
+                else min(min_response_ms, rollup.min_response_ms)
+        if rollup.max_response_ms is not None:
+            max_response_ms = rollup.max_response_ms if max_response_ms is None \
+                else max(max_response_ms, rollup.max_response_ms)
+        sketch.merge(LatencySketch.from_json(rollup.sketch))
+
+    def percentile(q):
+        value = sketch.quantile(q)
+        return round(value, 1) if value is not None else None
+
+    return {
+        'count': count,
+        'up_count': up_count,
+        'uptime_percent': round(100.0 * up_count / count, 3) if count else None,
+        'min_response_ms': min_response_ms,
+        'max_response_ms': max_response_ms,
+        'avg_response_ms': round(sum_response_ms / response_count, 1) if response_count else None,
+        'p50_response_ms': percentile(0.50),
+        'p95_response_ms': percentile(0.95),
+        'p99_response_ms': percentile(0.99)
+    }
@@ -0,0 +1,145 @@
+"""
+Per-site check scheduler.
+
+Websites are kept in a min-heap keyed on the time their next check is due,
+so each tick only touches the sites that actually need checking instead of
+sweeping the whole table.  Every due time gets a little random jitter so
+sites with the same interval drift apart rather than all firing at the top
+of the minute.
+
+Changes made through the API are applied with schedule()/remove(); stale
+heap entries are skipped lazily when they reach the top.
+"""
+import heapq
+import random
+import threading
+import time
+
+from app.utils.telemetry import QUEUE_LAG
+
+DEFAULT_INTERVAL_MINUTES = 5
+
+# Each due time is moved by up to +/- this fraction of the interval
+DEFAULT_JITTER = 0.1
+
+# Longest the monitor loop sleeps before re-checking the heap
+MAX_WAIT_SECONDS = 60
+
+
+class CheckScheduler:
+    """Min-heap of website IDs ordered by next due time"""
+
+    def __init__(self, jitter=DEFAULT_JITTER, clock=time.monotonic):
+        self.jitter = jitter
+        self.clock = clock
+        self._heap = []
+        # website_id -> (generation, interval_seconds)
+        self._entries = {}
+        self._generation = 0
+        self._condition = threading.Condition()
+
+    def __len__(self):
+        with self._condition:
+            return len(self._entries)
+
+    def __contains__(self, website_id):
+        with self._condition:
+            return website_id in self._entries
+
+    def _jittered(self, interval):
+        return interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def _push(self, website_id, due, interval):
+        self._generation += 1
+        self._entries[website_id] = (self._generation, interval)
+        heapq.heappush(self._heap, (due, self._generation, website_id))
+
+    def schedule(self, website_id, interval_minutes, first_check_within=None, first_check_in=None):
+        """
+        Add a website, or update its interval.
+
+        Args:
+            website_id: ID of the website
+            interval_minutes: Minutes between checks
+            first_check_within: The first check happens at a random time
+                within this many seconds (defaults to one full interval)
+            first_check_in: Exact number of seconds until the first check,
+                e.g. to carry on from a site's last check
+        """
+        interval = max(1, interval_minutes or DEFAULT_INTERVAL_MINUTES) * 60
+        with self._condition:
+            entry = self._entries.get(website_id)
+            if entry is not None and entry[1] == interval:
+                return
+            if first_check_in is not None:
+                due = self.clock() + max(0.0, first_check_in)
+            else:
+                window = interval if first_check_within is None else first_check_within
+                due = self.clock() + random.uniform(0, window)
+            self._push(website_id, due, interval)
+            self._condition.notify()
+
+    def remove(self, website_id):
+        """Stop checking a website (its heap entry is discarded lazily)"""
+        with self._condition:
+            self._entries.pop(website_id, None)
+
+    def website_ids(self):
+        """IDs of every scheduled website"""
+        with self._condition:
+            return list(self._entries)
+
+    def _discard_stale(self):
+        while self._heap:
+            _, generation, website_id = self._heap[0]
+            entry = self._entries.get(website_id)
+            if entry is not None and entry[0] == generation:
+                return
+            heapq.heappop(self._heap)
+
+    def pop_due(self):
+        """
+        Take every website whose check is due and schedule its next check.
+
+        Returns:
+            list: IDs of the websites to check now
+        """
+        due_ids = []
+        with self._condition:
+            now = self.clock()
+            self._discard_stale()
+            while self._heap and self._heap[0][0] <= now:
+                due, _, website_id = heapq.heappop(self._heap)
+                interval = self._entries[website_id][1]
+                QUEUE_LAG.observe(now - due)
+                # If we fell behind, don't try to catch up with a burst
+                self._push(website_id, max(due, now) + self._jittered(interval), interval)
+                due_ids.append(website_id)
+                self._discard_stale()
+        return due_ids
+
+    def seconds_until_due(self):
+        """Seconds until the next check is due (None if nothing is scheduled)"""
+        with self._condition:
+            self._discard_stale()
+            if not self._heap:
+                return None
+            return max(0.0, self._heap[0][0] - self.clock())
+
+    def wait(self, max_wait=MAX_WAIT_SECONDS):
+        """Block until a check is due, the schedule changes or max_wait passes"""
+        with self._condition:
+            timeout = self.seconds_until_due()
+            if timeout is None or timeout > max_wait:
+                timeout = max_wait
+            if timeout > 0:
+                self._condition.wait(timeout)
+
+    def wake(self):
+        """Return from wait() straight away"""
+        with self._condition:
+            self._condition.notify_all()
+
+
+# Shared scheduler for the API process; routes keep it in sync with the database
+scheduler = CheckScheduler()
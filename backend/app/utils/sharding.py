@@ -0,0 +1,47 @@
+"""
+Consistent hashing of website IDs onto check workers.
+
+Each worker is placed on a hash ring at many points (virtual nodes) and a
+website belongs to the first worker point at or after its own hash.  When a
+worker joins or leaves only the websites next to its points move, roughly
+1/N of them, so the other workers keep their schedules.
+
+Hashes come from hashlib rather than hash(), which is salted per process,
+so every worker computes the same ring.
+"""
+import bisect
+import hashlib
+
+DEFAULT_REPLICAS = 100
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.blake2b(str(key).encode(), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """Maps keys to one of a set of nodes"""
+
+    def __init__(self, nodes=(), replicas=DEFAULT_REPLICAS):
+        self.nodes = frozenset(nodes)
+        self.replicas = replicas
+        points = sorted(
+            (_hash(f"{node}#{replica}"), node)
+            for node in self.nodes
+            for replica in range(replicas)
+        )
+        self._hashes = [point[0] for point in points]
+        self._owners = [point[1] for point in points]
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def owner(self, key):
+        """Node responsible for key (None if the ring is empty)"""
+        if not self._hashes:
+            return None
+        index = bisect.bisect_left(self._hashes, _hash(key))
+        return self._owners[index % len(self._owners)]
+
+    def owns(self, node, key):
+        return self.owner(key) == node
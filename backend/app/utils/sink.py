@@ -0,0 +1,249 @@
+"""
+Write-behind sink for check results.
+
+Committing every check on its own costs one fsync per row on SQLite, which
+ends up dominating a sweep.  CheckSink buffers result dicts in memory and
+writes them with a single executemany INSERT once either max_batch rows are
+waiting or the oldest row has waited max_delay seconds, so every result
+reaches the database within a bounded delay.  Rows only feed the latency
+baselines (see app.utils.anomaly) once they have been committed.
+
+While the database refuses writes, failed batches go back on the buffer to
+be retried, but it never holds more than max_buffer rows: past that the
+oldest are dropped and counted (rows_dropped, upmon_sink_rows_dropped_total),
+so an outage costs old results rather than the process's memory.
+"""
+import atexit
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models import Check
+from app.utils.anomaly import track_latency
+from app.utils.status_cache import get_status_cache
+from app.utils.telemetry import DB_WRITE, SINK_QUEUE_DEPTH, SINK_ROWS_DROPPED
+
+DEFAULT_MAX_BATCH = 500
+DEFAULT_MAX_DELAY = 2.0
+
+# Callers flush inline instead of queueing more than this many rows
+DEFAULT_MAX_QUEUE = 20000
+
+# Most rows held while writes keep failing; older ones are dropped
+DEFAULT_MAX_BUFFER = 50000
+
+CHECK_COLUMNS = ('website_id', 'status_code', 'response_time_ms', 'is_up', 'checked_at', 'error_message',
+                 'connection_mode', 'dns_ms', 'connect_ms', 'tls_ms', 'ttfb_ms', 'download_ms')
+
+
+class CheckSink:
+    """Buffers check results and bulk-inserts them from a background thread"""
+
+    def __init__(self, app, max_batch=DEFAULT_MAX_BATCH, max_delay=DEFAULT_MAX_DELAY,
+                 max_queue=DEFAULT_MAX_QUEUE, max_buffer=DEFAULT_MAX_BUFFER):
+        self.app = app
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_queue = max_queue
+        self.max_buffer = max(max_buffer, max_queue)
+
+        self._buffer = []
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._thread = None
+
+        # Metrics
+        self.rows_written = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.rows_dropped = 0
+        self.last_flush_rows = 0
+        self.last_flush_ms = None
+        self.last_flush_at = None
+
+    @property
+    def queue_depth(self):
+        return len(self._buffer)
+
+    def stats(self):
+        """Flush and queue metrics as a dictionary"""
+        return {
+            'queue_depth': self.queue_depth,
+            'rows_written': self.rows_written,
+            'flushes': self.flushes,
+            'failed_flushes': self.failed_flushes,
+            'rows_dropped': self.rows_dropped,
+            'last_flush_rows': self.last_flush_rows,
+            'last_flush_ms': self.last_flush_ms,
+            'last_flush_at': self.last_flush_at.isoformat() if self.last_flush_at else None
+        }
+
+    def put(self, result):
+        """Queue a single check result dict"""
+        self.put_many([result])
+
+    def put_many(self, results):
+        """Queue check result dicts (see CHECK_COLUMNS for the expected keys)"""
+        rows = [{column: result.get(column) for column in CHECK_COLUMNS} for result in results]
+        if not rows:
+            return
+        if self._closed:
+            # Nothing will flush for us any more, so write straight through
+            self._write(rows)
+            return
+
+        with self._lock:
+            if not self._buffer:
+                self._oldest = time.monotonic()
+            self._buffer.extend(rows)
+            dropped = self._trim()
+            depth = len(self._buffer)
+        SINK_QUEUE_DEPTH.set(depth)
+        self._dropped(dropped, 'buffer_full')
+
+        if depth >= self.max_queue:
+            # Back-pressure: the flusher is falling behind
+            self.flush()
+        elif depth >= self.max_batch:
+            self._wakeup.set()
+
+    def _trim(self):
+        """Drop the oldest rows past max_buffer (call with _lock held)"""
+        excess = len(self._buffer) - self.max_buffer
+        if excess <= 0:
+            return 0
+        del self._buffer[:excess]
+        return excess
+
+    def _dropped(self, count, reason):
+        if not count:
+            return
+        self.rows_dropped += count
+        SINK_ROWS_DROPPED.inc(reason, amount=count)
+        if reason == 'buffer_full':
+            self.app.logger.error(f"Sink buffer full ({self.max_buffer} rows), dropped the oldest {count} checks")
+
+    def _take(self):
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+            self._oldest = None
+        SINK_QUEUE_DEPTH.set(0)
+        return rows
+
+    def _write(self, rows):
+        with self.app.app_context(), DB_WRITE.time('check_batch'):
+            try:
+                db.session.execute(Check.__table__.insert(), rows)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            track_latency(rows)
+        get_status_cache(self.app).invalidate()
+
+    def _write_one(self, row):
+        try:
+            self._write([row])
+            return True
+        except Exception as e:
+            self.app.logger.error(f"Dropped check that could not be written: {str(e)}")
+            return False
+
+    def flush(self):
+        """
+        Write everything currently buffered.
+
+        Returns:
+            int: Number of rows written
+        """
+        with self._flush_lock:
+            rows = self._take()
+            if not rows:
+                return 0
+
+            start = time.monotonic()
+            try:
+                self._write(rows)
+            except IntegrityError as e:
+                # One bad row shouldn't hold back the rest of the batch
+                self.failed_flushes += 1
+                self.app.logger.error(f"Bulk insert of {len(rows)} checks failed, retrying one by one: {str(e)}")
+                written = [row for row in rows if self._write_one(row)]
+                self._dropped(len(rows) - len(written), 'rejected')
+                rows = written
+            except Exception as e:
+                self.failed_flushes += 1
+                self.app.logger.error(f"Failed to write {len(rows)} checks: {str(e)}")
+                # Put the rows back so they go out with the next flush
+                with self._lock:
+                    self._buffer[:0] = rows
+                    self._oldest = self._oldest or start
+                    dropped = self._trim()
+                    SINK_QUEUE_DEPTH.set(len(self._buffer))
+                self._dropped(dropped, 'buffer_full')
+                return 0
+
+            self.flushes += 1
+            self.rows_written += len(rows)
+            self.last_flush_rows = len(rows)
+            self.last_flush_ms = (time.monotonic() - start) * 1000
+            self.last_flush_at = datetime.utcnow()
+            return len(rows)
+
+    def _due(self):
+        with self._lock:
+            if not self._buffer:
+                return None
+            if len(self._buffer) >= self.max_batch:
+                return 0
+            return max(0.0, self._oldest + self.max_delay - time.monotonic())
+
+    def _run(self):
+        while not self._closed:
+            wait = self._due()
+            if wait is None:
+                wait = self.max_delay
+            if wait > 0:
+                self._wakeup.wait(wait)
+                self._wakeup.clear()
+                continue
+            if not self.flush() and self.queue_depth:
+                # The write failed; don't spin against a database that is refusing it
+                self._wakeup.wait(self.max_delay)
+                self._wakeup.clear()
+
+    def start(self):
+        """Start the background flusher; pending rows are flushed at exit"""
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+        return self
+
+    def close(self):
+        """
+        Stop the flusher and write whatever is still buffered.
+
+        If the database is still refusing the bulk insert, rows are tried one
+        at a time so as much as possible is kept before the process exits.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=self.max_delay + 5)
+
+        self.flush()
+        rows = self._take()
+        if rows:
+            written = sum(1 for row in rows if self._write_one(row))
+            self.rows_written += written
+            if written < len(rows):
+                self._dropped(len(rows) - written, 'shutdown')
+                self.app.logger.error(f"Dropped {len(rows) - written} checks on shutdown")
@@ -0,0 +1,78 @@
+"""
+Mergeable percentile sketch for response times.
+
+Values are counted in logarithmically sized buckets (the DDSketch idea), so
+any quantile can be answered with a bounded relative error and two sketches
+are merged by adding their bucket counts.  That is what lets rollup buckets
+of different sizes be combined into percentiles for arbitrary windows.
+"""
+import json
+import math
+
+DEFAULT_RELATIVE_ACCURACY = 0.02
+
+
+class LatencySketch:
+    """Log-bucketed histogram of non-negative values"""
+
+    def __init__(self, relative_accuracy=DEFAULT_RELATIVE_ACCURACY, buckets=None, zero_count=0):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets = buckets if buckets is not None else {}
+        self.zero_count = zero_count
+
+    @property
+    def count(self):
+        return self.zero_count + sum(self.buckets.values())
+
+    def add(self, value, count=1):
+        """Record a value (values below 1 are counted as zero)"""
+        if value is None:
+            return
+        if value < 1:
+            self.zero_count += count
+            return
+        index = math.ceil(math.log(value) / self._log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + count
+
+    def merge(self, other):
+        """Add another sketch's counts into this one"""
+        self.zero_count += other.zero_count
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        return self
+
+    def quantile(self, q):
+        """
+        Estimate the q-th quantile (0 <= q <= 1).
+
+        Returns:
+            float: Estimated value, or None if the sketch is empty
+        """
+        total = self.count
+        if not total:
+            return None
+        rank = q * (total - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank < seen:
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+    def to_json(self):
+        """Compact serialized form for storage"""
+        return json.dumps({
+            'z': self.zero_count,
+            'b': [[index, count] for index, count in sorted(self.buckets.items())]
+        }, separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, data, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+        if not data:
+            return cls(relative_accuracy)
+        raw = json.loads(data)
+        return cls(relative_accuracy, {index: count for index, count in raw['b']}, raw['z'])
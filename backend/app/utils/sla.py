@@ -0,0 +1,359 @@
+"""
+SLA / uptime reports over raw checks.
+
+Checks are pulled a batch of websites at a time as plain columns (epoch
+seconds, up flag, response time), joined in SQL into one string per website
+and parsed straight into NumPy arrays; no ORM objects, or even per-check
+rows, are built.  Everything for a batch is then worked out in
+one vectorized pass:
+
+- uptime is time-weighted: each check's result holds until the next check,
+  for at most GAP_INTERVALS times the website's check interval (time after
+  that wasn't monitored and counts neither way)
+- an outage is a run of failed checks, from the first failure to the next
+  successful check (if it is still going on, to the end of the window or of
+  monitoring, as above)
+- MTTR is the mean length of the outages that ended within the window
+- response time percentiles are over successful checks, interpolated
+  linearly as numpy.percentile does
+
+Raw checks are only kept for CHECK_RETENTION_DAYS (see app.utils.retention).
+Outages and time-weighted uptime can't be rebuilt from the rollups, so a
+window reaching back past that cutoff is only reported on from the cutoff:
+the report records where its checks start (covered_from), what share of
+the window that is, and complete=False.
+"""
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app import db
+from app.models import Check, Website
+from app.utils.scheduler import DEFAULT_INTERVAL_MINUTES
+
+PERCENTILES = (50, 90, 95, 99)
+
+# A check's result stands for at most this many check intervals
+GAP_INTERVALS = 2
+
+# Websites whose checks are loaded and summarized together
+DEFAULT_SITE_BATCH_SIZE = 200
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def month_window(month):
+    """[start, end) of a month given as YYYY-MM"""
+    start = datetime.strptime(month, '%Y-%m')
+    end = (start + timedelta(days=32)).replace(day=1)
+    return start, end
+
+
+def _epoch_seconds(column):
+    """SQL expression for a (naive UTC) DateTime column as integer epoch seconds"""
+    if db.engine.dialect.name == 'sqlite':
+        return db.cast(db.func.strftime('%s', column), db.Integer)
+    return db.cast(db.func.extract('epoch', column), db.BigInteger)
+
+
+def _joined(*columns):
+    """
+    SQL aggregate joining a group's rows into one comma-separated string,
+    each row's columns together, so the values of a row stay side by side
+    whatever order the database aggregates the rows in
+    """
+    token = db.cast(columns[0], db.String)
+    for column in columns[1:]:
+        token = token + ',' + db.cast(column, db.String)
+    if db.engine.dialect.name == 'sqlite':
+        return db.func.group_concat(token)
+    return db.func.string_agg(token, ',')
+
+
+def _parse(joined, width):
+    """A joined string as a (rows, width) array"""
+    values = np.fromstring(joined, dtype=np.int64, sep=',') if joined else np.empty(0, dtype=np.int64)
+    return values.reshape(-1, width)
+
+
+def load_check_arrays(first_id, last_id, start, end):
+    """
+    Checks of websites first_id..last_id within [start, end), as arrays.
+
+    Each website's checks come back as one comma-joined string, parsed by
+    NumPy, so there is one row per website rather than per check.
+
+    Returns:
+        tuple: (website_id, checked_at epoch seconds, is_up, response_time_ms
+            with -1 for none) arrays, sorted by website and time
+    """
+    rows = db.session.execute(
+        db.select(
+            Check.website_id,
+            _joined(_epoch_seconds(Check.checked_at), db.cast(Check.is_up, db.Integer),
+                    db.func.coalesce(Check.response_time_ms, -1))
+        ).where(
+            Check.website_id >= first_id,
+            Check.website_id <= last_id,
+            Check.checked_at >= start,
+            Check.checked_at < end
+        ).group_by(Check.website_id)
+    ).all()
+
+    checks = [_parse(row[1], 3) for row in rows]
+    website_id = np.repeat(np.array([row[0] for row in rows], dtype=np.int64),
+                           [len(site_checks) for site_checks in checks])
+    checks = np.concatenate(checks) if checks else np.empty((0, 3), dtype=np.int64)
+    checked_at, is_up, response_time_ms = checks[:, 0], checks[:, 1], checks[:, 2]
+
+    order = np.lexsort((checked_at, website_id))
+    return website_id[order], checked_at[order], is_up[order].astype(bool), response_time_ms[order]
+
+
+def _percentiles(groups, values, group_count, percentiles):
+    """Linearly interpolated percentiles of values for each group (NaN where a group has none)"""
+    order = np.lexsort((values, groups))
+    values = values[order].astype(np.float64)
+    counts = np.bincount(groups, minlength=group_count)
+    firsts = np.cumsum(counts) - counts
+    empty = counts == 0
+    results = {}
+    for percentile in percentiles:
+        position = firsts + (percentile / 100.0) * np.maximum(counts - 1, 0)
+        low = np.floor(position).astype(np.int64)
+        high = np.minimum(low + 1, firsts + counts - 1)
+        if len(values):
+            low_values = values[np.where(empty, 0, low)]
+            high_values = values[np.where(empty, 0, np.maximum(high, 0))]
+            result = low_values + (high_values - low_values) * (position - low)
+        else:
+            result = np.zeros(group_count)
+        result[empty] = np.nan
+        results[percentile] = result
+    return results
+
+
+def summarize_checks(website_id, checked_at, is_up, response_time_ms, end, interval_seconds,
+                     percentiles=PERCENTILES):
+    """
+    Per-website SLA figures and outage intervals for sorted check arrays.
+
+    Args:
+        website_id, checked_at, is_up, response_time_ms: Arrays from
+            load_check_arrays
+        end: Window end, in epoch seconds
+        interval_seconds: Check interval of each row's website, in seconds
+        percentiles: Response time percentiles to work out
+
+    Returns:
+        tuple: (sites, outages), dicts of arrays.  sites has one entry per
+            website with checks; outages one per outage.
+    """
+    count = len(website_id)
+    first = np.ones(count, dtype=bool)
+    first[1:] = website_id[1:] != website_id[:-1]
+    last = np.ones(count, dtype=bool)
+    last[:-1] = first[1:]
+    group = np.cumsum(first) - 1
+    group_count = int(first.sum())
+
+    # Time each check's result stands for
+    next_at = np.empty(count, dtype=np.int64)
+    next_at[:-1] = checked_at[1:]
+    next_at[last] = end
+    span = np.clip(np.minimum(next_at, end) - checked_at, 0, GAP_INTERVALS * interval_seconds)
+    down = ~is_up
+    monitored = np.bincount(group, weights=span, minlength=group_count)
+    downtime = np.bincount(group, weights=span * down, minlength=group_count)
+
+    # Outages: runs of failed checks within a website
+    previous_up = np.ones(count, dtype=bool)
+    previous_up[1:] = is_up[:-1]
+    next_up = np.ones(count, dtype=bool)
+    next_up[:-1] = is_up[1:]
+    run_first = np.flatnonzero(down & (first | previous_up))
+    run_last = np.flatnonzero(down & (last | next_up))
+    ongoing = last[run_last]
+    # One still going on ends where monitoring does (at most the window end)
+    outage_end = np.where(
+        ongoing,
+        np.minimum(end, checked_at[run_last] + GAP_INTERVALS * interval_seconds[run_last]),
+        checked_at[np.minimum(run_last + 1, count - 1)]
+    )
+    duration = outage_end - checked_at[run_first]
+    outage_group = group[run_first]
+    resolved = ~ongoing
+    resolved_count = np.bincount(outage_group[resolved], minlength=group_count)
+    resolved_total = np.bincount(outage_group[resolved], weights=duration[resolved], minlength=group_count)
+    longest = np.zeros(group_count, dtype=np.int64)
+    np.maximum.at(longest, outage_group, duration)
+
+    # Response times of successful checks
+    answered = is_up & (response_time_ms >= 0)
+    latency_group = group[answered]
+    latency = response_time_ms[answered]
+    latency_count = np.bincount(latency_group, minlength=group_count)
+    latency_total = np.bincount(latency_group, weights=latency, minlength=group_count)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sites = {
+            'website_id': website_id[first],
+            'checks': np.bincount(group, minlength=group_count),
+            'failed_checks': np.bincount(group, weights=down, minlength=group_count).astype(np.int64),
+            'monitored_seconds': monitored,
+            'downtime_seconds': downtime,
+            'uptime_percent': 100.0 * (1 - downtime / monitored),
+            'outages': np.bincount(outage_group, minlength=group_count),
+            'mttr_seconds': resolved_total / resolved_count,
+            'longest_outage_seconds': longest,
+            'avg_response_ms': latency_total / latency_count
+        }
+    for percentile, values in _percentiles(latency_group, latency, group_count, percentiles).items():
+        sites[f"p{percentile}_response_ms"] = values
+
+    outages = {
+        'website_id': website_id[run_first],
+        'start': checked_at[run_first],
+        'end': outage_end,
+        'duration_seconds': duration,
+        'failed_checks': run_last - run_first + 1,
+        'ongoing': ongoing
+    }
+    return sites, outages
+
+
+def _value(value):
+    """A NumPy scalar as JSON-friendly Python (NaN as None)"""
+    value = value.item() if hasattr(value, 'item') else value
+    if isinstance(value, float):
+        return None if value != value else round(value, 3)
+    return value
+
+
+def _timestamp(seconds):
+    return (_EPOCH + timedelta(seconds=int(seconds))).isoformat()
+
+
+class SLAReport:
+    """Per-website SLA figures and outages for one window"""
+
+    def __init__(self, start, end, websites, outages, percentiles=PERCENTILES, covered_from=None):
+        self.start = start
+        self.end = end
+        # Start of the part of the window raw checks are still kept for
+        self.covered_from = min(max(covered_from or start, start), end)
+        # Lists of dicts, in website ID (then outage start) order
+        self.websites = websites
+        self.outages = outages
+        self.percentiles = percentiles
+
+    @property
+    def website_columns(self):
+        return ['website_id', 'name', 'url', 'checks', 'failed_checks', 'uptime_percent', 'monitored_seconds',
+                'downtime_seconds', 'outages', 'mttr_seconds', 'longest_outage_seconds', 'avg_response_ms'] + \
+            [f"p{percentile}_response_ms" for percentile in self.percentiles]
+
+    outage_columns = ['website_id', 'start', 'end', 'duration_seconds', 'failed_checks', 'ongoing']
+
+    @property
+    def complete(self):
+        """Whether raw checks cover the whole window"""
+        return self.covered_from <= self.start
+
+    @property
+    def coverage_percent(self):
+        """Share of the window raw checks cover"""
+        if self.end <= self.start:
+            return 100.0
+        return round(100.0 * (self.end - self.covered_from) / (self.end - self.start), 3)
+
+    def to_dict(self):
+        """Convert object to dictionary"""
+        return {
+            'start': self.start.isoformat(),
+            'end': self.end.isoformat(),
+            'covered_from': self.covered_from.isoformat(),
+            'coverage_percent': self.coverage_percent,
+            'complete': self.complete,
+            'generated_at': datetime.utcnow().isoformat(),
+            'websites': self.websites,
+            'outages': self.outages
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict())
+
+    def to_csv(self, table='websites'):
+        """The websites (or outages) table as CSV text"""
+        rows, columns = (self.outages, self.outage_columns) if table == 'outages' \
+            else (self.websites, self.website_columns)
+        output = io.StringIO()
+        writer = csv.DictWriter(output, fieldnames=columns, extrasaction='ignore', lineterminator='\n')
+        writer.writeheader()
+        writer.writerows(rows)
+        return output.getvalue()
+
+
+def build_sla_report(start, end, website_ids=None, percentiles=PERCENTILES, batch_size=DEFAULT_SITE_BATCH_SIZE,
+                     checks_since=None):
+    """
+    SLA report for every website (or website_ids) over [start, end).
+
+    Websites without checks in the window are listed with no figures.
+
+    Args:
+        checks_since: Oldest time raw checks are kept from (see
+            app.utils.retention.checks_kept_since); if it falls inside the
+            window the report is marked incomplete
+
+    Returns:
+        SLAReport: The report
+    """
+    query = db.session.query(Website.id, Website.name, Website.url, Website.check_interval_minutes)
+    if website_ids is not None:
+        query = query.filter(Website.id.in_(website_ids))
+    websites = query.order_by(Website.id).all()
+    end_seconds = int((end - _EPOCH).total_seconds())
+
+    rows = []
+    outages = []
+    for offset in range(0, len(websites), batch_size):
+        batch = websites[offset:offset + batch_size]
+        ids = np.array([website.id for website in batch], dtype=np.int64)
+        intervals = np.array([(website.check_interval_minutes or DEFAULT_INTERVAL_MINUTES) * 60
+                              for website in batch], dtype=np.int64)
+
+        website_id, checked_at, is_up, response_time_ms = load_check_arrays(int(ids[0]), int(ids[-1]), start, end)
+        # Checks of websites in the ID range that aren't in the report
+        wanted = np.isin(website_id, ids)
+        if not wanted.all():
+            website_id, checked_at, is_up, response_time_ms = (
+                website_id[wanted], checked_at[wanted], is_up[wanted], response_time_ms[wanted])
+        interval_seconds = intervals[np.searchsorted(ids, website_id)]
+        sites, site_outages = summarize_checks(website_id, checked_at, is_up, response_time_ms, end_seconds,
+                                               interval_seconds, percentiles)
+
+        # Only here, turning the arrays into report rows, is there a loop per website
+        columns = list(sites)
+        summaries = dict(zip(sites['website_id'].tolist(), zip(*(sites[column] for column in columns))))
+        for website in batch:
+            row = {'website_id': website.id, 'name': website.name, 'url': website.url}
+            summary = summaries.get(website.id)
+            if summary is not None:
+                row.update((column, _value(value)) for column, value in zip(columns, summary))
+            rows.append(row)
+        for website_id_, outage_start, outage_end, duration, failed, ongoing in zip(
+                *(site_outages[column].tolist() for column in SLAReport.outage_columns)):
+            outages.append({
+                'website_id': website_id_,
+                'start': _timestamp(outage_start),
+                'end': None if ongoing else _timestamp(outage_end),
+                'duration_seconds': duration,
+                'failed_checks': failed,
+                'ongoing': ongoing
+            })
+
+    return SLAReport(start, end, rows, outages, percentiles, checks_since)
@@ -0,0 +1,253 @@
+"""
+Latest-status cache for the dashboard endpoints.
+
+Keeps each website's latest check summary in memory together with running
+up/down/response-time totals, so a dashboard poll is answered without
+walking every website or check.  Every change bumps an ETag, letting
+pollers that send If-None-Match get a 304 when nothing happened.
+
+StatusCache is the plain in-memory cache (used directly by run.py).
+DatabaseStatusCache keeps one in step with the database: it folds in checks
+newer than the last one it saw (written by the in-process monitor or by
+separate workers) and reloads when the websites table changes.  Each app
+gets its own, see get_status_cache().  Its ETag is
+derived from the database state, so every API process hands out the same
+one for the same data.
+"""
+import threading
+import time
+
+from flask import current_app, jsonify, request
+
+from app import db
+from app.models import Check, Website
+
+# Longest a DatabaseStatusCache serves without looking for new checks,
+# unless it is told about a write sooner
+DEFAULT_REFRESH_INTERVAL = 1.0
+
+# New checks folded in per query while catching up
+REFRESH_BATCH_SIZE = 5000
+
+
+class StatusCache:
+    """Website ID -> latest status, with up/down/average totals"""
+
+    def __init__(self):
+        self._statuses = {}
+        self._lock = threading.RLock()
+        self._version = 0
+        self._up = 0
+        self._down = 0
+        self._response_total = 0
+        self._response_count = 0
+
+    def _contribute(self, status, sign):
+        if status['is_up']:
+            self._up += sign
+        else:
+            self._down += sign
+        if status.get('response_time_ms') is not None:
+            self._response_total += sign * status['response_time_ms']
+            self._response_count += sign
+
+    def update(self, website_id, status):
+        """
+        Record a website's latest status, unless a newer one is already cached.
+
+        Args:
+            website_id: ID of the website
+            status: Status summary with at least is_up, response_time_ms and
+                checked_at (comparable timestamps, e.g. ISO strings)
+        """
+        with self._lock:
+            current = self._statuses.get(website_id)
+            if current is not None:
+                if (status.get('checked_at') or '') < (current.get('checked_at') or ''):
+                    return
+                self._contribute(current, -1)
+            self._statuses[website_id] = status
+            self._contribute(status, 1)
+            self._version += 1
+
+    def remove(self, website_id):
+        """Forget a website"""
+        with self._lock:
+            status = self._statuses.pop(website_id, None)
+            if status is not None:
+                self._contribute(status, -1)
+            self._version += 1
+
+    def replace(self, statuses):
+        """Swap in a full website ID -> status mapping"""
+        with self._lock:
+            self._statuses = {}
+            self._up = self._down = self._response_total = self._response_count = 0
+            for website_id, status in statuses.items():
+                self._statuses[website_id] = status
+                self._contribute(status, 1)
+            self._version += 1
+
+    def touch(self):
+        """Mark the cached data as changed without changing any status"""
+        with self._lock:
+            self._version += 1
+
+    def get(self, website_id):
+        """Latest status of one website (None if it has never been checked)"""
+        return self._statuses.get(website_id)
+
+    def statuses(self):
+        """Snapshot of every cached status, keyed by website ID"""
+        with self._lock:
+            return dict(self._statuses)
+
+    def stats(self, total_websites):
+        """
+        Dashboard totals.
+
+        Args:
+            total_websites: Number of monitored websites
+
+        Returns:
+            dict: total_websites, websites_up, websites_down and
+                avg_response_time (over each website's latest check)
+        """
+        with self._lock:
+            return {
+                'total_websites': total_websites,
+                'websites_up': self._up,
+                'websites_down': self._down,
+                'avg_response_time': self._response_total / self._response_count if self._response_count else 0
+            }
+
+    @property
+    def etag(self):
+        return f"v{self._version}"
+
+
+class DatabaseStatusCache(StatusCache):
+    """StatusCache that follows the checks and websites tables"""
+
+    def __init__(self, refresh_interval=DEFAULT_REFRESH_INTERVAL, clock=time.monotonic):
+        super().__init__()
+        self.refresh_interval = refresh_interval
+        self.clock = clock
+        self._last_check_id = None
+        self._websites_marker = None
+        self._website_count = 0
+        self._refreshed_at = None
+        self._stale = True
+        self._refresh_lock = threading.Lock()
+        self._listeners = []
+
+    def invalidate(self):
+        """Look for new data on the next read (called after checks are written)"""
+        self._stale = True
+
+    @property
+    def website_count(self):
+        return self._website_count
+
+    def add_listener(self, listener):
+        """
+        Have listener told about changes found by refresh().
+
+        Args:
+            listener: Object with on_check(check_id, website_id, status,
+                previous), called for each new check (previous is the
+                status it replaced, or None), and on_refresh(cache,
+                reloaded), called after a refresh that changed something
+        """
+        self._listeners.append(listener)
+
+    def _reload(self, marker):
+        """Load every website's latest status from scratch"""
+        last_check_id = db.session.query(db.func.max(Check.id)).scalar() or 0
+        self.replace(Website.get_latest_statuses())
+        self._last_check_id = last_check_id
+        self._websites_marker = marker
+        self._website_count = marker[0]
+
+    def _fold_new_checks(self):
+        """Returns: int: Number of new checks"""
+        folded = 0
+        while True:
+            checks = Check.query.filter(Check.id > self._last_check_id)\
+                .order_by(Check.id).limit(REFRESH_BATCH_SIZE).all()
+            for check in checks:
+                previous = self.get(check.website_id)
+                status = check.status_dict()
+                self.update(check.website_id, status)
+                for listener in self._listeners:
+                    listener.on_check(check.id, check.website_id, status, previous)
+            if checks:
+                self._last_check_id = checks[-1].id
+            folded += len(checks)
+            if len(checks) < REFRESH_BATCH_SIZE:
+                return folded
+
+    def refresh(self, force=False):
+        """
+        Bring the cache up to date if it may be stale (needs an app context).
+
+        Runs at most once per refresh_interval unless invalidate() was
+        called or force is set, so a burst of reads costs a few indexed
+        lookups at most.
+        """
+        now = self.clock()
+        if not (force or self._stale or self._refreshed_at is None
+                or now - self._refreshed_at >= self.refresh_interval):
+            return
+        with self._refresh_lock:
+            self._stale = False
+            self._refreshed_at = now
+            # Website edits are rare, so any of them triggers a full reload
+            marker = db.session.query(db.func.count(Website.id), db.func.max(Website.updated_at)).one()
+            marker = (marker[0], marker[1].isoformat() if marker[1] else None)
+            reloaded = marker != self._websites_marker or self._last_check_id is None
+            if reloaded:
+                self._reload(marker)
+                changed = True
+            else:
+                changed = self._fold_new_checks() > 0
+            if changed:
+                for listener in self._listeners:
+                    listener.on_refresh(self, reloaded)
+
+    @property
+    def etag(self):
+        return f"c{self._last_check_id}-w{self._websites_marker[0]}-{self._websites_marker[1]}" \
+            if self._websites_marker else 'empty'
+
+
+def etag_response(cache, build):
+    """
+    JSON response for data derived from cache, honouring If-None-Match.
+
+    Args:
+        cache: StatusCache the response depends on
+        build: Callable returning the data to serialise; only called when
+            the client's copy is out of date
+
+    Returns:
+        Response: 304 with no body, or 200 with the data and an ETag
+    """
+    etag = cache.etag
+    if etag in request.if_none_match:
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    # Let browsers keep the body but revalidate on every poll
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def get_status_cache(app=None):
+    """The DatabaseStatusCache of app (or the current app), created on first use"""
+    app = app or current_app._get_current_object()
+    cache = app.extensions.get('status_cache')
+    if cache is None:
+        cache = app.extensions.setdefault('status_cache', DatabaseStatusCache())
+    return cache
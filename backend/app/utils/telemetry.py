@@ -0,0 +1,322 @@
+"""
+Prometheus metrics for the monitor itself.
+
+A small in-process registry of counters, gauges and histograms, rendered in
+the Prometheus text format (or OpenMetrics when the scraper asks for it) by
+GET /metrics.  Updating a metric is a lock and an addition, so the check
+hot path can afford it.
+
+The monitor's metrics are defined at the bottom of this module and updated
+by the scheduler, check engine and sink:
+
+    upmon_sweep_duration_seconds        histogram  one CheckEngine.run
+    upmon_sweep_checks_per_second       gauge      throughput of the last sweep
+    upmon_checks_total{result}          counter    finished checks (up/down/error)
+    upmon_checks_in_flight              gauge      checks holding a concurrency slot
+    upmon_check_queue_lag_seconds       histogram  scheduled due time -> dispatch
+    upmon_db_write_seconds{operation}   histogram  database writes of check results
+    upmon_sink_queue_depth              gauge      results buffered by the CheckSink
+    upmon_check_errors_total{host}      counter    failed checks per host
+
+Host labels are capped at MAX_HOST_LABELS so a monitor with a million sites
+can't blow up the scrape; hosts past the cap are counted as host="other".
+
+Each process has its own registry.  Worker processes serve theirs with
+serve_metrics (see worker.py --metrics-port).
+"""
+import math
+import threading
+import time
+from urllib.parse import urlsplit
+
+TEXT_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+OPENMETRICS_CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+# Histogram buckets, in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SWEEP_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+LAG_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+# Most distinct host labels on the per-host error counter
+MAX_HOST_LABELS = 1000
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    """Base class for a metric family, keyed by label values"""
+
+    type = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if len(labels) != len(self.label_names):
+            raise ValueError(f"{self.name} takes labels {self.label_names}")
+        return tuple(str(value) for value in labels)
+
+    def _header(self, openmetrics):
+        # OpenMetrics names a counter family without its _total suffix
+        name = self.name[:-len('_total')] if openmetrics and self.type == 'counter' else self.name
+        return [f"# HELP {name} {self.documentation}", f"# TYPE {name} {self.type}"]
+
+    def render(self, openmetrics=False):
+        with self._lock:
+            values = dict(self._values)
+        lines = self._header(openmetrics)
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """A value that only goes up (name it *_total)"""
+
+    type = 'counter'
+
+    def inc(self, *labels, amount=1):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """A value that goes up and down, or is read from a callback at scrape time"""
+
+    type = 'gauge'
+
+    def __init__(self, name, documentation, labels=(), callback=None):
+        super().__init__(name, documentation, labels)
+        self.callback = callback
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, *labels, amount=1):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def value(self, *labels):
+        return self._values.get(self._key(labels), 0)
+
+    def render(self, openmetrics=False):
+        if self.callback is not None:
+            value = self.callback()
+            if value is None:
+                return self._header(openmetrics)
+            self.set(value)
+        return super().render(openmetrics)
+
+
+class Histogram(_Metric):
+    """Counts observations into cumulative buckets, with their sum and count"""
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, *labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (not yet cumulative) counts, then the sum
+                state = self._values[key] = [0] * len(self.buckets) + [0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[index] += 1
+                    break
+            state[-1] += value
+
+    def time(self, *labels):
+        """Context manager observing how long its block took"""
+        return _Timer(self, labels)
+
+    def count(self, *labels):
+        state = self._values.get(self._key(labels))
+        return sum(state[:-1]) if state else 0
+
+    def render(self, openmetrics=False):
+        with self._lock:
+            values = {labels: list(state) for labels, state in self._values.items()}
+        lines = self._header(openmetrics)
+        for labels, state in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                bucket_labels = _format_labels(self.label_names, labels, f'le="{_format_value(float(bound))}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            label_text = _format_labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(state[-1])}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+class MetricsRegistry:
+    """Every metric family exposed by a process"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name, documentation, labels=(), callback=None):
+        return self.register(Gauge(name, documentation, labels, callback))
+
+    def histogram(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render(self, openmetrics=False):
+        """The exposition text of every metric"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render(openmetrics))
+        if openmetrics:
+            lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+
+def host_label(url):
+    """Host (and port, if any) of url, for the per-host metrics"""
+    try:
+        parts = urlsplit(url)
+        host = parts.hostname or 'unknown'
+        return f"{host}:{parts.port}" if parts.port else host
+    except ValueError:
+        return 'unknown'
+
+
+def serve_metrics(port, host='0.0.0.0', metrics_registry=None):
+    """
+    Serve /metrics from a daemon thread, for processes without a Flask app
+    exposed (the check workers).
+
+    Returns:
+        WSGIServer: The running server (call shutdown() to stop it)
+    """
+    from wsgiref.simple_server import make_server, WSGIRequestHandler
+
+    metrics_registry = metrics_registry or registry
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+    def application(environ, start_response):
+        if environ.get('PATH_INFO') != '/metrics':
+            start_response('404 Not Found', [('Content-Type', 'text/plain')])
+            return [b'Not found\n']
+        openmetrics = 'application/openmetrics-text' in environ.get('HTTP_ACCEPT', '')
+        body = metrics_registry.render(openmetrics).encode()
+        start_response('200 OK', [
+            ('Content-Type', OPENMETRICS_CONTENT_TYPE if openmetrics else TEXT_CONTENT_TYPE),
+            ('Content-Length', str(len(body)))
+        ])
+        return [body]
+
+    server = make_server(host, port, application, handler_class=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# Shared registry for the process
+registry = MetricsRegistry()
+
+SWEEP_DURATION = registry.histogram(
+    'upmon_sweep_duration_seconds', 'Time taken to run one batch of due checks', buckets=SWEEP_BUCKETS)
+SWEEP_CHECKS_PER_SECOND = registry.gauge(
+    'upmon_sweep_checks_per_second', 'Checks per second achieved by the last sweep')
+CHECKS = registry.counter(
+    'upmon_checks_total', 'Finished website checks by result (up, down or error)', labels=('result',))
+CHECKS_IN_FLIGHT = registry.gauge(
+    'upmon_checks_in_flight', 'Checks currently holding a concurrency slot')
+QUEUE_LAG = registry.histogram(
+    'upmon_check_queue_lag_seconds', 'How long after its scheduled time a check was dispatched',
+    buckets=LAG_BUCKETS)
+DB_WRITE = registry.histogram(
+    'upmon_db_write_seconds', 'Time taken to write check results to the database', labels=('operation',))
+SINK_QUEUE_DEPTH = registry.gauge(
+    'upmon_sink_queue_depth', 'Check results waiting to be written by the sink')
+SINK_ROWS_DROPPED = registry.counter(
+    'upmon_sink_rows_dropped_total',
+    'Check results the sink gave up on (buffer_full, rejected or shutdown)', labels=('reason',))
+HOST_ERRORS = registry.counter(
+    'upmon_check_errors_total', 'Failed checks (down or error) by host', labels=('host',))
+
+_host_labels = set()
+_host_labels_lock = threading.Lock()
+
+
+def record_check(url, is_up, status_code):
+    """Count a finished check, and its host's errors if it failed"""
+    if is_up:
+        CHECKS.inc('up')
+        return
+    CHECKS.inc('down' if status_code else 'error')
+    host = host_label(url)
+    if host not in _host_labels:
+        with _host_labels_lock:
+            if len(_host_labels) >= MAX_HOST_LABELS:
+                host = 'other'
+            else:
+                _host_labels.add(host)
+    HOST_ERRORS.inc(host)
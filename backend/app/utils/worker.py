@@ -0,0 +1,215 @@
+"""
+Sharded check worker.
+
+Runs checks outside the API process, as any number of worker processes (see
+backend/worker.py).  The database is the only coordination point:
+
+- Every worker upserts its row in the workers table on each heartbeat.
+  Rows whose heartbeat is older than WORKER_TIMEOUT_SECONDS are treated as
+  gone and deleted by whichever worker notices first.
+- The live worker IDs form a consistent hash ring (app.utils.sharding).
+  Each worker schedules only the websites the ring gives it, and re-syncs
+  its shard whenever the set of live workers changes.
+- A website that moves to another worker keeps its rhythm: its next check
+  is due one interval after its last recorded check.
+- Website edits made through the API are picked up from Website.updated_at.
+  Deleted websites drop out the next time they come due.
+- The worker with the lowest ID also runs rollups and retention, so those
+  jobs never run twice at once.
+
+When workers are running, leave MONITOR_ENABLED off in the API.
+"""
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import Check, Website, Worker
+from app.utils.anomaly import get_latency_detector
+from app.utils.engine import CheckEngine
+from app.utils.monitor import Maintenance, run_due_checks
+from app.utils.scheduler import CheckScheduler, DEFAULT_INTERVAL_MINUTES
+from app.utils.sharding import HashRing
+from app.utils.sink import CheckSink
+
+HEARTBEAT_INTERVAL_SECONDS = 5
+
+# A worker that hasn't sent a heartbeat for this long is considered dead
+WORKER_TIMEOUT_SECONDS = 20
+
+# Most IDs per IN (...) lookup, well under SQLite's variable limit
+ID_BATCH_SIZE = 500
+
+# Re-read website changes from slightly before the last sync, in case a
+# transaction committed a change stamped just before that sync ran
+CHANGE_OVERLAP_SECONDS = 5
+
+
+def new_worker_id():
+    """Unique ID for a worker process"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def enable_wal():
+    """Let readers (the API) keep working while workers write, on SQLite"""
+    if db.engine.dialect.name == 'sqlite':
+        with db.engine.connect() as connection:
+            connection.exec_driver_sql('PRAGMA journal_mode = WAL')
+
+
+class ShardWorker:
+    """Checks the websites in one shard of the hash ring"""
+
+    def __init__(self, app, worker_id=None, engine=None, scheduler=None, clock=time.monotonic):
+        self.app = app
+        self.id = worker_id or new_worker_id()
+        self.engine = engine or CheckEngine()
+        self.scheduler = scheduler or CheckScheduler()
+        self.clock = clock
+        self.ring = HashRing()
+        self.maintenance = Maintenance(app)
+        self._changes_since = None
+        self._registered = False
+        self._stopping = threading.Event()
+
+    @property
+    def is_leader(self):
+        """Whether this worker runs the maintenance jobs"""
+        return bool(self.ring.nodes) and min(self.ring.nodes) == self.id
+
+    def heartbeat(self):
+        """Record that this worker is alive and return the live worker IDs"""
+        now = datetime.utcnow()
+        worker = db.session.get(Worker, self.id)
+        if worker is None:
+            worker = Worker(id=self.id, started_at=now)
+            db.session.add(worker)
+        worker.heartbeat_at = now
+        worker.shard_size = len(self.scheduler)
+
+        Worker.query.filter(
+            Worker.heartbeat_at < now - timedelta(seconds=WORKER_TIMEOUT_SECONDS),
+            Worker.id != self.id
+        ).delete(synchronize_session=False)
+        db.session.commit()
+
+        return [row[0] for row in db.session.query(Worker.id)]
+
+    def _last_checked(self, website_ids):
+        """Website ID -> time of its latest check, for the given websites"""
+        last_checked = {}
+        for start in range(0, len(website_ids), ID_BATCH_SIZE):
+            batch = website_ids[start:start + ID_BATCH_SIZE]
+            rows = db.session.query(Check.website_id, db.func.max(Check.checked_at))\
+                .filter(Check.website_id.in_(batch)).group_by(Check.website_id)
+            last_checked.update(rows)
+        return last_checked
+
+    def rebalance(self, worker_ids):
+        """
+        Rebuild the ring and re-sync this worker's shard from scratch.
+
+        Returns:
+            tuple: (websites added, websites removed)
+        """
+        self.ring = HashRing(worker_ids)
+        # Anything changed from here on is picked up by sync_changes
+        self._changes_since = datetime.utcnow() - timedelta(seconds=CHANGE_OVERLAP_SECONDS)
+
+        rows = Website.query.with_entities(Website.id, Website.check_interval_minutes)\
+            .filter_by(is_active=True).all()
+        owned = {website_id: interval for website_id, interval in rows if self.ring.owns(self.id, website_id)}
+
+        removed = 0
+        for website_id in self.scheduler.website_ids():
+            if website_id not in owned:
+                self._drop(website_id)
+                removed += 1
+        new_ids = [website_id for website_id in owned if website_id not in self.scheduler]
+        last_checked = self._last_checked(new_ids)
+        now = datetime.utcnow()
+        for website_id, interval in owned.items():
+            checked_at = last_checked.get(website_id)
+            if website_id in new_ids and checked_at is not None:
+                # Pick up where the previous owner left off
+                interval_seconds = max(1, interval or DEFAULT_INTERVAL_MINUTES) * 60
+                first_check_in = interval_seconds - (now - checked_at).total_seconds()
+                self.scheduler.schedule(website_id, interval, first_check_in=first_check_in)
+            else:
+                self.scheduler.schedule(website_id, interval)
+        return len(new_ids), removed
+
+    def sync_changes(self):
+        """Apply websites added or edited since the last sync to this shard"""
+        since = self._changes_since
+        self._changes_since = datetime.utcnow() - timedelta(seconds=CHANGE_OVERLAP_SECONDS)
+        rows = Website.query.with_entities(Website.id, Website.check_interval_minutes, Website.is_active)\
+            .filter(Website.updated_at >= since).all()
+        for website_id, interval, is_active in rows:
+            if is_active and self.ring.owns(self.id, website_id):
+                if website_id not in self.scheduler:
+                    # New or reactivated, so check it soon
+                    self.scheduler.schedule(website_id, interval, first_check_within=10)
+                else:
+                    self.scheduler.schedule(website_id, interval)
+            else:
+                self._drop(website_id)
+        return len(rows)
+
+    def _drop(self, website_id):
+        """Stop checking a website that left this shard"""
+        self.scheduler.remove(website_id)
+        # Its new owner keeps the latency baseline from here on; saving our
+        # stale copy later would overwrite theirs
+        get_latency_detector(self.app).forget(website_id)
+
+    def tick(self):
+        """Heartbeat, then rebalance or pick up website changes"""
+        worker_ids = self.heartbeat()
+        if not self._registered:
+            # Give workers started together a heartbeat to see each other
+            # before taking a shard, rather than all starting with everything
+            self._registered = True
+            return
+        if frozenset(worker_ids) != self.ring.nodes:
+            added, removed = self.rebalance(worker_ids)
+            self.app.logger.info(
+                f"Worker {self.id}: {len(worker_ids)} workers live, shard now {len(self.scheduler)} "
+                f"websites (+{added}/-{removed})"
+            )
+        else:
+            self.sync_changes()
+
+    def run_forever(self):
+        """Check this worker's shard until stop() is called"""
+        sink = CheckSink(self.app).start()
+        next_tick = self.clock()
+        try:
+            while not self._stopping.is_set():
+                with self.app.app_context():
+                    try:
+                        if self.clock() >= next_tick:
+                            next_tick = self.clock() + HEARTBEAT_INTERVAL_SECONDS
+                            self.tick()
+
+                        run_due_checks(self.scheduler, self.engine, sink)
+                        if self.is_leader:
+                            self.maintenance.run_due()
+                    except Exception as e:
+                        db.session.rollback()
+                        self.app.logger.error(f"Error in worker {self.id}: {str(e)}")
+                self.scheduler.wait(max_wait=max(0.0, next_tick - self.clock()))
+        finally:
+            sink.close()
+            self.engine.close()
+            with self.app.app_context():
+                # Leave the ring now rather than after the timeout
+                Worker.query.filter_by(id=self.id).delete()
+                db.session.commit()
+
+    def stop(self):
+        self._stopping.set()
+        self.scheduler.wake()
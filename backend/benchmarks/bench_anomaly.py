@@ -0,0 +1,121 @@
+"""
+Benchmark the response time anomaly detector.
+
+Feeds synthetic response times (log-normal noise around a per-site typical
+time) for N sites through LatencyDetector, with a step slowdown injected
+into a fraction of them part way through, and reports:
+
+- cost per check folded in
+- how many slowdowns were flagged, how many checks after they started and
+  for how long before they were learnt as the new normal
+- how many healthy sites were flagged anyway (false positives)
+- how long saving every site's baseline to SQLite takes
+
+Usage (from backend/):
+    python benchmarks/bench_anomaly.py --sites 10000 --checks 200 --slowdown 3
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db  # noqa: E402
+from app.models import Website  # noqa: E402
+from app.utils.anomaly import LatencyDetector, get_latency_detector  # noqa: E402
+
+
+def synthetic_series(args):
+    """Per site: (typical ms, check index the slowdown starts at or None)"""
+    rng = random.Random(args.seed)
+    sites = []
+    for _ in range(args.sites):
+        typical = rng.lognormvariate(5, 0.8)
+        onset = rng.randrange(args.checks // 2, args.checks - 20) if rng.random() < args.degraded_fraction else None
+        sites.append((typical, onset))
+    return sites
+
+
+def run_detector(sites, args):
+    rng = random.Random(args.seed + 1)
+    detector = LatencyDetector()
+    start_time = datetime(2026, 1, 1)
+    flagged_at = {}
+    cleared_at = {}
+    elapsed = 0.0
+    for index in range(args.checks):
+        checked_at = start_time + timedelta(minutes=index)
+        times = []
+        for typical, onset in sites:
+            factor = args.slowdown if onset is not None and index >= onset else 1
+            times.append(int(typical * factor * rng.lognormvariate(0, args.noise)))
+        started = time.perf_counter()
+        for website_id, response_time_ms in enumerate(times):
+            change = detector.observe(website_id, response_time_ms, True, checked_at)
+            if change == 'degraded':
+                flagged_at.setdefault(website_id, index)
+            elif change == 'recovered':
+                cleared_at.setdefault(website_id, index)
+        elapsed += time.perf_counter() - started
+    return detector, flagged_at, cleared_at, elapsed
+
+
+def time_save(detector, sites):
+    """Seconds to write every baseline into a fresh SQLite database"""
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(directory, 'bench.db')}",
+            'SQLALCHEMY_TRACK_MODIFICATIONS': False
+        })
+        with app.app_context():
+            db.create_all()
+            db.session.execute(Website.__table__.insert(), [
+                {'name': f"site {i}", 'url': f"https://site{i}.example.com"} for i in range(len(sites))
+            ])
+            db.session.commit()
+            stored = get_latency_detector()
+            # Website IDs start at 1
+            stored._baselines = {website_id + 1: baseline for website_id, baseline in detector._baselines.items()}
+            stored._dirty = set(stored._baselines)
+            started = time.perf_counter()
+            written = stored.save(force=True)
+            return written, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sites', type=int, default=10000)
+    parser.add_argument('--checks', type=int, default=200, help='checks per site')
+    parser.add_argument('--degraded-fraction', type=float, default=0.05)
+    parser.add_argument('--slowdown', type=float, default=3.0, help='response time multiplier once degraded')
+    parser.add_argument('--noise', type=float, default=0.15, help='sigma of the log-normal noise')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    sites = synthetic_series(args)
+    detector, flagged_at, cleared_at, elapsed = run_detector(sites, args)
+    total = args.sites * args.checks
+    print(f"observe:   {total:,} checks in {elapsed:.2f}s ({elapsed / total * 1e6:.2f}us per check)")
+
+    degraded = {website_id: onset for website_id, (_, onset) in enumerate(sites) if onset is not None}
+    caught = [flagged_at[website_id] - onset for website_id, onset in degraded.items()
+              if flagged_at.get(website_id, -1) >= onset]
+    false_positives = sum(1 for website_id in flagged_at if website_id not in degraded)
+    print(f"detected:  {len(caught)}/{len(degraded)} slowdowns, "
+          f"median {statistics.median(caught) if caught else 0:.0f} checks after onset")
+    print(f"false:     {false_positives}/{args.sites - len(degraded)} healthy sites flagged at some point")
+    held = [cleared_at[website_id] - flagged_at[website_id] for website_id in degraded if website_id in cleared_at]
+    print(f"flagged:   {len(detector.degraded())} sites at the end; {len(held)} cleared as the new normal, "
+          f"median {statistics.median(held) if held else 0:.0f} checks after being flagged")
+
+    written, seconds = time_save(detector, sites)
+    print(f"save:      {written:,} baselines in {seconds * 1000:.0f}ms")
+
+
+if __name__ == '__main__':
+    main()
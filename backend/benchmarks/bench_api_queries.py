@@ -0,0 +1,110 @@
+"""
+Count SQL statements and time the website listing endpoints.
+
+Seeds an in-memory database with increasing numbers of websites and checks
+that GET /api/websites and GET /api/websites/<id>/status run the same number
+of queries no matter how many websites exist.  Exits non-zero if they don't.
+Also times a repeat poll that sends the ETag back and gets a 304.
+
+Usage (from backend/):
+    python benchmarks/bench_api_queries.py --sizes 10 100 1000 5000
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db  # noqa: E402
+from app.models import Website, Check  # noqa: E402
+
+
+class StatementCounter:
+    """Counts statements executed on an engine while active"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        self.count = 0
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+
+
+def seed(site_count, checks_per_site):
+    now = datetime.utcnow()
+    db.session.execute(Website.__table__.insert(), [
+        {'name': f"Site {i}", 'url': f"http://site{i}.test", 'check_interval_minutes': 5,
+         'created_at': now, 'is_active': True}
+        for i in range(site_count)
+    ])
+    website_ids = [row[0] for row in db.session.query(Website.id)]
+    db.session.execute(Check.__table__.insert(), [
+        {'website_id': website_id, 'status_code': 200, 'response_time_ms': 100 + n,
+         'is_up': True, 'checked_at': now - timedelta(minutes=n)}
+        for website_id in website_ids
+        for n in range(checks_per_site)
+    ])
+    db.session.commit()
+    return website_ids
+
+
+def measure(client, counter, path, repeat, headers=None, expected_status=200):
+    with counter:
+        response = client.get(path, headers=headers)
+    assert response.status_code == expected_status, response.status_code
+    statements = counter.count
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        client.get(path, headers=headers)
+    elapsed_ms = (time.perf_counter() - start) / repeat * 1000
+    return statements, elapsed_ms, response.headers.get('ETag')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Statement counts for website listing endpoints')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--checks-per-site', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    statement_counts = {}
+    for size in args.sizes:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'TESTING': True})
+        with app.app_context():
+            db.create_all()
+            website_ids = seed(size, args.checks_per_site)
+            counter = StatementCounter(db.engine)
+            client = app.test_client()
+
+            for path in ('/api/websites', f"/api/websites/{website_ids[-1]}/status"):
+                statements, elapsed_ms, etag = measure(client, counter, path, args.repeat)
+                name = path.replace(str(website_ids[-1]), '<id>')
+                statement_counts.setdefault(name, set()).add(statements)
+                print(f"{size:>6} sites  {name:<28} {statements} statements  {elapsed_ms:8.1f} ms")
+
+                _, elapsed_ms, _ = measure(client, counter, path, args.repeat,
+                                           headers={'If-None-Match': etag}, expected_status=304)
+                print(f"{size:>6} sites  {name:<28} 304 repoll    {elapsed_ms:8.1f} ms")
+
+    for name, counts in statement_counts.items():
+        if len(counts) > 1:
+            print(f"FAIL: {name} statement count depends on site count: {sorted(counts)}")
+            sys.exit(1)
+    print("OK: statement counts are constant")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark adaptive timeouts and host circuit breaking.
+
+Sweeps the same sites a few times with and without the engine's CheckGuard.
+Most sites are on healthy stub origins, a few of whose requests hang; the
+rest are on a "dead" origin that accepts connections but never answers and
+on a port nothing listens on.  Without the guard every hang costs the full
+timeout and every dead site a worker slot each sweep; with it, hung requests
+on the healthy origins are retried on a fresh connection once the site's
+learnt allowance runs out and the dead origins' sites are skipped once their
+circuit opens.  Allowances are learnt per site, so the guard only pays off
+once every site has had a few answered checks (breaker.MIN_SAMPLES sweeps).
+
+Usage (from backend/):
+    python benchmarks/bench_breaker.py --sites 2000 --dead-fraction 0.2 --sweeps 8
+"""
+import argparse
+import logging
+import os
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_server import StubServer  # noqa: E402
+from app.utils.check_modes import CheckOptions  # noqa: E402
+from app.utils.engine import CheckEngine  # noqa: E402
+from app.utils.http_client import PhaseTimeouts  # noqa: E402
+from app.utils.log import check_logger  # noqa: E402
+
+
+def closed_port():
+    """A localhost port with nothing listening on it"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def run_sweeps(targets, guard, args):
+    timeouts = PhaseTimeouts(ttfb=args.timeout, read=args.timeout, total=args.timeout)
+    engine = CheckEngine(concurrency=args.concurrency, per_host_limit=args.per_host_limit,
+                         timeouts=timeouts, guard=guard)
+    sweeps = []
+    for _ in range(args.sweeps):
+        start = time.perf_counter()
+        results = engine.run_sync(targets)
+        sweeps.append((time.perf_counter() - start, sum(1 for result in results if result['is_up'])))
+    return sweeps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sites', type=int, default=2000)
+    parser.add_argument('--origins', type=int, default=4, help='number of healthy stub servers')
+    parser.add_argument('--dead-fraction', type=float, default=0.2, help='fraction of sites on dead origins')
+    parser.add_argument('--hang-rate', type=float, default=0.01, help='fraction of hung requests on healthy origins')
+    parser.add_argument('--latency-ms', type=int, default=50)
+    parser.add_argument('--timeout', type=float, default=10.0, help='configured check timeout in seconds')
+    parser.add_argument('--sweeps', type=int, default=8)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--per-host-limit', type=int, default=64)
+    args = parser.parse_args()
+    # Every dead site would log a warning each sweep
+    check_logger.setLevel(logging.ERROR)
+
+    healthy = [StubServer(latency_ms=args.latency_ms, latency_jitter_ms=args.latency_ms // 2,
+                          hang_rate=args.hang_rate, seed=i).start() for i in range(args.origins)]
+    hanging = StubServer(hang_rate=1.0).start()
+    dead_urls = [hanging.url, f"http://127.0.0.1:{closed_port()}"]
+
+    dead = int(args.sites * args.dead_fraction)
+    targets = [(i, f"{dead_urls[i % len(dead_urls)]}/site/{i}", CheckOptions()) for i in range(dead)]
+    targets += [(i, f"{healthy[i % len(healthy)].url}/site/{i}", CheckOptions()) for i in range(dead, args.sites)]
+
+    try:
+        for label, guard in (('no guard', False), ('guard', True)):
+            sweeps = run_sweeps(targets, guard, args)
+            times = ', '.join(f"{elapsed:.2f}s" for elapsed, _ in sweeps)
+            print(f"{label:>8}: sweeps {times} (total {sum(elapsed for elapsed, _ in sweeps):.2f}s, "
+                  f"{sweeps[-1][1]}/{len(targets)} up in the last)")
+    finally:
+        for server in healthy + [hanging]:
+            server.stop()
+
+
+if __name__ == '__main__':
+    main()
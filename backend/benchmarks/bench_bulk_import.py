@@ -0,0 +1,107 @@
+"""
+Throughput of the bulk website import and export endpoints.
+
+Imports --sites websites into an empty file-backed SQLite database through
+POST /api/websites/bulk, as NDJSON and then as CSV (the second import
+updates every website created by the first), and streams them back out of
+GET /api/websites/export.  Every --bad-every'th row is invalid or a
+duplicate so per-row error handling is part of the measurement.  For
+comparison, --single websites are created one request at a time through
+POST /api/websites.
+
+Usage (from backend/):
+    python benchmarks/bench_bulk_import.py --sites 20000
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db  # noqa: E402
+from app.utils.bulk import IMPORT_FIELDS  # noqa: E402
+
+
+def make_rows(sites, bad_every):
+    rows = []
+    for n in range(sites):
+        row = {'name': f"Site {n}", 'url': f"https://site-{n}.example.com/", 'check_interval_minutes': 5}
+        if n % 3 == 0:
+            row.update(check_mode='keyword', check_keyword='ok')
+        if bad_every and n % bad_every == bad_every - 1:
+            # Alternate between a duplicate URL and a validation error
+            if n % (2 * bad_every) == bad_every - 1:
+                row['url'] = f"HTTPS://site-{n - 1}.example.com:443"
+            else:
+                row['check_interval_minutes'] = 0
+        rows.append(row)
+    return rows
+
+
+def to_ndjson(rows):
+    return ''.join(json.dumps(row) + '\n' for row in rows).encode()
+
+
+def to_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=IMPORT_FIELDS)
+    writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue().encode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sites', type=int, default=20000)
+    parser.add_argument('--bad-every', type=int, default=100)
+    parser.add_argument('--single', type=int, default=500)
+    args = parser.parse_args()
+
+    rows = make_rows(args.sites, args.bad_every)
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(directory, 'bulk.db')}"})
+        with app.app_context():
+            db.create_all()
+        client = app.test_client()
+
+        for name, body, content_type in (
+            ('ndjson', to_ndjson(rows), 'application/x-ndjson'),
+            ('csv', to_csv(rows), 'text/csv'),
+        ):
+            start = time.perf_counter()
+            response = client.post('/api/websites/bulk', data=body, content_type=content_type)
+            elapsed = time.perf_counter() - start
+            result = response.get_json()
+            assert response.status_code == 200, result
+            print(f"import {name:>6}: {len(rows)} rows ({len(body) / 1e6:.1f} MB) in {elapsed:6.2f}s  "
+                  f"{len(rows) / elapsed:8.0f} rows/s  created {result['created']}  "
+                  f"updated {result['updated']}  failed {result['failed']}")
+
+        for name in ('ndjson', 'csv'):
+            start = time.perf_counter()
+            response = client.get(f"/api/websites/export?format={name}")
+            body = response.get_data()
+            elapsed = time.perf_counter() - start
+            count = body.count(b'\n') - (name == 'csv')
+            print(f"export {name:>6}: {count} websites ({len(body) / 1e6:.1f} MB) in {elapsed:6.2f}s  "
+                  f"{count / elapsed:8.0f} rows/s")
+
+        start = time.perf_counter()
+        for n in range(args.single):
+            response = client.post('/api/websites', json={'name': f"Single {n}", 'url': f"https://single-{n}.example.com"})
+            assert response.status_code == 201
+        elapsed = time.perf_counter() - start
+        print(f"one at a time: {args.single} websites in {elapsed:6.2f}s  {args.single / elapsed:8.0f} rows/s "
+              f"(POST /api/websites, for comparison)")
+
+        with app.app_context():
+            db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
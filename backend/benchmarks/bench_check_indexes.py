@@ -0,0 +1,130 @@
+"""
+Measure checks-table query latency with and without the hot-path indexes.
+
+Seeds a SQLite file with a synthetic check history, drops the indexes added
+in migration 4e377f5306cf, times the queries the website routes run, then
+recreates the indexes and times them again.
+
+Usage (from backend/):
+    python benchmarks/bench_check_indexes.py --sites 200 --checks-per-site 5000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db  # noqa: E402
+from app.models import Website, Check  # noqa: E402
+
+INSERT_CHUNK = 50000
+
+
+def seed(site_count, checks_per_site, failure_rate):
+    now = datetime.utcnow()
+    db.session.execute(Website.__table__.insert(), [
+        {'name': f"Site {i}", 'url': f"http://site{i}.test", 'check_interval_minutes': 1,
+         'created_at': now, 'is_active': True}
+        for i in range(site_count)
+    ])
+    db.session.commit()
+
+    # Interleave sites like a real sweep would
+    rows = []
+    for n in range(checks_per_site):
+        checked_at = now - timedelta(minutes=checks_per_site - n)
+        for website_id in range(1, site_count + 1):
+            is_up = random.random() >= failure_rate
+            rows.append({
+                'website_id': website_id,
+                'status_code': 200 if is_up else 503,
+                'response_time_ms': random.randint(50, 800),
+                'is_up': is_up,
+                'checked_at': checked_at,
+                'error_message': None
+            })
+            if len(rows) >= INSERT_CHUNK:
+                db.session.execute(Check.__table__.insert(), rows)
+                rows = []
+    if rows:
+        db.session.execute(Check.__table__.insert(), rows)
+    db.session.commit()
+
+
+def hot_queries(website_id, deep_page):
+    def recent():
+        return Check.query.filter_by(website_id=website_id)\
+            .order_by(Check.checked_at.desc()).limit(10).all()
+
+    def first_page():
+        return Check.query.filter_by(website_id=website_id)\
+            .order_by(Check.checked_at.desc()).paginate(page=1, per_page=20, error_out=False).items
+
+    def deep():
+        return Check.query.filter_by(website_id=website_id)\
+            .order_by(Check.checked_at.desc()).paginate(page=deep_page, per_page=20, error_out=False).items
+
+    def failures():
+        return Check.query.filter(Check.website_id == website_id, Check.is_up.is_(False))\
+            .order_by(Check.checked_at.desc()).limit(10).all()
+
+    return [
+        ('latest status (all sites)', Website.get_latest_statuses),
+        ('recent 10 checks', recent),
+        ('checks page 1', first_page),
+        (f"checks page {deep_page}", deep),
+        ('recent failures', failures),
+    ]
+
+
+def time_queries(queries, repeat):
+    timings = {}
+    for name, query in queries:
+        query()  # warm the page cache
+        start = time.perf_counter()
+        for _ in range(repeat):
+            query()
+        timings[name] = (time.perf_counter() - start) / repeat * 1000
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='checks table index benchmark')
+    parser.add_argument('--sites', type=int, default=200)
+    parser.add_argument('--checks-per-site', type=int, default=2000)
+    parser.add_argument('--failure-rate', type=float, default=0.02)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{path}"})
+    with app.app_context():
+        db.create_all()
+        start = time.perf_counter()
+        seed(args.sites, args.checks_per_site, args.failure_rate)
+        print(f"Seeded {args.sites * args.checks_per_site:,} checks in {time.perf_counter() - start:.1f}s")
+
+        indexes = list(Check.__table__.indexes)
+        for index in indexes:
+            index.drop(db.engine)
+
+        queries = hot_queries(args.sites // 2, deep_page=max(1, args.checks_per_site // 40))
+        before = time_queries(queries, args.repeat)
+
+        for index in indexes:
+            index.create(db.engine)
+        db.session.execute(db.text('ANALYZE'))
+        after = time_queries(queries, args.repeat)
+
+    print(f"{'query':<28} {'no index':>12} {'indexed':>12}")
+    for name, _ in queries:
+        print(f"{name:<28} {before[name]:>9.2f} ms {after[name]:>9.2f} ms")
+    os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
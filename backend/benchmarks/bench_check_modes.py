@@ -0,0 +1,76 @@
+"""
+Benchmark the check modes against a stub origin serving a large page.
+
+Checks the same sites with a full download (what requests.get did) and with
+each check mode, and reports time, bytes the origin had to send and peak
+Python memory per sweep.
+
+Usage (from backend/):
+    python benchmarks/bench_check_modes.py --sites 50 --body-size 5000000
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_server import StubServer  # noqa: E402
+from app.utils.check_modes import CheckOptions  # noqa: E402
+from app.utils.engine import CheckEngine  # noqa: E402
+
+
+class _FullDownload(CheckOptions):
+    """Reads the whole body into memory, like the old requests.get checks"""
+
+    def __init__(self):
+        super().__init__('keyword', keyword='ok')
+        self.max_bytes = None
+
+    def match(self, body):
+        return None
+
+
+def run_sweep(server, targets, options):
+    engine = CheckEngine(cold_connections=True)
+    sent_before = server.bytes_sent
+    tracemalloc.start()
+    start = time.perf_counter()
+    results = engine.run_sync([(website_id, url, options) for website_id, url in targets])
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    engine.close()
+    # Give the origin a moment to notice closed connections
+    time.sleep(0.2)
+    failures = sum(1 for result in results if not result['is_up'])
+    return elapsed, server.bytes_sent - sent_before, peak, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sites', type=int, default=50)
+    parser.add_argument('--body-size', type=int, default=5_000_000)
+    parser.add_argument('--max-bytes', type=int, default=64 * 1024)
+    args = parser.parse_args()
+
+    server = StubServer(body_size=args.body_size).start()
+    targets = [(i, f"{server.url}/site/{i}") for i in range(args.sites)]
+
+    sweeps = [
+        ('full download', _FullDownload()),
+        ('head', CheckOptions('head')),
+        ('partial', CheckOptions('partial', args.max_bytes)),
+        ('keyword', CheckOptions('keyword', args.max_bytes, keyword='ok')),
+    ]
+    print(f"{args.sites} sites, {args.body_size} byte page, max_bytes={args.max_bytes}")
+    for name, options in sweeps:
+        elapsed, sent, peak, failures = run_sweep(server, targets, options)
+        print(f"{name:>14}: {elapsed:6.2f}s  {sent / 1e6:9.1f} MB sent  "
+              f"peak {peak / 1e6:7.1f} MB  {failures} failures")
+    server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Memory and throughput of run.py's check history.
+
+Fills a HistoryStore (one ring buffer per website) with --sites x --checks
+checks and reports resident memory per check and appends per second, then
+times serialising one website's history to JSON.  For comparison, the old
+list-of-dicts history (insert(0, ...) and trim to capacity) is filled for
+--legacy-sites websites; at full size it would not fit in memory.
+
+Usage (from backend/):
+    python benchmarks/bench_history.py --sites 100000 --checks 1000
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.history import HistoryStore  # noqa: E402
+
+
+def rss_mb():
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1e6
+
+
+def fill_rings(sites, checks):
+    store = HistoryStore(capacity=checks)
+    append = store.append
+    start = time.perf_counter()
+    for website_id in range(sites):
+        for n in range(checks):
+            append(website_id, 1_700_000_000 + n * 60, 200, 50 + n % 100, True)
+    return store, time.perf_counter() - start
+
+
+def fill_legacy(sites, checks):
+    history = {}
+    start = time.perf_counter()
+    for website_id in range(sites):
+        entries = history[website_id] = []
+        for n in range(checks):
+            entries.insert(0, {
+                'website_id': website_id,
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(1_700_000_000 + n * 60)),
+                'status': 'up',
+                'is_up': True,
+                'response_time_ms': 50 + n % 100,
+                'status_code': 200
+            })
+            if len(entries) > checks:
+                del entries[checks:]
+    return history, time.perf_counter() - start
+
+
+def report(name, sites, checks, before, elapsed):
+    used = rss_mb() - before
+    total = sites * checks
+    print(f"{name:>13}: {sites} sites x {checks} checks  {used:8.0f} MB  "
+          f"{used * 1e6 / total:6.1f} bytes/check  {total / elapsed / 1e6:5.2f}M appends/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sites', type=int, default=100_000)
+    parser.add_argument('--checks', type=int, default=1000)
+    parser.add_argument('--legacy-sites', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=100)
+    args = parser.parse_args()
+
+    gc.collect()
+    before = rss_mb()
+    legacy, elapsed = fill_legacy(args.legacy_sites, args.checks)
+    report('list of dicts', args.legacy_sites, args.checks, before, elapsed)
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        json.dumps(legacy[0])
+    legacy_json_ms = (time.perf_counter() - start) / args.repeat * 1000
+    del legacy
+    gc.collect()
+
+    before = rss_mb()
+    store, elapsed = fill_rings(args.sites, args.checks)
+    report('ring buffers', args.sites, args.checks, before, elapsed)
+
+    # Appends once every ring is full overwrite in place
+    ring = store.get(0)
+    start = time.perf_counter()
+    for n in range(100_000):
+        ring.append(1_800_000_000 + n, 200, 50, True)
+    print(f"{'full ring':>13}: {100_000 / (time.perf_counter() - start) / 1e6:5.2f}M appends/s")
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        ring.to_json(0)
+    ring_json_ms = (time.perf_counter() - start) / args.repeat * 1000
+    print(f"JSON for one site's {args.checks} checks: list of dicts {legacy_json_ms:.2f} ms, "
+          f"ring buffer {ring_json_ms:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
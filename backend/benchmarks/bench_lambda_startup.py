@@ -0,0 +1,89 @@
+"""
+Startup time of the Lambda checker, measured locally.
+
+Runs the checker in --runs fresh interpreters, as Lambda does for a cold
+start, against a temporary database of --sites websites served by the stub
+origin.  Each run times importing lambda_function, the first (cold)
+invocation and a second (warm) one in the same process.  Reports the median
+and best of each.
+
+Usage (from backend/):
+    python benchmarks/bench_lambda_startup.py --runs 10 --sites 200
+"""
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAMBDA_DIR = os.path.join(os.path.dirname(BACKEND), 'lambda_function')
+sys.path.insert(0, BACKEND)
+
+from app import create_app, db  # noqa: E402
+from benchmarks.stub_server import StubServer  # noqa: E402
+
+# Runs in the fresh interpreter; prints timings in ms as JSON
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import lambda_function
+imported = time.perf_counter()
+modules = len(sys.modules)
+first = lambda_function.lambda_handler({}, None)
+cold = time.perf_counter()
+second = lambda_function.lambda_handler({}, None)
+warm = time.perf_counter()
+assert first['statusCode'] == second['statusCode'] == 200, (first, second)
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'first_invocation_ms': (cold - imported) * 1000,
+    'warm_invocation_ms': (warm - cold) * 1000,
+    'modules_after_import': modules
+}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--sites', type=int, default=200)
+    args = parser.parse_args()
+
+    server = StubServer().start()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'upmon.db')
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{path}"})
+        with app.app_context():
+            db.create_all()
+            db.engine.dispose()
+        conn = sqlite3.connect(path)
+        now = datetime.utcnow().isoformat()
+        conn.executemany(
+            "INSERT INTO websites (name, url, check_interval_minutes, is_active, created_at, updated_at, check_mode) "
+            "VALUES (?, ?, 5, 1, ?, ?, 'partial')",
+            [(f"Site {i}", f"{server.url}/site/{i}", now, now) for i in range(args.sites)]
+        )
+        conn.commit()
+        conn.close()
+
+        env = {**os.environ, 'DATABASE_PATH': path, 'PYTHONDONTWRITEBYTECODE': '1'}
+        samples = []
+        for _ in range(args.runs):
+            output = subprocess.run([sys.executable, '-c', CHILD], cwd=LAMBDA_DIR, env=env,
+                                    capture_output=True, text=True, check=True).stdout
+            samples.append(json.loads(output.strip().splitlines()[-1]))
+    server.stop()
+
+    print(f"{args.runs} cold starts, {args.sites} sites")
+    for key in ('import_ms', 'first_invocation_ms', 'warm_invocation_ms', 'modules_after_import'):
+        values = [sample[key] for sample in samples]
+        print(f"{key:>22}: median {statistics.median(values):8.1f}  best {min(values):8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Exercise the Lambda checker's notification outbox against stub receivers.
+
+Queues --notifications alerts on four channels served by StubReceiver:
+
+    ok      answers at once
+    flaky   fails every --fail-every'th request
+    slow    answers after --slow-ms
+    down    always fails
+
+and runs dispatch rounds (with a short backoff) until nothing is pending.
+Reports per round how long dispatch took and what happened, then per
+channel what the receiver accepted.  Exits non-zero if a notification on a
+working channel was lost, or one on the down channel wasn't dead-lettered.
+
+Usage (from backend/):
+    python benchmarks/bench_notifications.py --notifications 500
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+sys.path.insert(0, os.path.join(os.path.dirname(BACKEND), 'lambda_function'))
+
+from app import create_app, db  # noqa: E402
+from benchmarks.stub_receiver import StubReceiver  # noqa: E402
+import lambda_function  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--notifications', type=int, default=500)
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--fail-every', type=int, default=2)
+    parser.add_argument('--slow-ms', type=int, default=1500)
+    parser.add_argument('--max-attempts', type=int, default=4)
+    parser.add_argument('--budget', type=float, default=20.0,
+                        help='Dispatch budget per round, in seconds')
+    args = parser.parse_args()
+
+    receivers = {
+        'ok': StubReceiver().start(),
+        'flaky': StubReceiver(fail_every=args.fail_every).start(),
+        'slow': StubReceiver(latency_ms=args.slow_ms).start(),
+        'down': StubReceiver(always_fail=True).start(),
+    }
+    lambda_function.NOTIFICATION_CHANNELS = {name: receiver.url for name, receiver in receivers.items()}
+    lambda_function.NOTIFY_BATCH_SIZE = args.batch_size
+    lambda_function.NOTIFY_MAX_ATTEMPTS = args.max_attempts
+    lambda_function.NOTIFY_BACKOFF_BASE_SECONDS = 0.05
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'outbox.db')
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{path}"})
+        with app.app_context():
+            db.create_all()
+            db.engine.dispose()
+
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        now = datetime.utcnow()
+        for n in range(args.notifications):
+            website = {'id': n, 'name': f"Site {n}"}
+            lambda_function.notify_status_change(conn, website, {
+                'status': 'down', 'previous_status': 'up', 'is_up': False,
+                'status_code': 503, 'error_message': None
+            }, now)
+        conn.commit()
+        print(f"{args.notifications} notifications x {len(receivers)} channels queued")
+
+        for round_number in range(1, 200):
+            start = time.perf_counter()
+            metrics = lambda_function.dispatch_notifications(conn, budget_seconds=args.budget)
+            elapsed = time.perf_counter() - start
+            print(f"round {round_number:>2}: {elapsed:5.2f}s  delivered {metrics['delivered']:>5}  "
+                  f"retrying {metrics['retrying']:>4}  dead {metrics['dead_lettered']:>4}  "
+                  f"pending {metrics['pending']:>5}  latency {metrics['latency_ms']}")
+            if not metrics['pending']:
+                break
+            time.sleep(lambda_function.NOTIFY_BACKOFF_BASE_SECONDS * 2 ** args.max_attempts)
+
+        failed = False
+        for name, receiver in receivers.items():
+            statuses = dict(conn.execute(
+                "SELECT status, COUNT(*) FROM notification_outbox WHERE channel = ? GROUP BY status", (name,)
+            ).fetchall())
+            duplicates = sum(len(times) - 1 for times in receiver.received.values())
+            print(f"{name:>6}: {receiver.requests} requests, {receiver.failures} failed, "
+                  f"{len(receiver.received)} notifications received ({duplicates} duplicates), outbox {statuses}")
+            if name == 'down':
+                failed |= statuses.get('dead', 0) != args.notifications
+            else:
+                failed |= len(receiver.received) != args.notifications
+        conn.close()
+
+    for receiver in receivers.values():
+        receiver.stop()
+    print("FAIL" if failed else "OK: every notification delivered or dead-lettered")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
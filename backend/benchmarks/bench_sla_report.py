@@ -0,0 +1,128 @@
+"""
+Benchmark the vectorized SLA report against walking ORM Check objects.
+
+Seeds a temporary SQLite database with N websites and a month of checks each
+(with random outages and response times), then times build_sla_report for
+the whole fleet.  The ORM baseline (load each website's Check objects and
+loop over them in Python) is timed on a sample of websites and scaled up to
+the fleet.
+
+Usage (from backend/):
+    python benchmarks/bench_sla_report.py --sites 2000 --checks-per-site 8640
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db  # noqa: E402
+from app.models import Website, Check  # noqa: E402
+from app.utils.sla import build_sla_report, month_window  # noqa: E402
+
+INSERT_BATCH = 50000
+
+
+def seed(site_count, checks_per_site, start, seed_value):
+    """A month of checks per site, evenly spaced, with a few outages each"""
+    rng = random.Random(seed_value)
+    interval = timedelta(days=30) / checks_per_site
+    db.session.execute(Website.__table__.insert(), [
+        {'name': f"Site {i}", 'url': f"http://site{i}.test",
+         'check_interval_minutes': max(1, int(interval.total_seconds() // 60)), 'is_active': True}
+        for i in range(site_count)
+    ])
+    website_ids = [row[0] for row in db.session.query(Website.id)]
+
+    rows = []
+    for website_id in website_ids:
+        typical = rng.lognormvariate(5, 0.6)
+        down_until = -1
+        for n in range(checks_per_site):
+            if n > down_until and rng.random() < 0.0005:
+                down_until = n + rng.randrange(1, 30)
+            is_up = n > down_until
+            rows.append({
+                'website_id': website_id, 'status_code': 200 if is_up else None,
+                'response_time_ms': int(typical * rng.lognormvariate(0, 0.3)) if is_up else None,
+                'is_up': is_up, 'checked_at': start + n * interval
+            })
+            if len(rows) >= INSERT_BATCH:
+                db.session.execute(Check.__table__.insert(), rows)
+                rows = []
+    if rows:
+        db.session.execute(Check.__table__.insert(), rows)
+    db.session.commit()
+    return website_ids
+
+
+def orm_report(website_ids, start, end):
+    """The old way: every Check of every website as an ORM object"""
+    report = []
+    for website_id in website_ids:
+        checks = Check.query.filter(Check.website_id == website_id, Check.checked_at >= start,
+                                    Check.checked_at < end).order_by(Check.checked_at).all()
+        times = sorted(check.response_time_ms for check in checks if check.is_up and check.response_time_ms)
+        outages = 0
+        previous_up = True
+        for check in checks:
+            if previous_up and not check.is_up:
+                outages += 1
+            previous_up = check.is_up
+        report.append({
+            'website_id': website_id,
+            'uptime_percent': 100.0 * sum(1 for check in checks if check.is_up) / len(checks) if checks else None,
+            'outages': outages,
+            'p95_response_ms': times[int(0.95 * (len(times) - 1))] if times else None
+        })
+    db.session.expunge_all()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sites', type=int, default=1000)
+    parser.add_argument('--checks-per-site', type=int, default=8640, help='checks per site over the month')
+    parser.add_argument('--orm-sample', type=int, default=20, help='websites the ORM baseline is timed on')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    start, end = month_window('2026-09')
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(directory, 'bench.db')}",
+            'SQLALCHEMY_TRACK_MODIFICATIONS': False
+        })
+        with app.app_context():
+            db.create_all()
+            started = time.perf_counter()
+            website_ids = seed(args.sites, args.checks_per_site, start, args.seed)
+            total = args.sites * args.checks_per_site
+            print(f"seeded:    {total:,} checks for {args.sites} sites in {time.perf_counter() - started:.1f}s")
+
+            started = time.perf_counter()
+            report = build_sla_report(start, end)
+            elapsed = time.perf_counter() - started
+            print(f"report:    {len(report.websites)} sites, {len(report.outages)} outages in {elapsed:.2f}s "
+                  f"({total / elapsed:,.0f} checks/s)")
+
+            started = time.perf_counter()
+            csv_text = report.to_csv()
+            json_text = report.to_json()
+            print(f"export:    csv {len(csv_text) / 1e6:.1f}MB, json {len(json_text) / 1e6:.1f}MB "
+                  f"in {(time.perf_counter() - started) * 1000:.0f}ms")
+
+            sample = website_ids[:args.orm_sample]
+            started = time.perf_counter()
+            orm_report(sample, start, end)
+            orm_elapsed = (time.perf_counter() - started) / len(sample) * args.sites
+            print(f"orm:       {orm_elapsed:.1f}s estimated for the fleet "
+                  f"(from {len(sample)} sites; {orm_elapsed / elapsed:.0f}x slower)")
+
+
+if __name__ == '__main__':
+    main()
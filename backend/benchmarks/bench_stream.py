@@ -0,0 +1,214 @@
+"""
+Load-test /api/stream with many idle server-sent event clients.
+
+Serves the app from a threaded werkzeug server in a child process (on a
+temporary SQLite database), with the STREAM_MAX_CLIENTS cap lifted so the
+cost of a thread per stream can be measured past what one worker is
+configured for (see app.utils.events).  It opens --clients stream
+connections from one asyncio client, and reports connect time and the
+server's memory and thread count while they sit idle.  It then writes checks straight into the
+database, the way a separate worker would, and measures how long each
+client takes to receive its events.  Every --per-site-every'th client
+subscribes to a single website instead of all of them.
+
+Usage (from backend/):
+    python benchmarks/bench_stream.py --clients 2000 --checks 20
+"""
+import argparse
+import asyncio
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db  # noqa: E402
+from app.models import Website, Check  # noqa: E402
+
+
+def serve(database_uri, port):
+    """Child process: serve the app until killed"""
+    import logging
+    from werkzeug.serving import make_server
+
+    # One access log line per connection would swamp the results
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    # A thread per client, so lift the per-process stream cap
+    app = create_app({'SQLALCHEMY_DATABASE_URI': database_uri, 'STREAM_MAX_CLIENTS': 100000})
+    server = make_server('127.0.0.1', port, app, threaded=True)
+    # Werkzeug listens with a backlog of 128; allow a burst of connects
+    server.socket.listen(4096)
+    print('ready', flush=True)
+    server.serve_forever()
+
+
+def server_stats(pid):
+    """Resident memory (MB) and thread count of a process"""
+    rss_kb = threads = 0
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                rss_kb = int(line.split()[1])
+            elif line.startswith('Threads:'):
+                threads = int(line.split()[1])
+    return rss_kb / 1024, threads
+
+
+class StreamClient:
+    """One idle SSE connection that records when check events arrive"""
+
+    def __init__(self, website_id=None):
+        self.website_id = website_id
+        self.received = {}
+        self.reader = None
+        self.writer = None
+
+    async def connect(self, port):
+        self.reader, self.writer = await asyncio.open_connection('127.0.0.1', port)
+        query = f"?websites={self.website_id}" if self.website_id else ''
+        self.writer.write(f"GET /api/stream{query} HTTP/1.1\r\nHost: localhost\r\n"
+                          f"Accept: text/event-stream\r\n\r\n".encode())
+        await self.writer.drain()
+        status_line = await self.reader.readline()
+        if b' 200 ' not in status_line:
+            raise RuntimeError(f"stream refused: {status_line!r}")
+        # Headers, then the retry: line that starts every stream
+        while (await self.reader.readline()) not in (b'\r\n', b''):
+            pass
+        await self.reader.readuntil(b'\n\n')
+
+    async def listen(self):
+        event_id = None
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                return
+            if line.startswith(b'id: '):
+                event_id = int(line[4:])
+            elif line == b'event: check\n':
+                self.received[event_id] = time.perf_counter()
+
+    def close(self):
+        self.writer.close()
+
+
+async def run_clients(args, port, website_ids, database_uri, server_pid):
+    clients = [
+        StreamClient(website_ids[i % len(website_ids)] if args.per_site_every and i % args.per_site_every == 0 else None)
+        for i in range(args.clients)
+    ]
+
+    start = time.perf_counter()
+    for offset in range(0, len(clients), args.connect_batch):
+        await asyncio.gather(*(client.connect(port) for client in clients[offset:offset + args.connect_batch]))
+    connect_seconds = time.perf_counter() - start
+    listeners = [asyncio.ensure_future(client.listen()) for client in clients]
+
+    await asyncio.sleep(args.idle)
+    rss_mb, threads = server_stats(server_pid)
+    print(f"{args.clients} idle clients connected in {connect_seconds:.2f}s")
+    print(f"server: {rss_mb:.0f} MB RSS, {threads} threads "
+          f"({rss_mb * 1024 / args.clients:.0f} KB per client)")
+
+    # Write checks the way a worker would and time their delivery
+    app = create_app({'SQLALCHEMY_DATABASE_URI': database_uri})
+    written = {}
+    with app.app_context():
+        for n in range(args.checks):
+            website_id = website_ids[n % len(website_ids)]
+            check = Check(website_id=website_id, status_code=200, response_time_ms=50,
+                          is_up=n % 2 == 0, checked_at=datetime.utcnow())
+            db.session.add(check)
+            db.session.commit()
+            written[check.id] = (website_id, time.perf_counter())
+            await asyncio.sleep(args.check_gap)
+
+    await asyncio.sleep(args.settle)
+    latencies = []
+    missing = 0
+    for client in clients:
+        for check_id, (website_id, written_at) in written.items():
+            if client.website_id not in (None, website_id):
+                continue
+            received_at = client.received.get(check_id)
+            if received_at is None:
+                missing += 1
+            else:
+                latencies.append(received_at - written_at)
+
+    for listener in listeners:
+        listener.cancel()
+    for client in clients:
+        client.close()
+
+    latencies.sort()
+    if latencies:
+        p50 = latencies[len(latencies) // 2] * 1000
+        p99 = latencies[int(len(latencies) * 0.99)] * 1000
+        print(f"fan-out: {len(latencies)} deliveries of {len(written)} checks, "
+              f"p50 {p50:.0f} ms, p99 {p99:.0f} ms, max {latencies[-1] * 1000:.0f} ms, {missing} missing")
+    return missing
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--clients', type=int, default=2000)
+    parser.add_argument('--websites', type=int, default=100)
+    parser.add_argument('--checks', type=int, default=20)
+    parser.add_argument('--check-gap', type=float, default=0.05,
+                        help='Seconds between written checks')
+    parser.add_argument('--per-site-every', type=int, default=2,
+                        help='Every Nth client follows one website (0: all follow everything)')
+    parser.add_argument('--connect-batch', type=int, default=200)
+    parser.add_argument('--idle', type=float, default=3.0,
+                        help='Seconds to sit idle before measuring the server')
+    parser.add_argument('--settle', type=float, default=3.0,
+                        help='Seconds to wait for the last events')
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--serve', metavar='DATABASE_URI', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port)
+        return
+
+    # Checks are written by the benchmark, never by a monitor
+    os.environ['MONITOR_ENABLED'] = 'false'
+    # Each connection is a socket on both ends
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    with tempfile.TemporaryDirectory() as directory:
+        database_uri = f"sqlite:///{os.path.join(directory, 'stream.db')}"
+        app = create_app({'SQLALCHEMY_DATABASE_URI': database_uri})
+        with app.app_context():
+            db.create_all()
+            db.session.execute(Website.__table__.insert(), [
+                {'name': f"Site {i}", 'url': f"http://site{i}.test", 'check_interval_minutes': 5,
+                 'created_at': datetime.utcnow(), 'updated_at': datetime.utcnow(), 'is_active': True}
+                for i in range(args.websites)
+            ])
+            db.session.commit()
+            website_ids = [row[0] for row in db.session.query(Website.id)]
+            db.engine.dispose()
+
+        server = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), '--serve', database_uri, '--port', str(args.port)],
+            stdout=subprocess.PIPE, text=True
+        )
+        try:
+            server.stdout.readline()
+            missing = asyncio.run(run_clients(args, args.port, website_ids, database_uri, server.pid))
+        finally:
+            server.terminate()
+            server.wait()
+
+    sys.exit(1 if missing else 0)
+
+
+if __name__ == '__main__':
+    main()
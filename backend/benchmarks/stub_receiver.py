@@ -0,0 +1,97 @@
+"""
+Local stub notification receiver.
+
+Accepts POSTs of {"notifications": [...]} like a notification channel and
+records which notification IDs arrived and when.  It can answer slowly, or
+fail some requests with a 503 (every fail_every'th one, or always), so
+the dispatcher's retries and dead-lettering can be exercised without a
+real endpoint.
+
+Usage:
+    python benchmarks/stub_receiver.py --port 8098 --fail-every 3
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubReceiver:
+    """Notification endpoint on localhost that records what it accepted"""
+
+    def __init__(self, host='127.0.0.1', port=0, latency_ms=0, fail_every=0, always_fail=False):
+        self.host = host
+        self.port = port
+        self.latency_ms = latency_ms
+        self.fail_every = fail_every
+        self.always_fail = always_fail
+        self.requests = 0
+        self.failures = 0
+        # Notification ID -> times it was accepted (more than one is a duplicate)
+        self.received = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/notifications"
+
+    def _respond(self, handler):
+        body = handler.rfile.read(int(handler.headers.get('Content-Length', 0)))
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        with self._lock:
+            self.requests += 1
+            fail = self.always_fail or (self.fail_every and self.requests % self.fail_every == 0)
+            if fail:
+                self.failures += 1
+            else:
+                now = time.time()
+                for notification in json.loads(body)['notifications']:
+                    self.received.setdefault(notification['id'], []).append(now)
+        handler.send_response(503 if fail else 200)
+        handler.send_header('Content-Length', '0')
+        handler.end_headers()
+
+    def start(self):
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                receiver._respond(self)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--port', type=int, default=8098)
+    parser.add_argument('--latency-ms', type=int, default=0)
+    parser.add_argument('--fail-every', type=int, default=0)
+    parser.add_argument('--always-fail', action='store_true')
+    args = parser.parse_args()
+
+    receiver = StubReceiver(port=args.port, latency_ms=args.latency_ms, fail_every=args.fail_every,
+                            always_fail=args.always_fail).start()
+    print(f"Stub receiver listening on {receiver.url}")
+    try:
+        receiver._thread.join()
+    except KeyboardInterrupt:
+        receiver.stop()
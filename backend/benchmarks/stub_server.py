@@ -0,0 +1,199 @@
+"""
+Local stub HTTP origin for benchmarks.
+
+Answers every request with a 200 response (small by default, or padded to
+body_size bytes), optionally after a fixed delay.  Runs its own event loop in a background thread so a benchmark can
+point real check code at it.
+
+Faults can be injected at random, from a seeded generator so runs are
+reproducible:
+
+    latency_jitter_ms  extra delay, uniform between 0 and this
+    error_rate         fraction of requests answered with error_status
+    hang_rate          fraction of requests never answered (the connection
+                       stays open until the client gives up)
+
+or per URL, whatever the rates: /status/<code> answers with that status,
+/delay/<ms> waits that long first and /hang never answers.
+
+Usage:
+    python benchmarks/stub_server.py --port 8099 --latency-ms 50 --body-size 5000000
+    python benchmarks/stub_server.py --port 8099 --error-rate 0.05 --hang-rate 0.01
+"""
+import argparse
+import asyncio
+import random
+import socket
+import threading
+
+BODY = b'<html><body>ok</body></html>'
+
+REASONS = {200: b'OK', 404: b'Not Found', 429: b'Too Many Requests', 500: b'Internal Server Error',
+           502: b'Bad Gateway', 503: b'Service Unavailable', 504: b'Gateway Timeout'}
+
+WRITE_CHUNK_SIZE = 64 * 1024
+
+
+class StubServer:
+    """Minimal keep-alive capable HTTP/1.1 server on localhost"""
+
+    def __init__(self, host='127.0.0.1', port=0, latency_ms=0, body_size=None, latency_jitter_ms=0,
+                 error_rate=0.0, error_status=503, hang_rate=0.0, seed=0):
+        self.host = host
+        self.port = port
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.hang_rate = hang_rate
+        self.random = random.Random(seed)
+        self.body = BODY
+        if body_size and body_size > len(BODY):
+            self.body = BODY + b' ' * (body_size - len(BODY))
+        self.requests_served = 0
+        self.bytes_sent = 0
+        self.errors_served = 0
+        self.hangs = 0
+        self._loop = None
+        self._server = None
+        self._writers = set()
+        self._thread = None
+        self._ready = threading.Event()
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def _plan(self, request_line):
+        """(status, delay in seconds, hang) for one request"""
+        parts = request_line.split()
+        path = parts[1].decode('latin-1') if len(parts) > 1 else '/'
+        status = 200
+        delay_ms = self.latency_ms
+        if self.latency_jitter_ms:
+            delay_ms += self.random.uniform(0, self.latency_jitter_ms)
+        hang = self.hang_rate and self.random.random() < self.hang_rate
+        if self.error_rate and self.random.random() < self.error_rate:
+            status = self.error_status
+
+        directive, _, argument = path.lstrip('/').partition('/')
+        argument = argument.split('/')[0].split('?')[0]
+        if directive == 'hang':
+            hang = True
+        elif directive == 'status' and argument.isdigit():
+            status = int(argument)
+        elif directive == 'delay' and argument.isdigit():
+            delay_ms = int(argument)
+        return status, delay_ms / 1000, hang
+
+    async def _handle(self, reader, writer):
+        self._writers.add(writer)
+        if len(self.body) > WRITE_CHUNK_SIZE:
+            # Keep the kernel from buffering megabytes ahead of the client,
+            # so bytes_sent is close to what the client actually read
+            writer.get_extra_info('socket').setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, WRITE_CHUNK_SIZE)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                keep_alive = True
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    if line.lower().startswith(b'connection:') and b'close' in line.lower():
+                        keep_alive = False
+
+                status, delay, hang = self._plan(request_line)
+                if hang:
+                    # Say nothing until the client hangs up
+                    self.hangs += 1
+                    while await reader.read(65536):
+                        pass
+                    break
+                if delay:
+                    await asyncio.sleep(delay)
+                if status != 200:
+                    self.errors_served += 1
+
+                body = b'' if request_line.startswith(b'HEAD ') else self.body
+                writer.write(
+                    b'HTTP/1.1 ' + str(status).encode() + b' ' + REASONS.get(status, b'Error') + b'\r\n'
+                    b'Content-Type: text/html\r\n'
+                    b'Content-Length: ' + str(len(self.body)).encode() + b'\r\n'
+                    + (b'' if keep_alive else b'Connection: close\r\n')
+                    + b'\r\n'
+                )
+                # Write large bodies in pieces so a client that hangs up
+                # early really saves the transfer
+                for start in range(0, len(body), WRITE_CHUNK_SIZE):
+                    writer.write(body[start:start + WRITE_CHUNK_SIZE])
+                    await writer.drain()
+                    self.bytes_sent += len(body[start:start + WRITE_CHUNK_SIZE])
+                await writer.drain()
+                self.requests_served += 1
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _serve(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port, backlog=4096)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        async with self._server:
+            await self._server.serve_forever()
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._loop.run_until_complete(self._serve())
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._loop.close()
+
+    def start(self):
+        """Start serving in a background thread and wait until it is listening"""
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def _close(self):
+        self._server.close()
+        # Drop open keep-alive connections too, like a real server going away
+        for writer in list(self._writers):
+            writer.close()
+
+    def stop(self):
+        if self._loop and self._server:
+            self._loop.call_soon_threadsafe(self._close)
+        if self._thread:
+            self._thread.join(timeout=5)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency-ms', type=int, default=0)
+    parser.add_argument('--body-size', type=int, default=None)
+    parser.add_argument('--latency-jitter-ms', type=int, default=0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--hang-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    server = StubServer(port=args.port, latency_ms=args.latency_ms, body_size=args.body_size,
+                        latency_jitter_ms=args.latency_jitter_ms, error_rate=args.error_rate,
+                        error_status=args.error_status, hang_rate=args.hang_rate, seed=args.seed).start()
+    print(f"Stub origin listening on {server.url}")
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,376 @@
+"""
+Reproducible benchmark suite for the check pipeline and the API.
+
+Starts a stub origin with injectable latency, errors and hangs (see
+benchmarks/stub_server.py), seeds a fresh file-backed SQLite database with
+--sites websites and --checks historical checks, then measures:
+
+    seed      how fast the history was written and what it costs on disk
+    sweep     one CheckEngine sweep of every site through a CheckSink:
+              checks/s, check latency percentiles, failures, DB growth
+    api       latency percentiles of GET /api/websites, /api/dashboard and
+              /api/websites/<id>/checks (cursor pagination, walking pages)
+    memory    bytes per site held by the monitor (scheduler, website rows
+              and status cache), by tracemalloc and by RSS
+
+Everything is written as one JSON document (to --output, or stdout) with the
+commit, Python and SQLite versions and the parameters used, so runs can be
+compared across commits:
+
+    python benchmarks/suite.py --output base.json
+    git checkout my-branch
+    python benchmarks/suite.py --output new.json --compare base.json
+
+--compare prints every metric that moved by more than --threshold in the
+wrong direction and exits non-zero if any did.  Timings are only
+comparable between runs on the same machine.
+
+Usage (from backend/):
+    python benchmarks/suite.py --sites 2000 --checks 200000 --error-rate 0.05 --hang-rate 0.01
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+# The suite drives checks itself; the in-process monitor must stay off
+os.environ['MONITOR_ENABLED'] = 'false'
+
+from app import create_app, db  # noqa: E402
+from app.models import Check, Website  # noqa: E402
+from app.utils.engine import CheckEngine  # noqa: E402
+from app.utils.http_client import PhaseTimeouts  # noqa: E402
+from app.utils.monitor import load_schedule  # noqa: E402
+from app.utils.scheduler import CheckScheduler  # noqa: E402
+from app.utils.sink import CheckSink  # noqa: E402
+from app.utils.status_cache import DatabaseStatusCache  # noqa: E402
+from benchmarks.stub_server import StubServer  # noqa: E402
+
+SCHEMA_VERSION = 1
+
+# Rows per executemany when seeding
+SEED_BATCH_SIZE = 10000
+
+# Metrics where a bigger number is an improvement; everything else numeric
+# is treated as lower-is-better by --compare
+HIGHER_IS_BETTER = ('per_second',)
+
+# Results that describe the run rather than measure it, or are a single
+# sample and too noisy to compare
+NOT_COMPARED = ('count', 'failures', 'hangs', 'errors', 'pages', 'sites', 'checks', 'origin_requests', 'max_ms')
+
+
+def percentiles(samples):
+    """Summary of a list of durations in seconds, in milliseconds"""
+    if not samples:
+        return {'count': 0}
+    ordered = sorted(samples)
+
+    def at(fraction):
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000, 3)
+
+    return {
+        'count': len(ordered),
+        'mean_ms': round(statistics.fmean(ordered) * 1000, 3),
+        'p50_ms': at(0.50),
+        'p95_ms': at(0.95),
+        'p99_ms': at(0.99),
+        'max_ms': round(ordered[-1] * 1000, 3)
+    }
+
+
+def rss_bytes():
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def database_bytes(path):
+    """Size of the database including any WAL file"""
+    return sum(os.path.getsize(file) for file in (path, path + '-wal') if os.path.exists(file))
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def seed(sites, checks, origins, rng):
+    """Insert the websites and their check history, oldest first"""
+    now = datetime.utcnow()
+    db.session.execute(Website.__table__.insert(), [
+        {'name': f"Site {n}", 'url': f"{origins[n % len(origins)]}/site/{n}", 'check_interval_minutes': 5,
+         'is_active': True, 'created_at': now, 'updated_at': now}
+        for n in range(sites)
+    ])
+    db.session.commit()
+    website_ids = [row[0] for row in db.session.query(Website.id).order_by(Website.id)]
+
+    # Spread the history evenly, one check per site every 5 minutes
+    per_site = max(1, checks // max(1, len(website_ids)))
+    rows = []
+    written = 0
+    for n in range(per_site):
+        checked_at = now - timedelta(minutes=5 * (per_site - n))
+        for website_id in website_ids:
+            if written >= checks:
+                break
+            is_up = rng.random() > 0.02
+            rows.append({
+                'website_id': website_id, 'status_code': 200 if is_up else 503, 'is_up': is_up,
+                'response_time_ms': int(rng.lognormvariate(4.5, 0.5)), 'checked_at': checked_at
+            })
+            written += 1
+            if len(rows) >= SEED_BATCH_SIZE:
+                db.session.execute(Check.__table__.insert(), rows)
+                rows = []
+    if rows:
+        db.session.execute(Check.__table__.insert(), rows)
+    db.session.commit()
+    return website_ids, written
+
+
+def run_seed(args, path, origins, rng):
+    before = database_bytes(path)
+    start = time.perf_counter()
+    website_ids, written = seed(args.sites, args.checks, origins, rng)
+    elapsed = time.perf_counter() - start
+    growth = database_bytes(path) - before
+    return website_ids, {
+        'sites': len(website_ids),
+        'checks': written,
+        'seconds': round(elapsed, 3),
+        'checks_per_second': round(written / elapsed, 1),
+        'db_bytes': database_bytes(path),
+        'db_bytes_per_check': round(growth / max(1, written), 1)
+    }
+
+
+def server_counts(servers):
+    """Requests, errors and hangs served so far by all the stub origins"""
+    return (sum(server.requests_served for server in servers), sum(server.errors_served for server in servers),
+            sum(server.hangs for server in servers))
+
+
+def run_sweep(args, app, path, servers):
+    """Check every site once, the way the monitor does, and time it"""
+    timeout = args.timeout
+    engine = CheckEngine(concurrency=args.concurrency, per_host_limit=args.per_host_limit, timeouts=PhaseTimeouts(
+        dns=timeout, connect=timeout, tls=timeout, ttfb=timeout, read=timeout, total=timeout))
+    sink = CheckSink(app).start()
+    websites = Website.query.all()
+    targets = [(website.id, website.url) for website in websites]
+    served_before, errors_before, hangs_before = server_counts(servers)
+    rows_before = db.session.query(db.func.count(Check.id)).scalar()
+    bytes_before = database_bytes(path)
+
+    start = time.perf_counter()
+    results = engine.run_sync(targets)
+    checked = time.perf_counter() - start
+    sink.put_many(results)
+    sink.close()
+    written = time.perf_counter() - start
+    engine.close()
+
+    rows_after = db.session.query(db.func.count(Check.id)).scalar()
+    served, errors, hangs = server_counts(servers)
+    return {
+        'sites': len(targets),
+        'seconds': round(written, 3),
+        'checks_per_second': round(len(results) / checked, 1),
+        'written_per_second': round((rows_after - rows_before) / written, 1),
+        'failures': sum(1 for result in results if not result['is_up']),
+        'errors': errors - errors_before,
+        'hangs': hangs - hangs_before,
+        'origin_requests': served - served_before,
+        'check_latency': percentiles([result['response_time_ms'] / 1000 for result in results]),
+        'db_bytes_per_check': round((database_bytes(path) - bytes_before) / max(1, rows_after - rows_before), 1)
+    }
+
+
+def time_requests(client, path, count):
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        response = client.get(path)
+        response.get_data()
+        samples.append(time.perf_counter() - start)
+        assert response.status_code == 200, (path, response.status_code)
+    return percentiles(samples)
+
+
+def time_pagination(client, website_ids, count, per_page, rng):
+    """Walk up to count pages of check history, starting on random sites"""
+    samples = []
+    pages = 0
+    while pages < count:
+        website_id = rng.choice(website_ids)
+        cursor = ''
+        while pages < count:
+            start = time.perf_counter()
+            response = client.get(f"/api/websites/{website_id}/checks",
+                                  query_string={'cursor': cursor, 'per_page': per_page})
+            body = response.get_json()
+            samples.append(time.perf_counter() - start)
+            assert response.status_code == 200, response.status_code
+            pages += 1
+            cursor = body['pagination']['next_cursor']
+            if not cursor:
+                break
+    return {**percentiles(samples), 'pages': pages}
+
+
+def run_api(args, app, website_ids, rng):
+    client = app.test_client()
+    # Warm up the status cache and connection pool
+    client.get('/api/websites')
+    return {
+        'websites': time_requests(client, '/api/websites', args.requests),
+        'dashboard': time_requests(client, '/api/dashboard', args.requests),
+        'website_status': time_requests(client, f"/api/websites/{website_ids[0]}/status", args.requests),
+        'checks_pagination': time_pagination(client, website_ids, args.requests, args.per_page, rng)
+    }
+
+
+def run_memory(sites):
+    """What the monitor keeps in memory per site"""
+    gc.collect()
+    rss_before = rss_bytes()
+    tracemalloc.start()
+    scheduler = CheckScheduler()
+    load_schedule(scheduler)
+    websites = Website.query.all()
+    status_cache = DatabaseStatusCache()
+    status_cache.refresh(force=True)
+    traced, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss = rss_bytes() - rss_before
+    del websites, scheduler, status_cache
+    return {
+        'sites': sites,
+        'traced_bytes_per_site': round(traced / max(1, sites), 1),
+        'rss_bytes_per_site': round(rss / max(1, sites), 1)
+    }
+
+
+def flatten(results, prefix=''):
+    """Numeric leaves of the results as {'a.b.c': value}"""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(results, baseline, threshold):
+    """
+    Metrics that got worse than the baseline by more than threshold.
+
+    Returns:
+        list: (metric, baseline value, new value, relative change) tuples
+    """
+    current = flatten(results)
+    regressions = []
+    for name, old in flatten(baseline).items():
+        new = current.get(name)
+        leaf = name.rsplit('.', 1)[-1]
+        if new is None or not old or leaf in NOT_COMPARED:
+            continue
+        change = (new - old) / abs(old)
+        higher_is_better = any(marker in leaf for marker in HIGHER_IS_BETTER)
+        if (-change if higher_is_better else change) > threshold:
+            regressions.append((name, old, new, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sites', type=int, default=2000)
+    parser.add_argument('--checks', type=int, default=200000, help='Historical checks to seed, in total')
+    parser.add_argument('--origins', type=int, default=8, help='Stub servers to spread the sites over (distinct hosts)')
+    parser.add_argument('--latency-ms', type=int, default=20)
+    parser.add_argument('--latency-jitter-ms', type=int, default=30)
+    parser.add_argument('--error-rate', type=float, default=0.05)
+    parser.add_argument('--hang-rate', type=float, default=0.01)
+    parser.add_argument('--timeout', type=float, default=2.0, help='Check timeout in seconds (hangs cost this)')
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--per-host-limit', type=int, default=64)
+    parser.add_argument('--requests', type=int, default=200, help='Requests per API endpoint')
+    parser.add_argument('--per-page', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the JSON results here instead of stdout')
+    parser.add_argument('--compare', help='Baseline JSON results to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.20, help='Allowed relative regression')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    servers = [
+        StubServer(latency_ms=args.latency_ms, latency_jitter_ms=args.latency_jitter_ms,
+                   error_rate=args.error_rate, hang_rate=args.hang_rate, seed=args.seed + n).start()
+        for n in range(args.origins)
+    ]
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'suite.db')
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{path}", 'LOG_LEVEL': 'ERROR'})
+        with app.app_context():
+            db.create_all()
+            website_ids, results['seed'] = run_seed(args, path, [server.url for server in servers], rng)
+            print(f"seeded {results['seed']['sites']} sites, {results['seed']['checks']} checks", file=sys.stderr)
+            results['sweep'] = run_sweep(args, app, path, servers)
+            print(f"sweep: {results['sweep']['checks_per_second']} checks/s", file=sys.stderr)
+            results['api'] = run_api(args, app, website_ids, rng)
+            results['memory'] = run_memory(len(website_ids))
+            results['db'] = {'final_bytes': database_bytes(path)}
+            db.engine.dispose()
+    for server in servers:
+        server.stop()
+
+    document = {
+        'schema': SCHEMA_VERSION,
+        'commit': git_commit(),
+        'created_at': datetime.utcnow().isoformat() + 'Z',
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'machine': {'platform': platform.platform(), 'cpus': os.cpu_count()},
+        'parameters': vars(args),
+        'results': results
+    }
+    text = json.dumps(document, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(text + '\n')
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(results, baseline['results'], args.threshold)
+        for name, old, new, change in regressions:
+            print(f"REGRESSION {name}: {old} -> {new} ({change:+.0%})", file=sys.stderr)
+        print(f"{len(regressions)} regressions against {baseline.get('commit')} "
+              f"(threshold {args.threshold:.0%})", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
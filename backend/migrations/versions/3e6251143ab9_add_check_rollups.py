@@ -0,0 +1,45 @@
+"""Add check rollup tables
+
+Revision ID: 3e6251143ab9
+Revises: 4e377f5306cf
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3e6251143ab9'
+down_revision = '4e377f5306cf'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('check_rollups',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('website_id', sa.Integer(), nullable=False),
+    sa.Column('resolution', sa.Integer(), nullable=False),
+    sa.Column('bucket_start', sa.DateTime(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('up_count', sa.Integer(), nullable=False),
+    sa.Column('min_response_ms', sa.Integer(), nullable=True),
+    sa.Column('max_response_ms', sa.Integer(), nullable=True),
+    sa.Column('sum_response_ms', sa.BigInteger(), nullable=False),
+    sa.Column('sketch', sa.Text(), nullable=True),
+    sa.ForeignKeyConstraint(['website_id'], ['websites.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('website_id', 'resolution', 'bucket_start', name='uq_check_rollups_bucket')
+    )
+    op.create_table('rollup_state',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('last_check_id', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('rollup_state')
+    op.drop_table('check_rollups')
@@ -0,0 +1,33 @@
+"""Add indexes for checks hot queries
+
+Revision ID: 4e377f5306cf
+Revises: a413b80efcc6
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4e377f5306cf'
+down_revision = 'a413b80efcc6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        'ix_checks_website_id_checked_at', 'checks',
+        ['website_id', sa.text('checked_at DESC')], unique=False
+    )
+    op.create_index(
+        'ix_checks_failures', 'checks',
+        ['website_id', sa.text('checked_at DESC')], unique=False,
+        sqlite_where=sa.text('NOT is_up'), postgresql_where=sa.text('NOT is_up')
+    )
+
+
+def downgrade():
+    op.drop_index('ix_checks_failures', table_name='checks')
+    op.drop_index('ix_checks_website_id_checked_at', table_name='checks')
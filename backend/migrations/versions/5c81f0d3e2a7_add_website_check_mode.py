@@ -0,0 +1,34 @@
+"""Add check mode settings to websites
+
+Revision ID: 5c81f0d3e2a7
+Revises: b7d2c94e1a3f
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c81f0d3e2a7'
+down_revision = 'b7d2c94e1a3f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('websites', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('check_mode', sa.String(length=10), nullable=False,
+                                      server_default='partial'))
+        batch_op.add_column(sa.Column('check_max_bytes', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('check_keyword', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('check_keyword_is_regex', sa.Boolean(), nullable=False,
+                                      server_default=sa.false()))
+
+
+def downgrade():
+    with op.batch_alter_table('websites', schema=None) as batch_op:
+        batch_op.drop_column('check_keyword_is_regex')
+        batch_op.drop_column('check_keyword')
+        batch_op.drop_column('check_max_bytes')
+        batch_op.drop_column('check_mode')
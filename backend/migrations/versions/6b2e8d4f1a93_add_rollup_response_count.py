@@ -0,0 +1,41 @@
+"""Add response_count to check_rollups
+
+Revision ID: 6b2e8d4f1a93
+Revises: 9d4f6b8a2c15
+Create Date: 2026-10-17 20:00:00.000000
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6b2e8d4f1a93'
+down_revision = '9d4f6b8a2c15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('check_rollups', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('response_count', sa.Integer(), nullable=False, server_default='0'))
+
+    # Every response time went into the bucket's sketch, so its total is
+    # exactly the number of checks that had one
+    connection = op.get_bind()
+    rollups = sa.table('check_rollups', sa.column('id', sa.Integer), sa.column('sketch', sa.Text),
+                       sa.column('response_count', sa.Integer))
+    rows = connection.execute(sa.select(rollups.c.id, rollups.c.sketch).where(rollups.c.sketch.isnot(None)))
+    updates = []
+    for rollup_id, sketch in rows:
+        raw = json.loads(sketch)
+        updates.append({'_id': rollup_id, 'response_count': raw['z'] + sum(count for _, count in raw['b'])})
+    if updates:
+        connection.execute(rollups.update().where(rollups.c.id == sa.bindparam('_id')), updates)
+
+
+def downgrade():
+    with op.batch_alter_table('check_rollups', schema=None) as batch_op:
+        batch_op.drop_column('response_count')
@@ -0,0 +1,36 @@
+"""Add latency_baselines table
+
+Revision ID: 9d4f6b8a2c15
+Revises: 0a7e2c4b6d81
+Create Date: 2026-10-17 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d4f6b8a2c15'
+down_revision = '0a7e2c4b6d81'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('latency_baselines',
+    sa.Column('website_id', sa.Integer(), nullable=False),
+    sa.Column('mean_ms', sa.Float(), nullable=False),
+    sa.Column('variance', sa.Float(), nullable=False),
+    sa.Column('samples', sa.Integer(), nullable=False),
+    sa.Column('anomalous_checks', sa.Integer(), nullable=False),
+    sa.Column('normal_checks', sa.Integer(), nullable=False),
+    sa.Column('degraded_since', sa.DateTime(), nullable=True),
+    sa.Column('last_response_ms', sa.Integer(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['website_id'], ['websites.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('website_id')
+    )
+
+
+def downgrade():
+    op.drop_table('latency_baselines')
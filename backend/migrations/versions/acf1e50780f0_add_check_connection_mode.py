@@ -0,0 +1,26 @@
+"""Add connection mode to checks
+
+Revision ID: acf1e50780f0
+Revises: 3e6251143ab9
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'acf1e50780f0'
+down_revision = '3e6251143ab9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('checks', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('connection_mode', sa.String(length=10), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('checks', schema=None) as batch_op:
+        batch_op.drop_column('connection_mode')
@@ -0,0 +1,34 @@
+"""Add per-phase timings to checks
+
+Revision ID: b7d2c94e1a3f
+Revises: acf1e50780f0
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d2c94e1a3f'
+down_revision = 'acf1e50780f0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('checks', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('dns_ms', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('connect_ms', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('tls_ms', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('ttfb_ms', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('download_ms', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('checks', schema=None) as batch_op:
+        batch_op.drop_column('download_ms')
+        batch_op.drop_column('ttfb_ms')
+        batch_op.drop_column('tls_ms')
+        batch_op.drop_column('connect_ms')
+        batch_op.drop_column('dns_ms')
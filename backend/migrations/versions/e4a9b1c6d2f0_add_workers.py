@@ -0,0 +1,37 @@
+"""Add workers table and website updated_at
+
+Revision ID: e4a9b1c6d2f0
+Revises: 5c81f0d3e2a7
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a9b1c6d2f0'
+down_revision = '5c81f0d3e2a7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('workers',
+    sa.Column('id', sa.String(length=100), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=False),
+    sa.Column('heartbeat_at', sa.DateTime(), nullable=False),
+    sa.Column('shard_size', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('websites', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_websites_updated_at'), ['updated_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('websites', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_websites_updated_at'))
+        batch_op.drop_column('updated_at')
+
+    op.drop_table('workers')
@@ -0,0 +1,37 @@
+"""Add website_states table
+
+Revision ID: f1c3d5e7a9b2
+Revises: e4a9b1c6d2f0
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1c3d5e7a9b2'
+down_revision = 'e4a9b1c6d2f0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('website_states',
+    sa.Column('website_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=10), nullable=True),
+    sa.Column('consecutive_failures', sa.Integer(), nullable=False),
+    sa.Column('consecutive_successes', sa.Integer(), nullable=False),
+    sa.Column('recent_results', sa.Integer(), nullable=False),
+    sa.Column('recent_count', sa.Integer(), nullable=False),
+    sa.Column('is_flapping', sa.Boolean(), nullable=False),
+    sa.Column('changed_at', sa.DateTime(), nullable=True),
+    sa.Column('notified_status', sa.String(length=10), nullable=True),
+    sa.Column('notified_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['website_id'], ['websites.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('website_id')
+    )
+
+
+def downgrade():
+    op.drop_table('website_states')
@@ -1,12 +1,22 @@
 # Simplified version to ensure the Flask server starts correctly
 from flask import Flask, jsonify, request
 from flask_cors import CORS
-import logging
 import datetime
+import json
 import threading
 import time
 import requests
 from concurrent.futures import ThreadPoolExecutor
+from app.utils.scheduler import CheckScheduler
+from app.utils.status_cache import StatusCache, etag_response
+from app.utils.events import EventBroker
+from app.utils.history import HistoryStore, format_timestamp
+from app.utils.breaker import CheckGuard
+from app.utils.anomaly import LatencyDetector
+from app.routes.stream import stream_bp
+from app.routes.telemetry import telemetry_bp
+from app.utils.log import configure_logging, log_check
+from app.utils.telemetry import CHECKS_IN_FLIGHT, SWEEP_CHECKS_PER_SECOND, SWEEP_DURATION, record_check
 
 # Create a basic Flask app
 app = Flask(__name__)
@@ -18,8 +28,11 @@ CORS(app, resources={
     }
 })
 
-# Set up logging
-app.logger.setLevel(logging.DEBUG)
+# Structured logging; per-check lines are sampled (see app.utils.log)
+configure_logging(app)
+
+# Monitor internals for Prometheus at /metrics
+app.register_blueprint(telemetry_bp)
 
 # Create a test endpoint
 @app.route('/api/test', methods=['GET'])
@@ -30,34 +43,80 @@ def test():
 # Simple in-memory storage for websites (not persistent - will reset when server restarts)
 websites = []
 
-# Storage for website check history
-check_history = {}
+# Index of websites by ID so due checks can be looked up directly
+websites_by_id = {}
+
+# Latest 100 checks of each website, in compact ring buffers
+check_history = HistoryStore(capacity=100)
+
+# Schedules each website according to its check_interval_minutes
+scheduler = CheckScheduler()
+
+# Latest status of each website plus dashboard totals, updated as checks finish
+status_cache = StatusCache()
+
+# Adaptive timeouts, and circuit breaking for hosts that stop answering
+check_guard = CheckGuard()
+
+# Response time baselines, flagging websites that slow down
+latency_detector = LatencyDetector()
+
+# Pushes finished checks to /api/stream clients
+event_broker = EventBroker(app, follow_database=False)
+app.extensions['event_broker'] = event_broker
+app.register_blueprint(stream_bp)
 
 # Function to check a website's status
 def check_website(website):
     start_time = time.time()
     website_id = website['id']
     url = website['url']
-    app.logger.info(f"Checking website {website['name']} ({url})")
-    
-    try:
-        response = requests.get(url, timeout=10)
-        end_time = time.time()
-        response_time_ms = int((end_time - start_time) * 1000)
-        status_code = response.status_code
-        is_up = 200 <= status_code < 400
-        status = 'up' if is_up else 'down'
-        
-        app.logger.info(f"Website {website['name']} is {status} - Status code: {status_code} - Response time: {response_time_ms}ms")
-    except Exception as e:
-        end_time = time.time()
-        response_time_ms = int((end_time - start_time) * 1000)
+    error_message = None
+    timed_out = False
+    key = check_guard.host_key(url)
+    allowance, circuit_error = check_guard.before(key, website_id)
+    
+    if circuit_error:
+        # Host isn't answering; recorded as down without waiting out a timeout
+        response_time_ms = 0
         status_code = 0
         is_up = False
         status = 'down'
-        app.logger.error(f"Error checking website {website['name']}: {str(e)}")
+        error_message = circuit_error
+    else:
+        CHECKS_IN_FLIGHT.inc()
+        try:
+            try:
+                response = requests.get(url, timeout=allowance)
+            except requests.exceptions.Timeout:
+                # Only the learnt allowance may have run out; give the site
+                # the rest of the configured timeout before calling it down
+                retry = check_guard.retry_timeout(allowance, time.time() - start_time)
+                if retry is None:
+                    raise
+                response = requests.get(url, timeout=retry)
+            end_time = time.time()
+            response_time_ms = int((end_time - start_time) * 1000)
+            status_code = response.status_code
+            is_up = 200 <= status_code < 400
+            status = 'up' if is_up else 'down'
+        except Exception as e:
+            end_time = time.time()
+            response_time_ms = int((end_time - start_time) * 1000)
+            status_code = 0
+            is_up = False
+            status = 'down'
+            error_message = str(e)
+            timed_out = isinstance(e, requests.exceptions.Timeout)
+        finally:
+            CHECKS_IN_FLIGHT.dec()
+        check_guard.after(key, end_time - start_time, status_code != 0, timed_out, error_message, website_id)
+    
+    record_check(url, is_up, status_code)
+    log_check(website_id, url, is_up, status_code, response_time_ms, error_message)
     
-    timestamp = datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
+    checked_at = int(time.time())
+    timestamp = format_timestamp(checked_at)
     
     # Create check result
     check_result = {
@@ -69,17 +128,30 @@ def check_website(website):
         'status_code': status_code
     }
     
-    # Initialize history for this website if it doesn't exist
-    if website_id not in check_history:
-        check_history[website_id] = []
+    # Add to history (the oldest check drops out after 100)
+    check_history.append(website_id, checked_at, status_code, response_time_ms, is_up)
+    
+    change = latency_detector.observe(website_id, response_time_ms, is_up)
+    if change:
+        app.logger.warning(f"Website {website_id} response times {change}")
     
-    # Add to history (limit to 100 entries per website)
-    check_history[website_id].insert(0, check_result)  # Add at the beginning
-    if len(check_history[website_id]) > 100:
-        check_history[website_id] = check_history[website_id][:100]
+    previous = status_cache.get(website_id)
+    status_cache.update(website_id, {**check_result, 'checked_at': timestamp})
+    event_broker.on_check(None, website_id, check_result, previous)
+    event_broker.publish_stats(status_cache.stats(len(websites)))
     
     return check_result
 
+# Function to check a batch of websites
+def check_websites(batch):
+    # Use thread pool to check websites concurrently
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        executor.map(check_website, batch)
+    elapsed = time.perf_counter() - start
+    SWEEP_DURATION.observe(elapsed)
+    SWEEP_CHECKS_PER_SECOND.set(len(batch) / max(elapsed, 1e-6))
+
 # Function to check all websites
 def check_all_websites():
     app.logger.info("Starting check of all websites")
@@ -87,23 +159,38 @@ def check_all_websites():
         app.logger.info("No websites to check")
         return
 
-    # Use thread pool to check websites concurrently
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        executor.map(check_website, websites)
+    check_websites(websites)
     
     app.logger.info("Finished checking all websites")
 
-# Background thread to periodically check websites
+# Function to check only the websites that are due
+def check_due_websites():
+    due = [websites_by_id[website_id] for website_id in scheduler.pop_due()
+           if website_id in websites_by_id]
+    if due:
+        app.logger.info(f"Checking {len(due)} due websites")
+        check_websites(due)
+
+# Add a website to the schedule (or update its interval)
+def schedule_website(website, first_check_within=None):
+    if website.get('is_active', True):
+        scheduler.schedule(website['id'], website.get('check_interval_minutes'), first_check_within)
+    else:
+        scheduler.remove(website['id'])
+
+# Background thread to run checks as they become due
 def website_monitor_thread():
     app.logger.info("Starting website monitor thread")
+    for website in websites:
+        schedule_website(website)
+
     while True:
+        # Sleep until the next check is due (or a website is added)
+        scheduler.wait()
         try:
-            check_all_websites()
+            check_due_websites()
         except Exception as e:
             app.logger.error(f"Error in website monitor thread: {str(e)}")
-        
-        # Sleep for 60 seconds (check every minute)
-        time.sleep(60)
 
 # Start monitoring thread when app starts
 @app.before_first_request
@@ -117,8 +204,19 @@ def start_monitoring_thread():
 @app.route('/api/websites', methods=['GET'])
 def get_websites():
     app.logger.info('GET /api/websites called')
-    # Return the websites from our simple in-memory storage
-    return jsonify(websites)
+    # Return the websites from our simple in-memory storage (304 if unchanged)
+    return etag_response(status_cache, lambda: websites)
+
+@app.route('/api/websites/degraded', methods=['GET'])
+def get_degraded_websites():
+    app.logger.info('GET /api/websites/degraded called')
+    
+    # Websites whose response times are flagged, longest first
+    return jsonify([
+        {'website_id': website_id, 'name': websites_by_id[website_id]['name'],
+         'url': websites_by_id[website_id]['url'], **baseline.to_dict()}
+        for website_id, baseline in latency_detector.degraded() if website_id in websites_by_id
+    ])
 
 @app.route('/api/websites/<int:website_id>', methods=['GET'])
 def get_website(website_id):
@@ -150,6 +248,9 @@ def create_website():
     
     # Add the new website to our in-memory storage
     websites.append(new_website)
+    websites_by_id[new_id] = new_website
+    status_cache.touch()
+    schedule_website(new_website, first_check_within=10)
     
     app.logger.info(f'Added website: {new_website}')
     return jsonify(new_website), 201
@@ -170,18 +271,20 @@ def get_website_status(website_id):
         return jsonify({'error': 'Website not found'}), 404
     
     # Check if we have history for this website
-    if website_id in check_history and check_history[website_id]:
-        latest_check = check_history[website_id][0]  # Most recent check
-        history = check_history[website_id]
+    history = check_history.get(website_id)
+    if history:
+        latest_check = history.latest(website_id)  # Most recent check
         
-        return jsonify({
+        # The history is written as JSON straight from the ring buffer
+        summary = json.dumps({
             'website_id': website_id,
             'status': latest_check['status'],
             'response_time_ms': latest_check['response_time_ms'],
             'status_code': latest_check['status_code'],
-            'last_checked': latest_check['timestamp'],
-            'history': history
+            'last_checked': latest_check['timestamp']
         })
+        body = f'{summary[:-1]}, "history": {history.to_json(website_id)}}}'
+        return app.response_class(body, mimetype='application/json')
     else:
         # If no history yet, perform a check now
         check_result = check_website(website)
@@ -200,27 +303,10 @@ def get_website_status(website_id):
 def get_dashboard_stats():
     app.logger.info('GET /api/dashboard called')
     
-    total_websites = len(websites)
-    websites_up = 0
-    websites_down = 0
-    response_times = []
-    
-    for website_id in check_history:
-        if check_history[website_id]:
-            latest_check = check_history[website_id][0]
-            if latest_check['is_up']:
-                websites_up += 1
-            else:
-                websites_down += 1
-            response_times.append(latest_check['response_time_ms'])
-    
-    avg_response_time = sum(response_times) / len(response_times) if response_times else 0
-    
-    return jsonify({
-        'total_websites': total_websites,
-        'websites_up': websites_up,
-        'websites_down': websites_down,
-        'avg_response_time': avg_response_time,
+    # Totals are kept up to date by the status cache, and the 15s dashboard
+    # poll gets a 304 if no check has finished since the last one
+    return etag_response(status_cache, lambda: {
+        **status_cache.stats(len(websites)),
         'last_updated': datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
     })
 
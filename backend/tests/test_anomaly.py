@@ -0,0 +1,121 @@
+"""Response time baselines and the degraded flag"""
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import LatencyBaseline, Website
+from app.utils.anomaly import DatabaseLatencyDetector, LatencyDetector, latency_settings
+
+START = datetime(2024, 1, 1)
+
+
+def settle(detector, website_id=1, checks=40):
+    """A site answering in 100-120ms"""
+    for n in range(checks):
+        detector.observe(website_id, 100 + 20 * (n % 2), checked_at=START + timedelta(minutes=n))
+
+
+def test_baseline_follows_normal_response_times():
+    detector = LatencyDetector()
+    settle(detector)
+    baseline = detector.get(1)
+
+    assert baseline.samples == 40
+    assert 105 < baseline.mean < 115
+    assert 5 < baseline.deviation < 15
+    # Failed checks and missing timings aren't response times
+    assert detector.observe(1, 5000, is_up=False) is None
+    assert detector.observe(1, None) is None
+    assert detector.get(1).samples == 40
+
+
+def test_nothing_is_flagged_before_min_samples():
+    detector = LatencyDetector(min_samples=20)
+    settle(detector, checks=10)
+
+    assert [detector.observe(1, 2000) for _ in range(5)] == [None] * 5
+    assert detector.degraded() == []
+
+
+def test_sustained_slowdown_is_flagged_then_cleared():
+    detector = LatencyDetector(trigger_checks=3, recover_checks=2)
+    settle(detector)
+
+    changes = [detector.observe(1, 400, checked_at=START + timedelta(hours=1, minutes=n)) for n in range(3)]
+    assert changes == [None, None, 'degraded']
+    (website_id, baseline), = detector.degraded()
+    assert website_id == 1 and baseline.degraded_since == START + timedelta(hours=1, minutes=2)
+    assert baseline.last_response_ms == 400
+
+    # One normal check in between starts the recovery count over
+    assert detector.observe(1, 110) is None
+    assert detector.observe(1, 400) is None
+    assert [detector.observe(1, 110) for _ in range(2)] == [None, 'recovered']
+    assert detector.degraded() == []
+
+
+def test_spikes_do_not_inflate_the_baseline():
+    detector = LatencyDetector()
+    settle(detector)
+    before = detector.get(1)
+    mean, deviation = before.mean, before.deviation
+
+    # Isolated spikes, never enough in a row to flag
+    for n in range(10):
+        detector.observe(1, 10000)
+        detector.observe(1, 110)
+    after = detector.get(1)
+
+    assert detector.degraded() == []
+    assert after.deviation < 2 * deviation
+    # Each spike moved the mean by at most alpha times the threshold distance
+    assert after.mean < mean + 10 * 0.05 * 50 + 1
+
+
+def test_a_lasting_slowdown_becomes_the_new_normal():
+    detector = LatencyDetector()
+    settle(detector)
+
+    changes = [detector.observe(1, 400) for _ in range(300)]
+
+    assert changes.count('degraded') == 1 and changes.count('recovered') == 1
+    assert changes.index('degraded') < changes.index('recovered')
+    assert 350 < detector.get(1).mean <= 400
+
+
+def test_settings_come_from_config(app):
+    app.config['LATENCY_THRESHOLD'] = '4.5'
+    app.config['LATENCY_MIN_SAMPLES'] = 'many'
+
+    settings = latency_settings(app)
+
+    assert settings['threshold'] == 4.5
+    # Unusable values fall back to the default
+    assert settings['min_samples'] == 20
+    assert LatencyDetector(**settings).trigger_checks == 3
+
+
+def test_baselines_survive_a_restart(app):
+    website = Website(name='Site', url='http://site.test')
+    db.session.add(website)
+    db.session.commit()
+
+    clock = [0.0]
+    detector = DatabaseLatencyDetector(save_interval=30, clock=lambda: clock[0])
+    settle(detector, website.id)
+    # Nothing is written until the interval has passed
+    assert detector.save() == 0
+    clock[0] = 30
+    assert detector.save() == 1
+
+    # A flag change is written straight away
+    for n in range(3):
+        detector.observe(website.id, 400)
+    assert detector.save() == 1
+    row = db.session.get(LatencyBaseline, website.id)
+    assert row.samples == 43 and row.degraded_since is not None
+
+    restarted = DatabaseLatencyDetector()
+    assert restarted.observe(website.id, 110) is None
+    baseline = restarted.get(website.id)
+    assert baseline.samples == 44 and baseline.degraded_since == row.degraded_since
+    assert [website_id for website_id, _ in restarted.degraded()] == [website.id]
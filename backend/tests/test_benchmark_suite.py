@@ -0,0 +1,94 @@
+"""The stub origin and the benchmark suite's run and --compare"""
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+
+import pytest
+
+from benchmarks.stub_server import StubServer
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def stubs():
+    started = []
+
+    def start(**options):
+        started.append(StubServer(**options).start())
+        return started[-1]
+
+    yield start
+    for server in started:
+        server.stop()
+
+
+def get(server, path, timeout=5):
+    connection = http.client.HTTPConnection(server.host, server.port, timeout=timeout)
+    try:
+        connection.request('GET', path)
+        response = connection.getresponse()
+        return response.status, response.read()
+    finally:
+        connection.close()
+
+
+def suite(*args):
+    return subprocess.run([sys.executable, 'benchmarks/suite.py', *args], cwd=BACKEND,
+                          capture_output=True, text=True, timeout=120)
+
+
+def test_stub_server_directives(stubs):
+    server = stubs(body_size=1000)
+
+    status, body = get(server, '/')
+    assert status == 200 and len(body) == 1000
+    assert get(server, '/status/429')[0] == 429
+    assert get(server, '/delay/10/anything?x=1')[0] == 200
+    with pytest.raises(socket.timeout):
+        get(server, '/hang', timeout=0.2)
+
+    assert (server.requests_served, server.errors_served, server.hangs) == (3, 1, 1)
+
+
+def test_stub_server_faults_are_seeded(stubs):
+    def statuses(server):
+        return [get(server, '/', timeout=0.2)[0] for _ in range(20)]
+
+    first = statuses(stubs(error_rate=0.5, seed=3))
+    assert first == statuses(stubs(error_rate=0.5, seed=3))
+    assert set(first) == {200, 503}
+
+
+def test_suite_run_and_compare(tmp_path):
+    base = tmp_path / 'base.json'
+    result = suite('--sites', '20', '--checks', '200', '--requests', '3', '--origins', '2',
+                   '--timeout', '0.5', '--error-rate', '0.2', '--hang-rate', '0.1', '--output', str(base))
+    assert result.returncode == 0, result.stderr
+
+    document = json.loads(base.read_text())
+    assert document['parameters']['sites'] == 20
+    results = document['results']
+    assert (results['seed']['sites'], results['seed']['checks']) == (20, 200)
+    sweep = results['sweep']
+    assert sweep['sites'] == sweep['check_latency']['count'] == 20
+    # Every hang and error the origins injected shows up as a failed check
+    assert sweep['failures'] >= sweep['errors'] + sweep['hangs'] > 0
+    assert results['api']['checks_pagination']['pages'] == 3
+
+    # Against a baseline that was far faster, the second run fails --compare
+    baseline = json.loads(base.read_text())
+    baseline['results']['sweep']['checks_per_second'] *= 100
+    baseline['results']['api']['websites']['p50_ms'] /= 100
+    faster = tmp_path / 'faster.json'
+    faster.write_text(json.dumps(baseline))
+    result = suite('--sites', '20', '--checks', '200', '--requests', '3', '--origins', '2',
+                   '--timeout', '0.5', '--output', str(tmp_path / 'new.json'), '--compare', str(faster))
+    assert result.returncode == 1
+    assert 'REGRESSION sweep.checks_per_second' in result.stderr
+    assert 'REGRESSION api.websites.p50_ms' in result.stderr
+    # Descriptive counts are never compared
+    assert 'seed.sites' not in result.stderr
@@ -0,0 +1,164 @@
+"""Adaptive timeouts and the host circuit breaker"""
+import socket
+
+import pytest
+
+from app.utils.breaker import AdaptiveTimeouts, CheckGuard, HostCircuitBreaker, TRIAL_TIMEOUT_SECONDS
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def open_breaker(clock, key='host:80'):
+    breaker = HostCircuitBreaker(failure_threshold=3, probe_interval=10, max_probe_interval=40, clock=clock)
+    for _ in range(3):
+        breaker.record(key, False, 'Connection refused')
+    return breaker
+
+
+def learnt_guard(seconds=1.0, samples=5):
+    guard = CheckGuard(timeouts=AdaptiveTimeouts(ceiling=20.0))
+    for _ in range(samples):
+        guard.after('host:80', seconds, True, site=1)
+    return guard
+
+
+def test_a_timed_out_check_backs_off_once():
+    guard = learnt_guard()
+    allowance, error = guard.before('host:80', 1)
+    assert error is None and 2.0 < allowance < 5.0
+
+    # The allowance runs out, the retry gets the rest and runs out too
+    retry = guard.retry_timeout(allowance, allowance)
+    assert retry == pytest.approx(20.0 - allowance)
+    guard.after('host:80', 20.0, False, timed_out=True, site=1)
+
+    assert guard.before('host:80', 1)[0] == pytest.approx(2 * allowance)
+
+
+def test_a_retry_that_answers_does_not_back_off():
+    guard = learnt_guard()
+    allowance = guard.before('host:80', 1)[0]
+
+    assert guard.retry_timeout(allowance, allowance) is not None
+    guard.after('host:80', allowance + 0.5, True, site=1)
+
+    # Learnt from like any slow answer, with no backoff on top
+    unretried = learnt_guard()
+    unretried.after('host:80', allowance + 0.5, True, site=1)
+    assert guard.before('host:80', 1)[0] == unretried.before('host:80', 1)[0]
+
+
+def test_allowance_is_the_ceiling_until_learnt_and_stays_within_bounds():
+    timeouts = AdaptiveTimeouts(ceiling=10.0, floor=2.0, min_samples=3)
+    timeouts.observe(1, 0.1)
+    timeouts.observe(1, 0.1)
+    assert timeouts.timeout(1) == 10.0
+    timeouts.observe(1, 0.1)
+    # Fast sites get the floor, not a fraction of a second
+    assert timeouts.timeout(1) == 2.0
+
+    timeouts.timed_out(1)
+    assert timeouts.timeout(1) == 4.0
+    for _ in range(10):
+        timeouts.timed_out(1)
+    assert timeouts.timeout(1) == 10.0
+    # Any answer ends the backoff
+    timeouts.observe(1, 0.1)
+    assert timeouts.timeout(1) == 2.0
+
+
+def test_circuit_opens_after_consecutive_failures():
+    clock = Clock()
+    breaker = HostCircuitBreaker(failure_threshold=3, clock=clock)
+    breaker.record('host:80', False)
+    breaker.record('host:80', False)
+    # A response in between resets the count
+    breaker.record('host:80', True)
+    breaker.record('host:80', False)
+    breaker.record('host:80', False)
+    assert breaker.before_check('host:80') == 'check'
+
+    breaker.record('host:80', False, 'Connection refused')
+    assert breaker.open_hosts() == ['host:80']
+    assert breaker.before_check('host:80') == 'skip'
+    assert breaker.before_check('other:80') == 'check'
+    assert breaker.circuit_error('host:80') == \
+        'Host host:80 unreachable, circuit open (probing every 10s): Connection refused'
+
+
+def test_probe_then_trial_closes_or_reopens_with_backoff():
+    clock = Clock()
+    breaker = open_breaker(clock)
+
+    clock.now += 10
+    assert breaker.before_check('host:80') == 'probe'
+    # Only one probe at a time
+    assert breaker.before_check('host:80') == 'skip'
+    breaker.probe_result('host:80', False, 'Connection timed out')
+    assert 'probing every 20s' in breaker.circuit_error('host:80')
+
+    clock.now += 19
+    assert breaker.before_check('host:80') == 'skip'
+    clock.now += 1
+    assert breaker.before_check('host:80') == 'probe'
+    breaker.probe_result('host:80', True)
+    # The caller's check is the trial; nothing else gets through meanwhile
+    assert breaker.before_check('host:80') == 'skip'
+    breaker.record('host:80', False, 'Read timed out')
+    assert 'probing every 40s' in breaker.circuit_error('host:80')
+
+    # Capped, and the trial times out if it never reports
+    for _ in range(2):
+        clock.now += 40
+        assert breaker.before_check('host:80') == 'probe'
+        breaker.probe_result('host:80', False)
+    assert 'probing every 40s' in breaker.circuit_error('host:80')
+    clock.now += 40
+    assert breaker.before_check('host:80') == 'probe'
+    breaker.probe_result('host:80', True)
+    clock.now += TRIAL_TIMEOUT_SECONDS
+    assert breaker.before_check('host:80') == 'probe'
+    breaker.probe_result('host:80', True)
+
+    breaker.record('host:80', True)
+    assert breaker.open_hosts() == []
+    assert breaker.before_check('host:80') == 'check'
+
+
+def test_guard_probes_with_a_tcp_connect():
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen()
+    port = listener.getsockname()[1]
+    key = CheckGuard.host_key(f"http://127.0.0.1:{port}/health")
+    assert key == f"127.0.0.1:{port}"
+
+    clock = Clock()
+    guard = CheckGuard(timeout=10.0, breaker=open_breaker(clock, key))
+    allowance, error = guard.before(key, 1)
+    assert allowance is None and 'circuit open' in error
+
+    # Listening: the probe connects and the check goes ahead as the trial
+    clock.now += 10
+    assert guard.before(key, 1) == (10.0, None)
+    guard.after(key, 0.1, False, error='Connection reset')
+
+    # Not listening any more: the probe fails and the check is skipped
+    listener.close()
+    clock.now += 20
+    allowance, error = guard.before(key, 1)
+    assert allowance is None and 'probing every 40s' in error
+
+
+def test_host_keys():
+    assert CheckGuard.host_key('https://Example.com/a') == 'example.com:443'
+    assert CheckGuard.host_key('http://example.com:8080') == 'example.com:8080'
+    assert CheckGuard.host_key('http://example.com', resolve=lambda host, port: '10.0.0.1') == '10.0.0.1:80'
+    assert CheckGuard.host_key('not a url') is None
+    assert CheckGuard.host_key('http://example.com:bad') is None
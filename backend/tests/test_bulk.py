@@ -0,0 +1,116 @@
+"""Bulk website import and export through /api/websites/bulk and /export"""
+import io
+import json
+
+from app.models import Website
+from app.utils.bulk import BulkImport, normalize_url, read_ndjson
+
+
+def ndjson(*rows):
+    return ''.join((row if isinstance(row, str) else json.dumps(row)) + '\n' for row in rows)
+
+
+def import_rows(client, body, content_type='application/x-ndjson', query=''):
+    response = client.post(f"/api/websites/bulk{query}", data=body, content_type=content_type)
+    return response.status_code, response.get_json()
+
+
+def test_url_normalisation():
+    assert normalize_url('HTTP://Example.com:80/') == 'http://example.com'
+    assert normalize_url('https://example.com:443/a#top') == 'https://example.com/a'
+    assert normalize_url('https://example.com:8443/a?b=1') == 'https://example.com:8443/a?b=1'
+    assert normalize_url('ftp://example.com') is None
+    assert normalize_url('http://example.com:notaport') is None
+
+
+def test_valid_rows_are_written_and_bad_ones_reported_by_line(client):
+    body = ndjson(
+        {'name': 'One', 'url': 'http://one.test'},
+        '',
+        {'name': 'Two', 'url': 'https://two.test/', 'check_interval_minutes': 1, 'is_active': False},
+        '{not json',
+        ['a', 'list'],
+        {'url': 'http://nameless.test'},
+        {'name': 'Bad interval', 'url': 'http://interval.test', 'check_interval_minutes': 0},
+        {'name': 'Bad mode', 'url': 'http://mode.test', 'check_mode': 'sideways'},
+        {'name': 'Again', 'url': 'HTTP://ONE.test:80/'},
+        {'name': 'Extra', 'url': 'http://extra.test', 'colour': 'blue'},
+    )
+    status, result = import_rows(client, body)
+
+    assert status == 200
+    assert (result['rows'], result['created'], result['updated'], result['failed']) == (9, 2, 0, 7)
+    errors = {error['line']: error['error'] for error in result['errors']}
+    assert sorted(errors) == [4, 5, 6, 7, 8, 9, 10]
+    assert errors[4].startswith('Invalid JSON')
+    assert errors[6] == 'name is required'
+    assert errors[9] == 'Duplicate of line 1'
+    assert errors[10] == 'Unknown fields: colour'
+    two = Website.query.filter_by(name='Two').one()
+    assert (two.url, two.check_interval_minutes, two.is_active) == ('https://two.test/', 1, False)
+    assert Website.query.count() == 2
+
+
+def test_matching_urls_update_existing_websites(client):
+    import_rows(client, ndjson({'name': 'Site', 'url': 'http://site.test/', 'check_interval_minutes': 5}))
+
+    status, result = import_rows(client, ndjson({'url': 'http://SITE.test', 'check_interval_minutes': 10}))
+
+    assert status == 200
+    assert (result['created'], result['updated'], result['failed']) == (0, 1, 0)
+    site, = Website.query.all()
+    # An update may leave out the name and keeps the row's spelling of the URL
+    assert (site.name, site.url, site.check_interval_minutes) == ('Site', 'http://SITE.test', 10)
+
+
+def test_csv_import_converts_values_and_rejects_unknown_columns(client):
+    body = ('name,url,check_interval_minutes,is_active\n'
+            'One,http://one.test,15,no\n'
+            'Two,http://two.test,,\n'
+            'Three,http://three.test,often,yes\n')
+    status, result = import_rows(client, body, 'text/csv')
+
+    assert status == 200
+    assert (result['created'], result['failed']) == (2, 1)
+    assert result['errors'][0]['line'] == 4
+    one, two = Website.query.order_by(Website.name).all()
+    assert (one.check_interval_minutes, one.is_active) == (15, False)
+    assert (two.check_interval_minutes, two.is_active) == (5, True)
+
+    status, result = import_rows(client, 'name,url,owner\nX,http://x.test,me\n', query='?format=csv')
+    assert result['errors'] == [{'line': 1, 'url': None, 'error': 'Unknown CSV columns: owner'}]
+
+
+def test_rows_and_errors_past_the_limits_are_dropped(app):
+    body = ndjson(*({'name': f"Site {n}", 'url': f"http://site{n}.test"} for n in range(8)))
+
+    bulk = BulkImport(chunk_size=2, max_rows=5, max_errors=2).run(read_ndjson(io.BytesIO(body.encode())))
+
+    assert (bulk.created, bulk.error_count) == (5, 3)
+    assert bulk.errors[0]['error'] == 'Too many rows, at most 5 per import'
+    assert len(bulk.errors) == 2 and bulk.result()['errors_truncated']
+    assert Website.query.count() == 5
+    # Written in chunks of two, so every created website is queued for scheduling
+    assert len(bulk.changed) == 5
+
+
+def test_empty_and_unknown_format_are_rejected(client):
+    assert import_rows(client, '\n\n')[0] == 400
+    assert import_rows(client, ndjson({'name': 'A', 'url': 'http://a.test'}), query='?format=xml')[0] == 400
+
+
+def test_export_round_trips_through_import(client):
+    import_rows(client, ndjson({'name': 'One', 'url': 'http://one.test', 'check_keyword': 'ok',
+                                'check_mode': 'keyword'},
+                               {'name': 'Two', 'url': 'http://two.test', 'is_active': False}))
+
+    exported = client.get('/api/websites/export').get_data(as_text=True)
+    rows = [json.loads(line) for line in exported.splitlines()]
+    assert [row['name'] for row in rows] == ['One', 'Two']
+    assert rows[0]['check_keyword'] == 'ok' and rows[1]['is_active'] is False
+
+    csv_export = client.get('/api/websites/export?format=csv')
+    assert csv_export.mimetype == 'text/csv'
+    status, result = import_rows(client, csv_export.get_data(as_text=True), 'text/csv')
+    # Every exported row matches the website it came from
+    assert (result['created'], result['updated'], result['failed']) == (0, 2, 0)
@@ -0,0 +1,76 @@
+"""Keyset (cursor) pagination of a website's check history"""
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import Check, Website
+from app.routes import websites
+
+
+def seed_checks(count, same_time_every=3):
+    """count checks, newest first, with runs of same_time_every sharing a timestamp"""
+    website = Website(name='Site', url='http://site.test')
+    db.session.add(website)
+    db.session.commit()
+    start = datetime(2026, 9, 1)
+    db.session.execute(Check.__table__.insert(), [
+        {'website_id': website.id, 'status_code': 200, 'is_up': True, 'response_time_ms': n,
+         'checked_at': start + timedelta(minutes=n // same_time_every)}
+        for n in range(count)
+    ])
+    db.session.commit()
+    return website.id
+
+
+def walk(client, website_id, per_page, **params):
+    pages = []
+    cursor = ''
+    while cursor is not None:
+        response = client.get(f'/api/websites/{website_id}/checks',
+                              query_string={'cursor': cursor, 'per_page': per_page, **params})
+        assert response.status_code == 200
+        body = response.get_json()
+        pages.append(body)
+        cursor = body['pagination']['next_cursor']
+        assert body['pagination']['has_more'] == (cursor is not None)
+    return pages
+
+
+def test_pages_cover_every_check_once_newest_first(client, app):
+    website_id = seed_checks(23)
+
+    pages = walk(client, website_id, 5)
+    assert [len(page['checks']) for page in pages] == [5, 5, 5, 5, 3]
+    ids = [check['id'] for page in pages for check in page['checks']]
+    assert len(ids) == len(set(ids)) == 23
+    # Ties on checked_at are broken by ID, so none is skipped or repeated
+    keys = [(check['checked_at'], check['id']) for page in pages for check in page['checks']]
+    assert keys == sorted(keys, reverse=True)
+    assert pages[0]['pagination']['total'] is None
+
+
+def test_new_checks_do_not_shift_later_pages(client, app):
+    website_id = seed_checks(10)
+    first = client.get(f'/api/websites/{website_id}/checks?cursor=&per_page=4').get_json()
+
+    db.session.add(Check(website_id=website_id, is_up=True, checked_at=datetime(2026, 10, 1)))
+    db.session.commit()
+    second = client.get(f'/api/websites/{website_id}/checks',
+                        query_string={'cursor': first['pagination']['next_cursor'], 'per_page': 4}).get_json()
+
+    first_ids = {check['id'] for check in first['checks']}
+    assert not first_ids & {check['id'] for check in second['checks']}
+    assert max(check['id'] for check in second['checks']) < min(first_ids)
+
+
+def test_totals_and_bad_cursors(client, app, monkeypatch):
+    website_id = seed_checks(12)
+    monkeypatch.setattr(websites, 'TOTAL_COUNT_CAP', 10)
+    url = f'/api/websites/{website_id}/checks?cursor=&per_page=500'
+
+    exact = client.get(url + '&total=exact').get_json()['pagination']
+    assert exact['total'] == 12 and exact['per_page'] == 100
+    capped = client.get(url + '&total=capped').get_json()['pagination']
+    assert (capped['total'], capped['total_capped']) == (10, True)
+
+    assert client.get(f'/api/websites/{website_id}/checks?cursor=not-a-cursor').status_code == 400
+    assert client.get('/api/websites/999/checks?cursor=').status_code == 404
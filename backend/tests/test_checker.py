@@ -0,0 +1,20 @@
+"""Single-site checks over requests"""
+from app import db
+from app.models import Check, Website
+from app.utils import checker
+
+
+def test_unexpected_error_is_recorded_as_a_down_check(app, monkeypatch):
+    website = Website(name='Site', url='http://site.test')
+    db.session.add(website)
+    db.session.commit()
+
+    def broken_fetch(*args, **kwargs):
+        raise RuntimeError('decoder bug')
+
+    monkeypatch.setattr(checker, '_fetch_within', broken_fetch)
+    check = checker.check_website(website)
+
+    assert not check.is_up
+    assert check.error_message == 'Check failed: RuntimeError: decoder bug'
+    assert Check.query.filter_by(website_id=website.id, is_up=False).count() == 1
@@ -0,0 +1,48 @@
+"""Ring-buffer check history for run.py"""
+import json
+
+from app.utils.history import CheckRing, HistoryStore, format_timestamp
+
+DAY = 86400
+START = 1789000000  # 2026-09-10 00:26:40 UTC
+
+
+def test_ring_keeps_the_latest_checks_newest_first():
+    ring = CheckRing(capacity=4)
+    assert len(ring) == 0 and ring.latest(1) is None and ring.to_json(1) == '[]'
+
+    for n in range(6):
+        ring.append(START + n * 60, 200 if n % 2 == 0 else 0, 100 + n, n % 2 == 0)
+
+    assert len(ring) == 4 and len(ring.timestamps) == 4
+    entries = ring.to_dicts(7)
+    assert [entry['response_time_ms'] for entry in entries] == [105, 104, 103, 102]
+    assert entries[0] == {
+        'website_id': 7, 'timestamp': format_timestamp(START + 300), 'status': 'down', 'is_up': False,
+        'response_time_ms': 105, 'status_code': 0
+    }
+    assert ring.latest(7) == entries[0]
+    assert [entry['response_time_ms'] for entry in ring.to_dicts(7, limit=2)] == [105, 104]
+
+
+def test_json_matches_the_dicts_across_day_boundaries():
+    ring = CheckRing(capacity=50)
+    # Every 47 minutes for about a day and a half, wrapping the ring
+    for n in range(70):
+        ring.append(START + DAY - 3600 + n * 47 * 60 + n, 200, n * 7, n % 3 != 0)
+
+    assert json.loads(ring.to_json(3)) == ring.to_dicts(3)
+    assert json.loads(ring.to_json(3, limit=5)) == ring.to_dicts(3, limit=5)
+
+
+def test_store_keeps_one_ring_per_website():
+    store = HistoryStore(capacity=3)
+    for n in range(5):
+        store.append(1, START + n, 200, n, True)
+    store.append(2, START, 503, 900, False)
+
+    assert len(store) == 2 and 1 in store and 3 not in store
+    assert [entry['response_time_ms'] for entry in store.get(1).to_dicts(1)] == [4, 3, 2]
+    assert store.get(2).latest(2)['status'] == 'down'
+    store.remove(1)
+    assert store.get(1) is None and len(store) == 1
@@ -0,0 +1,183 @@
+"""The engine's asyncio HTTP/1.1 client, against a scripted origin on localhost"""
+import asyncio
+import gzip
+
+import pytest
+
+from app.utils.http_client import HTTPClient, HTTPError, PhaseTimeouts
+
+
+class Origin:
+    """Answers each path with canned raw response bytes and records what it saw"""
+
+    def __init__(self, routes):
+        self.routes = routes
+        self.connections = 0
+        self.requests = []
+        self._server = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.sockets[0].getsockname()[1]}"
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while (line := await reader.readline()) not in (b'\r\n', b''):
+                    name, _, value = line.decode().partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                path = request_line.split()[1].decode()
+                self.requests.append((path, headers))
+                response = self.routes[path]
+                writer.write(response)
+                await writer.drain()
+                if b'Connection: close' in response:
+                    break
+        finally:
+            writer.close()
+
+    async def __aenter__(self):
+        self._server = await asyncio.start_server(self._handle, '127.0.0.1', 0)
+        return self
+
+    async def __aexit__(self, *exc):
+        self._server.close()
+
+
+def ok(body=b'hello', extra=b''):
+    return b'HTTP/1.1 200 OK\r\nContent-Length: ' + str(len(body)).encode() + b'\r\n' + extra + b'\r\n' + body
+
+
+def chunked(*chunks):
+    body = b''.join(f"{len(chunk):x};ext=1\r\n".encode() + chunk + b'\r\n' for chunk in chunks)
+    return (b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n' + body
+            + b'0\r\nX-Trailer: yes\r\n\r\n')
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_chunked_body_is_decoded_and_the_connection_reused():
+    async def main():
+        async with Origin({'/': chunked(b'hello ', b'chunked ', b'world')}) as origin:
+            client = HTTPClient()
+            first = await client.fetch(origin.url + '/', keep_body=True)
+            second = await client.fetch(origin.url + '/')
+            client.close()
+            return origin, first, second
+
+    origin, first, second = run(main())
+    assert first.body == b'hello chunked world'
+    assert first.body_bytes == len(b'hello chunked world')
+    assert not first.truncated
+    # The trailer was consumed, so the same connection served the next request
+    assert (first.connection_mode, second.connection_mode) == ('new', 'reused')
+    assert origin.connections == 1
+
+
+def test_gzip_bodies_are_counted_raw_and_decoded_when_kept():
+    text = b'<html>' + b'status: all systems operational ' * 200 + b'</html>'
+    compressed = gzip.compress(text)
+
+    async def main():
+        # This server compresses whatever the client asked for
+        routes = {'/': ok(compressed, b'Content-Encoding: gzip\r\n')}
+        async with Origin(routes) as origin:
+            client = HTTPClient()
+            counted = await client.fetch(origin.url + '/')
+            kept = await client.fetch(origin.url + '/', keep_body=True, max_body_bytes=100000)
+            limited = await client.fetch(origin.url + '/', keep_body=True, max_body_bytes=64)
+            client.close()
+            return origin, counted, kept, limited
+
+    origin, counted, kept, limited = run(main())
+    assert counted.body_bytes == len(compressed) and counted.body is None
+    assert kept.body == text
+    # The compressed prefix is cut at the limit, and so is what it expands to
+    assert limited.truncated and len(limited.body) <= 64 and text.startswith(limited.body)
+    accept = [headers['accept-encoding'] for _, headers in origin.requests]
+    assert accept == ['gzip, deflate', 'identity', 'identity']
+
+
+def test_body_limit_stops_reading_and_drops_the_connection():
+    async def main():
+        routes = {'/big': ok(b'x' * 200000), '/chunked': chunked(b'y' * 5000, b'y' * 5000), '/': ok()}
+        async with Origin(routes) as origin:
+            client = HTTPClient()
+            big = await client.fetch(origin.url + '/big', max_body_bytes=1000)
+            after = await client.fetch(origin.url + '/')
+            partial = await client.fetch(origin.url + '/chunked', max_body_bytes=7000, keep_body=True)
+            client.close()
+            return big, after, partial
+
+    big, after, partial = run(main())
+    assert (big.body_bytes, big.truncated) == (1000, True)
+    # Unread bytes would corrupt the next response, so that connection was closed
+    assert after.connection_mode == 'new' and after.status_code == 200
+    assert partial.body == b'y' * 7000 and partial.truncated
+
+
+def test_redirects_are_followed_up_to_the_limit():
+    def redirect(location):
+        return b'HTTP/1.1 302 Found\r\nLocation: ' + location + b'\r\nContent-Length: 0\r\n\r\n'
+
+    async def main():
+        routes = {'/a': redirect(b'/b'), '/b': redirect(b'/c?x=1'), '/c?x=1': ok(b'done'),
+                  '/loop': redirect(b'/loop')}
+        async with Origin(routes) as origin:
+            client = HTTPClient()
+            response = await client.fetch(origin.url + '/a', keep_body=True)
+            with pytest.raises(HTTPError, match='Exceeded 3 redirects'):
+                await client.fetch(origin.url + '/loop', max_redirects=3)
+            client.close()
+            return origin, response
+
+    origin, response = run(main())
+    assert response.status_code == 200 and response.body == b'done'
+    assert response.url.endswith('/c?x=1')
+    assert [path for path, _ in origin.requests[:3]] == ['/a', '/b', '/c?x=1']
+    # The first hop opened the connection, so the chain isn't reported as reused,
+    # but every hop (and the loop after it) went over that one connection
+    assert response.connection_mode == 'new'
+    assert origin.connections == 1
+    assert len([path for path, _ in origin.requests if path == '/loop']) == 4
+
+
+def test_keep_alive_cold_requests_and_server_close():
+    async def main():
+        routes = {'/': ok(), '/close': ok(b'bye', b'Connection: close\r\n')}
+        async with Origin(routes) as origin:
+            client = HTTPClient()
+            modes = [(await client.fetch(origin.url + path, cold=cold)).connection_mode
+                     for path, cold in (('/', False), ('/', False), ('/close', False), ('/', False), ('/', True))]
+            client.close()
+            return origin, modes
+
+    origin, modes = run(main())
+    assert modes == ['new', 'reused', 'reused', 'new', 'cold']
+    # new, then a fresh one after the server closed it, then the cold one
+    assert origin.connections == 3
+    assert origin.requests[-1][1]['connection'] == 'close'
+
+
+def test_pooled_connection_the_server_closed_is_not_reused():
+    async def main():
+        async with Origin({'/': ok()}) as origin:
+            client = HTTPClient()
+            await client.fetch(origin.url + '/')
+            # The server drops its idle keep-alive connections
+            for idle in client._idle.values():
+                for connection in idle:
+                    connection.reader.feed_eof()
+            response = await client.fetch(origin.url + '/', timeouts=PhaseTimeouts(total=5))
+            client.close()
+            return response
+
+    response = run(main())
+    assert response.status_code == 200 and response.connection_mode == 'new'
@@ -0,0 +1,86 @@
+"""The Lambda checker's alerting state machine and alert queue"""
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                                'lambda_function'))
+import lambda_function  # noqa: E402
+from lambda_function import AlertQueue, advance_state, alert_status, new_state  # noqa: E402
+
+NOW = datetime(2026, 10, 17, 12, 0)
+
+
+@pytest.fixture(autouse=True)
+def thresholds(monkeypatch):
+    monkeypatch.setattr(lambda_function, 'ALERT_FAILURE_THRESHOLD', 3)
+    monkeypatch.setattr(lambda_function, 'ALERT_RECOVERY_THRESHOLD', 2)
+    monkeypatch.setattr(lambda_function, 'FLAP_WINDOW', 10)
+    monkeypatch.setattr(lambda_function, 'FLAP_START_RATIO', 0.5)
+    monkeypatch.setattr(lambda_function, 'FLAP_STOP_RATIO', 0.25)
+
+
+def feed(state, results):
+    """advance_state for each result; the alert status after each"""
+    statuses = []
+    for n, is_up in enumerate(results):
+        advance_state(state, is_up, NOW + timedelta(minutes=n))
+        statuses.append(alert_status(state))
+    return statuses
+
+
+def test_status_changes_only_once_enough_checks_agree(monkeypatch):
+    # Never flapping, so only the thresholds are in play
+    monkeypatch.setattr(lambda_function, 'FLAP_START_RATIO', 1.0)
+    state = new_state(1)
+    assert feed(state, [True, True]) == [None, 'up']
+    # Two failures are a blip, the third confirms the outage
+    assert feed(state, [False, False, True, False, False, False]) == ['up', 'up', 'up', 'up', 'up', 'down']
+    assert state['changed_at'] == (NOW + timedelta(minutes=5)).isoformat()
+    # One good check doesn't end it
+    assert feed(state, [True, False, True, True]) == ['down', 'down', 'down', 'up']
+
+
+def test_flapping_starts_and_stops_with_hysteresis():
+    state = new_state(1)
+    feed(state, [True] * 10)
+    statuses = feed(state, [False, True] * 5)
+    assert statuses[-1] == 'flapping'
+    assert state['is_flapping']
+    # Still above the stop ratio while the alternation is in the window
+    assert feed(state, [True] * 3)[-1] == 'flapping'
+    assert feed(state, [True] * 7)[-1] == 'up'
+    assert not state['is_flapping']
+
+
+def test_alert_queue_collapses_defers_and_summarises():
+    sent = []
+
+    def send(website, payload):
+        sent.append((website and website['id'], payload['status']))
+        return True
+
+    queue = AlertQueue(min_interval=300, max_per_run=2)
+    states = {website_id: new_state(website_id) for website_id in range(1, 5)}
+    for state in states.values():
+        feed(state, [True, True])
+        queue.offer({'id': state['website_id']}, state, {}, NOW)
+    # A new site coming up is not news
+    assert queue.alerts == [] and states[1]['notified_status'] == 'up'
+
+    for state in states.values():
+        feed(state, [False] * 3)
+        queue.offer({'id': state['website_id']}, state, {'is_up': False}, NOW)
+    assert queue.flush(send, NOW) == 3
+    assert sent == [(1, 'down'), (2, 'down'), (None, 'summary')]
+    assert all(state['notified_status'] == 'down' for state in states.values())
+
+    # Back up within the minimum interval: held back, then sent later
+    feed(states[1], [True, True])
+    queue.offer({'id': 1}, states[1], {}, NOW + timedelta(seconds=60))
+    assert queue.deferred == 1 and queue.alerts == []
+    queue.offer({'id': 1}, states[1], {}, NOW + timedelta(seconds=400))
+    assert queue.flush(send, NOW + timedelta(seconds=400)) == 1
+    assert sent[-1] == (1, 'up')
@@ -0,0 +1,118 @@
+"""The Lambda checker's per-site checks, against a local stub origin (benchmarks/stub_server.py)"""
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import pytest
+
+from app import create_app, db
+from app.models import Check, Website
+from benchmarks.stub_server import StubServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                                'lambda_function'))
+import lambda_function  # noqa: E402
+
+
+@pytest.fixture
+def origin():
+    server = StubServer().start()
+    yield server
+    server.stop()
+
+
+def website(website_id, url, **options):
+    return {'id': website_id, 'name': f"Site {website_id}", 'url': url, 'check_mode': options.get('mode'),
+            'check_max_bytes': None, 'check_keyword': options.get('keyword')}
+
+
+def test_unexpected_error_fails_only_that_site(origin, monkeypatch):
+    fetch = lambda_function.fetch
+
+    def failing_fetch(url, method, cold):
+        if url.endswith('/boom'):
+            raise RuntimeError('decoder bug')
+        return fetch(url, method, cold)
+
+    monkeypatch.setattr(lambda_function, 'fetch', failing_fetch)
+    websites = [website(1, origin.url), website(2, f"{origin.url}/boom"), website(3, f"{origin.url}/status/503")]
+
+    results = {site['id']: result for site, result in lambda_function.run_checks(websites, time.monotonic() + 30)}
+
+    assert results[1]['is_up'] and results[1]['status_code'] == 200
+    assert not results[2]['is_up']
+    assert results[2]['error_message'] == 'Check failed: RuntimeError: decoder bug'
+    assert results[2]['response_time_ms'] is not None
+    assert not results[3]['is_up'] and results[3]['status_code'] == 503
+
+
+class Context:
+    """The part of the Lambda context the handler reads"""
+
+    def __init__(self, seconds):
+        self.deadline = time.monotonic() + seconds
+
+    def get_remaining_time_in_millis(self):
+        return int((self.deadline - time.monotonic()) * 1000)
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """The handler pointed at a fresh database with the backend's schema"""
+    path = str(tmp_path / 'lambda.db')
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{path}", 'SQLALCHEMY_TRACK_MODIFICATIONS': False})
+    with app.app_context():
+        db.create_all()
+        db.engine.dispose()
+    monkeypatch.setattr(lambda_function, 'DATABASE_PATH', path)
+    monkeypatch.setattr(lambda_function, '_conn', None)
+    monkeypatch.setattr(lambda_function, '_websites', {'marker': None, 'rows': []})
+    monkeypatch.setattr(lambda_function, 'NOTIFICATION_CHANNELS', {})
+    yield app
+    if lambda_function._conn is not None:
+        lambda_function._conn.close()
+
+
+def add_websites(app, urls):
+    with app.app_context():
+        db.session.add_all(Website(name=f"Site {n}", url=url, created_at=datetime.utcnow(),
+                                   updated_at=datetime.utcnow()) for n, url in enumerate(urls))
+        db.session.commit()
+        ids = [website.id for website in Website.query.order_by(Website.id)]
+        db.engine.dispose()
+    return ids
+
+
+def test_continuation_token_round_trip():
+    token = lambda_function.encode_continuation_token([5, 3, 9])
+    assert lambda_function.decode_continuation_token(token) == [3, 5, 9]
+    for bad in ('not base64!', lambda_function.encode_continuation_token([]).replace('e', 'x'),
+                lambda_function.base64.urlsafe_b64encode(lambda_function.zlib.compress(b'{"a":1}')).decode()):
+        with pytest.raises(ValueError):
+            lambda_function.decode_continuation_token(bad)
+
+
+def test_sites_past_the_deadline_are_handed_to_the_next_run(database, origin, monkeypatch):
+    monkeypatch.setattr(lambda_function, 'CHECK_CONCURRENCY', 2)
+    monkeypatch.setattr(lambda_function, 'CHECK_TIMEOUT_SECONDS', 0.5)
+    monkeypatch.setattr(lambda_function, 'DEADLINE_RESERVE_SECONDS', 0)
+    monkeypatch.setattr(lambda_function, 'NOTIFY_DISPATCH_SECONDS', 0)
+    ids = add_websites(database, [f"{origin.url}/delay/400"] * 6)
+
+    # Two at a time, each 0.4s, and none may start later than 0.5s in
+    first = json.loads(lambda_function.lambda_handler({}, Context(1.0))['body'])
+    assert len(first['results']) == 4 and first['unchecked'] == 2
+    token = first['continuation_token']
+    remaining = lambda_function.decode_continuation_token(token)
+    assert sorted(remaining + [result['website_id'] for result in first['results']]) == ids
+
+    second = json.loads(lambda_function.lambda_handler({'continuation_token': token}, Context(5.0))['body'])
+    assert sorted(result['website_id'] for result in second['results']) == remaining
+    assert second['continuation_token'] is None
+    with database.app_context():
+        assert Check.query.count() == 6
+
+    response = lambda_function.lambda_handler({'continuation_token': 'garbage'}, Context(5.0))
+    assert response['statusCode'] == 400
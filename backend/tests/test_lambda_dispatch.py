@@ -0,0 +1,160 @@
+"""
+The Lambda checker's notification outbox, delivered to local stub receivers
+(benchmarks/stub_receiver.py; bench_notifications.py runs it at scale).
+"""
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import create_app, db
+from benchmarks.stub_receiver import StubReceiver
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                                'lambda_function'))
+import lambda_function  # noqa: E402
+
+DOWN = {'status': 'down', 'previous_status': 'up', 'is_up': False, 'status_code': 503, 'error_message': None}
+
+
+@pytest.fixture
+def conn(tmp_path):
+    """sqlite3 connection to a database with the backend's schema, as the Lambda sees it"""
+    path = str(tmp_path / 'outbox.db')
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{path}", 'SQLALCHEMY_TRACK_MODIFICATIONS': False})
+    with app.app_context():
+        db.create_all()
+        db.engine.dispose()
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def receivers(monkeypatch):
+    """Starts StubReceivers and routes a notification channel of the same name to each"""
+    started = {}
+
+    def start(**channels):
+        for name, options in channels.items():
+            started[name] = StubReceiver(**options).start()
+        monkeypatch.setattr(lambda_function, 'NOTIFICATION_CHANNELS',
+                            {name: receiver.url for name, receiver in started.items()})
+        return started
+
+    monkeypatch.setattr(lambda_function, 'NOTIFY_BACKOFF_BASE_SECONDS', 30)
+    yield start
+    for receiver in started.values():
+        receiver.stop()
+
+
+def queue(conn, count, now=None):
+    now = now or datetime.utcnow()
+    for n in range(count):
+        lambda_function.notify_status_change(conn, {'id': n, 'name': f"Site {n}"}, DOWN, now)
+    conn.commit()
+
+
+def outbox(conn, channel):
+    return conn.execute("SELECT * FROM notification_outbox WHERE channel = ? ORDER BY id", (channel,)).fetchall()
+
+
+def test_each_channel_gets_its_notifications_in_batches(conn, receivers, monkeypatch):
+    monkeypatch.setattr(lambda_function, 'NOTIFY_BATCH_SIZE', 3)
+    stubs = receivers(first={}, second={})
+    queue(conn, 7)
+
+    metrics = lambda_function.dispatch_notifications(conn)
+
+    assert metrics['delivered'] == 14
+    assert metrics['pending'] == 0
+    for name, stub in stubs.items():
+        # 7 notifications in batches of 3
+        assert stub.requests == 3
+        assert sorted(stub.received) == [row['id'] for row in outbox(conn, name)]
+        assert all(len(times) == 1 for times in stub.received.values())
+        assert {row['status'] for row in outbox(conn, name)} == {'delivered'}
+
+
+def test_failed_batch_backs_off_with_the_rest_of_its_channel(conn, receivers, monkeypatch):
+    monkeypatch.setattr(lambda_function, 'NOTIFY_BATCH_SIZE', 2)
+    stubs = receivers(flaky={'fail_every': 2}, ok={})
+    queue(conn, 6)
+
+    started = datetime.utcnow()
+    metrics = lambda_function.dispatch_notifications(conn)
+
+    # flaky accepted its first batch, failed the second and wasn't sent the third
+    assert stubs['flaky'].requests == 2
+    assert len(stubs['flaky'].received) == 2
+    assert len(stubs['ok'].received) == 6
+    assert metrics['delivered'] == 8
+    assert metrics['retrying'] == 2
+    rows = outbox(conn, 'flaky')
+    assert [row['status'] for row in rows] == ['delivered'] * 2 + ['pending'] * 4
+    assert [row['attempts'] for row in rows] == [1, 1, 1, 1, 0, 0]
+    assert rows[2]['last_error'] == 'HTTP 503'
+    for row in rows[2:]:
+        retry_at = datetime.fromisoformat(row['next_attempt_at'])
+        assert started + timedelta(seconds=29) < retry_at < datetime.utcnow() + timedelta(seconds=31)
+
+    # Nothing is due again until the backoff has passed
+    metrics = lambda_function.dispatch_notifications(conn)
+    assert stubs['flaky'].requests == 2
+    assert metrics['pending'] == 4
+
+
+def test_timed_out_batch_is_retried_later(conn, receivers, monkeypatch):
+    monkeypatch.setattr(lambda_function, 'NOTIFY_TIMEOUT', (1, 0.2))
+    receivers(slow={'latency_ms': 1000})
+    queue(conn, 1)
+
+    metrics = lambda_function.dispatch_notifications(conn)
+
+    assert metrics['retrying'] == 1
+    row, = outbox(conn, 'slow')
+    assert row['status'] == 'pending'
+    assert row['attempts'] == 1
+    assert 'timed out' in row['last_error'].lower()
+
+
+def test_dead_lettered_after_max_attempts(conn, receivers, monkeypatch):
+    monkeypatch.setattr(lambda_function, 'NOTIFY_MAX_ATTEMPTS', 3)
+    monkeypatch.setattr(lambda_function, 'NOTIFY_BACKOFF_BASE_SECONDS', 0.01)
+    stubs = receivers(down={'always_fail': True})
+    queue(conn, 1)
+
+    results = []
+    for _ in range(5):
+        results.append(lambda_function.dispatch_notifications(conn))
+        time.sleep(0.1)
+
+    assert [result['retrying'] for result in results] == [1, 1, 0, 0, 0]
+    assert [result['dead_lettered'] for result in results] == [0, 0, 1, 0, 0]
+    # Nothing more is sent once it is dead
+    assert stubs['down'].requests == 3
+    row, = outbox(conn, 'down')
+    assert row['status'] == 'dead'
+    assert row['attempts'] == 3
+    assert results[-1]['pending'] == 0
+
+
+def test_records_delivery_latency(conn, receivers):
+    receivers(ok={})
+    queued_at = datetime.utcnow() - timedelta(seconds=5)
+    queue(conn, 4, now=queued_at)
+
+    metrics = lambda_function.dispatch_notifications(conn)
+
+    assert metrics['delivered'] == 4
+    latency = metrics['latency_ms']
+    assert 5000 <= latency['p50'] <= latency['p95'] <= latency['max'] < 10000
+    for row in outbox(conn, 'ok'):
+        delivered_at = datetime.fromisoformat(row['delivered_at'])
+        assert queued_at + timedelta(seconds=5) <= delivered_at <= datetime.utcnow()
+        assert json.loads(row['payload'])['status'] == 'down'
@@ -0,0 +1,76 @@
+"""Retention of raw checks and rollups"""
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import Check, CheckRollup, RollupState, Website
+from app.utils import retention
+from app.utils.rollups import DAY, HOUR, MINUTE, update_rollups
+
+NOW = datetime(2026, 10, 17, 12, 0)
+
+
+def seed(site_count=2, days=40):
+    """One check per site every 6 hours for the last `days` days"""
+    db.session.execute(Website.__table__.insert(), [
+        {'name': f"Site {i}", 'url': f"http://site{i}.test", 'created_at': NOW, 'is_active': True}
+        for i in range(site_count)
+    ])
+    website_ids = [row[0] for row in db.session.query(Website.id)]
+    db.session.execute(Check.__table__.insert(), [
+        {'website_id': website_id, 'is_up': True, 'response_time_ms': 100, 'checked_at': NOW - timedelta(hours=6 * n)}
+        for website_id in website_ids
+        for n in range(days * 4)
+    ])
+    db.session.commit()
+    return website_ids
+
+
+def test_only_rolled_up_checks_are_deleted(app):
+    seed()
+    # Site 1 (IDs 1-160) is rolled up completely, site 2 only for its newest checks
+    update_rollups(batch_size=200, max_batches=1)
+    rolled_up_to = db.session.get(RollupState, 'checks').last_check_id
+    old = Check.checked_at < NOW - timedelta(days=30)
+    deletable = Check.query.filter(old, Check.id <= rolled_up_to).count()
+
+    deleted = retention.delete_old_checks(NOW - timedelta(days=30), batch_size=7, pause=0)
+    assert deleted == deletable > 0
+    # Checks past the cutoff but not yet in the rollups are kept
+    assert Check.query.filter(old, Check.id <= rolled_up_to).count() == 0
+    assert Check.query.filter(old, Check.id > rolled_up_to).count() > 0
+
+
+def test_deletes_run_in_committed_batches(app, monkeypatch):
+    seed()
+    update_rollups()
+    commits = []
+    commit = db.session.commit
+    monkeypatch.setattr(db.session, 'commit', lambda: (commits.append(1), commit()))
+
+    # 2 sites x 39 checks each older than 30 days (the one at exactly 30 days stays)
+    deleted = retention.delete_old_checks(NOW - timedelta(days=30), batch_size=15, pause=0)
+    assert deleted == 78
+    # Per site: 15 + 15 + 9, each in its own transaction
+    assert len(commits) == 6
+    assert Check.query.count() == 2 * 121
+
+
+def test_apply_retention_keeps_the_long_term_record(app):
+    website_ids = seed(days=200)
+    stats = retention.apply_retention(check_days=30, minute_rollup_days=7, hour_rollup_days=180,
+                                      batch_size=50, pause=0, now=NOW)
+
+    assert stats['rolled_up'] == 2 * 800
+    assert stats['checks_deleted'] == 2 * 679
+    assert Check.query.filter(Check.checked_at < NOW - timedelta(days=30)).count() == 0
+    oldest = {resolution: db.session.query(db.func.min(CheckRollup.bucket_start))
+              .filter(CheckRollup.resolution == resolution).scalar() for resolution in (MINUTE, HOUR, DAY)}
+    assert oldest[MINUTE] >= NOW - timedelta(days=7)
+    assert oldest[HOUR] >= NOW - timedelta(days=180)
+    # Day rollups still count every check ever made
+    assert db.session.query(db.func.sum(CheckRollup.count)).filter(
+        CheckRollup.resolution == DAY).scalar() == len(website_ids) * 800
+    # A second run has nothing left to do
+    again = retention.apply_retention(check_days=30, batch_size=50, pause=0, now=NOW)
+    assert (again['rolled_up'], again['checks_deleted'], again['minute_rollups_deleted'],
+            again['hour_rollups_deleted']) == (0, 0, 0, 0)
@@ -0,0 +1,156 @@
+"""Incremental check rollups and window summaries"""
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import Check, CheckRollup, Website
+from app.utils.retention import rollup_cutoffs
+from app.utils.rollups import (
+    DAY, HOUR, MINUTE, bucket_start, cover_window, summarize, update_rollups, window_rollups
+)
+from app.utils.sketch import LatencySketch
+
+START = datetime(2026, 9, 1)
+
+
+def add_website():
+    website = Website(name='Site', url='http://site.test')
+    db.session.add(website)
+    db.session.commit()
+    return website.id
+
+
+def add_checks(website_id, results, start=START, step=timedelta(seconds=20)):
+    """Checks from (is_up, response_time_ms) pairs, step apart"""
+    db.session.add_all(
+        Check(website_id=website_id, is_up=is_up, response_time_ms=response_time_ms, checked_at=start + n * step)
+        for n, (is_up, response_time_ms) in enumerate(results)
+    )
+    db.session.commit()
+
+
+def test_sketch_quantiles_merge_and_round_trip():
+    first, second = LatencySketch(), LatencySketch()
+    for value in range(1, 501):
+        first.add(value)
+    for value in range(501, 1001):
+        second.add(value)
+    second.add(0.5)
+    second.add(None)
+
+    merged = LatencySketch.from_json(first.to_json()).merge(LatencySketch.from_json(second.to_json()))
+    assert merged.count == 1001
+    assert merged.quantile(0) == 0.0
+    for q, expected in ((0.5, 500), (0.95, 950), (0.99, 990), (1, 1000)):
+        assert abs(merged.quantile(q) - expected) <= expected * 0.02
+    assert LatencySketch().quantile(0.5) is None
+
+
+def test_buckets_at_every_resolution(app):
+    website_id = add_website()
+    add_checks(website_id, [(True, 100), (True, 300), (False, None), (True, 200)])
+
+    assert update_rollups() == 4
+    rollups = {rollup.resolution: rollup for rollup in CheckRollup.query.filter(CheckRollup.bucket_start == START)}
+    assert set(rollups) == {MINUTE, HOUR, DAY}
+    hour = rollups[HOUR]
+    assert (hour.count, hour.up_count, hour.response_count) == (4, 3, 3)
+    assert (hour.min_response_ms, hour.max_response_ms, hour.sum_response_ms) == (100, 300, 600)
+    # The fourth check is 60s in, so in the second minute bucket
+    assert rollups[MINUTE].count == 3
+
+
+def test_average_ignores_checks_without_a_response_time(app):
+    website_id = add_website()
+    add_checks(website_id, [(True, 100), (False, None), (False, None), (True, 300)])
+    update_rollups()
+
+    summary = summarize(window_rollups(START, START + timedelta(days=1), [website_id]))
+    assert summary['count'] == 4
+    assert summary['uptime_percent'] == 50.0
+    assert summary['avg_response_ms'] == 200.0
+    assert CheckRollup.query.filter_by(resolution=DAY).one().to_dict()['avg_response_ms'] == 200.0
+
+
+def test_later_runs_merge_into_existing_buckets(app):
+    website_id = add_website()
+    add_checks(website_id, [(True, 100)] * 3)
+    update_rollups()
+    add_checks(website_id, [(True, 400)] * 3, start=START + timedelta(minutes=30))
+
+    # Only the new checks are read, and they land in the same hour and day
+    assert update_rollups(batch_size=2) == 3
+    day = CheckRollup.query.filter_by(resolution=DAY).one()
+    assert (day.count, day.response_count, day.sum_response_ms) == (6, 6, 1500)
+    assert update_rollups() == 0
+
+    summary = summarize(window_rollups(START, START + timedelta(days=1), [website_id]))
+    assert summary['min_response_ms'] == 100
+    assert summary['max_response_ms'] == 400
+    # Sketch percentiles are within 2% of the true values
+    assert abs(summary['p95_response_ms'] - 400) <= 8
+    assert abs(summary['p50_response_ms'] - 100) <= 2
+
+
+def test_window_combines_coarse_and_fine_buckets(app):
+    website_id = add_website()
+    add_checks(website_id, [(True, 100)] * (3 * 24 * 6), step=timedelta(minutes=10))
+    update_rollups()
+
+    # 00:30 on day one to 12:00 on day three: minute, hour and day buckets
+    start, end = START + timedelta(minutes=30), START + timedelta(days=2, hours=12)
+    rollups = window_rollups(start, end, [website_id]).all()
+    assert {rollup.resolution for rollup in rollups} == {MINUTE, HOUR, DAY}
+    assert summarize(rollups)['count'] == int((end - start).total_seconds() // 600)
+
+
+def test_cover_window_without_cutoffs():
+    start, end = datetime(2026, 9, 1, 10, 15, 30), datetime(2026, 9, 3, 2, 5)
+    assert cover_window(start, end) == [
+        (MINUTE, datetime(2026, 9, 1, 10, 15), datetime(2026, 9, 1, 11)),
+        (HOUR, datetime(2026, 9, 1, 11), datetime(2026, 9, 2)),
+        (DAY, datetime(2026, 9, 2), datetime(2026, 9, 3)),
+        (HOUR, datetime(2026, 9, 3), datetime(2026, 9, 3, 2)),
+        (MINUTE, datetime(2026, 9, 3, 2), datetime(2026, 9, 3, 2, 5)),
+    ]
+
+
+def test_cover_window_uses_buckets_retention_keeps(app):
+    now = datetime(2026, 10, 17, 12, 0)
+    app.config.update(MINUTE_ROLLUP_RETENTION_DAYS=7, HOUR_ROLLUP_RETENTION_DAYS=180)
+    kept_since = rollup_cutoffs(app, now)
+    assert kept_since == {MINUTE: datetime(2026, 10, 10, 12), HOUR: datetime(2026, 4, 20, 12)}
+
+    # Both edges are older than the minute cutoff: whole hours only
+    segments = cover_window(datetime(2026, 9, 1, 10, 15), datetime(2026, 9, 3, 2, 5), kept_since)
+    assert segments == [
+        (HOUR, datetime(2026, 9, 1, 10), datetime(2026, 9, 2)),
+        (DAY, datetime(2026, 9, 2), datetime(2026, 9, 3)),
+        (HOUR, datetime(2026, 9, 3), datetime(2026, 9, 3, 3)),
+    ]
+
+    # A year back to now: days past the hour cutoff, minutes only at the recent end
+    segments = cover_window(datetime(2025, 10, 17, 9, 30), datetime(2026, 10, 17, 11, 42), kept_since)
+    assert segments[0] == (DAY, datetime(2025, 10, 17), datetime(2026, 10, 17))
+    assert segments[1:] == [
+        (HOUR, datetime(2026, 10, 17), datetime(2026, 10, 17, 11)),
+        (MINUTE, datetime(2026, 10, 17, 11), datetime(2026, 10, 17, 11, 42)),
+    ]
+    for resolution, range_start, range_end in segments:
+        if resolution in kept_since:
+            assert range_start >= bucket_start(kept_since[resolution], resolution)
+    assert all(a[2] == b[1] for a, b in zip(segments, segments[1:]))
+
+
+def test_window_past_retention_still_counts_every_check(app):
+    website_id = add_website()
+    add_checks(website_id, [(True, 100)] * (2 * 24 * 6), step=timedelta(minutes=10))
+    update_rollups()
+    # Retention has since removed the minute buckets
+    CheckRollup.query.filter_by(resolution=MINUTE).delete()
+    db.session.commit()
+
+    kept_since = {MINUTE: START + timedelta(days=30), HOUR: START - timedelta(days=30)}
+    start, end = START + timedelta(minutes=25), START + timedelta(days=1, hours=5, minutes=35)
+    summary = summarize(window_rollups(start, end, [website_id], kept_since))
+    # Widened to 00:00 - 06:00 on day two
+    assert summary['count'] == (24 + 6) * 6
@@ -0,0 +1,89 @@
+"""Per-site heap scheduler"""
+import threading
+import time
+
+import pytest
+
+from app.utils.scheduler import CheckScheduler
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def test_sites_come_due_in_order_at_their_own_intervals(clock):
+    scheduler = CheckScheduler(jitter=0, clock=clock)
+    scheduler.schedule(1, 1, first_check_in=0)
+    scheduler.schedule(2, 5, first_check_in=30)
+    scheduler.schedule(3, 1, first_check_in=90)
+
+    assert scheduler.pop_due() == [1]
+    assert scheduler.pop_due() == []
+    assert scheduler.seconds_until_due() == 30
+
+    clock.now += 60
+    assert scheduler.pop_due() == [2, 1]
+    clock.now += 60
+    # 3 is due at 90s and 1 again at 120s; 2, popped at 60s, not until 360s
+    assert scheduler.pop_due() == [3, 1]
+    clock.now += 240
+    assert sorted(scheduler.pop_due()) == [1, 2, 3]
+
+
+def test_jitter_stays_within_its_fraction_of_the_interval(clock):
+    scheduler = CheckScheduler(jitter=0.1, clock=clock)
+    for website_id in range(200):
+        scheduler.schedule(website_id, 10, first_check_in=0)
+    assert len(scheduler.pop_due()) == 200
+
+    dues = sorted(due for due, _, _ in scheduler._heap)
+    assert 1000 + 540 <= dues[0] and dues[-1] <= 1000 + 660
+    # Spread out rather than all at once
+    assert dues[-1] - dues[0] > 60
+
+
+def test_reschedule_and_remove_skip_stale_entries(clock):
+    scheduler = CheckScheduler(jitter=0, clock=clock)
+    scheduler.schedule(1, 5, first_check_in=10)
+    scheduler.schedule(2, 5, first_check_in=10)
+    # Same interval: the existing due time stands
+    scheduler.schedule(1, 5, first_check_in=500)
+    # New interval: a new entry replaces the old one
+    scheduler.schedule(2, 1, first_check_in=100)
+    scheduler.remove(1)
+
+    assert 1 not in scheduler and len(scheduler) == 1
+    clock.now += 10
+    assert scheduler.pop_due() == []
+    assert scheduler.seconds_until_due() == 90
+    clock.now += 90
+    assert scheduler.pop_due() == [2]
+    assert scheduler.website_ids() == [2]
+
+
+def test_falling_behind_does_not_cause_a_burst(clock):
+    scheduler = CheckScheduler(jitter=0, clock=clock)
+    scheduler.schedule(1, 1, first_check_in=0)
+    clock.now += 3600
+    # One check now, then the next a full interval later
+    assert scheduler.pop_due() == [1]
+    assert scheduler.pop_due() == []
+    assert scheduler.seconds_until_due() == 60
+
+
+def test_wait_returns_when_the_schedule_changes():
+    scheduler = CheckScheduler(jitter=0)
+    threading.Timer(0.1, scheduler.schedule, args=(1, 1), kwargs={'first_check_in': 0}).start()
+    started = time.monotonic()
+    scheduler.wait(max_wait=5)
+    assert time.monotonic() - started < 2
+    assert scheduler.pop_due() == [1]
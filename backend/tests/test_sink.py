@@ -0,0 +1,128 @@
+"""Write-behind check sink"""
+import time
+from datetime import datetime
+
+from app import db
+from app.models import Check, Website
+from app.utils.anomaly import get_latency_detector
+from app.utils.sink import CheckSink
+from app.utils.telemetry import SINK_ROWS_DROPPED
+
+
+def add_website():
+    website = Website(name='Site', url='http://site.test')
+    db.session.add(website)
+    db.session.commit()
+    return website.id
+
+
+def results(website_id, count, response_time_ms=100):
+    return [{'website_id': website_id, 'status_code': 200, 'response_time_ms': response_time_ms, 'is_up': True,
+             'checked_at': datetime.utcnow()} for _ in range(count)]
+
+
+def test_baselines_only_see_written_checks(app):
+    website_id = add_website()
+    sink = CheckSink(app)
+    detector = get_latency_detector(app)
+
+    sink.put_many(results(website_id, 3))
+    assert detector.get(website_id) is None
+
+    # A failed write leaves the rows queued and the baselines alone
+    Check.__table__.drop(db.engine)
+    assert sink.flush() == 0
+    assert sink.queue_depth == 3
+    assert detector.get(website_id) is None
+
+    Check.__table__.create(db.engine)
+    assert sink.flush() == 3
+    assert Check.query.count() == 3
+    assert detector.get(website_id).samples == 3
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_flushes_once_a_batch_is_full(app):
+    website_id = add_website()
+    sink = CheckSink(app, max_batch=5, max_delay=60).start()
+    try:
+        sink.put_many(results(website_id, 4))
+        time.sleep(0.2)
+        assert sink.flushes == 0 and sink.queue_depth == 4
+
+        sink.put(results(website_id, 1)[0])
+        assert wait_for(lambda: sink.flushes == 1)
+        assert (sink.last_flush_rows, sink.queue_depth) == (5, 0)
+        assert Check.query.count() == 5
+    finally:
+        sink.close()
+
+
+def test_flushes_rows_that_have_waited_max_delay(app):
+    website_id = add_website()
+    sink = CheckSink(app, max_batch=1000, max_delay=0.3).start()
+    try:
+        queued_at = time.monotonic()
+        sink.put_many(results(website_id, 3))
+        assert wait_for(lambda: sink.flushes == 1)
+        assert time.monotonic() - queued_at >= 0.3
+        assert Check.query.count() == 3
+    finally:
+        sink.close()
+
+
+def test_back_pressure_flushes_inline(app):
+    website_id = add_website()
+    sink = CheckSink(app, max_batch=1000, max_delay=60, max_queue=10)
+
+    sink.put_many(results(website_id, 9))
+    assert sink.flushes == 0
+    sink.put_many(results(website_id, 1))
+    # Written by the caller, with no flusher thread running
+    assert (sink.flushes, sink.queue_depth) == (1, 0)
+
+
+def test_retries_after_a_failed_flush(app):
+    website_id = add_website()
+    sink = CheckSink(app, max_batch=3, max_delay=0.1).start()
+    try:
+        Check.__table__.drop(db.engine)
+        sink.put_many(results(website_id, 3))
+        assert wait_for(lambda: sink.failed_flushes >= 1)
+        assert sink.queue_depth == 3
+
+        Check.__table__.create(db.engine)
+        assert wait_for(lambda: sink.rows_written == 3)
+        assert sink.queue_depth == 0 and sink.rows_dropped == 0
+        assert Check.query.count() == 3
+    finally:
+        sink.close()
+
+
+def test_buffer_drops_oldest_rows_while_writes_fail(app):
+    website_id = add_website()
+    sink = CheckSink(app, max_queue=4, max_buffer=6)
+    dropped_before = SINK_ROWS_DROPPED.value('buffer_full')
+    Check.__table__.drop(db.engine)
+
+    sink.put_many(results(website_id, 3, response_time_ms=1))
+    assert sink.flush() == 0
+    # Crosses max_queue, so the put tries to flush inline; that fails too
+    sink.put_many(results(website_id, 5, response_time_ms=2))
+    assert sink.failed_flushes == 2
+    assert sink.queue_depth == 6
+    assert sink.rows_dropped == 2 and sink.stats()['rows_dropped'] == 2
+    assert SINK_ROWS_DROPPED.value('buffer_full') - dropped_before == 2
+
+    Check.__table__.create(db.engine)
+    assert sink.flush() == 6
+    # The two oldest went
+    assert sorted(row.response_time_ms for row in Check.query) == [1] + [2] * 5
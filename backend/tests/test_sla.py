@@ -0,0 +1,78 @@
+"""SLA reports and check retention"""
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import Check, Website
+from app.utils.retention import checks_kept_since
+from app.utils.sla import build_sla_report
+
+
+def add_site_checks(start, end, step=timedelta(minutes=5)):
+    website = Website(name='Site', url='http://site.test', check_interval_minutes=5)
+    db.session.add(website)
+    db.session.commit()
+    checked_at = start
+    while checked_at < end:
+        db.session.add(Check(website_id=website.id, is_up=True, response_time_ms=100, checked_at=checked_at))
+        checked_at += step
+    db.session.commit()
+    return website.id
+
+
+def test_window_past_check_retention_is_marked_incomplete(app):
+    app.config['CHECK_RETENTION_DAYS'] = 30
+    now = datetime.utcnow().replace(microsecond=0)
+    cutoff = checks_kept_since(app, now)
+    assert cutoff == now - timedelta(days=30)
+    # Retention has already deleted everything before the cutoff
+    website_id = add_site_checks(cutoff, now)
+
+    report = build_sla_report(now - timedelta(days=60), now, checks_since=cutoff)
+    assert not report.complete
+    assert report.covered_from == cutoff
+    assert report.coverage_percent == 50.0
+    data = report.to_dict()
+    assert (data['complete'], data['covered_from'], data['coverage_percent']) == (False, cutoff.isoformat(), 50.0)
+    # The figures are over the covered part, not the whole window
+    site = data['websites'][0]
+    assert site['website_id'] == website_id
+    assert site['uptime_percent'] == 100.0
+    assert abs(site['monitored_seconds'] - 30 * 86400) <= 300
+
+    recent = build_sla_report(now - timedelta(days=7), now, checks_since=cutoff)
+    assert recent.complete and recent.coverage_percent == 100.0
+    assert recent.covered_from == now - timedelta(days=7)
+
+
+def test_cli_warns_about_partial_windows(app):
+    app.config['CHECK_RETENTION_DAYS'] = 30
+    now = datetime.utcnow().replace(microsecond=0)
+    add_site_checks(now - timedelta(days=2), now)
+    runner = app.test_cli_runner()
+
+    start = now - timedelta(days=45)
+    result = runner.invoke(args=['sla-report', '--start', f'{start:%Y-%m-%d %H:%M:%S}',
+                                 '--end', f'{now:%Y-%m-%d %H:%M:%S}'])
+    assert result.exit_code == 0, result.output
+    assert '"complete": false' in result.output
+    assert 'Warning: raw checks before' in result.output
+
+    result = runner.invoke(args=['sla-report', '--start', f'{now - timedelta(days=3):%Y-%m-%d %H:%M:%S}',
+                                 '--end', f'{now:%Y-%m-%d %H:%M:%S}'])
+    assert '"complete": true' in result.output
+    assert 'Warning' not in result.output
+
+
+def test_api_reports_coverage(app, client):
+    app.config['CHECK_RETENTION_DAYS'] = 30
+    now = datetime.utcnow().replace(microsecond=0)
+    website_id = add_site_checks(now - timedelta(days=1), now)
+    start = now - timedelta(days=40)
+
+    response = client.get(f'/api/metrics/sla?websites={website_id}&start={start.isoformat()}&end={now.isoformat()}')
+    assert response.status_code == 200
+    assert response.get_json()['complete'] is False
+
+    response = client.get(f'/api/metrics/sla?websites={website_id}&start={start.isoformat()}'
+                          f'&end={now.isoformat()}&format=csv')
+    assert float(response.headers['X-SLA-Coverage-Percent']) == 75.0
@@ -0,0 +1,17 @@
+"""Conditional GETs of a website's status"""
+from app import db
+from app.models import Website
+
+
+def test_status_of_missing_website_is_404_despite_etag(client):
+    website = Website(name='Site', url='http://site.test')
+    db.session.add(website)
+    db.session.commit()
+    path = f"/api/websites/{website.id}/status"
+
+    etag = client.get(path).headers['ETag']
+    assert client.get(path, headers={'If-None-Match': etag}).status_code == 304
+
+    # Same data version, so the ETag still matches, but there is no such website
+    missing = client.get(f"/api/websites/{website.id + 1}/status", headers={'If-None-Match': etag})
+    assert missing.status_code == 404
@@ -0,0 +1,104 @@
+"""
+The website listing and status endpoints must run a fixed number of SQL
+statements however many websites there are (see benchmarks/bench_api_queries.py
+for timings at larger sizes).
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from app import db
+from app.models import Check, Website
+from app.utils.status_cache import get_status_cache
+
+SMALL = 5
+LARGE = 10 * SMALL
+
+
+class StatementLog:
+    """Records the statements executed on an engine while active"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def _on_execute(self, connection, cursor, statement, *args):
+        self.statements.append(' '.join(statement.split()))
+
+    def __enter__(self):
+        self.statements = []
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+
+    def __len__(self):
+        return len(self.statements)
+
+    def reading(self, table):
+        """Statements that select rows (not just aggregates) from table"""
+        return [statement for statement in self.statements if statement.startswith(f"SELECT {table}.id")]
+
+
+def seed(site_count, checks_per_site=3):
+    now = datetime.utcnow()
+    db.session.execute(Website.__table__.insert(), [
+        {'name': f"Site {i}", 'url': f"http://site{i}.test", 'check_interval_minutes': 5,
+         'created_at': now, 'is_active': True}
+        for i in range(site_count)
+    ])
+    website_ids = [row[0] for row in db.session.query(Website.id)]
+    db.session.execute(Check.__table__.insert(), [
+        {'website_id': website_id, 'status_code': 200, 'response_time_ms': 100 + n,
+         'is_up': n % 2 == 0, 'checked_at': now - timedelta(minutes=n)}
+        for website_id in website_ids
+        for n in range(checks_per_site)
+    ])
+    db.session.commit()
+    return website_ids
+
+
+def statements_for(client, path):
+    log = StatementLog(db.engine)
+    with log:
+        response = client.get(path)
+    assert response.status_code == 200
+    return log, response
+
+
+@pytest.fixture(params=[SMALL, LARGE], ids=['n', '10n'])
+def website_ids(request, app):
+    return seed(request.param)
+
+
+def test_listing_statement_count_is_constant(client, website_ids):
+    # First poll loads the status cache: websites version, newest check ID,
+    # every website's latest check in one query, then the websites
+    cold, response = statements_for(client, '/api/websites')
+    assert len(cold) == 4
+    assert len(response.get_json()) == len(website_ids)
+
+    # Later polls only read the websites
+    warm, _ = statements_for(client, '/api/websites')
+    assert len(warm) == 1
+
+    get_status_cache().invalidate()
+    reloaded, _ = statements_for(client, '/api/websites')
+    assert len(reloaded) == 3
+
+
+def test_listing_loads_latest_statuses_in_one_query(client, website_ids):
+    log, response = statements_for(client, '/api/websites')
+    assert len(log.reading('checks')) == 1
+    # Newest check of each website (n == 0, an up check)
+    assert all(website['latest_status']['is_up'] for website in response.get_json())
+
+
+def test_status_statement_count_is_constant(client, website_ids):
+    client.get('/api/websites')
+    log, response = statements_for(client, f"/api/websites/{website_ids[-1]}/status")
+    # The website, then its recent checks
+    assert len(log) == 2
+    assert len(response.get_json()['recent_checks']) == 3
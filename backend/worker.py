@@ -0,0 +1,87 @@
+"""
+Standalone check workers for the database-backed app.
+
+Starts N worker processes (one per CPU core by default), each with its own
+event loop, that split the websites between them with consistent hashing
+(see app.utils.worker).  Workers can also be started on their own, several
+times over; they find each other through the database.  A worker process
+that dies is restarted.
+
+With --metrics-port, worker process n serves its Prometheus metrics at
+http://<host>:<port + n>/metrics (n counting from 0).
+
+Usage (from backend/, with MONITOR_ENABLED off for the API):
+    python worker.py --processes 4 --metrics-port 9100
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import time
+
+
+def run_worker(metrics_port=None):
+    """Entry point of one worker process"""
+    # The API's in-process monitor must never run inside a worker
+    os.environ['MONITOR_ENABLED'] = 'false'
+
+    from app import create_app
+    from app.utils.telemetry import serve_metrics
+    from app.utils.worker import ShardWorker, enable_wal
+
+    app = create_app()
+    if metrics_port:
+        serve_metrics(metrics_port)
+    with app.app_context():
+        enable_wal()
+    worker = ShardWorker(app)
+    signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
+    signal.signal(signal.SIGINT, lambda signum, frame: worker.stop())
+    app.logger.info(f"Worker {worker.id} started")
+    worker.run_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                        help='Worker processes to run (default: one per CPU core)')
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help='Serve each worker\'s /metrics on this port plus its index')
+    args = parser.parse_args()
+
+    def metrics_port(index):
+        return args.metrics_port + index if args.metrics_port else None
+
+    # Fresh interpreters, so no database connections are shared with the parent
+    context = multiprocessing.get_context('spawn')
+    processes = []
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for index in range(args.processes):
+        process = context.Process(target=run_worker, args=(metrics_port(index),))
+        process.start()
+        processes.append(process)
+
+    while not stopping:
+        time.sleep(1)
+        for index, process in enumerate(processes):
+            if not process.is_alive() and not stopping:
+                print(f"Worker process {process.pid} exited with {process.exitcode}, restarting")
+                processes[index] = context.Process(target=run_worker, args=(metrics_port(index),))
+                processes[index].start()
+
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join(timeout=30)
+
+
+if __name__ == '__main__':
+    main()
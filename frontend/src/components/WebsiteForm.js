@@ -10,6 +10,7 @@ import {
   Slider,
   FormControlLabel,
   Switch,
+  MenuItem,
   CircularProgress,
   Alert
 } from '@mui/material';
@@ -23,7 +24,10 @@ const WebsiteForm = ({ website, onSubmit, isSubmitting, error }) => {
     name: '',
     url: '',
     check_interval_minutes: 5,
-    is_active: true
+    is_active: true,
+    check_mode: 'partial',
+    check_keyword: '',
+    check_keyword_is_regex: false
   });
 
   const [formErrors, setFormErrors] = useState({});
@@ -35,7 +39,10 @@ const WebsiteForm = ({ website, onSubmit, isSubmitting, error }) => {
         name: website.name || '',
         url: website.url || '',
         check_interval_minutes: website.check_interval_minutes || 5,
-        is_active: website.is_active !== undefined ? website.is_active : true
+        is_active: website.is_active !== undefined ? website.is_active : true,
+        check_mode: website.check_mode || 'partial',
+        check_keyword: website.check_keyword || '',
+        check_keyword_is_regex: !!website.check_keyword_is_regex
       });
     }
   }, [website]);
@@ -83,6 +90,10 @@ const WebsiteForm = ({ website, onSubmit, isSubmitting, error }) => {
       }
     }
     
+    if (formValues.check_mode === 'keyword' && !formValues.check_keyword.trim()) {
+      errors.check_keyword = 'Keyword is required for keyword checks';
+    }
+    
     setFormErrors(errors);
     return Object.keys(errors).length === 0;
   };
@@ -92,7 +103,10 @@ const WebsiteForm = ({ website, onSubmit, isSubmitting, error }) => {
     e.preventDefault();
     
     if (validateForm()) {
-      onSubmit(formValues);
+      onSubmit({
+        ...formValues,
+        check_keyword: formValues.check_keyword.trim() || null
+      });
     }
   };
 
@@ -166,6 +180,52 @@ const WebsiteForm = ({ website, onSubmit, isSubmitting, error }) => {
             </Typography>
           </Grid>
 
+          {/* Check mode */}
+          <Grid item xs={12}>
+            <TextField
+              select
+              fullWidth
+              label="Check Mode"
+              name="check_mode"
+              value={formValues.check_mode}
+              onChange={handleInputChange}
+              helperText="How much of the page to fetch on each check"
+              disabled={isSubmitting}
+            >
+              <MenuItem value="head">HEAD request only</MenuItem>
+              <MenuItem value="partial">GET, first part of the page</MenuItem>
+              <MenuItem value="keyword">GET, and look for a keyword</MenuItem>
+            </TextField>
+          </Grid>
+
+          {formValues.check_mode === 'keyword' && (
+            <Grid item xs={12}>
+              <TextField
+                fullWidth
+                label="Keyword"
+                name="check_keyword"
+                value={formValues.check_keyword}
+                onChange={handleInputChange}
+                error={!!formErrors.check_keyword}
+                helperText={formErrors.check_keyword || 'The site is down if this is missing from the start of the page'}
+                disabled={isSubmitting}
+                required
+              />
+              <FormControlLabel
+                control={
+                  <Switch
+                    checked={formValues.check_keyword_is_regex}
+                    onChange={handleInputChange}
+                    name="check_keyword_is_regex"
+                    color="primary"
+                    disabled={isSubmitting}
+                  />
+                }
+                label="Regular expression"
+              />
+            </Grid>
+          )}
+
           {/* Is active switch */}
           <Grid item xs={12}>
             <FormControlLabel
@@ -15,7 +15,7 @@ import {
 import CheckCircleIcon from '@mui/icons-material/CheckCircle';
 import ErrorIcon from '@mui/icons-material/Error';
 import TimerIcon from '@mui/icons-material/Timer';
-import { getWebsites, getDashboardStats } from '../services/api';
+import { getWebsites, getDashboardStats, subscribeToStream } from '../services/api';
 
 function Dashboard() {
   const [websites, setWebsites] = useState([]);
@@ -58,10 +58,43 @@ function Dashboard() {
     };
 
     fetchData();
-    // Refresh data every 15 seconds
-    const interval = setInterval(fetchData, 15000);
-    
-    return () => clearInterval(interval);
+
+    // Live updates come from the event stream; poll every 15 seconds only
+    // while it is disconnected
+    let interval = null;
+    const startPolling = () => {
+      if (!interval) {
+        interval = setInterval(fetchData, 15000);
+      }
+    };
+    const stopPolling = () => {
+      clearInterval(interval);
+      interval = null;
+    };
+
+    const unsubscribe = subscribeToStream(null, {
+      check: ({ website_id, status }) => {
+        setWebsites(current => current.map(website =>
+          website.id === website_id ? { ...website, latest_status: status } : website
+        ));
+      },
+      stats: (statsData) => {
+        setStats(current => ({ ...current, ...statsData, last_updated: new Date().toISOString() }));
+      },
+      resync: fetchData,
+      onOpen: () => {
+        stopPolling();
+        // Catch up on anything missed while disconnected
+        fetchData();
+      },
+      onError: startPolling
+    });
+    startPolling();
+
+    return () => {
+      unsubscribe();
+      stopPolling();
+    };
   }, []);
 
   // Render status chip
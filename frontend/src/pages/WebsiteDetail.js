@@ -23,7 +23,7 @@ import CheckCircleIcon from '@mui/icons-material/CheckCircle';
 import ErrorIcon from '@mui/icons-material/Error';
 import EditIcon from '@mui/icons-material/Edit';
 import ArrowBackIcon from '@mui/icons-material/ArrowBack';
-import { getWebsite, getWebsiteStatus, getWebsiteChecks } from '../services/api';
+import { getWebsite, getWebsiteStatus, getWebsiteChecksByCursor, subscribeToStream } from '../services/api';
 
 function WebsiteDetail() {
   const { id } = useParams();
@@ -35,8 +35,10 @@ function WebsiteDetail() {
   const [rowsPerPage, setRowsPerPage] = useState(10);
   const [pagination, setPagination] = useState({
     total: 0,
-    pages: 0
+    has_more: false
   });
+  // cursors[n] is the cursor that loads page n ('' loads the first page)
+  const [cursors, setCursors] = useState(['']);
 
   // Fetch website details and status
   useEffect(() => {
@@ -74,20 +76,60 @@ function WebsiteDetail() {
     };
 
     fetchWebsiteData();
-    // Refresh data every 30 seconds
-    const interval = setInterval(fetchWebsiteData, 30000);
-    
-    return () => clearInterval(interval);
+
+    // Refetch when this website is checked; poll every 30 seconds only
+    // while the event stream is disconnected
+    let interval = null;
+    const stopPolling = () => {
+      clearInterval(interval);
+      interval = null;
+    };
+    const unsubscribe = subscribeToStream([Number(id)], {
+      check: fetchWebsiteData,
+      resync: fetchWebsiteData,
+      onOpen: stopPolling,
+      onError: () => {
+        if (!interval) {
+          interval = setInterval(fetchWebsiteData, 30000);
+        }
+      }
+    });
+
+    return () => {
+      unsubscribe();
+      stopPolling();
+    };
   }, [id]);
 
+  // The first page of history comes from the status endpoint, so fetch its
+  // cursor page once to know where page two starts
+  useEffect(() => {
+    getWebsiteChecksByCursor(id, '', 10)
+      .then(result => {
+        setPagination(result.pagination || { total: 0, has_more: false });
+        setCursors(result.pagination?.next_cursor ? ['', result.pagination.next_cursor] : ['']);
+      })
+      .catch(err => console.error('Error fetching check history cursor:', err));
+  }, [id]);
+
+  // Load one page of check history by its cursor
+  const loadChecksPage = async (newPage, perPage, pageCursors) => {
+    const result = await getWebsiteChecksByCursor(id, pageCursors[newPage], perPage);
+    const nextCursors = pageCursors.slice(0, newPage + 1);
+    if (result.pagination?.next_cursor) {
+      nextCursors.push(result.pagination.next_cursor);
+    }
+    setChecks(result.checks || []);
+    setPagination(result.pagination || { total: 0, has_more: false });
+    setCursors(nextCursors);
+    setPage(newPage);
+  };
+
   // Handle pagination change
   const handleChangePage = async (event, newPage) => {
     try {
       setLoading(true);
-      const result = await getWebsiteChecks(id, newPage + 1, rowsPerPage);
-      setChecks(result.checks || []);
-      setPagination(result.pagination || { total: 0, pages: 0 });
-      setPage(newPage);
+      await loadChecksPage(newPage, rowsPerPage, cursors);
     } catch (err) {
       setError('Failed to load check history. Please try again later.');
       console.error('Error fetching website checks:', err);
@@ -101,11 +143,9 @@ function WebsiteDetail() {
     const newRowsPerPage = parseInt(event.target.value, 10);
     try {
       setLoading(true);
-      const result = await getWebsiteChecks(id, 1, newRowsPerPage);
-      setChecks(result.checks || []);
-      setPagination(result.pagination || { total: 0, pages: 0 });
+      // Cursors depend on the page size, so start again from the first page
+      await loadChecksPage(0, newRowsPerPage, ['']);
       setRowsPerPage(newRowsPerPage);
-      setPage(0);
     } catch (err) {
       setError('Failed to load check history. Please try again later.');
       console.error('Error fetching website checks:', err);
@@ -282,9 +322,10 @@ function WebsiteDetail() {
               </TableContainer>
               <TablePagination
                 component="div"
-                count={pagination.total || 0}
+                count={pagination.total_capped || pagination.total == null ? -1 : pagination.total}
                 page={page}
                 onPageChange={handleChangePage}
+                nextIconButtonProps={{ disabled: cursors[page + 1] === undefined }}
                 rowsPerPage={rowsPerPage}
                 onRowsPerPageChange={handleChangeRowsPerPage}
                 rowsPerPageOptions={[5, 10, 25, 50]}
@@ -131,6 +131,28 @@ export const getWebsiteChecks = async (id, page = 1, perPage = 20) => {
   }
 };
 
+/**
+ * Get a page of check history using keyset (cursor) pagination.
+ * Follow pagination.next_cursor from each response to get the next page;
+ * every page costs the same regardless of how deep it is.
+ * @param {number} id Website ID
+ * @param {string} cursor Cursor from the previous page ('' for the first page)
+ * @param {number} perPage Items per page
+ * @param {string} total 'none', 'capped' or 'exact' count of all checks
+ * @returns {Promise<Object>} Checks and cursor pagination info
+ */
+export const getWebsiteChecksByCursor = async (id, cursor = '', perPage = 20, total = 'capped') => {
+  try {
+    const response = await api.get(`/websites/${id}/checks`, {
+      params: { cursor, per_page: perPage, total }
+    });
+    return response.data;
+  } catch (error) {
+    console.error(`Error fetching checks for website ${id}:`, error);
+    throw error;
+  }
+};
+
 /**
  * Get dashboard statistics
  * @returns {Promise<Object>} Dashboard statistics
@@ -145,4 +167,34 @@ export const getDashboardStats = async () => {
   }
 };
 
+/**
+ * Subscribe to live status events (server-sent events from /api/stream).
+ * Handlers are called with the parsed event data: check (a new check),
+ * status (a website went up or down), stats (dashboard totals, only when
+ * following every website) and resync (events were missed, refetch).
+ * onOpen and onError report the connection state; the browser reconnects
+ * by itself after an error.
+ * @param {Array<number>|null} websiteIds Websites to follow (null for all)
+ * @param {Object} handlers Callbacks keyed by event type
+ * @returns {Function} Call to close the stream
+ */
+export const subscribeToStream = (websiteIds, handlers) => {
+  const query = websiteIds ? `?websites=${websiteIds.join(',')}` : '';
+  const source = new EventSource(`/api/stream${query}`);
+
+  ['check', 'status', 'stats', 'resync'].forEach(type => {
+    if (handlers[type]) {
+      source.addEventListener(type, event => handlers[type](JSON.parse(event.data)));
+    }
+  });
+  if (handlers.onOpen) {
+    source.onopen = handlers.onOpen;
+  }
+  if (handlers.onError) {
+    source.onerror = handlers.onError;
+  }
+
+  return () => source.close();
+};
+
 export default api;
@@ -1,106 +1,727 @@
+import base64
 import json
-import requests
 import time
 import os
 import sqlite3
-from datetime import datetime
+import zlib
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout, as_completed, wait
+from datetime import datetime, timedelta
+
+# requests (most of this module's import time) and re are imported where
+# they're used, so a cold start only pays for them when a check runs
 
 # Configuration
-DATABASE_PATH = '/tmp/upmon.db'  # Lambda can only write to /tmp
+DATABASE_PATH = os.environ.get('DATABASE_PATH', '/tmp/upmon.db')  # Lambda can only write to /tmp
 API_ENDPOINT = os.environ.get('API_ENDPOINT', 'http://localhost:5000/api')
 
+# Websites checked at once
+CHECK_CONCURRENCY = int(os.environ.get('CHECK_CONCURRENCY', '32'))
+
+# Seconds a single check may take (the requests timeout), so no check is
+# started unless it can finish before the deadline
+CHECK_TIMEOUT_SECONDS = 10
+
+# Time kept back from the invocation's remaining time to write results and
+# deliver notifications, and the run length assumed outside Lambda
+DEADLINE_RESERVE_SECONDS = float(os.environ.get('DEADLINE_RESERVE_SECONDS', '5'))
+DEFAULT_RUN_SECONDS = float(os.environ.get('DEFAULT_RUN_SECONDS', '840'))
+
+# Set to force a new connection per check for true first-byte timings
+COLD_CONNECTIONS = os.environ.get('COLD_CONNECTIONS', 'false').lower() == 'true'
+
+# Kept at module level so warm invocations of the same container reuse
+# them: the HTTP session (and its keep-alive connections), the database
+# connection and the list of websites to check
+_session = None
+_conn = None
+_websites = {'marker': None, 'rows': []}
+
+# Body bytes read per check unless the website sets check_max_bytes, and the
+# most it may set (same as app.utils.check_modes in the backend)
+DEFAULT_MAX_BYTES = 64 * 1024
+MAX_BYTES_LIMIT = 1024 * 1024
+STREAM_CHUNK_SIZE = 16 * 1024
+
+# Alerting: a site is confirmed down after ALERT_FAILURE_THRESHOLD failed
+# checks in a row and back up after ALERT_RECOVERY_THRESHOLD good ones
+ALERT_FAILURE_THRESHOLD = int(os.environ.get('ALERT_FAILURE_THRESHOLD', '3'))
+ALERT_RECOVERY_THRESHOLD = int(os.environ.get('ALERT_RECOVERY_THRESHOLD', '2'))
+
+# A site is flapping once more than FLAP_START_RATIO of its last FLAP_WINDOW
+# checks changed result, and stops once that falls under FLAP_STOP_RATIO.
+# While flapping it gets one alert rather than one per bounce.
+FLAP_WINDOW = int(os.environ.get('FLAP_WINDOW', '20'))
+FLAP_START_RATIO = float(os.environ.get('FLAP_START_RATIO', '0.5'))
+FLAP_STOP_RATIO = float(os.environ.get('FLAP_STOP_RATIO', '0.25'))
+
+# At most one alert per site per ALERT_MIN_INTERVAL_SECONDS (later changes
+# wait and are coalesced), and at most ALERT_MAX_PER_RUN alerts per
+# invocation (any more are sent as one summary)
+ALERT_MIN_INTERVAL_SECONDS = int(os.environ.get('ALERT_MIN_INTERVAL_SECONDS', '300'))
+ALERT_MAX_PER_RUN = int(os.environ.get('ALERT_MAX_PER_RUN', '50'))
+
+# Where alerts are delivered: JSON object of channel name -> URL, each
+# receiving POSTs of {"notifications": [...]}
+NOTIFICATION_CHANNELS = json.loads(os.environ.get('NOTIFICATION_CHANNELS') or 'null') \
+    or {'api': f"{API_ENDPOINT}/notifications"}
+
+# Alerts wait in the notification_outbox table until a channel accepts
+# them.  Failed batches are retried after NOTIFY_BACKOFF_BASE_SECONDS,
+# doubling up to NOTIFY_BACKOFF_MAX_SECONDS, and dead-lettered (kept with
+# status 'dead') after NOTIFY_MAX_ATTEMPTS.
+NOTIFY_BATCH_SIZE = int(os.environ.get('NOTIFY_BATCH_SIZE', '50'))
+NOTIFY_MAX_ATTEMPTS = int(os.environ.get('NOTIFY_MAX_ATTEMPTS', '8'))
+NOTIFY_BACKOFF_BASE_SECONDS = float(os.environ.get('NOTIFY_BACKOFF_BASE_SECONDS', '30'))
+NOTIFY_BACKOFF_MAX_SECONDS = float(os.environ.get('NOTIFY_BACKOFF_MAX_SECONDS', '3600'))
+# Connect and read timeouts per batch, and the most a run spends delivering
+NOTIFY_TIMEOUT = (3, 10)
+NOTIFY_DISPATCH_SECONDS = float(os.environ.get('NOTIFY_DISPATCH_SECONDS', '20'))
+# Delivered notifications are kept this long, dead ones until removed
+NOTIFY_KEEP_DAYS = int(os.environ.get('NOTIFY_KEEP_DAYS', '7'))
+
+STATE_COLUMNS = ('website_id', 'status', 'consecutive_failures', 'consecutive_successes', 'recent_results',
+                 'recent_count', 'is_flapping', 'changed_at', 'notified_status', 'notified_at')
+
+def get_session():
+    """
+    Shared session so checks reuse keep-alive connections (also across warm
+    invocations).  Call it once before starting threads that use it.
+    """
+    global _session
+    if _session is None:
+        import requests
+        session = requests.Session()
+        session.headers['User-Agent'] = 'UpMon Lambda Website Checker/1.0'
+        session.mount('http://', requests.adapters.HTTPAdapter(pool_connections=100, pool_maxsize=4))
+        session.mount('https://', requests.adapters.HTTPAdapter(pool_connections=100, pool_maxsize=4))
+        _session = session
+    return _session
+
 def connect_db():
-    """Connect to the SQLite database"""
+    """Connection to the SQLite database, opened once per container"""
+    global _conn
+    if _conn is not None:
+        try:
+            _conn.execute("SELECT 1")
+            return _conn
+        except sqlite3.Error:
+            _conn = None
     conn = sqlite3.connect(DATABASE_PATH)
     conn.row_factory = sqlite3.Row
+    _conn = conn
     return conn
 
-def fetch_websites(conn):
-    """Fetch all active websites from the database"""
+def websites_marker(conn):
+    """Changes whenever a website is added, removed or edited"""
     cur = conn.cursor()
-    cur.execute("SELECT id, name, url FROM websites WHERE is_active = 1")
-    return cur.fetchall()
+    cur.execute("SELECT COUNT(*), MAX(id), MAX(updated_at) FROM websites")
+    return tuple(cur.fetchone())
+
+def fetch_websites(conn, website_ids=None):
+    """
+    Fetch all active websites from the database (or only those in website_ids).
+    
+    The list is kept between warm invocations and only read again when
+    websites_marker() changes.  That relies on websites.updated_at, which
+    the API sets on every edit; rows changed by hand should touch it too.
+    
+    Returns:
+        tuple: (websites, whether the cached list was used)
+    """
+    marker = websites_marker(conn)
+    cached = marker == _websites['marker']
+    if not cached:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT id, name, url, check_mode, check_max_bytes, check_keyword, check_keyword_is_regex "
+            "FROM websites WHERE is_active = 1 ORDER BY id"
+        )
+        _websites['rows'] = cur.fetchall()
+        _websites['marker'] = marker
+    websites = _websites['rows']
+    if website_ids is not None:
+        website_ids = set(website_ids)
+        websites = [website for website in websites if website['id'] in website_ids]
+    return websites, cached
+
+def encode_continuation_token(website_ids):
+    """Opaque token listing the websites a run didn't get to"""
+    data = zlib.compress(json.dumps(sorted(website_ids), separators=(',', ':')).encode())
+    return base64.urlsafe_b64encode(data).decode()
+
+def decode_continuation_token(token):
+    """Website IDs from a continuation token (ValueError if it's malformed)"""
+    try:
+        website_ids = json.loads(zlib.decompress(base64.urlsafe_b64decode(token.encode())))
+    except (zlib.error, TypeError, UnicodeError, ValueError) as e:
+        raise ValueError(f"Invalid continuation token: {e}")
+    if not isinstance(website_ids, list) or not all(isinstance(i, int) for i in website_ids):
+        raise ValueError("Invalid continuation token")
+    return website_ids
+
+def run_deadline(context):
+    """time.monotonic() by which checking must stop, leaving time to write results"""
+    if context is not None and hasattr(context, 'get_remaining_time_in_millis'):
+        remaining = context.get_remaining_time_in_millis() / 1000
+    else:
+        remaining = DEFAULT_RUN_SECONDS
+    return time.monotonic() + max(remaining - DEADLINE_RESERVE_SECONDS - NOTIFY_DISPATCH_SECONDS, 0)
+
+def check_until(website, start_by):
+    """Check a website unless it is already too late to start (then None)"""
+    if time.monotonic() > start_by:
+        return None
+    return check_website(website)
+
+def run_checks(websites, deadline):
+    """
+    Check websites concurrently until the deadline.
+    
+    Checks start in order, CHECK_CONCURRENCY at a time, and none starts
+    later than CHECK_TIMEOUT_SECONDS before the deadline, so every started
+    check normally finishes in time.  One that somehow doesn't is
+    abandoned (its thread is left to finish on its own).
+    
+    Yields:
+        tuple: (website, check result) as checks finish; the websites not
+            reached are yielded last with a None result
+    """
+    start_by = deadline - CHECK_TIMEOUT_SECONDS
+    if websites:
+        # Create the shared session before the threads race to
+        get_session()
+    executor = ThreadPoolExecutor(max_workers=CHECK_CONCURRENCY)
+    futures = {executor.submit(check_until, website, start_by): website for website in websites}
+    try:
+        for future in as_completed(futures, timeout=max(deadline - time.monotonic(), 0)):
+            yield futures.pop(future), future.result()
+    except FuturesTimeout:
+        pass
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    for website in futures.values():
+        yield website, None
 
-def record_check(conn, website_id, status_code, response_time_ms, is_up, error_message=None):
-    """Record a website check in the database"""
+def record_check(conn, website_id, status_code, response_time_ms, is_up, error_message=None, commit=True,
+                 connection_mode=None, ttfb_ms=None, download_ms=None):
+    """Record a website check in the database (pass commit=False to batch several inserts)"""
     cur = conn.cursor()
     cur.execute(
-        "INSERT INTO checks (website_id, status_code, response_time_ms, is_up, checked_at, error_message) "
-        "VALUES (?, ?, ?, ?, ?, ?)",
-        (website_id, status_code, response_time_ms, is_up, datetime.utcnow().isoformat(), error_message)
+        "INSERT INTO checks (website_id, status_code, response_time_ms, is_up, checked_at, error_message, "
+        "connection_mode, ttfb_ms, download_ms) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (website_id, status_code, response_time_ms, is_up, datetime.utcnow().isoformat(), error_message,
+         connection_mode, ttfb_ms, download_ms)
     )
-    conn.commit()
+    if commit:
+        conn.commit()
     return cur.lastrowid
 
-def check_website(website):
-    """Check if a website is up"""
+def connections_opened(url):
+    """How many connections the session's pool for url has opened so far"""
+    try:
+        return get_session().get_adapter(url).poolmanager.connection_from_url(url).num_connections
+    except Exception:
+        return None
+
+def idle_connection_open(url):
+    """Whether the next request to url can go over an open pooled connection"""
+    try:
+        pool = get_session().get_adapter(url).poolmanager.connection_from_url(url)
+        # Pools are a LIFO queue of connections, padded with None; a
+        # connection closed mid-body stays in it but has to reconnect
+        idle = pool.pool.queue if pool.pool is not None else []
+        return bool(idle) and idle[-1] is not None and idle[-1].sock is not None
+    except Exception:
+        return None
+
+def fetch(url, method, cold):
+    """Send a streamed check request, falling back from HEAD to GET if HEAD isn't supported"""
+    import requests
+    
+    if cold:
+        response = requests.request(
+            method,
+            url,
+            timeout=CHECK_TIMEOUT_SECONDS,
+            stream=True,
+            headers={'User-Agent': 'UpMon Lambda Website Checker/1.0', 'Connection': 'close'}
+        )
+    else:
+        response = get_session().request(method, url, timeout=CHECK_TIMEOUT_SECONDS, stream=True)
+    if method == 'HEAD' and response.status_code in (405, 501):
+        response.close()
+        return fetch(url, 'GET', cold)
+    return response
+
+def read_window(response, max_bytes, keep):
+    """Read at most max_bytes of the body, then drop the rest of it"""
+    kept = bytearray()
+    received = 0
+    try:
+        for chunk in response.iter_content(chunk_size=min(STREAM_CHUNK_SIZE, max_bytes)):
+            chunk = chunk[:max_bytes - received]
+            received += len(chunk)
+            if keep:
+                kept += chunk
+            if received >= max_bytes:
+                break
+    finally:
+        response.close()
+    return bytes(kept)
+
+def match_keyword(website, body, max_bytes):
+    """Error message if the website's keyword isn't in the body window, otherwise None"""
+    import re
+    
+    keyword = website['check_keyword']
+    pattern = keyword if website['check_keyword_is_regex'] else re.escape(keyword)
+    if re.search(pattern, body.decode('utf-8', errors='replace')):
+        return None
+    kind = 'Pattern' if website['check_keyword_is_regex'] else 'Keyword'
+    return f"{kind} '{keyword}' not found in the first {max_bytes} bytes"
+
+def check_website(website, cold=COLD_CONNECTIONS):
+    """
+    Check if a website is up.
+    
+    Only the start of the body is read, as set by the website's check mode.
+    requests doesn't expose DNS, connect and TLS times, so only time to
+    first byte (including any connection setup) and download time are kept.
+    """
+    import requests
+    
     start_time = time.time()
     is_up = False
     status_code = None
     error_message = None
+    connection_mode = None
+    ttfb_ms = None
+    download_ms = None
+    mode = website['check_mode'] or 'partial'
+    method = 'HEAD' if mode == 'head' else 'GET'
+    max_bytes = min(website['check_max_bytes'] or DEFAULT_MAX_BYTES, MAX_BYTES_LIMIT)
+    match = mode == 'keyword' and bool(website['check_keyword'])
     
     try:
-        # Set a reasonable timeout
-        response = requests.get(
-            website['url'], 
-            timeout=10,
-            headers={'User-Agent': 'UpMon Lambda Website Checker/1.0'}
-        )
+        if cold:
+            response = fetch(website['url'], method, cold=True)
+            connection_mode = 'cold'
+        else:
+            opened = connections_opened(website['url'])
+            idle_open = idle_connection_open(website['url'])
+            response = fetch(website['url'], method, cold=False)
+            if opened is not None:
+                reused = idle_open and connections_opened(website['url']) == opened
+                connection_mode = 'reused' if reused else 'new'
+        body = read_window(response, max_bytes, keep=match)
         status_code = response.status_code
         # Consider 2xx and 3xx status codes as up
         is_up = 200 <= status_code < 400
+        if is_up and match:
+            error_message = match_keyword(website, body, max_bytes)
+            is_up = error_message is None
         response_time_ms = int((time.time() - start_time) * 1000)
+        # elapsed stops once the headers have been parsed
+        ttfb_ms = int(response.elapsed.total_seconds() * 1000)
+        download_ms = max(response_time_ms - ttfb_ms, 0)
     except requests.exceptions.RequestException as e:
         response_time_ms = int((time.time() - start_time) * 1000)
         error_message = str(e)
+    except Exception as e:
+        # Anything else (a malformed URL, a decoding bug) fails this site,
+        # not the whole invocation
+        response_time_ms = int((time.time() - start_time) * 1000)
+        is_up = False
+        error_message = f"Check failed: {type(e).__name__}: {e}"
     
     return {
         'website_id': website['id'],
         'status_code': status_code,
         'response_time_ms': response_time_ms,
         'is_up': is_up,
-        'error_message': error_message
+        'error_message': error_message,
+        'connection_mode': connection_mode,
+        'ttfb_ms': ttfb_ms,
+        'download_ms': download_ms
     }
 
-def notify_status_change(website, check_result):
-    """Notify the API about a status change"""
-    try:
-        response = requests.post(
-            f"{API_ENDPOINT}/notifications",
-            json={
-                'website_id': website['id'],
-                'website_name': website['name'],
-                'is_up': check_result['is_up'],
-                'status_code': check_result['status_code'],
-                'error_message': check_result['error_message']
+def new_state(website_id):
+    """Alerting state of a website that has none recorded yet"""
+    return {
+        'website_id': website_id,
+        'status': None,
+        'consecutive_failures': 0,
+        'consecutive_successes': 0,
+        'recent_results': 0,
+        'recent_count': 0,
+        'is_flapping': False,
+        'changed_at': None,
+        'notified_status': None,
+        'notified_at': None
+    }
+
+def load_states(conn):
+    """Alerting state of every website that has one, by website ID"""
+    cur = conn.cursor()
+    cur.execute(f"SELECT {', '.join(STATE_COLUMNS)} FROM website_states")
+    return {row['website_id']: dict(row) for row in cur.fetchall()}
+
+def save_states(conn, states):
+    """Upsert alerting states (committed with the checks)"""
+    updates = ', '.join(f"{column} = excluded.{column}" for column in STATE_COLUMNS[1:])
+    conn.executemany(
+        f"INSERT INTO website_states ({', '.join(STATE_COLUMNS)}) "
+        f"VALUES ({', '.join('?' for _ in STATE_COLUMNS)}) "
+        f"ON CONFLICT (website_id) DO UPDATE SET {updates}",
+        [tuple(state[column] for column in STATE_COLUMNS) for state in states]
+    )
+
+def flap_ratio(recent_results, recent_count):
+    """Share of consecutive checks in the window whose result changed"""
+    if recent_count < 2:
+        return 0.0
+    changes = (recent_results ^ (recent_results >> 1)) & ((1 << (recent_count - 1)) - 1)
+    return bin(changes).count('1') / (recent_count - 1)
+
+def alert_status(state):
+    """The status alerts are about: 'flapping', 'up', 'down' or None"""
+    return 'flapping' if state['is_flapping'] else state['status']
+
+def advance_state(state, is_up, now):
+    """
+    Feed one check result into a website's alerting state.
+    
+    The confirmed status only changes after enough checks in a row agree,
+    and a different number is needed each way, so one slow response
+    doesn't page anyone and one good one doesn't call an outage over.
+    Flapping is judged on the share of result changes in the last
+    FLAP_WINDOW checks, with separate start and stop ratios so a site near
+    the line doesn't keep entering and leaving it.
+    
+    Args:
+        state: State dict (see new_state), updated in place
+        is_up: Result of the check
+        now: Time of the check (datetime)
+    
+    Returns:
+        bool: Whether the status alerts are about changed
+    """
+    before = alert_status(state)
+    
+    if is_up:
+        state['consecutive_successes'] += 1
+        state['consecutive_failures'] = 0
+    else:
+        state['consecutive_failures'] += 1
+        state['consecutive_successes'] = 0
+    
+    state['recent_results'] = ((state['recent_results'] << 1) | int(is_up)) & ((1 << FLAP_WINDOW) - 1)
+    state['recent_count'] = min(state['recent_count'] + 1, FLAP_WINDOW)
+    
+    if is_up and state['status'] != 'up' and state['consecutive_successes'] >= ALERT_RECOVERY_THRESHOLD:
+        state['status'] = 'up'
+    elif not is_up and state['status'] != 'down' and state['consecutive_failures'] >= ALERT_FAILURE_THRESHOLD:
+        state['status'] = 'down'
+    
+    ratio = flap_ratio(state['recent_results'], state['recent_count'])
+    if not state['is_flapping'] and state['recent_count'] >= FLAP_WINDOW // 2 and ratio > FLAP_START_RATIO:
+        state['is_flapping'] = True
+    elif state['is_flapping'] and ratio < FLAP_STOP_RATIO:
+        state['is_flapping'] = False
+    
+    changed = alert_status(state) != before
+    if changed:
+        state['changed_at'] = now.isoformat()
+    return changed
+
+class AlertQueue:
+    """
+    Collects alerts during a run, one per website at most.
+    
+    A website is due an alert when the status alerts are about differs
+    from the last one notified, so a site that goes down and comes back
+    before its alert is sent produces none, and several changes collapse
+    into the latest.  A site alerted within ALERT_MIN_INTERVAL_SECONDS
+    waits; the change stays pending in its state and goes out on a later
+    run if it still holds.  Nothing is sent for a new site coming up.
+    """
+    
+    def __init__(self, min_interval=ALERT_MIN_INTERVAL_SECONDS, max_per_run=ALERT_MAX_PER_RUN):
+        self.min_interval = min_interval
+        self.max_per_run = max_per_run
+        self.alerts = []
+        self.deferred = 0
+    
+    def offer(self, website, state, check_result, now):
+        """Queue an alert for the website if one is due"""
+        status = alert_status(state)
+        if status is None or status == state['notified_status']:
+            return
+        if state['notified_status'] is None and status == 'up':
+            # First confirmed status of a new site, nothing to report
+            state['notified_status'] = status
+            return
+        if state['notified_at'] is not None:
+            since = (now - datetime.fromisoformat(state['notified_at'])).total_seconds()
+            if since < self.min_interval:
+                self.deferred += 1
+                return
+        self.alerts.append((website, state, check_result, status))
+    
+    def flush(self, send, now):
+        """
+        Send the queued alerts, or the first max_per_run of them and one
+        summary of the rest.
+        
+        Returns:
+            int: Notifications sent
+        """
+        sent = 0
+        for website, state, check_result, status in self.alerts[:self.max_per_run]:
+            previous = state['notified_status']
+            if send(website, {**check_result, 'status': status, 'previous_status': previous}):
+                state['notified_status'] = status
+                state['notified_at'] = now.isoformat()
+                sent += 1
+        overflow = self.alerts[self.max_per_run:]
+        if overflow:
+            summary = {
+                'website_id': None,
+                'website_name': f"{len(overflow)} more websites",
+                'status': 'summary',
+                'changes': [
+                    {'website_id': website['id'], 'status': status} for website, _, _, status in overflow
+                ]
             }
-        )
-        return response.status_code == 200
-    except:
-        return False
+            if send(None, summary):
+                for _, state, _, status in overflow:
+                    state['notified_status'] = status
+                    state['notified_at'] = now.isoformat()
+                sent += 1
+        self.alerts = []
+        return sent
+
+def notify_status_change(conn, website, check_result, now):
+    """
+    Queue a status change notification on every channel.
+    
+    The rows are written in the caller's transaction, together with the
+    alerting states that record the notification as sent, so an alert is
+    queued exactly once; dispatch_notifications() delivers it.
+    
+    Args:
+        conn: Database connection
+        website: Website row, or None for a summary of several changes
+        check_result: Check result with the alert status ('up', 'down' or
+            'flapping') and the previous one, or the summary
+        now: Current time (datetime)
+    """
+    if website is None:
+        payload = check_result
+    else:
+        payload = {
+            'website_id': website['id'],
+            'website_name': website['name'],
+            'status': check_result['status'],
+            'previous_status': check_result['previous_status'],
+            'is_up': check_result['is_up'],
+            'status_code': check_result['status_code'],
+            'error_message': check_result['error_message']
+        }
+    conn.executemany(
+        "INSERT INTO notification_outbox (channel, payload, status, attempts, created_at, next_attempt_at) "
+        "VALUES (?, ?, 'pending', 0, ?, ?)",
+        [(channel, json.dumps(payload), now.isoformat(), now.isoformat()) for channel in NOTIFICATION_CHANNELS]
+    )
+    return True
+
+def backoff_seconds(attempts):
+    """Delay before retrying a notification that has failed attempts times"""
+    return min(NOTIFY_BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), NOTIFY_BACKOFF_MAX_SECONDS)
+
+def deliver_channel(url, rows, deadline):
+    """
+    POST a channel's due notifications in batches, oldest first.
+    
+    Runs on a dispatcher thread, so it doesn't touch the database.  Stops at
+    the first failed batch, so a channel's notifications arrive in order,
+    and backs the rest of the channel off with it rather than sending them
+    to an endpoint that just failed.  Doesn't start a batch that could
+    time out after the deadline.
+    
+    Returns:
+        list: (notification IDs, error message or None, time finished,
+            whether they were attempted) for each batch attempted, and
+            for the notifications held back after a failure
+    """
+    import requests
+    
+    session = get_session()
+    outcomes = []
+    for start in range(0, len(rows), NOTIFY_BATCH_SIZE):
+        if time.monotonic() + sum(NOTIFY_TIMEOUT) > deadline:
+            break
+        batch = rows[start:start + NOTIFY_BATCH_SIZE]
+        ids = [row['id'] for row in batch]
+        error = None
+        try:
+            response = session.post(url, timeout=NOTIFY_TIMEOUT, json={
+                'notifications': [{'id': row['id'], **json.loads(row['payload'])} for row in batch]
+            })
+            if not 200 <= response.status_code < 300:
+                error = f"HTTP {response.status_code}"
+        except requests.exceptions.RequestException as e:
+            error = str(e)
+        outcomes.append((ids, error, datetime.utcnow(), True))
+        if error:
+            held_back = [row['id'] for row in rows[start + NOTIFY_BATCH_SIZE:]]
+            if held_back:
+                outcomes.append((held_back, error, datetime.utcnow(), False))
+            break
+    return outcomes
+
+def dispatch_notifications(conn, budget_seconds=NOTIFY_DISPATCH_SECONDS):
+    """
+    Deliver due notifications from the outbox, one thread per channel.
+    
+    A slow or failing channel only holds up its own notifications, and the
+    whole dispatch returns within budget_seconds (no batch starts unless
+    it can time out by then); anything not confirmed stays pending for the
+    next run.  Receivers get each
+    notification's outbox ID and may see it again after a timeout.
+    
+    Returns:
+        dict: delivered, retrying, dead_lettered and pending counts, plus
+            delivery latency (queued to accepted) p50/p95/max in ms
+    """
+    now = datetime.utcnow()
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT id, channel, payload, attempts, created_at FROM notification_outbox "
+        "WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY id",
+        (now.isoformat(),)
+    )
+    due = {}
+    for row in cur.fetchall():
+        due.setdefault(row['channel'], []).append(row)
+    
+    metrics = {'delivered': 0, 'retrying': 0, 'dead_lettered': 0}
+    latencies = []
+    if due:
+        rows_by_id = {row['id']: row for rows in due.values() for row in rows}
+        get_session()
+        deadline = time.monotonic() + budget_seconds
+        executor = ThreadPoolExecutor(max_workers=len(due))
+        futures = [
+            executor.submit(deliver_channel, NOTIFICATION_CHANNELS[channel], rows, deadline)
+            for channel, rows in due.items() if channel in NOTIFICATION_CHANNELS
+        ]
+        done, _ = wait(futures, timeout=max(budget_seconds, 0))
+        executor.shutdown(wait=False)
+        
+        for future in done:
+            for ids, error, finished_at, attempted in future.result():
+                for notification_id in ids:
+                    row = rows_by_id[notification_id]
+                    if not attempted:
+                        retry_at = finished_at + timedelta(seconds=backoff_seconds(row['attempts'] + 1))
+                        conn.execute(
+                            "UPDATE notification_outbox SET next_attempt_at = ? WHERE id = ?",
+                            (retry_at.isoformat(), notification_id)
+                        )
+                    elif error is None:
+                        conn.execute(
+                            "UPDATE notification_outbox SET status = 'delivered', attempts = ?, delivered_at = ?, "
+                            "last_error = NULL WHERE id = ?",
+                            (row['attempts'] + 1, finished_at.isoformat(), notification_id)
+                        )
+                        latencies.append((finished_at - datetime.fromisoformat(row['created_at'])).total_seconds())
+                        metrics['delivered'] += 1
+                    elif row['attempts'] + 1 >= NOTIFY_MAX_ATTEMPTS:
+                        conn.execute(
+                            "UPDATE notification_outbox SET status = 'dead', attempts = ?, last_error = ? WHERE id = ?",
+                            (row['attempts'] + 1, error, notification_id)
+                        )
+                        metrics['dead_lettered'] += 1
+                    else:
+                        retry_at = finished_at + timedelta(seconds=backoff_seconds(row['attempts'] + 1))
+                        conn.execute(
+                            "UPDATE notification_outbox SET attempts = ?, next_attempt_at = ?, last_error = ? "
+                            "WHERE id = ?",
+                            (row['attempts'] + 1, retry_at.isoformat(), error, notification_id)
+                        )
+                        metrics['retrying'] += 1
+    
+    conn.execute(
+        "DELETE FROM notification_outbox WHERE status = 'delivered' AND delivered_at < ?",
+        ((now - timedelta(days=NOTIFY_KEEP_DAYS)).isoformat(),)
+    )
+    conn.commit()
+    
+    cur.execute("SELECT COUNT(*) FROM notification_outbox WHERE status = 'pending'")
+    metrics['pending'] = cur.fetchone()[0]
+    latencies.sort()
+    metrics['latency_ms'] = {
+        'p50': int(latencies[len(latencies) // 2] * 1000),
+        'p95': int(latencies[int(len(latencies) * 0.95)] * 1000),
+        'max': int(latencies[-1] * 1000)
+    } if latencies else None
+    return metrics
 
 def lambda_handler(event, context):
-    """AWS Lambda handler function"""
+    """
+    AWS Lambda handler function.
+    
+    Checks every active website (or those listed by event's
+    continuation_token) concurrently, stopping in time to store the
+    results within the invocation's remaining time.  Checks, alerting
+    states and queued notifications are written in one transaction.
+    Websites it didn't get to are returned as continuation_token, to pass
+    to the next invocation; it is None once everything was checked.
+    """
+    deadline = run_deadline(context)
+    website_ids = None
+    if event and event.get('continuation_token'):
+        try:
+            website_ids = decode_continuation_token(event['continuation_token'])
+        except ValueError as e:
+            return {
+                'statusCode': 400,
+                'body': json.dumps({
+                    'message': str(e)
+                })
+            }
+    
     try:
         # Connect to the database
         conn = connect_db()
         
         # Fetch websites to check
-        websites = fetch_websites(conn)
+        websites, websites_cached = fetch_websites(conn, website_ids)
+        states = load_states(conn)
+        alerts = AlertQueue()
         
         results = []
-        for website in websites:
-            # Check website status
-            check_result = check_website(website)
+        checked = []
+        unchecked = []
+        for website, check_result in run_checks(websites, deadline):
+            if check_result is None:
+                unchecked.append(website['id'])
+                continue
+            checked.append(website)
             
-            # Record the check
+            # Record the check (committed with everything else below)
             check_id = record_check(
                 conn,
                 check_result['website_id'],
                 check_result['status_code'],
                 check_result['response_time_ms'],
                 check_result['is_up'],
-                check_result['error_message']
+                check_result['error_message'],
+                commit=False,
+                connection_mode=check_result['connection_mode'],
+                ttfb_ms=check_result['ttfb_ms'],
+                download_ms=check_result['download_ms']
             )
             
             # Add the result to our list
@@ -111,16 +732,43 @@ def lambda_handler(event, context):
                 'is_up': check_result['is_up']
             })
             
-            # TODO: In Phase 2, implement status change detection and notification
+            # Only confirmed changes (and the start and end of flapping)
+            # can raise an alert
+            now = datetime.utcnow()
+            state = states.setdefault(website['id'], new_state(website['id']))
+            advance_state(state, check_result['is_up'], now)
+            alerts.offer(website, state, check_result, now)
+        
+        # Alerts are queued in the same transaction that records them as
+        # sent, then delivered from the outbox
+        now = datetime.utcnow()
+        notifications_queued = alerts.flush(
+            lambda website, check_result: notify_status_change(conn, website, check_result, now), now
+        )
+        save_states(conn, [states[website['id']] for website in checked])
+        conn.commit()
+        # Deliver in whatever is left of the time kept back for it
+        notifications = dispatch_notifications(
+            conn, budget_seconds=min(NOTIFY_DISPATCH_SECONDS, deadline + NOTIFY_DISPATCH_SECONDS - time.monotonic())
+        )
         
         return {
             'statusCode': 200,
             'body': json.dumps({
                 'message': f"Successfully checked {len(results)} websites",
-                'results': results
+                'results': results,
+                'unchecked': len(unchecked),
+                'websites_cached': websites_cached,
+                'continuation_token': encode_continuation_token(unchecked) if unchecked else None,
+                'notifications_queued': notifications_queued,
+                'notifications_deferred': alerts.deferred,
+                'notifications': notifications
             })
         }
     except Exception as e:
+        # The connection outlives this invocation, so drop anything half written
+        if _conn is not None:
+            _conn.rollback()
         return {
             'statusCode': 500,
             'body': json.dumps({